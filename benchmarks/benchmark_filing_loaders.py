@@ -0,0 +1,192 @@
+"""
+Loading a filing from its native HTML/iXBRL against loading the PDF rendering of it.
+
+    python -m benchmarks.benchmark_filing_loaders --html aapl-20230930.htm --pdf aapl-20230930.pdf
+    python -m benchmarks.benchmark_filing_loaders --pages 120
+
+Without --html/--pdf a synthetic 10-K (items, statement tables tagged with
+ix:nonFraction, a hidden ix:header, page numbers and "Table of Contents" links)
+is written both as inline XBRL and as a plain text PDF of the same pages.
+Reports pages/sec, extracted characters, chunks and sections from
+split_sec_filing, financial facts found and peak Python memory per path.
+"""
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+from financial_facts import extract_financial_facts
+from routes.upload_filings.filing_loaders import load_filing_pages
+from routes.upload_filings.sec_section_splitter import split_sec_filing
+
+ITEMS = [("1", "Business"), ("1A", "Risk Factors"), ("2", "Properties"), ("3", "Legal Proceedings"),
+         ("7", "Management's Discussion and Analysis"), ("8", "Financial Statements and Supplementary Data")]
+SENTENCE = ("The Company depends on component suppliers and contract manufacturers located outside the "
+            "United States, and changes in trade policy could affect gross margin in future periods. ")
+STATEMENT = [("Total net sales", [383285, 394328, 365817]), ("Cost of sales", [214137, 223546, 212981]),
+             ("Gross margin", [169148, 170782, 152836]), ("Operating income", [114301, 119437, 108949]),
+             ("Net income", [96995, 99803, 94680])]
+
+
+def synthetic_pages(page_count):
+    """Per page: a list of ('text', str) and ('row', [cells]) blocks"""
+    pages = []
+    for number in range(page_count):
+        blocks = []
+        if number % max(1, page_count // len(ITEMS)) == 0 and number // max(1, page_count // len(ITEMS)) < len(ITEMS):
+            item, title = ITEMS[number // max(1, page_count // len(ITEMS))]
+            blocks.append(("text", f"Item {item}. {title}"))
+        if number % 10 == 5:
+            blocks.append(("text", "CONSOLIDATED STATEMENTS OF OPERATIONS (In millions, except per-share amounts)"))
+            blocks.append(("row", ["", "2023", "2022", "2021"]))
+            for label, values in STATEMENT:
+                blocks.append(("row", [label] + [f"$ {value:,}" for value in values]))
+        for paragraph in range(6):
+            blocks.append(("text", SENTENCE * 4))
+        pages.append(blocks)
+    return pages
+
+
+def write_ixbrl(pages, path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<html xmlns="http://www.w3.org/1999/xhtml" '
+                'xmlns:ix="http://www.xbrl.org/2013/inlineXBRL"><head><title>10-K</title>'
+                '<style>td { padding: 2px; }</style></head><body>\n')
+        f.write('<div style="display:none"><ix:header><ix:hidden>')
+        for index in range(200):
+            f.write(f'<ix:nonNumeric name="dei:Hidden{index}" contextRef="c-1">hidden fact {index}</ix:nonNumeric>')
+        f.write('</ix:hidden><ix:resources><xbrli:context id="c-1"><xbrli:entity>0000320193</xbrli:entity>'
+                '</xbrli:context></ix:resources></ix:header></div>\n')
+        for number, blocks in enumerate(pages, start=1):
+            in_table = False
+            for kind, content in blocks:
+                if kind == "row" and not in_table:
+                    f.write('<table style="border-collapse:collapse;width:100%">')
+                    in_table = True
+                elif kind == "text" and in_table:
+                    f.write("</table>")
+                    in_table = False
+                if kind == "text":
+                    f.write(f'<div style="margin-top:6pt"><span style="font-family:Helvetica">{content}</span></div>\n')
+                else:
+                    cells = [f"<td>{content[0]}</td>"]
+                    for value in content[1:]:
+                        if value.startswith("$ "):
+                            cells.append('<td>$</td><td style="text-align:right">'
+                                         f'<ix:nonFraction name="us-gaap:Revenues" contextRef="c-1" unitRef="usd" '
+                                         f'decimals="-6" scale="6">{value[2:]}</ix:nonFraction></td>')
+                        else:
+                            cells.append(f"<td>{value}</td>")
+                    f.write(f"<tr>{''.join(cells)}</tr>\n")
+            if in_table:
+                f.write("</table>")
+            f.write(f'<div style="text-align:center">{number}</div>'
+                    '<div><a href="#toc">Table of Contents</a></div>'
+                    '<hr style="page-break-after:always"/>\n')
+        f.write("</body></html>\n")
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(text, width=110):
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}".strip()
+    return lines + ([line] if line else [])
+
+
+def write_pdf(pages, path):
+    """Minimal PDF with one text content stream per page (Helvetica 8pt)"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for number, blocks in enumerate(pages, start=1):
+        lines = []
+        for kind, content in blocks:
+            lines.extend(_wrap(content) if kind == "text" else ["  ".join(content)])
+        lines.append(str(number))
+        stream = "BT /F1 8 Tf 10 TL 36 770 Td " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+    with open(path, "wb") as f:
+        offsets = []
+        f.write(b"%PDF-1.4\n")
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+        xref = f.tell()
+        f.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+        for offset in offsets:
+            f.write(f"{offset:010d} 00000 n \n".encode("latin-1"))
+        f.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1"))
+
+
+def measure(path, loader, repeats, chunk_size, chunk_overlap):
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        pages = load_filing_pages(path, loader)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    load_filing_pages(path, loader)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    documents = split_sec_filing(pages, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return {
+        "loader": loader,
+        "file_mb": os.path.getsize(path) / 1e6,
+        "seconds": best,
+        "pages": len(pages),
+        "pages_per_second": len(pages) / best if best else 0.0,
+        "characters": sum(len(page.page_content) for page in pages),
+        "chunks": len(documents),
+        "sections": len({document.metadata["section"] for document in documents}),
+        "financial_facts": len(extract_financial_facts(pages)),
+        "peak_mb": peak / 1e6
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--html", help="Native HTML/iXBRL filing")
+    parser.add_argument("--pdf", help="PDF rendering of the same filing")
+    parser.add_argument("--pages", type=int, default=120, help="Pages of the synthetic filing")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        html_path, pdf_path = args.html, args.pdf
+        if not html_path or not pdf_path:
+            pages = synthetic_pages(args.pages)
+            html_path = html_path or os.path.join(scratch, "filing.htm")
+            pdf_path = pdf_path or os.path.join(scratch, "filing.pdf")
+            if not args.html:
+                write_ixbrl(pages, html_path)
+            if not args.pdf:
+                write_pdf(pages, pdf_path)
+
+        print(f"{'loader':<6} {'file MB':>8} {'seconds':>8} {'pages':>6} {'pages/s':>9} {'chars':>9} "
+              f"{'chunks':>7} {'sections':>8} {'facts':>6} {'peak MB':>8}")
+        for path, loader in ((pdf_path, "pdf"), (html_path, "html")):
+            row = measure(path, loader, args.repeats, args.chunk_size, args.chunk_overlap)
+            print(f"{row['loader']:<6} {row['file_mb']:>8.2f} {row['seconds']:>8.3f} {row['pages']:>6} "
+                  f"{row['pages_per_second']:>9.1f} {row['characters']:>9} {row['chunks']:>7} "
+                  f"{row['sections']:>8} {row['financial_facts']:>6} {row['peak_mb']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
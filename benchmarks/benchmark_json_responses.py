@@ -0,0 +1,84 @@
+"""
+Serialization time and payload size of document listings.
+
+    python -m benchmarks.benchmark_json_responses --documents 2000
+
+Builds rows shaped like `documents` (including a long generated description),
+then compares Flask's default JSON provider with OrjsonProvider and reports
+identity, gzip and zstd payload sizes with their compression time.
+"""
+import gzip
+import time
+import argparse
+
+import zstandard
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from http_utils import OrjsonProvider
+
+
+def make_documents(count):
+    description = ("This Form 10-K annual report describes the registrant's business, risk factors, "
+                   "results of operations and financial condition for the fiscal year. ") * 8
+    return [{
+        "id": i,
+        "description": description,
+        "version": None,
+        "valid_from": "2023-01-01",
+        "valid_to": "2023-12-31",
+        "employer": f"Issuer {i % 50}",
+        "title": f"Annual report {i}",
+        "notes": None,
+        "language": "en",
+        "filetype": "application/pdf",
+        "filename": f"10-K_{i}.pdf",
+        "file_size_bytes": 1_500_000 + i,
+        "file_path": None,
+        "vectorstore_path": f"vectorstore/10-K_{i}",
+        "upload_date": "2025-01-01T00:00:00",
+        "chunk_size": 1000,
+        "chunk_overlap": 200,
+        "embedding_model": "text-embedding-3-small",
+        "processing_status": "pending",
+        "created_at": "2025-01-01 00:00:00",
+        "updated_at": "2025-01-01 00:00:00",
+        "added_at": "2025-01-01T00:00:00",
+        "added_by": None
+    } for i in range(count)]
+
+
+def timed(fn, repeats):
+    samples = []
+    result = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    payload = {"documents": make_documents(args.documents), "count": args.documents}
+    app = Flask(__name__)
+
+    for name, provider in (("flask default", DefaultJSONProvider(app)), ("orjson", OrjsonProvider(app))):
+        with app.app_context():
+            ms, response = timed(lambda: provider.response(payload), args.repeats)
+        print(f"{name:<14} serialize {ms:8.2f} ms  {len(response.get_data()):>10,} bytes")
+
+    body = OrjsonProvider(app).response(payload).get_data()
+    compressor = zstandard.ZstdCompressor(level=3)
+    for name, compress in (("gzip", lambda: gzip.compress(body, compresslevel=5)), ("zstd", lambda: compressor.compress(body))):
+        ms, compressed = timed(compress, args.repeats)
+        print(f"{name:<14} compress  {ms:8.2f} ms  {len(compressed):>10,} bytes ({len(compressed) / len(body):.1%} of identity)")
+
+
+if __name__ == "__main__":
+    main()
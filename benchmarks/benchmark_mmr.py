@@ -0,0 +1,71 @@
+"""
+Latency of diversified (MMR) retrieval against plain top-k on a FAISS flat index.
+
+    python -m benchmarks.benchmark_mmr --vectors 20000 --k 4 --fetch-k 20 40 100
+
+Compares plain top-k search, top-k search plus the vectorized NumPy MMR in
+retrieval.mmr_search, and LangChain's reference maximal_marginal_relevance.
+"""
+import time
+import argparse
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores.utils import maximal_marginal_relevance as langchain_mmr
+
+from retrieval.mmr_search import maximal_marginal_relevance, fetch_candidates
+
+
+class _IndexOnly:
+    def __init__(self, index):
+        self.index = index
+
+
+def timed(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--fetch-k", type=int, nargs="+", default=[20, 40, 100])
+    parser.add_argument("--lambda-mult", type=float, default=0.5)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.vectors, args.dimensions)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = faiss.IndexFlatL2(args.dimensions)
+    index.add(vectors)
+    store = _IndexOnly(index)
+    query = vectors[0] + 0.1 * rng.standard_normal(args.dimensions).astype(np.float32)
+
+    p50, p95 = timed(lambda: index.search(query.reshape(1, -1), args.k), args.repeats)
+    print(f"{'plain top-k':<32} k={args.k:<4} p50 {p50:7.2f} ms  p95 {p95:7.2f} ms")
+
+    for fetch_k in args.fetch_k:
+        def numpy_mmr():
+            ids, candidate_vectors = fetch_candidates(store, query, fetch_k)
+            maximal_marginal_relevance(query, candidate_vectors, k=args.k, lambda_mult=args.lambda_mult)
+
+        def reference_mmr():
+            ids, candidate_vectors = fetch_candidates(store, query, fetch_k)
+            langchain_mmr(query, candidate_vectors, k=args.k, lambda_mult=args.lambda_mult)
+
+        p50, p95 = timed(numpy_mmr, args.repeats)
+        print(f"{'top-k + numpy MMR':<32} fetch_k={fetch_k:<4} p50 {p50:7.2f} ms  p95 {p95:7.2f} ms")
+        p50, p95 = timed(reference_mmr, args.repeats)
+        print(f"{'top-k + langchain MMR':<32} fetch_k={fetch_k:<4} p50 {p50:7.2f} ms  p95 {p95:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
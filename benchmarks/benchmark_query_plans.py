@@ -0,0 +1,185 @@
+"""
+Query plans and latency of the DocumentLibraryManager queries on a seeded
+document library, before and after the schema migrations:
+
+    python -m benchmarks.benchmark_query_plans --documents 100000
+
+Seeds a database at schema version 1 (the schema before the hot-query
+indexes), calls every DocumentLibraryManager method below with the SQL it
+executes traced, and prints the EXPLAIN QUERY PLAN of each statement and the
+median latency of the read-only calls; then migrates the database to the
+current version and does the same.
+
+Exits non-zero if, once migrated, a statement scans a table without an index.
+The listings that return every live row (get_agreements, and search_documents
+outside a collection, a substring match) are exempt: no index can narrow them,
+and walking one in order measured slower than scanning the table and sorting.
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+from document_library_database import DocumentLibraryManager, migrate_document_library_db, get_schema_version, SCHEMA_VERSION
+
+EMPLOYERS = 2000
+STATEMENTS = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+# (name, call, read_only, listing)
+CASES = [
+    ("get_agreements", lambda m: m.get_agreements(), True, True),
+    ("get_all_collections", lambda m: m.get_all_collections(), True, False),
+    ("get_all_collections(include_inactive)", lambda m: m.get_all_collections(include_inactive=True), True, False),
+    ("get_collection_by_id", lambda m: m.get_collection_by_id(7), True, False),
+    ("get_document_by_id", lambda m: m.get_document_by_id(4242), True, False),
+    ("find_document_by_content", lambda m: m.find_document_by_content("hash-4242", "fingerprint"), True, False),
+    ("get_documents_by_collection", lambda m: m.get_documents_by_collection(7), True, False),
+    ("find_filings", lambda m: m.find_filings("issuer-7"), True, False),
+    ("find_filings(period, limit)", lambda m: m.find_filings("issuer-7", "2010-01-01", "2019-12-31", limit=4), True, False),
+    ("get_collections_for_document", lambda m: m.get_collections_for_document(4242), True, False),
+    ("search_documents", lambda m: m.search_documents("title 42"), True, True),
+    ("search_documents(collection)", lambda m: m.search_documents("title 42", collection_id=7), True, False),
+    ("set_filing_period", lambda m: m.set_filing_period(4243, "issuer-7", "2024-01-01", "2024-12-31"), False, False),
+    ("update_document_processing_status", lambda m: m.update_document_processing_status(4244, "completed"), False, False),
+    ("update_collection", lambda m: m.update_collection(8, description="Benchmark"), False, False),
+    ("add_document_to_collection", lambda m: m.add_document_to_collection(4245, 8), False, False),
+    ("remove_document_from_collection", lambda m: m.remove_document_from_collection(4245, 8), False, False),
+    ("bulk_add_documents_to_collection", lambda m: m.bulk_add_documents_to_collection(9, list(range(5000, 5050))), False, False),
+    ("bulk_move_documents", lambda m: m.bulk_move_documents(9, 10, list(range(5000, 5050))), False, False),
+    ("bulk_remove_documents_from_collection", lambda m: m.bulk_remove_documents_from_collection(10, list(range(5000, 5050))), False, False),
+    ("delete_document", lambda m: m.delete_document(4246), False, False),
+]
+
+
+def seed(db_path, documents, collections, seed_value=0):
+    """A library at schema version 1: issuers with yearly filings, about 5% deleted, each document in one or two collections"""
+    migrate_document_library_db(db_path, target_version=1)
+    rng = random.Random(seed_value)
+    start = datetime(2024, 1, 1)
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        'INSERT INTO collections (id, name, is_active, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+        [(index, f"collection-{index}", int(index % 10 != 0), (start + timedelta(hours=index)).isoformat(), start.isoformat())
+         for index in range(1, collections + 1)])
+    rows = []
+    for index in range(1, documents + 1):
+        year = rng.randrange(2000, 2025)
+        created = (start + timedelta(minutes=rng.randrange(525600))).isoformat()
+        rows.append((
+            index, f"title {index}", f"issuer-{rng.randrange(EMPLOYERS)}", f"{year}-01-01", f"{year}-12-31",
+            f"filing-{index}.pdf", f"vectorstore/store-{index}" if rng.random() < 0.97 else None,
+            f"hash-{index}", "fingerprint", "deleted" if rng.random() < 0.05 else "completed", created, created, "notes"))
+    conn.executemany('''
+        INSERT INTO documents (id, title, employer, valid_from, valid_to, filename, vectorstore_path, content_hash,
+                               vectorization_fingerprint, processing_status, created_at, updated_at, notes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    memberships = {(index, rng.randrange(1, collections + 1)) for index in range(1, documents + 1) for _ in range(rng.choice((1, 1, 2)))}
+    conn.executemany(
+        'INSERT OR IGNORE INTO document_collections (document_id, collection_id, added_at) VALUES (?, ?, ?)',
+        [(document_id, collection_id, (start + timedelta(minutes=rng.randrange(525600))).isoformat())
+         for document_id, collection_id in sorted(memberships)])
+    conn.commit()
+    conn.close()
+
+
+def full_scans(plan):
+    """Plan steps reading a whole table rather than searching it or walking an index"""
+    return [step for step in plan
+            if step.startswith('SCAN ') and 'USING' not in step and 'VIRTUAL TABLE' not in step and 'CONSTANT ROW' not in step]
+
+
+def measure(db_path, repeats):
+    """{case name: (median ms or None, [(statement, plan steps)])} on the database as it is"""
+    # Statements are only collected while a case runs for its trace, not while it is timed
+    trace = {"statements": None}
+    DocumentLibraryManager.get_connection = classmethod(lambda cls: _connect(db_path, trace))
+    explain = sqlite3.connect(db_path)
+    results = {}
+    for name, call, read_only, _ in CASES:
+        trace["statements"] = []
+        call(DocumentLibraryManager)
+        statements = [sql for sql in trace["statements"] if sql.lstrip().upper().startswith(STATEMENTS)]
+        trace["statements"] = None
+        # Bulk operations run one statement per id; one of each plan is enough
+        plans = {}
+        for sql in statements:
+            plan = tuple(row[3] for row in explain.execute(f'EXPLAIN QUERY PLAN {sql}'))
+            plans.setdefault(plan, sql)
+        median = None
+        if read_only:
+            samples = []
+            for _ in range(repeats):
+                started = time.perf_counter()
+                call(DocumentLibraryManager)
+                samples.append((time.perf_counter() - started) * 1000)
+            median = sorted(samples)[len(samples) // 2]
+        results[name] = (median, [(sql, list(plan)) for plan, sql in plans.items()])
+    explain.close()
+    return results
+
+
+def _connect(db_path, trace):
+    conn = sqlite3.connect(db_path)
+    conn.set_trace_callback(lambda sql: trace["statements"] is not None and trace["statements"].append(sql))
+    return conn
+
+
+def _one_line(sql):
+    return " ".join(sql.split())[:110]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=100000)
+    parser.add_argument("--collections", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=11)
+    parser.add_argument("--db", default=None, help="Keep the seeded database at this path (default a temporary file)")
+    parser.add_argument("--statements", action="store_true", help="Print each traced statement above its plan")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = args.db or os.path.join(directory, "library.db")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        started = time.perf_counter()
+        seed(db_path, args.documents, args.collections)
+        print(f"Seeded {args.documents} documents in {args.collections} collections in {time.perf_counter() - started:.1f}s")
+
+        before = measure(db_path, args.repeats)
+        migrate_document_library_db(db_path)
+        with sqlite3.connect(db_path) as conn:
+            version = get_schema_version(conn)
+        assert version == SCHEMA_VERSION, version
+        after = measure(db_path, args.repeats)
+
+        failures = []
+        print(f"\n{'':<40}{'v1 ms':>10}{f'v{version} ms':>10}")
+        for name, _, _, listing in CASES:
+            (before_ms, before_plans), (after_ms, after_plans) = before[name], after[name]
+            fmt = lambda ms: f"{ms:10.2f}" if ms is not None else f"{'-':>10}"
+            print(f"{name:<40}{fmt(before_ms)}{fmt(after_ms)}")
+            if [plan for _, plan in before_plans] != [plan for _, plan in after_plans]:
+                for sql, plan in before_plans:
+                    print(f"      v1: {' ; '.join(plan) or '(no table access)'}")
+            for sql, plan in after_plans:
+                if args.statements:
+                    print(f"    {_one_line(sql)}")
+                print(f"      v{version}: {' ; '.join(plan) or '(no table access)'}")
+                if full_scans(plan) and not listing:
+                    failures.append((name, _one_line(sql), full_scans(plan)))
+
+    if failures:
+        print("\nFull table scans after migrating:")
+        for name, sql, steps in failures:
+            print(f"  {name}: {' ; '.join(steps)}\n    {sql}")
+        sys.exit(1)
+    print(f"\nNo full table scans outside the {sum(1 for case in CASES if case[3])} full listings")
+
+
+if __name__ == "__main__":
+    main()
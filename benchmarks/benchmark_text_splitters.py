@@ -0,0 +1,104 @@
+"""
+Chunking throughput, memory and chunk-size spread of the splitters vectorize_file can use.
+
+    python -m benchmarks.benchmark_text_splitters --pages 1000 --chunk-tokens 256 --overlap-tokens 32
+    python -m benchmarks.benchmark_text_splitters --file aapl-20230930.htm
+
+Compares the character RecursiveCharacterTextSplitter (chunk sizes scaled by
+--chars-per-token), LangChain's recursive splitter measuring length with
+tiktoken, and TokenAwareTextSplitter. Without --file a synthetic 10-K of
+--pages pages is used (see benchmark_filing_loaders).
+"""
+import time
+import argparse
+import statistics
+import tracemalloc
+
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from routes.upload_filings.class_TokenAwareTextSplitter import TokenAwareTextSplitter, get_encoding
+from routes.upload_filings.filing_loaders import select_loader, load_filing_pages
+from benchmarks.benchmark_filing_loaders import synthetic_pages
+
+
+def synthetic_documents(page_count):
+    documents = []
+    for number, blocks in enumerate(synthetic_pages(page_count)):
+        text = "\n\n".join(content if kind == "text" else "  ".join(content) for kind, content in blocks)
+        documents.append(Document(page_content=text, metadata={"page": number}))
+    return documents
+
+
+def measure(name, splitter, pages, encoding, chunk_tokens, repeats):
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        chunks = splitter.split_documents(pages)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    splitter.split_documents(pages)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    sizes = sorted(len(tokens) for tokens in encoding.encode_ordinary_batch([chunk.page_content for chunk in chunks]))
+    return {
+        "splitter": name,
+        "seconds": best,
+        "chunks": len(chunks),
+        "chunks_per_second": len(chunks) / best if best else 0.0,
+        "pages_per_second": len(pages) / best if best else 0.0,
+        "peak_mb": peak / 1e6,
+        "tokens_mean": statistics.fmean(sizes),
+        "tokens_p5": sizes[int(len(sizes) * 0.05)],
+        "tokens_p95": sizes[int(len(sizes) * 0.95) - 1],
+        "tokens_stdev": statistics.pstdev(sizes),
+        "over_budget": sum(1 for size in sizes if size > chunk_tokens)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", help="PDF or HTML/iXBRL filing to split")
+    parser.add_argument("--pages", type=int, default=1000, help="Pages of the synthetic filing")
+    parser.add_argument("--chunk-tokens", type=int, default=256)
+    parser.add_argument("--overlap-tokens", type=int, default=32)
+    parser.add_argument("--chars-per-token", type=float, default=4.0)
+    parser.add_argument("--embedding-model", default="text-embedding-ada-002")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_filing_pages(args.file, select_loader(None, args.file)) if args.file else synthetic_documents(args.pages)
+    encoding = get_encoding(args.embedding_model)
+    print(f"{len(pages)} pages, {sum(len(page.page_content) for page in pages)} characters, "
+          f"chunks of {args.chunk_tokens} tokens overlapping by {args.overlap_tokens} ({encoding.name})")
+
+    splitters = [
+        ("recursive (characters)", RecursiveCharacterTextSplitter(
+            chunk_size=int(args.chunk_tokens * args.chars_per_token),
+            chunk_overlap=int(args.overlap_tokens * args.chars_per_token),
+            separators=["\n\n", "\n", " ", ""])),
+        ("recursive (tiktoken length)", RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+            encoding_name=encoding.name,
+            chunk_size=args.chunk_tokens,
+            chunk_overlap=args.overlap_tokens,
+            separators=["\n\n", "\n", " ", ""])),
+        ("token-aware", TokenAwareTextSplitter(
+            chunk_size=args.chunk_tokens,
+            chunk_overlap=args.overlap_tokens,
+            encoding=encoding)),
+    ]
+
+    print(f"{'splitter':<28} {'seconds':>8} {'chunks':>7} {'chunks/s':>9} {'pages/s':>8} {'peak MB':>8} "
+          f"{'mean tok':>8} {'p5':>5} {'p95':>5} {'stdev':>6} {'>budget':>7}")
+    for name, splitter in splitters:
+        row = measure(name, splitter, pages, encoding, args.chunk_tokens, args.repeats)
+        print(f"{row['splitter']:<28} {row['seconds']:>8.3f} {row['chunks']:>7} {row['chunks_per_second']:>9.0f} "
+              f"{row['pages_per_second']:>8.0f} {row['peak_mb']:>8.2f} {row['tokens_mean']:>8.1f} "
+              f"{row['tokens_p5']:>5} {row['tokens_p95']:>5} {row['tokens_stdev']:>6.1f} {row['over_budget']:>7}")
+
+
+if __name__ == "__main__":
+    main()
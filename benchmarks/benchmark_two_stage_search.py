@@ -0,0 +1,117 @@
+"""
+Recall@k and latency of two-stage truncated-dimension search against flat full-dimension search.
+
+    python -m benchmarks.benchmark_two_stage_search --vectors 100000 --k 10 --coarse-dimensions 64 128 256 512 --rescore-factor 2 5 10 20
+    python -m benchmarks.benchmark_two_stage_search --vectorstore vectorstore/ab/<hash>/<fingerprint>
+
+Exact top-k from a FAISS flat index over the full vectors is the reference;
+each TwoStageIndex configuration (coarse dimensions x rescore factor) is
+scored by the share of the reference top-k it returns, and timed for single
+queries and for batches as the BatchedSearcher sends them. The full vectors
+are read through a memory-mapped .npy, as in a saved store.
+
+By default the vectors are synthetic: clustered, with per-dimension spread
+falling off like the spectrum of Matryoshka embeddings, and queries are noisy
+copies of held-out vectors. Recall on real text-embedding-3 vectors should be
+checked with --vectorstore, which takes the vectors of a saved store (queries
+are then noisy copies of its own vectors).
+"""
+import os
+import time
+import argparse
+import tempfile
+
+import faiss
+import numpy as np
+
+from retrieval.class_TwoStageIndex import TwoStageIndex
+
+
+def synthetic_vectors(rng, count: int, dimensions: int, clusters: int) -> np.ndarray:
+    spread = (1.0 + np.arange(dimensions) / 32.0) ** -0.75
+    centers = rng.standard_normal((clusters, dimensions)).astype(np.float32) * spread
+    members = rng.integers(0, clusters, count)
+    vectors = centers[members] + 0.6 * rng.standard_normal((count, dimensions)).astype(np.float32) * spread
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def store_vectors(vectorstore_path: str) -> np.ndarray:
+    index = faiss.read_index(os.path.join(vectorstore_path, "index.faiss"))
+    # A two-stage store's index.faiss is the coarse one
+    index = TwoStageIndex.load(index, vectorstore_path) or index
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def noisy_queries(rng, vectors: np.ndarray, count: int, noise: float) -> np.ndarray:
+    queries = vectors[rng.integers(0, len(vectors), count)] + noise * rng.standard_normal((count, vectors.shape[1])).astype(np.float32) / np.sqrt(vectors.shape[1])
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries.astype(np.float32)
+
+
+def timed(fn, inputs):
+    samples = []
+    for item in inputs:
+        started = time.perf_counter()
+        fn(item)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], samples[max(0, int(len(samples) * 0.95) - 1)]
+
+
+def recall(found: np.ndarray, reference: np.ndarray) -> float:
+    return float(np.mean([len(set(row.tolist()) & set(truth.tolist())) / len(truth) for row, truth in zip(found, reference)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dimensions", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--vectorstore", help="use the vectors of this saved store instead of synthetic ones")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-noise", type=float, default=0.5)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--coarse-dimensions", type=int, nargs="+", default=[64, 128, 256, 512])
+    parser.add_argument("--rescore-factor", type=int, nargs="+", default=[2, 5, 10, 20])
+    parser.add_argument("--batch", type=int, default=16)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.vectorstore:
+        vectors = store_vectors(args.vectorstore).astype(np.float32)
+    else:
+        vectors = synthetic_vectors(rng, args.vectors, args.dimensions, args.clusters)
+    count, dimensions = vectors.shape
+    queries = noisy_queries(rng, vectors, args.queries, args.query_noise)
+    batches = [queries[start:start + args.batch] for start in range(0, len(queries) - args.batch + 1, args.batch)]
+    print(f"{count} vectors of {dimensions} dimensions, {len(queries)} queries, k={args.k}")
+
+    flat = faiss.IndexFlatL2(dimensions)
+    flat.add(vectors)
+    _, reference = flat.search(queries, args.k)
+    p50, p95 = timed(lambda query: flat.search(query.reshape(1, -1), args.k), queries)
+    batch_p50, _ = timed(lambda batch: flat.search(batch, args.k), batches)
+    print(f"{'flat full':<28} recall 1.000  p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  "
+          f"batch of {args.batch} {batch_p50:7.2f} ms  resident {flat.ntotal * dimensions * 4 / 2**20:7.1f} MiB")
+
+    with tempfile.TemporaryDirectory() as directory:
+        full_path = os.path.join(directory, "full_vectors.npy")
+        np.save(full_path, vectors)
+        full_vectors = np.load(full_path, mmap_mode="r")
+        for coarse_dimensions in args.coarse_dimensions:
+            if coarse_dimensions >= dimensions:
+                continue
+            built = TwoStageIndex.build(vectors, coarse_dimensions)
+            for rescore_factor in args.rescore_factor:
+                index = TwoStageIndex(built.coarse_index, full_vectors, rescore_factor)
+                _, found = index.search(queries, args.k)
+                p50, p95 = timed(lambda query: index.search(query.reshape(1, -1), args.k), queries)
+                batch_p50, _ = timed(lambda batch: index.search(batch, args.k), batches)
+                label = f"two-stage {coarse_dimensions} x{rescore_factor}"
+                print(f"{label:<28} recall {recall(found, reference):.3f}  p50 {p50:7.2f} ms  p95 {p95:7.2f} ms  "
+                      f"batch of {args.batch} {batch_p50:7.2f} ms  resident {index.resident_bytes / 2**20:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
 from .get_completion import get_completion
+from .get_embeddings import get_embeddings
+from .class_AdmissionScheduler import AdmissionScheduler, OverloadedError
 
-__all__ = ["get_completion"]
\ No newline at end of file
+__all__ = ["get_completion", "get_embeddings", "AdmissionScheduler", "OverloadedError"]
\ No newline at end of file
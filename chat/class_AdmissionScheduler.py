@@ -0,0 +1,314 @@
+import os
+import math
+import time
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, Dict, Any
+
+# Highest priority first
+LANES = ("interactive", "ingestion", "background")
+
+_LANE_DEFAULTS = {
+    # lane: (queue limit, max wait seconds)
+    "interactive": (32, 15.0),
+    "ingestion": (64, 120.0),
+    "background": (256, 600.0),
+}
+
+_current_lane = contextvars.ContextVar("llm_lane", default="interactive")
+
+
+class OverloadedError(Exception):
+    """Raised when work is shed because its lane is full or it waited too long for admission"""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _TokenBudget:
+    """Token bucket refilled continuously at tokens_per_minute; 0 means unlimited"""
+
+    def __init__(self, tokens_per_minute: int):
+        self.tokens_per_minute = tokens_per_minute
+        self.available = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(
+            float(self.tokens_per_minute),
+            self.available + (now - self._refilled_at) * self.tokens_per_minute / 60.0)
+        self._refilled_at = now
+
+    def clamp(self, tokens: int) -> int:
+        """A request larger than the whole budget waits for a full bucket rather than forever"""
+        return min(tokens, self.tokens_per_minute) if self.tokens_per_minute else tokens
+
+    def seconds_until(self, tokens: int) -> float:
+        if not self.tokens_per_minute:
+            return 0.0
+        self._refill()
+        missing = tokens - self.available
+        return max(0.0, missing * 60.0 / self.tokens_per_minute)
+
+    def take(self, tokens: int) -> None:
+        if self.tokens_per_minute:
+            self._refill()
+            self.available -= tokens
+
+    def give_back(self, tokens: int) -> None:
+        if self.tokens_per_minute:
+            self._refill()
+            self.available = min(float(self.tokens_per_minute), self.available + tokens)
+
+
+class _Ticket:
+    """A queued request: the resource whose budget it waits on and its clamped token estimate"""
+    __slots__ = ("resource", "tokens")
+
+    def __init__(self, resource: str, tokens: int):
+        self.resource = resource
+        self.tokens = tokens
+
+
+class Admission:
+    """Handle for admitted work; record_usage corrects the token estimate once the real count is known"""
+
+    def __init__(self, scheduler: "AdmissionScheduler", resource: str, lane: str, estimated_tokens: int, waited_seconds: float):
+        self._scheduler = scheduler
+        self.resource = resource
+        self.lane = lane
+        self.estimated_tokens = estimated_tokens
+        self.waited_seconds = waited_seconds
+
+    def record_usage(self, tokens: Optional[int]) -> None:
+        if tokens is None:
+            return
+        with self._scheduler._cond:
+            self._scheduler._budgets[self.resource].give_back(self.estimated_tokens - tokens)
+            self.estimated_tokens = tokens
+            self._scheduler._cond.notify_all()
+
+
+class AdmissionScheduler:
+    """
+    Singleton gate in front of every completion and embedding request.
+
+    Work waits in one FIFO queue per lane and is admitted in strict priority order
+    (interactive > ingestion > background) whenever a concurrency slot is free and
+    the resource's token-per-minute budget covers its estimate; higher-lane work
+    that is only waiting on the other resource's budget does not hold a lane back.
+    A lane whose queue is full, or work that waits longer than its lane allows, is
+    shed with OverloadedError carrying a Retry-After estimate. Retries wait out
+    their backoff through backoff(), bounded the same way and without a slot.
+
+    Configuration via environment:
+        LLM_MAX_CONCURRENCY                  requests in flight across all lanes (default 8)
+        LLM_COMPLETION_TOKENS_PER_MINUTE     completion token budget, 0 for unlimited (default 0)
+        LLM_EMBEDDING_TOKENS_PER_MINUTE      embedding token budget, 0 for unlimited (default 0)
+        LLM_QUEUE_LIMIT_<LANE>               queued requests before shedding
+        LLM_MAX_WAIT_<LANE>                  seconds a request may wait for admission
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self) -> None:
+        self._cond = threading.Condition()
+        self.max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        self._in_flight = 0
+        self._budgets = {
+            "completions": _TokenBudget(int(os.getenv("LLM_COMPLETION_TOKENS_PER_MINUTE", "0"))),
+            "embeddings": _TokenBudget(int(os.getenv("LLM_EMBEDDING_TOKENS_PER_MINUTE", "0"))),
+        }
+        self._queues = {lane: deque() for lane in LANES}
+        self.queue_limits = {}
+        self.max_wait = {}
+        for lane, (queue_limit, max_wait) in _LANE_DEFAULTS.items():
+            self.queue_limits[lane] = int(os.getenv(f"LLM_QUEUE_LIMIT_{lane.upper()}", str(queue_limit)))
+            self.max_wait[lane] = float(os.getenv(f"LLM_MAX_WAIT_{lane.upper()}", str(max_wait)))
+        self._waits = {lane: deque(maxlen=500) for lane in LANES}
+        self._service_times = deque(maxlen=200)
+        self._counters = {lane: {"admitted": 0, "shed": 0, "timed_out": 0, "backoffs": 0} for lane in LANES}
+        self._backing_off = {lane: 0 for lane in LANES}
+
+    @staticmethod
+    def current_lane() -> str:
+        return _current_lane.get()
+
+    @contextmanager
+    def lane(self, name: str):
+        """Run the enclosed block's LLM calls in the given lane unless they name one explicitly"""
+        if name not in LANES:
+            raise ValueError(f"Unknown lane {name!r}; expected one of {', '.join(LANES)}")
+        token = _current_lane.set(name)
+        try:
+            yield
+        finally:
+            _current_lane.reset(token)
+
+    def _ahead_of(self, lane: str) -> int:
+        return sum(len(self._queues[other]) for other in LANES[:LANES.index(lane) + 1])
+
+    def _retry_after(self, lane: str, resource: str, tokens: int) -> int:
+        service = sum(self._service_times) / len(self._service_times) if self._service_times else 1.0
+        drain = (self._ahead_of(lane) + self._in_flight) * service / max(1, self.max_concurrency)
+        return max(1, math.ceil(max(drain, self._budgets[resource].seconds_until(tokens))))
+
+    def _blocked_by_higher_lane(self, lane: str, resource: str) -> bool:
+        """
+        Whether queued higher-priority work comes first: work on the same resource,
+        or work on another resource whose budget already covers it (it only waits
+        for a concurrency slot). Work held back by another resource's exhausted
+        token budget does not stall this resource.
+        """
+        return any(
+            ticket.resource == resource or self._budgets[ticket.resource].seconds_until(ticket.tokens) == 0.0
+            for other in LANES[:LANES.index(lane)] for ticket in self._queues[other])
+
+    def _can_run(self, lane: str, ticket: _Ticket, resource: str, tokens: int) -> bool:
+        return (self._queues[lane][0] is ticket
+                and not self._blocked_by_higher_lane(lane, resource)
+                and self._in_flight < self.max_concurrency
+                and self._budgets[resource].seconds_until(tokens) == 0.0)
+
+    def _acquire(self, resource: str, tokens: int, lane: str, deadline: Optional[float]) -> Admission:
+        queue = self._queues[lane]
+        with self._cond:
+            tokens = self._budgets[resource].clamp(tokens)
+            if len(queue) >= self.queue_limits[lane]:
+                self._counters[lane]["shed"] += 1
+                raise OverloadedError(f"{lane} queue is full", self._retry_after(lane, resource, tokens))
+
+            ticket = _Ticket(resource, tokens)
+            queue.append(ticket)
+            enqueued_at = time.monotonic()
+            give_up_at = enqueued_at + self.max_wait[lane]
+            if deadline is not None:
+                give_up_at = min(give_up_at, deadline)
+            try:
+                while not self._can_run(lane, ticket, resource, tokens):
+                    remaining = give_up_at - time.monotonic()
+                    if remaining <= 0:
+                        self._counters[lane]["timed_out"] += 1
+                        raise OverloadedError(
+                            f"Waited {time.monotonic() - enqueued_at:.1f}s for admission in the {lane} lane",
+                            self._retry_after(lane, resource, tokens))
+                    budget_wait = self._budgets[resource].seconds_until(tokens)
+                    self._cond.wait(min(remaining, budget_wait) if budget_wait else remaining)
+            finally:
+                queue.remove(ticket)
+                self._cond.notify_all()
+
+            waited = time.monotonic() - enqueued_at
+            self._in_flight += 1
+            self._budgets[resource].take(tokens)
+            self._waits[lane].append(waited)
+            self._counters[lane]["admitted"] += 1
+            return Admission(self, resource, lane, tokens, waited)
+
+    def _release(self, started_at: float) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._service_times.append(time.monotonic() - started_at)
+            self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, resource: str, estimated_tokens: int, lane: Optional[str] = None, deadline: Optional[float] = None):
+        """
+        Block until the request may be sent, then hold a concurrency slot for the enclosed block.
+
+        Args:
+            resource: 'completions' or 'embeddings', selecting the token budget
+            estimated_tokens: Tokens the request is expected to use
+            lane: Priority lane; defaults to the lane set with lane()
+            deadline: Absolute time.monotonic() after which waiting is abandoned
+
+        Raises:
+            OverloadedError: The lane is full or admission did not happen in time
+        """
+        lane = lane or self.current_lane()
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane {lane!r}; expected one of {', '.join(LANES)}")
+        admission = self._acquire(resource, max(1, int(estimated_tokens)), lane, deadline)
+        started_at = time.monotonic()
+        try:
+            yield admission
+        finally:
+            self._release(started_at)
+
+    def backoff(self, seconds: float, lane: Optional[str] = None, deadline: Optional[float] = None) -> None:
+        """
+        Wait before retrying a request, without holding a concurrency slot.
+
+        The wait ends at deadline at the latest. A wait longer than the lane lets
+        work wait for admission is not started: the request is shed instead, so
+        an interactive caller is told when to come back rather than held.
+
+        Raises:
+            OverloadedError: seconds exceeds the lane's max wait
+        """
+        lane = lane or self.current_lane()
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane {lane!r}; expected one of {', '.join(LANES)}")
+        end = time.monotonic() + seconds
+        if deadline is not None:
+            end = min(end, deadline)
+        with self._cond:
+            if seconds > self.max_wait[lane]:
+                self._counters[lane]["shed"] += 1
+                raise OverloadedError(
+                    f"Retry backoff of {seconds:.1f}s exceeds the {lane} lane's {self.max_wait[lane]:g}s",
+                    math.ceil(seconds))
+            self._counters[lane]["backoffs"] += 1
+            self._backing_off[lane] += 1
+            try:
+                remaining = end - time.monotonic()
+                while remaining > 0:
+                    self._cond.wait(remaining)
+                    remaining = end - time.monotonic()
+            finally:
+                self._backing_off[lane] -= 1
+
+    @staticmethod
+    def _percentile(samples, fraction: float) -> Optional[float]:
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 2)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            lanes = {}
+            for lane in LANES:
+                waits = list(self._waits[lane])
+                lanes[lane] = {
+                    "queued": len(self._queues[lane]),
+                    "backing_off": self._backing_off[lane],
+                    "queue_limit": self.queue_limits[lane],
+                    "max_wait_seconds": self.max_wait[lane],
+                    **self._counters[lane],
+                    "wait_ms_p50": self._percentile(waits, 0.50),
+                    "wait_ms_p95": self._percentile(waits, 0.95),
+                    "wait_ms_max": round(max(waits) * 1000, 2) if waits else None,
+                }
+            budgets = {}
+            for resource, budget in self._budgets.items():
+                budget.seconds_until(0)
+                budgets[resource] = {
+                    "tokens_per_minute": budget.tokens_per_minute or None,
+                    "available": round(budget.available) if budget.tokens_per_minute else None,
+                }
+            return {
+                "in_flight": self._in_flight,
+                "max_concurrency": self.max_concurrency,
+                "lanes": lanes,
+                "token_budgets": budgets,
+            }
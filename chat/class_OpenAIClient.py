@@ -2,7 +2,8 @@
 # app/rag.py
 import os
 from dotenv import load_dotenv
-from openai import OpenAI, OpenAIError, RateLimitError, APITimeoutError, APIConnectionError
+from openai import OpenAI, AsyncOpenAI, OpenAIError, RateLimitError, APITimeoutError, APIConnectionError
+from .class_OpenAITransport import OpenAITransport
 
 class RAGError(Exception):
     """Custom exception for RAG-related errors"""
@@ -12,16 +13,33 @@ class OpenAIClient:
     """Singleton OpenAI client to avoid recreating connections"""
     _instance = None
     _client = None
+    _async_client = None
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
         return cls._instance
     
+    def _get_api_key(self) -> str:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise RAGError("OPENAI_API_KEY is not set in environment variables")
+        return api_key
+
     def get_client(self) -> OpenAI:
         if self._client is None:
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
-                raise RAGError("OPENAI_API_KEY is not set in environment variables")
-            self._client = OpenAI(api_key=api_key)
-        return self._client
\ No newline at end of file
+            transport = OpenAITransport()
+            self._client = OpenAI(
+                api_key=self._get_api_key(),
+                http_client=transport.sync_client,
+                timeout=transport.timeout)
+        return self._client
+
+    def get_async_client(self) -> AsyncOpenAI:
+        if self._async_client is None:
+            transport = OpenAITransport()
+            self._async_client = AsyncOpenAI(
+                api_key=self._get_api_key(),
+                http_client=transport.async_client,
+                timeout=transport.timeout)
+        return self._async_client
\ No newline at end of file
@@ -0,0 +1,112 @@
+import os
+import logging
+import importlib.util
+from typing import Dict, Any
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class OpenAITransport:
+    """
+    Singleton holder of the pooled HTTP clients shared by every OpenAI call
+    (completions and embeddings, sync and async), so connections and TLS
+    sessions are reused across both paths.
+
+    Settings are read from the environment:
+        OPENAI_HTTP_MAX_CONNECTIONS      pool size (default 20)
+        OPENAI_HTTP_MAX_KEEPALIVE        idle connections kept open (default 10)
+        OPENAI_HTTP_KEEPALIVE_EXPIRY     seconds an idle connection is kept (default 30)
+        OPENAI_HTTP2                     "true" to negotiate HTTP/2 (needs the h2 package)
+        OPENAI_HTTP_CONNECT_TIMEOUT      connect timeout in seconds (default 5)
+        OPENAI_HTTP_TIMEOUT              read/write/pool timeout in seconds (default 60)
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self) -> None:
+        self.max_connections = int(os.getenv("OPENAI_HTTP_MAX_CONNECTIONS", "20"))
+        self.max_keepalive_connections = int(os.getenv("OPENAI_HTTP_MAX_KEEPALIVE", "10"))
+        self.keepalive_expiry = float(os.getenv("OPENAI_HTTP_KEEPALIVE_EXPIRY", "30"))
+        self.http2 = os.getenv("OPENAI_HTTP2", "false").lower() == "true"
+        if self.http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("OPENAI_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+            self.http2 = False
+        self.timeout = httpx.Timeout(
+            float(os.getenv("OPENAI_HTTP_TIMEOUT", "60")),
+            connect=float(os.getenv("OPENAI_HTTP_CONNECT_TIMEOUT", "5"))
+        )
+        self.requests_total = 0
+        self._sync_client = None
+        self._async_client = None
+
+    def _client_kwargs(self) -> Dict[str, Any]:
+        return {
+            "limits": httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry
+            ),
+            "timeout": self.timeout,
+            "http2": self.http2,
+            "follow_redirects": True
+        }
+
+    def _count_request(self, request) -> None:
+        self.requests_total += 1
+
+    async def _count_async_request(self, request) -> None:
+        self.requests_total += 1
+
+    @property
+    def sync_client(self) -> httpx.Client:
+        if self._sync_client is None:
+            self._sync_client = httpx.Client(
+                event_hooks={"request": [self._count_request]},
+                **self._client_kwargs()
+            )
+        return self._sync_client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                event_hooks={"request": [self._count_async_request]},
+                **self._client_kwargs()
+            )
+        return self._async_client
+
+    def _pool_stats(self, client) -> Dict[str, Any]:
+        if client is None:
+            return {"open_connections": 0, "active_connections": 0, "idle_connections": 0,
+                    "in_flight_requests": 0, "queued_requests": 0, "utilization": 0.0}
+        pool = getattr(client._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        pending = list(getattr(pool, "_requests", []))
+        active = sum(1 for connection in connections if not connection.is_idle())
+        return {
+            "open_connections": len(connections),
+            "active_connections": active,
+            "idle_connections": len(connections) - active,
+            "in_flight_requests": len(pending),
+            "queued_requests": sum(1 for status in pending if status.connection is None),
+            "utilization": active / self.max_connections if self.max_connections else 0.0
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool settings and current utilization of the sync and async pools"""
+        return {
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "keepalive_expiry": self.keepalive_expiry,
+            "http2": self.http2,
+            "requests_total": self.requests_total,
+            "sync_pool": self._pool_stats(self._sync_client),
+            "async_pool": self._pool_stats(self._async_client)
+        }
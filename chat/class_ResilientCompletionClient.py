@@ -0,0 +1,216 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Optional, Dict, Any
+
+from openai import APITimeoutError, APIConnectionError, InternalServerError
+
+from .class_OpenAIClient import OpenAIClient
+from .class_CircuitBreaker import CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceededError(Exception):
+    """Raised when the caller's time budget runs out before a response arrives"""
+    pass
+
+
+# Errors that say something about upstream health and therefore count against the circuit
+UPSTREAM_FAILURES = (APITimeoutError, APIConnectionError, InternalServerError)
+
+
+class ResilientCompletionClient:
+    """
+    Singleton wrapper around OpenAIClient that adds hedged requests, a circuit
+    breaker per model and deadline-bounded per-attempt timeouts.
+
+    A hedge (a second identical request) is only sent once the primary request has
+    been outstanding longer than the observed p95 latency for that model, so roughly
+    one request in twenty is duplicated while the slow tail is cut off. Once one
+    attempt answers, or the time runs out, the others are cancelled: those still
+    queued for a worker are never sent, while one already waiting on the network
+    cannot be interrupted by the synchronous SDK and ends within its own timeout.
+    """
+    _instance = None
+
+    MIN_SAMPLES_FOR_P95 = 20
+    DEFAULT_HEDGE_DELAY = 2.0
+    MIN_HEDGE_DELAY = 0.25
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self) -> None:
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("OPENAI_HEDGE_WORKERS", "16")),
+            thread_name_prefix="openai-completion"
+        )
+        self._latencies: Dict[str, deque] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.hedging_enabled = os.getenv("OPENAI_HEDGING", "true").lower() == "true"
+        self.failure_threshold = int(os.getenv("OPENAI_CIRCUIT_FAILURES", "5"))
+        self.reset_timeout = float(os.getenv("OPENAI_CIRCUIT_RESET_SECONDS", "30"))
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self.attempts_cancelled = 0
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            if model not in self._breakers:
+                self._breakers[model] = CircuitBreaker(
+                    name=model,
+                    failure_threshold=self.failure_threshold,
+                    reset_timeout=self.reset_timeout
+                )
+            return self._breakers[model]
+
+    def latency_p95(self, model: str) -> Optional[float]:
+        """p95 of recent successful latencies for the model, None until enough samples exist"""
+        with self._lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if len(samples) < self.MIN_SAMPLES_FOR_P95:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def hedge_delay(self, model: str) -> float:
+        """p95 latency for the model, or a default until enough samples exist"""
+        p95 = self.latency_p95(model)
+        if p95 is None:
+            return self.DEFAULT_HEDGE_DELAY
+        return max(self.MIN_HEDGE_DELAY, p95)
+
+    def _record_latency(self, model: str, seconds: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=500)).append(seconds)
+
+    def _call(self, request_params: Dict[str, Any], timeout: float, blame_timeouts: bool = True):
+        model = request_params["model"]
+        client = OpenAIClient().get_client().with_options(max_retries=0, timeout=timeout)
+        breaker = self.breaker(model)
+        started = time.monotonic()
+        try:
+            response = client.responses.create(**request_params)
+        except APITimeoutError:
+            # A timeout shortened by the caller's deadline says nothing about upstream health
+            if blame_timeouts:
+                breaker.record_failure()
+            else:
+                breaker.release_probe()
+            raise
+        except UPSTREAM_FAILURES:
+            breaker.record_failure()
+            raise
+        except Exception:
+            # Rate limits, bad requests, ...: neither outcome, but a half-open probe must not stay taken
+            breaker.release_probe()
+            raise
+        self._record_latency(model, time.monotonic() - started)
+        breaker.record_success()
+        return response
+
+    def create_response(
+        self,
+        request_params: Dict[str, Any],
+        timeout: float = 30,
+        deadline: Optional[float] = None,
+        hedge: bool = True
+    ):
+        """
+        Send a Responses API request, hedging slow calls.
+
+        Args:
+            request_params: Keyword arguments for client.responses.create (without timeout)
+            timeout: Per-attempt timeout in seconds
+            deadline: Absolute time.monotonic() by which an answer is needed
+            hedge: Whether a hedge request may be sent
+
+        Raises:
+            CircuitOpenError: The model's circuit is open
+            DeadlineExceededError: No response arrived before the deadline
+        """
+        model = request_params["model"]
+        blame_timeouts = True
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            # Checked before allow(), which may hand this call the half-open probe
+            if remaining <= 0:
+                raise DeadlineExceededError("No time left for the request")
+            blame_timeouts = remaining >= timeout
+            timeout = min(timeout, remaining)
+        if not self.breaker(model).allow():
+            raise CircuitOpenError(f"Circuit for model '{model}' is open")
+
+        primary = self._executor.submit(self._call, request_params, timeout, blame_timeouts)
+        delay = self.hedge_delay(model)
+        if not (hedge and self.hedging_enabled) or delay >= timeout:
+            return self._result(primary, timeout)
+
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        if not primary.running():
+            # Still queued behind other calls: a hedge would only queue behind it
+            return self._result(primary, timeout - delay)
+
+        logger.info(f"Primary request for {model} slower than p95 ({delay:.2f}s), sending hedge")
+        with self._lock:
+            self.hedges_sent += 1
+        hedge_future = self._executor.submit(self._call, request_params, timeout - delay, blame_timeouts)
+        pending = {primary, hedge_future}
+        last_error = None
+        end = time.monotonic() + (timeout - delay)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, end - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge_future:
+                        with self._lock:
+                            self.hedges_won += 1
+                    self._cancel(pending)
+                    return future.result()
+                last_error = future.exception()
+        if last_error is not None and not pending:
+            raise last_error
+        self._cancel(pending)
+        raise DeadlineExceededError(f"No response from {model} within {timeout:.2f}s")
+
+    def _result(self, future, timeout: float):
+        done, _ = wait([future], timeout=timeout)
+        if not done:
+            self._cancel([future])
+            raise DeadlineExceededError(f"No response within {timeout:.2f}s")
+        return future.result()
+
+    def _cancel(self, futures) -> None:
+        """Drop attempts nobody waits for any more; only those not yet started can be stopped"""
+        cancelled = sum(future.cancel() for future in futures)
+        with self._lock:
+            self.attempts_cancelled += cancelled
+
+    def stats(self) -> Dict[str, Any]:
+        models = {}
+        with self._lock:
+            names = set(self._latencies) | set(self._breakers)
+        for model in names:
+            models[model] = {
+                "hedge_delay_seconds": self.hedge_delay(model),
+                "samples": len(self._latencies.get(model, ())),
+                "circuit": self.breaker(model).stats()
+            }
+        return {
+            "hedging_enabled": self.hedging_enabled,
+            "hedges_sent": self.hedges_sent,
+            "hedges_won": self.hedges_won,
+            "attempts_cancelled": self.attempts_cancelled,
+            "models": models
+        }
@@ -0,0 +1,38 @@
+import os
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from .class_AdmissionScheduler import AdmissionScheduler
+
+
+def estimate_tokens(texts: List[str]) -> int:
+    """Rough token count (about four characters per token) used for admission"""
+    return sum(len(text) for text in texts) // 4 + len(texts)
+
+
+class ScheduledEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that sends every request through the AdmissionScheduler.
+
+    embed_documents is admitted in batches of EMBEDDING_ADMISSION_BATCH texts, so a
+    large upload gives way to interactive queries between batches instead of
+    holding a slot for the whole document.
+    """
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+        self.batch_size = int(os.getenv("EMBEDDING_ADMISSION_BATCH", "256"))
+        self.scheduler = AdmissionScheduler()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            with self.scheduler.admit("embeddings", estimate_tokens(batch)):
+                vectors.extend(self.embeddings.embed_documents(batch))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        with self.scheduler.admit("embeddings", estimate_tokens([text])):
+            return self.embeddings.embed_query(text)
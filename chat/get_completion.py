@@ -1,11 +1,16 @@
 # app/rag.py
 import os
+import time
+import random
 import logging
 from typing import Optional, Dict, Any
 from dotenv import load_dotenv
-from openai import OpenAIError, RateLimitError, APITimeoutError, APIConnectionError
+from openai import OpenAIError, RateLimitError, APITimeoutError, APIConnectionError, InternalServerError
 from langchain_community.vectorstores import FAISS
 from .class_OpenAIClient import OpenAIClient, RAGError
+from .class_CircuitBreaker import CircuitOpenError
+from .class_ResilientCompletionClient import ResilientCompletionClient, DeadlineExceededError
+from .class_AdmissionScheduler import AdmissionScheduler, OverloadedError
 # Load environment variables
 load_dotenv()
 
@@ -22,6 +27,26 @@ def validate_inputs(prompt: str, temperature: float, system_prompt: str) -> None
     
     if not isinstance(temperature, (int, float)) or not (0.0 <= temperature <= 2.0):
         raise ValueError("Temperature must be a number between 0.0 and 2.0")
+
+# Output tokens assumed for admission when the caller sets no max_tokens
+DEFAULT_OUTPUT_TOKEN_ESTIMATE = 512
+
+def _estimate_tokens(request_params: Dict[str, Any]) -> int:
+    prompt_chars = sum(len(message["content"]) for message in request_params["input"])
+    return prompt_chars // 4 + request_params.get("max_output_tokens", DEFAULT_OUTPUT_TOKEN_ESTIMATE)
+
+def _backoff_seconds(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Server-provided Retry-After if present, otherwise jittered exponential backoff"""
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return (2 ** attempt) * random.uniform(0.5, 1.0)
+
+def _fits_before_deadline(seconds: float, deadline: Optional[float]) -> bool:
+    return deadline is None or time.monotonic() + seconds < deadline
+
 def get_completion(
     prompt: str, 
     temperature: float = 0.7,
@@ -29,7 +54,12 @@ def get_completion(
     model: str = "gpt-4o",
     max_tokens: Optional[int] = None,
     timeout: int = 30,
-    max_retries: int = 3
+    max_retries: int = 3,
+    deadline: Optional[float] = None,
+    fallback_model: Optional[str] = None,
+    hedge: bool = True,
+    priority: Optional[str] = None,
+    prompt_cache_key: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Get completion from OpenAI API with comprehensive error handling and recovery.
@@ -42,13 +72,24 @@ def get_completion(
         max_tokens: Maximum tokens in response
         timeout: Request timeout in seconds
         max_retries: Maximum number of retry attempts
+        deadline: Absolute time.monotonic() after which no attempt or backoff is started
+        fallback_model: Model to switch to when the primary model's circuit is open
+            or it is rate limited (defaults to OPENAI_FALLBACK_MODEL)
+        hedge: Allow a hedge request when the primary is slower than its p95
+        priority: AdmissionScheduler lane ('interactive', 'ingestion' or 'background');
+            defaults to the lane of the calling context. Retry backoffs longer
+            than the lane's max wait are returned as 'overloaded' instead
+        prompt_cache_key: Groups requests sharing a prompt prefix so upstream prompt
+            caching routes them together (e.g. a conversation id)
     
     Returns:
         Dict containing:
             - success: bool indicating if request succeeded
             - content: str with the response content or error message
             - usage: dict with token usage info (if successful)
+            - model: str with the model that answered (if successful)
             - error_type: str with error classification (if failed)
+            - retry_after: int seconds (if error_type is 'overloaded')
     
     Raises:
         RAGError: For configuration or validation errors
@@ -60,7 +101,7 @@ def get_completion(
     
     # Get OpenAI client
     try:
-        client = OpenAIClient().get_client()
+        OpenAIClient().get_client()
     except RAGError as e:
         logger.error(f"Client initialization failed: {e}")
         return {
@@ -68,6 +109,9 @@ def get_completion(
             "content": "Configuration error: Unable to initialize OpenAI client",
             "error_type": "configuration_error"
         }
+    resilient_client = ResilientCompletionClient()
+    scheduler = AdmissionScheduler()
+    fallback_model = fallback_model or os.getenv("OPENAI_FALLBACK_MODEL")
     
     # Prepare request parameters
     request_params = {
@@ -76,21 +120,44 @@ def get_completion(
             {"role": "system", "content": system_prompt.strip()},
             {"role": "user", "content": prompt.strip()}
         ],
-        "temperature": temperature,
-        "timeout": timeout
+        "temperature": temperature
     }
     
     if max_tokens is not None:
-        request_params["max_tokens"] = max_tokens
+        request_params["max_output_tokens"] = max_tokens
+    if prompt_cache_key is not None:
+        request_params["prompt_cache_key"] = prompt_cache_key
+
+    def switch_to_fallback() -> bool:
+        if not fallback_model or request_params["model"] == fallback_model:
+            return False
+        logger.warning(f"Switching from {request_params['model']} to fallback model {fallback_model}")
+        request_params["model"] = fallback_model
+        return True
     
     # Attempt completion with retries
     last_error = None
+    retry_wait = 0.0
     
     for attempt in range(max_retries):
+        if deadline is not None and time.monotonic() >= deadline:
+            break
         try:
-            logger.info(f"Attempting completion (attempt {attempt + 1}/{max_retries})")
+            if retry_wait:
+                # Bounded by the deadline and the lane's max wait; a longer backoff is shed as overloaded
+                scheduler.backoff(retry_wait, lane=priority, deadline=deadline)
+                retry_wait = 0.0
+            logger.info(f"Attempting completion with {request_params['model']} (attempt {attempt + 1}/{max_retries})")
             
-            response = client.responses.create(**request_params)
+            with scheduler.admit("completions", _estimate_tokens(request_params), lane=priority, deadline=deadline) as admission:
+                response = resilient_client.create_response(
+                    request_params,
+                    timeout=timeout,
+                    deadline=deadline,
+                    hedge=hedge
+                )
+                if response.usage:
+                    admission.record_usage(response.usage.input_tokens + response.usage.output_tokens)
             content = response.output_text
             if content is None:
                 content = "No content generated"
@@ -99,23 +166,47 @@ def get_completion(
             return {
                 "success": True,
                 "content": content,
+                "model": request_params["model"],
                 "usage": {
                     "imput_token": response.usage.input_tokens if response.usage else None, 
                     "output_tokens": response.usage.output_tokens if response.usage else None, 
+                    "cached_tokens": response.usage.input_tokens_details.cached_tokens if response.usage.input_tokens_details else 0,
                 } if response.usage else None
             }
+
+        except OverloadedError as e:
+            logger.warning(f"Completion shed: {e}")
+            return {
+                "success": False,
+                "content": "The service is busy. Please retry later.",
+                "error_type": "overloaded",
+                "retry_after": e.retry_after
+            }
+
+        except CircuitOpenError as e:
+            logger.warning(str(e))
+            last_error = e
+            if switch_to_fallback():
+                continue
+            return {
+                "success": False,
+                "content": "The OpenAI API is currently unavailable. Please try again later.",
+                "error_type": "circuit_open"
+            }
             
         except RateLimitError as e:
             error_msg = f"Rate limit exceeded: {str(e)}"
             logger.warning(f"{error_msg} (attempt {attempt + 1}/{max_retries})")
             last_error = e
+
+            # Another model has its own rate limit, so switch instead of waiting
+            if switch_to_fallback():
+                continue
             
-            if attempt < max_retries - 1:
-                # Exponential backoff for rate limiting
-                import time
-                wait_time = (2 ** attempt) * 1
-                logger.info(f"Waiting {wait_time}s before retry...")
-                time.sleep(wait_time)
+            wait_time = _backoff_seconds(attempt, e.response.headers.get("retry-after") if e.response is not None else None)
+            if attempt < max_retries - 1 and _fits_before_deadline(wait_time, deadline):
+                logger.info(f"Waiting {wait_time:.1f}s before retry...")
+                retry_wait = wait_time
                 continue
             
             return {
@@ -124,12 +215,16 @@ def get_completion(
                 "error_type": "rate_limit_error"
             }
             
-        except APITimeoutError as e:
+        except (APITimeoutError, DeadlineExceededError) as e:
             error_msg = f"Request timeout: {str(e)}"
             logger.warning(f"{error_msg} (attempt {attempt + 1}/{max_retries})")
             last_error = e
+            if not _fits_before_deadline(0, deadline):
+                break
             
-            if attempt < max_retries - 1:
+            wait_time = _backoff_seconds(attempt)
+            if attempt < max_retries - 1 and _fits_before_deadline(wait_time, deadline):
+                retry_wait = wait_time
                 continue
             
             return {
@@ -138,12 +233,14 @@ def get_completion(
                 "error_type": "timeout_error"
             }
             
-        except APIConnectionError as e:
+        except (APIConnectionError, InternalServerError) as e:
             error_msg = f"Connection error: {str(e)}"
             logger.warning(f"{error_msg} (attempt {attempt + 1}/{max_retries})")
             last_error = e
             
-            if attempt < max_retries - 1:
+            wait_time = _backoff_seconds(attempt)
+            if attempt < max_retries - 1 and _fits_before_deadline(wait_time, deadline):
+                retry_wait = wait_time
                 continue
             
             return {
@@ -171,6 +268,14 @@ def get_completion(
                 "content": "An unexpected error occurred while processing your request.",
                 "error_type": "unexpected_error"
             }
+
+    if deadline is not None and time.monotonic() >= deadline:
+        logger.error(f"Deadline exceeded before completion. Last error: {last_error}")
+        return {
+            "success": False,
+            "content": "Request could not be completed within the allotted time.",
+            "error_type": "deadline_exceeded"
+        }
     
     # If we get here, all retries failed
     logger.error(f"All {max_retries} attempts failed. Last error: {last_error}")
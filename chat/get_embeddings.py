@@ -0,0 +1,36 @@
+import os
+import threading
+from typing import Optional, Dict, Tuple
+
+from langchain_community.embeddings import OpenAIEmbeddings
+
+from .class_OpenAIClient import OpenAIClient
+from .class_ScheduledEmbeddings import ScheduledEmbeddings
+
+_embeddings: Dict[Tuple[str, Optional[str]], ScheduledEmbeddings] = {}
+_embeddings_lock = threading.Lock()
+
+
+def get_embeddings(embedding_model: str, openai_api_key: Optional[str] = None) -> ScheduledEmbeddings:
+    """
+    OpenAIEmbeddings for the given model that send requests through the shared
+    OpenAITransport pool instead of building their own HTTP clients, admitted by
+    the AdmissionScheduler in the caller's lane.
+
+    One instance is kept per model and API key (OPENAI_API_KEY when none is
+    given) and reused across uploads and queries.
+    """
+    api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
+    with _embeddings_lock:
+        if (embedding_model, api_key) not in _embeddings:
+            client = OpenAIClient()
+            sync_client, async_client = client.get_client(), client.get_async_client()
+            if api_key != sync_client.api_key:
+                # Same connection pool, another key
+                sync_client, async_client = sync_client.with_options(api_key=api_key), async_client.with_options(api_key=api_key)
+            _embeddings[(embedding_model, api_key)] = ScheduledEmbeddings(OpenAIEmbeddings(
+                model=embedding_model,
+                openai_api_key=api_key,
+                client=sync_client.embeddings,
+                async_client=async_client.embeddings))
+        return _embeddings[(embedding_model, api_key)]
\ No newline at end of file
@@ -0,0 +1,5 @@
+from .class_ConversationSession import ConversationSession, chunk_key
+from .class_SessionStore import SessionStore
+from .answer_turn import answer_turn, build_session_prompt
+
+__all__ = ["ConversationSession", "chunk_key", "SessionStore", "answer_turn", "build_session_prompt"]
\ No newline at end of file
@@ -0,0 +1,131 @@
+import os
+import time
+from typing import Dict, Any, Tuple
+
+import numpy as np
+
+from chat import get_completion
+from retrieval import retrieve, get_query_embeddings
+from retrieval.rag_query import build_context, RAG_SYSTEM_PROMPT
+from financial_facts import answer_from_financial_facts
+from .class_ConversationSession import ConversationSession
+
+SESSION_SYSTEM_PROMPT = RAG_SYSTEM_PROMPT + " Follow-up questions refer to the conversation so far."
+
+# A follow-up this similar to the last searched query is answered from the chunks already in context
+REUSE_SIMILARITY = float(os.getenv("SESSION_REUSE_SIMILARITY", "0.92"))
+HISTORY_TURNS = int(os.getenv("SESSION_HISTORY_TURNS", "4"))
+HISTORY_ANSWER_CHARS = int(os.getenv("SESSION_HISTORY_ANSWER_CHARS", "600"))
+MAX_CHUNKS_PER_K = 3
+
+
+def _cosine(a: np.ndarray, b: np.ndarray) -> float:
+    return float(a @ b / max(float(np.linalg.norm(a) * np.linalg.norm(b)), 1e-12))
+
+
+def _remember(session: ConversationSession, question: str, answer: str) -> None:
+    """Keep the last few turns, with long answers cut down, as the condensed history"""
+    if len(answer) > HISTORY_ANSWER_CHARS:
+        answer = answer[:HISTORY_ANSWER_CHARS].rsplit(" ", 1)[0] + " ..."
+    session.history.append({"question": question, "answer": answer})
+    del session.history[:-HISTORY_TURNS]
+
+
+def build_session_prompt(session: ConversationSession, question: str) -> str:
+    """
+    Excerpts first, in the order they entered the session, then the condensed
+    history, then the question: everything before the newest excerpts is the
+    same as on the previous turn, so upstream prompt caching can reuse it.
+    """
+    parts = [f"Excerpts:\n{build_context(list(session.chunks.values()))}"]
+    if session.history:
+        turns = "\n\n".join(f"Q: {turn['question']}\nA: {turn['answer']}" for turn in session.history)
+        parts.append(f"Conversation so far:\n{turns}")
+    parts.append(f"Question: {question}")
+    return "\n\n".join(parts)
+
+
+def answer_turn(
+    session: ConversationSession,
+    question: str,
+    temperature: float = 0.2,
+    model: str = "gpt-4o",
+    use_financial_facts: bool = True
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Answer one question in a conversation.
+
+    Follow-ups are retrieved with the previous question prepended, since they
+    rarely stand on their own. When that query is close to the last one that
+    was searched, the chunks already in context are reused without a search;
+    otherwise new chunks are appended to the context.
+
+    Returns:
+        (get_completion result dict plus chunks_used, savings of this turn)
+    """
+    started = time.perf_counter()
+    with session.lock:
+        turn = session.totals["turns"] + 1
+
+        if use_financial_facts:
+            answer = answer_from_financial_facts(session.document_id, question)
+            if answer is not None:
+                savings = {
+                    "turn": turn,
+                    "retrieval": "financial_facts",
+                    "latency_ms": round((time.perf_counter() - started) * 1000, 2)
+                }
+                _remember(session, question, answer["content"])
+                session.record(savings)
+                return answer, savings
+
+        retrieval_query = f"{session.history[-1]['question']}\n{question}" if session.history else question
+        query_vector = np.asarray(get_query_embeddings(session.embedding_model).embed_query(retrieval_query), dtype=np.float32)
+
+        if session.chunks and session.last_query_vector is not None and _cosine(query_vector, session.last_query_vector) >= REUSE_SIMILARITY:
+            retrieval = "reused"
+            retrieval_ms = 0.0
+            retrieval_ms_saved = session.mean_retrieval_ms()
+            chunk_counts = {"reused_chunks": len(session.chunks), "new_chunks": 0, "dropped_chunks": 0}
+        else:
+            retrieval = "extended" if session.chunks else "initial"
+            retrieval_started = time.perf_counter()
+            documents = retrieve(
+                retrieval_query,
+                session.vectorstore_path,
+                embedding_model=session.embedding_model,
+                **session.retrieval_params
+            )
+            retrieval_ms = (time.perf_counter() - retrieval_started) * 1000
+            retrieval_ms_saved = 0.0
+            session.retrieval_ms.append(retrieval_ms)
+            session.last_query_vector = query_vector
+            chunk_counts = session.add_chunks(documents, MAX_CHUNKS_PER_K * session.retrieval_params["k"])
+
+        result = get_completion(
+            build_session_prompt(session, question),
+            temperature=temperature,
+            system_prompt=SESSION_SYSTEM_PROMPT,
+            model=model,
+            prompt_cache_key=f"conversation-{session.session_id}"
+        )
+        usage = result.get("usage") or {}
+        input_tokens = usage.get("imput_token") or 0
+        cached_tokens = usage.get("cached_tokens") or 0
+        savings = {
+            "turn": turn,
+            "retrieval": retrieval,
+            "retrieval_ms": round(retrieval_ms, 2),
+            "retrieval_ms_saved": round(retrieval_ms_saved, 2),
+            **chunk_counts,
+            "context_chunks": len(session.chunks),
+            "input_tokens": input_tokens,
+            "cached_input_tokens": cached_tokens,
+            "cached_input_ratio": round(cached_tokens / input_tokens, 4) if input_tokens else 0.0,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+        if result.get("success"):
+            _remember(session, question, result["content"])
+        session.record(savings)
+        result["chunks_used"] = len(session.chunks)
+        return result, savings
@@ -0,0 +1,93 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+
+
+def chunk_key(document) -> str:
+    """Identity of a retrieved chunk that holds for both in-process and retrieval server results"""
+    digest = hashlib.blake2b(document.page_content.encode("utf-8"), digest_size=8).hexdigest()
+    return f"{document.metadata.get('page')}:{digest}"
+
+
+class ConversationSession:
+    """
+    State of one conversation about a document.
+
+    chunks keeps every excerpt sent so far in the order it was first retrieved,
+    so the excerpt block of the prompt only ever grows at the end and its
+    beginning stays byte-identical between turns (and cacheable upstream).
+    """
+
+    def __init__(self, session_id: str, document: Dict[str, Any], retrieval_params: Dict[str, Any]):
+        self.session_id = session_id
+        self.document_id = document["id"]
+        self.vectorstore_path = document["vectorstore_path"]
+        self.embedding_model = document.get("embedding_model")
+        self.retrieval_params = retrieval_params
+        self.chunks: "OrderedDict[str, Any]" = OrderedDict()
+        self.history: List[Dict[str, str]] = []
+        self.last_query_vector: Optional[np.ndarray] = None
+        self.retrieval_ms: List[float] = []
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+        self.totals = {
+            "turns": 0,
+            "input_tokens": 0,
+            "cached_input_tokens": 0,
+            "reused_chunks": 0,
+            "new_chunks": 0,
+            "retrievals_skipped": 0,
+            "retrieval_ms_saved": 0.0
+        }
+
+    def touch(self) -> None:
+        self.last_used = time.monotonic()
+
+    def mean_retrieval_ms(self) -> float:
+        return sum(self.retrieval_ms) / len(self.retrieval_ms) if self.retrieval_ms else 0.0
+
+    def add_chunks(self, documents, max_chunks: int) -> Dict[str, int]:
+        """
+        Append newly retrieved chunks. Over max_chunks, the most recently added
+        chunks not in this retrieval are dropped first: removing an early chunk
+        would change the prompt from that point on and void the cached prefix.
+        """
+        keys = [chunk_key(document) for document in documents]
+        reused = sum(1 for key in keys if key in self.chunks)
+        for key, document in zip(keys, documents):
+            self.chunks.setdefault(key, document)
+        dropped = 0
+        current = set(keys)
+        for key in reversed(list(self.chunks)):
+            if len(self.chunks) <= max_chunks:
+                break
+            if key not in current:
+                del self.chunks[key]
+                dropped += 1
+        return {"reused_chunks": reused, "new_chunks": len(set(keys)) - reused, "dropped_chunks": dropped}
+
+    def record(self, savings: Dict[str, Any]) -> None:
+        self.totals["turns"] += 1
+        for name in ("input_tokens", "cached_input_tokens", "reused_chunks", "new_chunks"):
+            self.totals[name] += savings.get(name) or 0
+        if savings.get("retrieval") == "reused":
+            self.totals["retrievals_skipped"] += 1
+        self.totals["retrieval_ms_saved"] = round(self.totals["retrieval_ms_saved"] + savings.get("retrieval_ms_saved", 0.0), 2)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "document_id": self.document_id,
+            "retrieval_params": self.retrieval_params,
+            "chunks": len(self.chunks),
+            "turns": len(self.history),
+            "history": self.history,
+            "created_at": self.created_at,
+            "idle_seconds": round(time.monotonic() - self.last_used, 1),
+            "totals": self.totals
+        }
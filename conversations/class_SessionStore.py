@@ -0,0 +1,81 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+from .class_ConversationSession import ConversationSession
+
+
+class SessionStore:
+    """
+    Singleton in-memory store of conversation sessions.
+
+    Sessions expire after SESSION_TTL_SECONDS without a turn, and at most
+    SESSION_MAX_SESSIONS are kept (least recently used go first).
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self) -> None:
+        self.ttl_seconds = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+        self.max_sessions = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.expired = 0
+        self.evicted = 0
+
+    def _purge_expired(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        # Ordered by last use, so expired sessions are all at the front
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_used >= cutoff:
+                break
+            del self._sessions[session_id]
+            self.expired += 1
+
+    def create(self, document: Dict[str, Any], retrieval_params: Dict[str, Any]) -> ConversationSession:
+        # The shard router finds the node holding a session from the document id it starts with
+        session = ConversationSession(f"{document['id']}-{uuid.uuid4().hex}", document, retrieval_params)
+        with self._lock:
+            self._purge_expired()
+            self._sessions[session.session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evicted += 1
+        return session
+
+    def get(self, session_id: str) -> Optional[ConversationSession]:
+        with self._lock:
+            self._purge_expired()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.touch()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._purge_expired()
+            sessions = list(self._sessions.values())
+        return {
+            "sessions": len(sessions),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "turns": sum(session.totals["turns"] for session in sessions),
+            "cached_input_tokens": sum(session.totals["cached_input_tokens"] for session in sessions),
+            "retrievals_skipped": sum(session.totals["retrievals_skipped"] for session in sessions)
+        }
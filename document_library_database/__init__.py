@@ -1,5 +1,11 @@
 from .ensure_document_library_db import ensure_document_library_db
+from .schema_migrations import migrate_document_library_db, get_schema_version, SCHEMA_VERSION
 from .class_DocumentLibraryManager import DocumentLibraryManager
 from .class_DocumentMetadataModel import DocumentMetadata
+from .class_FinancialFactsManager import FinancialFactsManager
+from .class_VectorstoreLifecycleManager import VectorstoreLifecycleManager
+from .class_EmbeddingMigrationManager import EmbeddingMigrationManager
+from .class_ShardStateManager import ShardStateManager
+from .class_UploadSessionManager import UploadSessionManager
 
-__all__ = ["ensure_document_library_db", "DocumentLibraryManager", "DocumentMetadata"]
\ No newline at end of file
+__all__ = ["ensure_document_library_db", "migrate_document_library_db", "get_schema_version", "SCHEMA_VERSION", "DocumentLibraryManager", "DocumentMetadata", "FinancialFactsManager", "VectorstoreLifecycleManager", "EmbeddingMigrationManager", "ShardStateManager", "UploadSessionManager"]
\ No newline at end of file
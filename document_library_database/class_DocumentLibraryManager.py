@@ -1,4 +1,6 @@
 
+import os
+import json
 import sqlite3
 from datetime import datetime
 
@@ -6,6 +8,8 @@ from document_library_database import ensure_document_library_db
 from document_library_database.class_DocumentMetadataModel import DocumentMetadata
 from document_library_database.documents.delete_documents import delete_document
 from .class_DocumentsManager import DocumentsManager
+from .class_FinancialFactsManager import FinancialFactsManager
+from .class_VectorstoreLifecycleManager import VectorstoreLifecycleManager
 
 class DocumentLibraryManager:
     """Singleton database operations manager for document library"""
@@ -18,6 +22,8 @@ class DocumentLibraryManager:
             cls._instance = super(DocumentLibraryManager, cls).__new__(cls)
             ensure_document_library_db(cls._db_path) 
             cls._instance.Documents = DocumentsManager()
+            cls._instance.FinancialFacts = FinancialFactsManager()
+            cls._instance.Vectorstores = VectorstoreLifecycleManager()
         return cls._instance
     
     @classmethod
@@ -29,33 +35,60 @@ class DocumentLibraryManager:
     def set_db_path(cls, db_path):
         """Set database path (useful for testing)"""
         cls._db_path = db_path
-        ensure_document_library_db()
+        ensure_document_library_db(db_path)
     
     @classmethod
     def delete_document(cls, document_id, soft_delete=True):
+        """Delete a document and wake the vectorstore collector; False if it does not exist"""
+        conn = cls.get_connection()
+        deleted = delete_document(
+            connection=conn,
+            cursor=conn.cursor(),
+            document_id=document_id,
+            soft_delete=soft_delete
+        )
+        if deleted:
+            VectorstoreLifecycleManager().request_collection()
+        return deleted
+
+    @classmethod
+    def get_agreements(cls):
+        """Live documents with a vectorstore, one row per collection they belong to"""
         conn = cls.get_connection()
         cursor = conn.cursor()
-        cursor.execute('SELECT id, vectorstore_path FROM documents WHERE id = ?', (document_id,))
-        result = cursor.fetchone()
-        if not result:
-            conn.close()
-            return False
-            delete_document(
-                connection=cls.get_connection(),
-                cursor=cls.get_connection().cursor(),
-                document_id=document_id,
-                soft_delete=soft_delete
-            )
+        cursor.execute('''
+            SELECT d.id, d.filename, d.title, d.employer, d.vectorstore_path, c.name
+            FROM documents d
+            LEFT JOIN document_collections dc ON d.id = dc.document_id
+            LEFT JOIN collections c ON c.id = dc.collection_id AND c.is_active = 1
+            WHERE d.processing_status != 'deleted' AND d.vectorstore_path IS NOT NULL
+            ORDER BY d.id
+        ''')
+        
+        agreements = []
+        for row in cursor.fetchall():
+            agreements.append({
+                'name': os.path.splitext(row[1] or '')[0] or row[2],
+                'collection': row[5],
+                'document_id': row[0],
+                'title': row[2],
+                'employer': row[3],
+                'vectorstore_path': row[4]
+            })
+        
+        conn.close()
+        return agreements
+    
     @classmethod
-    def create_collection(cls, name, description=None, created_by=None):
-        """Create a new collection"""
+    def create_collection(cls, name, description=None, created_by=None, collection_id=None):
+        """Create a new collection; collection_id is given when the shard router assigned one"""
         conn = cls.get_connection()
         cursor = conn.cursor()
         try:
             cursor.execute('''
-                INSERT INTO collections (name, description, created_by, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (name, description, created_by, datetime.now().isoformat(), datetime.now().isoformat()))
+                INSERT INTO collections (id, name, description, created_by, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (collection_id, name, description, created_by, datetime.now().isoformat(), datetime.now().isoformat()))
             collection_id = cursor.lastrowid
             conn.commit()
             return collection_id
@@ -81,11 +114,9 @@ class DocumentLibraryManager:
                 c.is_active,
                 c.created_at,
                 c.updated_at,
-                COUNT(dc.document_id) as document_count
+                (SELECT COUNT(*) FROM document_collections dc WHERE dc.collection_id = c.id) as document_count
             FROM collections c
-            LEFT JOIN document_collections dc ON c.id = dc.collection_id
             {where_clause}
-            GROUP BY c.id, c.name, c.description, c.created_by, c.is_active, c.created_at, c.updated_at
             ORDER BY c.created_at DESC
         ''')
         
@@ -186,20 +217,39 @@ class DocumentLibraryManager:
     def create_document(cls, 
                 document_metadata: DocumentMetadata, 
                 vectorstore_path: str,
-                document_description: str=""):
-        """Create a new document"""
+                document_description: str="",
+                vectorization_params: dict=None,
+                content_hash: str=None,
+                file_size_bytes: int=None,
+                vectorization_fingerprint: str=None,
+                document_id: int=None):
+        """Create a new document; document_id is given when the shard router assigned one"""
+        vectorization_params = vectorization_params or {}
         conn = cls.get_connection()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO documents (
-                filetype, filename, vectorstore_path, upload_date, description
-            ) VALUES (?, ?, ?, ?, ?)
+                id, filetype, filename, vectorstore_path, upload_date, description,
+                chunk_size, chunk_overlap, embedding_model,
+                content_hash, file_size_bytes, vectorization_fingerprint,
+                employer, valid_from, valid_to
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
+            document_id,
             document_metadata.file_type, 
             document_metadata.file_name, 
             vectorstore_path,
             datetime.now().isoformat(),
-            document_description
+            document_description,
+            vectorization_params.get('chunk_size'),
+            vectorization_params.get('chunk_overlap'),
+            vectorization_params.get('embedding_model'),
+            content_hash,
+            file_size_bytes,
+            vectorization_fingerprint,
+            document_metadata.employer,
+            document_metadata.valid_from,
+            document_metadata.valid_to
         ))
         #if there is a collection_id in document_metadata, associate the document with the appropriate collection
         document_id = cursor.lastrowid
@@ -227,6 +277,27 @@ class DocumentLibraryManager:
             return dict(zip(columns, row))
         return None
     
+    @classmethod
+    def find_document_by_content(cls, content_hash, vectorization_fingerprint):
+        """Most recent live document built from the same bytes with the same chunking and embedding parameters"""
+        conn = cls.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM documents
+            WHERE content_hash = ? AND vectorization_fingerprint = ?
+              AND processing_status != 'deleted'
+            ORDER BY id DESC
+            LIMIT 1
+        ''', (content_hash, vectorization_fingerprint))
+        
+        row = cursor.fetchone()
+        conn.close()
+        
+        if row:
+            columns = [description[0] for description in cursor.description]
+            return dict(zip(columns, row))
+        return None
+    
     @classmethod
     def get_documents_by_collection(cls, collection_id):
         """Get all documents in a collection"""
@@ -248,6 +319,54 @@ class DocumentLibraryManager:
         conn.close()
         return documents
     
+    @classmethod
+    def find_filings(cls, employer, period_start=None, period_end=None, limit=None):
+        """
+        Live filings of an issuer whose period overlaps [period_start, period_end]
+        (ISO dates, either open), oldest first; limit keeps the most recent ones.
+        Served by idx_documents_live_filings.
+        """
+        query = '''
+            SELECT id, employer, valid_from, valid_to, title, filename, vectorstore_path, embedding_model
+            FROM documents
+            WHERE employer = ? AND valid_from IS NOT NULL
+              AND processing_status != 'deleted' AND vectorstore_path IS NOT NULL
+        '''
+        params = [employer]
+        if period_end is not None:
+            query += ' AND valid_from <= ?'
+            params.append(period_end)
+        if period_start is not None:
+            query += ' AND COALESCE(valid_to, valid_from) >= ?'
+            params.append(period_start)
+        query += ' ORDER BY valid_from DESC, id DESC'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        conn = cls.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        columns = [description[0] for description in cursor.description]
+        filings = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        conn.close()
+        filings.reverse()
+        return filings
+
+    @classmethod
+    def set_filing_period(cls, document_id, employer, valid_from, valid_to=None):
+        """Record the issuer and period of an existing document; False if it does not exist"""
+        conn = cls.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE documents
+            SET employer = ?, valid_from = ?, valid_to = ?, updated_at = ?
+            WHERE id = ? AND processing_status != 'deleted'
+        ''', (employer, valid_from, valid_to, datetime.now().isoformat(), document_id))
+        updated = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return updated
+
     @classmethod
     def update_document_processing_status(cls, document_id, status):
         """Update document processing status"""
@@ -294,6 +413,134 @@ class DocumentLibraryManager:
         conn.close()
         return rows_affected > 0
     
+    # Bulk document-collection operations: one connection, one transaction, set-based checks
+    @classmethod
+    def _existing_document_ids(cls, cursor, document_ids):
+        cursor.execute('''
+            SELECT id FROM documents
+            WHERE id IN (SELECT value FROM json_each(?)) AND processing_status != 'deleted'
+        ''', (json.dumps(document_ids),))
+        return {row[0] for row in cursor.fetchall()}
+    
+    @classmethod
+    def _member_document_ids(cls, cursor, collection_id, document_ids):
+        cursor.execute('''
+            SELECT document_id FROM document_collections
+            WHERE collection_id = ? AND document_id IN (SELECT value FROM json_each(?))
+        ''', (collection_id, json.dumps(document_ids)))
+        return {row[0] for row in cursor.fetchall()}
+    
+    @classmethod
+    def _collection_exists(cls, cursor, collection_id):
+        cursor.execute('SELECT 1 FROM collections WHERE id = ?', (collection_id,))
+        return cursor.fetchone() is not None
+    
+    @classmethod
+    def bulk_add_documents_to_collection(cls, collection_id, document_ids, added_by=None):
+        """
+        Add many documents to a collection in one transaction.
+        
+        Returns None if the collection does not exist, otherwise one result per
+        document id: 'added', 'already_in_collection' or 'document_not_found'
+        (deleted documents count as not found).
+        """
+        document_ids = list(dict.fromkeys(document_ids))
+        conn = cls.get_connection()
+        cursor = conn.cursor()
+        try:
+            if not cls._collection_exists(cursor, collection_id):
+                return None
+            existing = cls._existing_document_ids(cursor, document_ids)
+            members = cls._member_document_ids(cursor, collection_id, document_ids)
+            to_add = [document_id for document_id in document_ids if document_id in existing and document_id not in members]
+            added_at = datetime.now().isoformat()
+            cursor.executemany('''
+                INSERT OR IGNORE INTO document_collections (document_id, collection_id, added_at, added_by)
+                VALUES (?, ?, ?, ?)
+            ''', [(document_id, collection_id, added_at, added_by) for document_id in to_add])
+            conn.commit()
+        finally:
+            conn.close()
+        
+        results = []
+        for document_id in document_ids:
+            if document_id not in existing:
+                status = 'document_not_found'
+            elif document_id in members:
+                status = 'already_in_collection'
+            else:
+                status = 'added'
+            results.append({'document_id': document_id, 'status': status})
+        return results
+    
+    @classmethod
+    def bulk_remove_documents_from_collection(cls, collection_id, document_ids):
+        """
+        Remove many documents from a collection in one transaction.
+        
+        Returns one result per document id: 'removed' or 'not_in_collection'.
+        """
+        document_ids = list(dict.fromkeys(document_ids))
+        conn = cls.get_connection()
+        cursor = conn.cursor()
+        try:
+            members = cls._member_document_ids(cursor, collection_id, document_ids)
+            cursor.executemany('''
+                DELETE FROM document_collections 
+                WHERE document_id = ? AND collection_id = ?
+            ''', [(document_id, collection_id) for document_id in members])
+            conn.commit()
+        finally:
+            conn.close()
+        return [{
+            'document_id': document_id,
+            'status': 'removed' if document_id in members else 'not_in_collection'
+        } for document_id in document_ids]
+    
+    @classmethod
+    def bulk_move_documents(cls, source_collection_id, target_collection_id, document_ids, added_by=None):
+        """
+        Move many documents from one collection to another in one transaction.
+        
+        Returns None if the target collection does not exist, otherwise one result
+        per document id: 'moved', 'already_in_target' (removed from source only)
+        or 'not_in_source'.
+        """
+        if source_collection_id == target_collection_id:
+            raise ValueError("Source and target collections must differ")
+        document_ids = list(dict.fromkeys(document_ids))
+        conn = cls.get_connection()
+        cursor = conn.cursor()
+        try:
+            if not cls._collection_exists(cursor, target_collection_id):
+                return None
+            in_source = cls._member_document_ids(cursor, source_collection_id, document_ids)
+            in_target = cls._member_document_ids(cursor, target_collection_id, document_ids)
+            added_at = datetime.now().isoformat()
+            cursor.executemany('''
+                INSERT OR IGNORE INTO document_collections (document_id, collection_id, added_at, added_by)
+                VALUES (?, ?, ?, ?)
+            ''', [(document_id, target_collection_id, added_at, added_by)
+                  for document_id in in_source if document_id not in in_target])
+            cursor.executemany('''
+                DELETE FROM document_collections 
+                WHERE document_id = ? AND collection_id = ?
+            ''', [(document_id, source_collection_id) for document_id in in_source])
+            conn.commit()
+        finally:
+            conn.close()
+        
+        results = []
+        for document_id in document_ids:
+            if document_id not in in_source:
+                status = 'not_in_source'
+            elif document_id in in_target:
+                status = 'already_in_target'
+            else:
+                status = 'moved'
+            results.append({'document_id': document_id, 'status': status})
+        return results
+    
     @classmethod
     def get_collections_for_document(cls, document_id):
         """Get all collections containing a document"""
@@ -331,8 +578,9 @@ class DocumentLibraryManager:
         conn = cls.get_connection()
         cursor = conn.cursor()
         
+        # No DISTINCT: a document is in a collection at most once, so the join cannot repeat it
         base_query = '''
-            SELECT DISTINCT d.*
+            SELECT d.*
             FROM documents d
         '''
         
@@ -1,5 +1,6 @@
 import json
 import os
+from datetime import date
 from flask import Blueprint, request, jsonify
 from werkzeug.utils import secure_filename
 from pydantic import BaseModel, Field, field_validator
@@ -11,6 +12,9 @@ class DocumentMetadata(BaseModel):
     file_type: str = Field(..., description="MIME type of the file")
     collection_id: int = Field(..., alias="collection", description="Collection ID")
     title: Optional[str] = Field(None, description="Document title")
+    employer: Optional[str] = Field(None, description="Issuer the filing belongs to")
+    valid_from: Optional[str] = Field(None, description="First day of the period the filing covers (YYYY-MM-DD)")
+    valid_to: Optional[str] = Field(None, description="Last day of the period the filing covers (YYYY-MM-DD)")
     
     
     class Config:
@@ -26,6 +30,19 @@ class DocumentMetadata(BaseModel):
         original_filename = secure_filename(v)
         return original_filename.strip()
 
+    @field_validator('employer')
+    def validate_employer(cls, v):
+        if v is None:
+            return v
+        return v.strip() or None
+
+    @field_validator('valid_from', 'valid_to')
+    def validate_period_date(cls, v):
+        if v is None:
+            return v
+        # Stored as ISO dates so the period index orders and compares them as text
+        return date.fromisoformat(v.strip()).isoformat()
+
     @field_validator('collection_id')
     def validate_collection_id(cls, v):
         if v <= 0:
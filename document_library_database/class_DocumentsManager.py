@@ -17,20 +17,30 @@ class DocumentsManager:
         from .class_DocumentLibraryManager import DocumentLibraryManager
         return DocumentLibraryManager.get_connection()
     
-    def create(self, document_metadata: DocumentMetadata, vectorstore_path: str, document_description: str = ""):
+    def create(self, document_metadata: DocumentMetadata, vectorstore_path: str, document_description: str = "", vectorization_params: dict = None,
+               content_hash: str = None, file_size_bytes: int = None, vectorization_fingerprint: str = None):
         """Create a new document"""
+        vectorization_params = vectorization_params or {}
         conn = self._get_connection()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO documents (
-                filetype, filename, vectorstore_path, upload_date, description
-            ) VALUES (?, ?, ?, ?, ?)
+                filetype, filename, vectorstore_path, upload_date, description,
+                chunk_size, chunk_overlap, embedding_model,
+                content_hash, file_size_bytes, vectorization_fingerprint
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             document_metadata.file_type, 
             document_metadata.file_name, 
             vectorstore_path,
             datetime.now().isoformat(),
-            document_description
+            document_description,
+            vectorization_params.get('chunk_size'),
+            vectorization_params.get('chunk_overlap'),
+            vectorization_params.get('embedding_model'),
+            content_hash,
+            file_size_bytes,
+            vectorization_fingerprint
         ))
         # If there is a collection_id in document_metadata, associate the document with the appropriate collection
         document_id = cursor.lastrowid
@@ -105,8 +115,9 @@ class DocumentsManager:
         conn = self._get_connection()
         cursor = conn.cursor()
         
+        # No DISTINCT: a document is in a collection at most once, so the join cannot repeat it
         base_query = '''
-            SELECT DISTINCT d.*
+            SELECT d.*
             FROM documents d
         '''
         
@@ -0,0 +1,186 @@
+from datetime import datetime
+from typing import List, Dict, Optional
+
+ACTIVE_STATUSES = ('running', 'paused')
+
+class EmbeddingMigrationManager:
+    """Singleton manager for embedding-model migrations and their per-vectorstore items"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(EmbeddingMigrationManager, cls).__new__(cls)
+        return cls._instance
+
+    def _get_connection(self):
+        """Get database connection from main manager"""
+        from .class_DocumentLibraryManager import DocumentLibraryManager
+        return DocumentLibraryManager.get_connection()
+
+    @staticmethod
+    def _rows(cursor):
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def get_migration_sources(self, target_model: str, default_model: str) -> List[Dict]:
+        """Live vectorstores not yet embedded with target_model, with what is needed to name their replacement"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT vectorstore_path,
+                   COALESCE(MIN(embedding_model), ?) AS embedding_model,
+                   MIN(content_hash) AS content_hash,
+                   MIN(vectorization_fingerprint) AS vectorization_fingerprint,
+                   MIN(chunk_size) AS chunk_size,
+                   MIN(chunk_overlap) AS chunk_overlap,
+                   COUNT(*) AS documents
+            FROM documents
+            WHERE processing_status != 'deleted'
+              AND vectorstore_path IS NOT NULL
+              AND COALESCE(embedding_model, ?) != ?
+            GROUP BY vectorstore_path
+            ORDER BY MIN(id)
+        ''', (default_model, default_model, target_model))
+        sources = self._rows(cursor)
+        conn.close()
+        return sources
+
+    def create_migration(self, target_model: str, chunks_per_second: float, items: List[Dict]) -> int:
+        """Record a migration and its planned items in one transaction"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO embedding_migrations (target_model, status, chunks_per_second)
+            VALUES (?, 'running', ?)
+        ''', (target_model, chunks_per_second))
+        migration_id = cursor.lastrowid
+        cursor.executemany('''
+            INSERT INTO embedding_migration_items (
+                migration_id, source_path, source_model, target_path, target_fingerprint,
+                documents, chunks_total, status, error
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(
+            migration_id,
+            item['source_path'],
+            item['source_model'],
+            item['target_path'],
+            item.get('target_fingerprint'),
+            item.get('documents', 0),
+            item.get('chunks_total', 0),
+            item.get('status', 'pending'),
+            item.get('error')
+        ) for item in items])
+        conn.commit()
+        conn.close()
+        return migration_id
+
+    def get_migration(self, migration_id) -> Optional[Dict]:
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM embedding_migrations WHERE id = ?', (migration_id,))
+        rows = self._rows(cursor)
+        conn.close()
+        return rows[0] if rows else None
+
+    def list_migrations(self, statuses: Optional[tuple] = None) -> List[Dict]:
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        if statuses:
+            placeholders = ', '.join('?' for _ in statuses)
+            cursor.execute(f'SELECT * FROM embedding_migrations WHERE status IN ({placeholders}) ORDER BY id', statuses)
+        else:
+            cursor.execute('SELECT * FROM embedding_migrations ORDER BY id')
+        migrations = self._rows(cursor)
+        conn.close()
+        return migrations
+
+    def set_status(self, migration_id, status: str, error: Optional[str] = None):
+        now = datetime.now().isoformat()
+        finished_at = now if status not in ACTIVE_STATUSES else None
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE embedding_migrations SET status = ?, error = ?, updated_at = ?, finished_at = ?
+            WHERE id = ?
+        ''', (status, error, now, finished_at, migration_id))
+        conn.commit()
+        conn.close()
+
+    def get_items(self, migration_id, statuses: Optional[tuple] = None) -> List[Dict]:
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        query = 'SELECT * FROM embedding_migration_items WHERE migration_id = ?'
+        params = [migration_id]
+        if statuses:
+            query += f" AND status IN ({', '.join('?' for _ in statuses)})"
+            params.extend(statuses)
+        cursor.execute(query + ' ORDER BY id', params)
+        items = self._rows(cursor)
+        conn.close()
+        return items
+
+    def update_item(self, item_id, **fields):
+        if not fields:
+            return
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'UPDATE embedding_migration_items SET {assignments} WHERE id = ?', (*fields.values(), item_id))
+        conn.commit()
+        conn.close()
+
+    def flip_documents(self, item: Dict, target_model: str) -> int:
+        """
+        Point every live document on the item's source store at the new store, and
+        mark the item done, in one transaction; returns the documents switched.
+        """
+        now = datetime.now().isoformat()
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                UPDATE documents
+                SET vectorstore_path = ?, embedding_model = ?,
+                    vectorization_fingerprint = COALESCE(?, vectorization_fingerprint), updated_at = ?
+                WHERE vectorstore_path = ? AND processing_status != 'deleted'
+            ''', (item['target_path'], target_model, item['target_fingerprint'], now, item['source_path']))
+            switched = cursor.rowcount
+            cursor.execute('''
+                UPDATE embedding_migration_items
+                SET status = 'done', chunks_done = chunks_total, documents = ?, finished_at = ?, error = NULL
+                WHERE id = ?
+            ''', (switched, now, item['id']))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return switched
+
+    def progress(self, migration_id) -> Dict:
+        """Item counts by status and chunk totals of a migration"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT status, COUNT(*), COALESCE(SUM(documents), 0), COALESCE(SUM(chunks_total), 0), COALESCE(SUM(chunks_done), 0)
+            FROM embedding_migration_items
+            WHERE migration_id = ?
+            GROUP BY status
+        ''', (migration_id,))
+        items, documents, chunks_total, chunks_done, chunks_remaining = {}, 0, 0, 0, 0
+        for status, count, status_documents, status_total, status_done in cursor.fetchall():
+            items[status] = count
+            documents += status_documents
+            chunks_total += status_total
+            chunks_done += status_done
+            if status in ('pending', 'running'):
+                chunks_remaining += status_total - status_done
+        conn.close()
+        return {
+            'items': items,
+            'documents': documents,
+            'chunks_total': chunks_total,
+            'chunks_done': chunks_done,
+            'chunks_remaining': chunks_remaining
+        }
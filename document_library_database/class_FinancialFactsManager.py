@@ -0,0 +1,94 @@
+
+from typing import List, Dict, Optional
+
+class FinancialFactsManager:
+    """Singleton manager for financial facts extracted from filings"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(FinancialFactsManager, cls).__new__(cls)
+        return cls._instance
+
+    def _get_connection(self):
+        """Get database connection from main manager"""
+        from .class_DocumentLibraryManager import DocumentLibraryManager
+        return DocumentLibraryManager.get_connection()
+
+    def add_facts(self, document_id, facts: List[Dict]):
+        """Store extracted facts for a document, replacing any previous value for the same metric and period"""
+        if not facts:
+            return 0
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT OR REPLACE INTO financial_facts (
+                document_id, metric, period, value, unit, scale, label, page, source_text
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(
+            document_id,
+            fact['metric'],
+            fact['period'],
+            fact['value'],
+            fact.get('unit'),
+            fact.get('scale', 1),
+            fact.get('label'),
+            fact.get('page'),
+            fact.get('source_text')
+        ) for fact in facts])
+        conn.commit()
+        conn.close()
+        return len(facts)
+
+    def get_facts(self, document_id, metric: Optional[str] = None, period: Optional[str] = None):
+        """Get facts for a document, optionally narrowed to one metric and/or period"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        conditions = ['document_id = ?']
+        params = [document_id]
+        if metric:
+            conditions.append('metric = ?')
+            params.append(metric)
+        if period:
+            conditions.append('period = ?')
+            params.append(period)
+
+        cursor.execute(f'''
+            SELECT document_id, metric, period, value, unit, scale, label, page, source_text
+            FROM financial_facts
+            WHERE {' AND '.join(conditions)}
+            ORDER BY metric, period DESC
+        ''', params)
+
+        columns = [description[0] for description in cursor.description]
+        facts = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        conn.close()
+        return facts
+
+    def copy_facts(self, source_document_id, target_document_id):
+        """Give a document the facts of another built from the same content"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO financial_facts (
+                document_id, metric, period, value, unit, scale, label, page, source_text
+            )
+            SELECT ?, metric, period, value, unit, scale, label, page, source_text
+            FROM financial_facts
+            WHERE document_id = ?
+        ''', (target_document_id, source_document_id))
+        rows_affected = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return rows_affected
+
+    def delete_facts(self, document_id):
+        """Remove all facts of a document"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM financial_facts WHERE document_id = ?', (document_id,))
+        rows_affected = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return rows_affected
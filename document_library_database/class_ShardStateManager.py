@@ -0,0 +1,182 @@
+import json
+import sqlite3
+from typing import List, Dict, Optional, Any
+
+# Each node hands out ids from its own block, so ids stay unique across nodes without coordination
+ID_BLOCK_BITS = 40
+
+class ShardStateManager:
+    """Singleton manager for this node's shard membership, id block and document hand-over"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ShardStateManager, cls).__new__(cls)
+        return cls._instance
+
+    def _get_connection(self):
+        """Get database connection from main manager"""
+        from .class_DocumentLibraryManager import DocumentLibraryManager
+        return DocumentLibraryManager.get_connection()
+
+    @staticmethod
+    def _rows(cursor):
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def get_nodes(self) -> List[str]:
+        """Nodes recorded as having joined, oldest first"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT url FROM shard_nodes ORDER BY added_at, url')
+        nodes = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return nodes
+
+    def set_nodes(self, nodes: List[str]) -> None:
+        """Replace the recorded membership"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM shard_nodes WHERE url NOT IN (SELECT value FROM json_each(?))', (json.dumps(nodes),))
+        cursor.executemany('INSERT OR IGNORE INTO shard_nodes (url) VALUES (?)', [(node,) for node in nodes])
+        conn.commit()
+        conn.close()
+
+    def allocate_id(self, node_id: int) -> int:
+        """Next id from the node's block [node_id << ID_BLOCK_BITS, (node_id + 1) << ID_BLOCK_BITS)"""
+        block_start = node_id << ID_BLOCK_BITS
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'shard_ids'")
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('shard_ids', ?)", (block_start,))
+            elif row[0] < block_start:
+                cursor.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'shard_ids'", (block_start,))
+            cursor.execute('INSERT INTO shard_ids DEFAULT VALUES')
+            allocated = cursor.lastrowid
+            # Only the sequence matters; keep the table itself empty
+            cursor.execute('DELETE FROM shard_ids')
+            conn.commit()
+        finally:
+            conn.close()
+        if allocated >= (node_id + 1) << ID_BLOCK_BITS:
+            raise ValueError(f"Id block of node {node_id} is exhausted")
+        return allocated
+
+    def get_document_ids(self) -> List[int]:
+        """Ids of every document record on this node, deleted ones included"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT id FROM documents ORDER BY id')
+        document_ids = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return document_ids
+
+    def export_document(self, document_id: int) -> Optional[Dict[str, Any]]:
+        """The document row with its collection memberships and financial facts, or None"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT * FROM documents WHERE id = ?', (document_id,))
+            documents = self._rows(cursor)
+            if not documents:
+                return None
+            cursor.execute('''
+                SELECT collection_id, added_at, added_by FROM document_collections WHERE document_id = ?
+            ''', (document_id,))
+            memberships = self._rows(cursor)
+            cursor.execute('''
+                SELECT metric, period, value, unit, scale, label, page, source_text
+                FROM financial_facts WHERE document_id = ?
+            ''', (document_id,))
+            facts = self._rows(cursor)
+        finally:
+            conn.close()
+        return {'document': documents[0], 'collections': memberships, 'financial_facts': facts}
+
+    def import_document(self, bundle: Dict[str, Any]) -> int:
+        """
+        Store a document exported by another node under the same id, in one
+        transaction; importing the same bundle twice leaves one copy. Memberships
+        are kept even for a collection whose row has not reached this node yet.
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            known_columns = {row[1] for row in cursor.execute('PRAGMA table_info(documents)')}
+            document = {column: value for column, value in bundle['document'].items() if column in known_columns}
+            columns = list(document)
+            cursor.execute(f'''
+                INSERT OR REPLACE INTO documents ({', '.join(columns)})
+                VALUES ({', '.join('?' for _ in columns)})
+            ''', [document[column] for column in columns])
+            document_id = document['id']
+            cursor.executemany('''
+                INSERT OR IGNORE INTO document_collections (document_id, collection_id, added_at, added_by)
+                VALUES (?, ?, ?, ?)
+            ''', [(document_id, membership['collection_id'], membership['added_at'], membership.get('added_by'))
+                  for membership in bundle.get('collections', [])])
+            cursor.execute('DELETE FROM financial_facts WHERE document_id = ?', (document_id,))
+            cursor.executemany('''
+                INSERT OR REPLACE INTO financial_facts (
+                    document_id, metric, period, value, unit, scale, label, page, source_text
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(
+                document_id,
+                fact['metric'],
+                fact['period'],
+                fact['value'],
+                fact.get('unit'),
+                fact.get('scale', 1),
+                fact.get('label'),
+                fact.get('page'),
+                fact.get('source_text')
+            ) for fact in bundle.get('financial_facts', [])])
+            conn.commit()
+        finally:
+            conn.close()
+        return document_id
+
+    def export_collections(self) -> List[Dict]:
+        """Every collection row, inactive ones included"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, name, description, created_by, is_active, created_at, updated_at FROM collections ORDER BY id
+        ''')
+        collections = self._rows(cursor)
+        conn.close()
+        return collections
+
+    def import_collections(self, collections: List[Dict]) -> Dict[str, int]:
+        """Insert or update collection rows by id; a name held by another id is reported as a conflict"""
+        imported = conflicts = 0
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        for collection in collections:
+            try:
+                cursor.execute('''
+                    INSERT INTO collections (id, name, description, created_by, is_active, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        name = excluded.name,
+                        description = excluded.description,
+                        is_active = excluded.is_active,
+                        updated_at = excluded.updated_at
+                ''', (
+                    collection['id'],
+                    collection['name'],
+                    collection.get('description'),
+                    collection.get('created_by'),
+                    collection.get('is_active', 1),
+                    collection.get('created_at'),
+                    collection.get('updated_at')
+                ))
+                imported += 1
+            except sqlite3.IntegrityError:
+                conflicts += 1
+        conn.commit()
+        conn.close()
+        return {'imported': imported, 'conflicts': conflicts}
@@ -0,0 +1,133 @@
+import json
+import sqlite3
+from datetime import datetime
+from typing import List, Dict, Optional, Any
+
+class UploadSessionManager:
+    """Singleton manager for resumable upload sessions and the parts received for them"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(UploadSessionManager, cls).__new__(cls)
+        return cls._instance
+
+    def _get_connection(self):
+        """Get database connection from main manager"""
+        from .class_DocumentLibraryManager import DocumentLibraryManager
+        return DocumentLibraryManager.get_connection()
+
+    @staticmethod
+    def _rows(cursor):
+        columns = [description[0] for description in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def create_session(self, session_id: str, metadata: Dict[str, Any], vectorization_params: Dict[str, Any],
+                       file_size_bytes: int, part_size_bytes: int, data_path: str, document_id: Optional[int] = None) -> None:
+        now = datetime.now().isoformat()
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO upload_sessions (id, document_id, metadata, vectorization_params, file_size_bytes,
+                                         part_size_bytes, data_path, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (session_id, document_id, json.dumps(metadata), json.dumps(vectorization_params),
+              file_size_bytes, part_size_bytes, data_path, now, now))
+        conn.commit()
+        conn.close()
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The session with metadata and vectorization_params decoded; None if there is none"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM upload_sessions WHERE id = ?', (session_id,))
+        rows = self._rows(cursor)
+        conn.close()
+        if not rows:
+            return None
+        session = rows[0]
+        session['metadata'] = json.loads(session['metadata'])
+        session['vectorization_params'] = json.loads(session['vectorization_params'])
+        return session
+
+    def get_parts(self, session_id: str) -> Dict[int, Dict[str, Any]]:
+        """{part_number: {'size_bytes', 'sha256'}} of the parts received so far"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT part_number, size_bytes, sha256 FROM upload_session_parts WHERE session_id = ?
+        ''', (session_id,))
+        parts = {row[0]: {'size_bytes': row[1], 'sha256': row[2]} for row in cursor.fetchall()}
+        conn.close()
+        return parts
+
+    def record_part(self, session_id: str, part_number: int, size_bytes: int, sha256: str) -> bool:
+        """Record a part whose bytes are on disk; False if the session is gone or no longer receiving"""
+        now = datetime.now().isoformat()
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                UPDATE upload_sessions SET updated_at = ? WHERE id = ? AND status = 'receiving'
+            ''', (now, session_id))
+            if cursor.rowcount == 0:
+                conn.rollback()
+                return False
+            cursor.execute('''
+                INSERT OR IGNORE INTO upload_session_parts (session_id, part_number, size_bytes, sha256, received_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (session_id, part_number, size_bytes, sha256, now))
+            conn.commit()
+            return True
+        finally:
+            conn.close()
+
+    def set_status(self, session_id: str, status: str, expected: str) -> bool:
+        """Move a session from status expected to status; False if it was not in expected"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE upload_sessions SET status = ?, updated_at = ? WHERE id = ? AND status = ?
+        ''', (status, datetime.now().isoformat(), session_id, expected))
+        changed = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return changed
+
+    def delete_session(self, session_id: str) -> bool:
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM upload_session_parts WHERE session_id = ?', (session_id,))
+        cursor.execute('DELETE FROM upload_sessions WHERE id = ?', (session_id,))
+        deleted = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return deleted
+
+    def get_stale_sessions(self, updated_before: str) -> List[Dict[str, Any]]:
+        """Sessions untouched since updated_before (ISO timestamp), whatever their status"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, data_path, status, updated_at FROM upload_sessions WHERE updated_at < ? ORDER BY updated_at
+        ''', (updated_before,))
+        sessions = self._rows(cursor)
+        conn.close()
+        return sessions
+
+    def get_data_paths(self) -> List[str]:
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT data_path FROM upload_sessions')
+        paths = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return paths
+
+    def count_sessions(self) -> Dict[str, int]:
+        """{status: sessions}"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT status, COUNT(*) FROM upload_sessions GROUP BY status')
+        counts = dict(cursor.fetchall())
+        conn.close()
+        return counts
@@ -0,0 +1,221 @@
+import os
+import time
+import uuid
+import shutil
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+VECTORSTORE_ROOT = "vectorstore"
+INDEX_FILE = "index.faiss"
+# Combined per-issuer indexes; no document points at them and retrieval.IssuerIndexes replaces them itself
+ISSUER_INDEX_DIR = "issuers"
+
+class VectorstoreLifecycleManager:
+    """
+    Singleton that reference-counts vectorstores from the documents table and
+    garbage-collects the ones no live document points at.
+
+    Content-addressed stores are shared by every document built from the same
+    bytes, so a store is only orphaned once all of its rows are deleted (soft or
+    hard) or gone. Stores younger than the grace period are left alone, since an
+    upload writes its index before the document row that references it exists.
+
+    Configuration via environment:
+        VECTORSTORE_GC_INTERVAL_SECONDS  background sweep interval, 0 disables (default 3600)
+        VECTORSTORE_GC_GRACE_SECONDS     minimum age of a store before it can be collected (default 3600)
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(VectorstoreLifecycleManager, cls).__new__(cls)
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        self.root = VECTORSTORE_ROOT
+        self.interval_seconds = float(os.getenv("VECTORSTORE_GC_INTERVAL_SECONDS", "3600"))
+        self.grace_seconds = float(os.getenv("VECTORSTORE_GC_GRACE_SECONDS", "3600"))
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._runs = 0
+        self._collected_total = 0
+        self._reclaimed_bytes_total = 0
+        self._last_run = None
+
+    def _get_connection(self):
+        """Get database connection from main manager"""
+        from .class_DocumentLibraryManager import DocumentLibraryManager
+        return DocumentLibraryManager.get_connection()
+
+    @staticmethod
+    def _key(path):
+        return os.path.normpath(os.path.abspath(path))
+
+    @staticmethod
+    def _dir_size(path):
+        total = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, filename))
+                except OSError:
+                    pass
+        return total
+
+    def reference_counts(self) -> Dict[str, Dict[str, int]]:
+        """{vectorstore_path: {'live': n, 'deleted': n}} for every path in the documents table"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT vectorstore_path,
+                   SUM(CASE WHEN processing_status != 'deleted' THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN processing_status = 'deleted' THEN 1 ELSE 0 END)
+            FROM documents
+            WHERE vectorstore_path IS NOT NULL
+            GROUP BY vectorstore_path
+        ''')
+        counts = {row[0]: {'live': row[1], 'deleted': row[2]} for row in cursor.fetchall()}
+        conn.close()
+        return counts
+
+    def _live_reference_count(self, path):
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT vectorstore_path FROM documents
+            WHERE vectorstore_path IS NOT NULL AND processing_status != 'deleted'
+        ''')
+        key = self._key(path)
+        count = sum(1 for (stored,) in cursor.fetchall() if self._key(stored) == key)
+        conn.close()
+        return count
+
+    def find_stores(self) -> List[str]:
+        """Every directory under the root holding a FAISS index, in both the legacy and content-addressed layouts"""
+        stores = []
+        if not os.path.isdir(self.root):
+            return stores
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if INDEX_FILE in filenames:
+                stores.append(dirpath)
+                dirnames[:] = []
+            elif dirpath == self.root and ISSUER_INDEX_DIR in dirnames:
+                dirnames.remove(ISSUER_INDEX_DIR)
+        return stores
+
+    def find_orphans(self) -> List[Dict]:
+        """Stores with no live document, split into collectable ones and ones still inside the grace period"""
+        live = {self._key(path) for path, count in self.reference_counts().items() if count['live']}
+        now = time.time()
+        orphans = []
+        for path in self.find_stores():
+            if self._key(path) in live:
+                continue
+            try:
+                age_seconds = now - os.path.getmtime(path)
+            except OSError:
+                continue
+            orphans.append({
+                'path': path,
+                'size_bytes': self._dir_size(path),
+                'age_seconds': round(age_seconds),
+                'collectable': age_seconds >= self.grace_seconds
+            })
+        return orphans
+
+    def _remove_empty_parents(self, path):
+        root = self._key(self.root)
+        parent = os.path.dirname(self._key(path))
+        while parent != root and parent.startswith(root + os.sep):
+            try:
+                os.rmdir(parent)
+            except OSError:
+                break
+            parent = os.path.dirname(parent)
+
+    def collect(self, dry_run=False) -> Dict:
+        """Remove collectable orphaned stores and report what was reclaimed"""
+        with self._lock:
+            started = time.perf_counter()
+            orphans = self.find_orphans()
+            collected = []
+            reclaimed_bytes = 0
+            for orphan in orphans:
+                if not orphan['collectable']:
+                    continue
+                if dry_run:
+                    collected.append(orphan['path'])
+                    reclaimed_bytes += orphan['size_bytes']
+                    continue
+                # A document may have been pointed at the store since the scan
+                if self._live_reference_count(orphan['path']):
+                    continue
+                # Renaming first makes the store vanish at once rather than file by file
+                trash_path = f"{orphan['path']}.trash-{uuid.uuid4().hex}"
+                try:
+                    os.rename(orphan['path'], trash_path)
+                except OSError as e:
+                    print(f"Error collecting vectorstore {orphan['path']}: {str(e)}")
+                    continue
+                shutil.rmtree(trash_path, ignore_errors=True)
+                self._remove_empty_parents(orphan['path'])
+                collected.append(orphan['path'])
+                reclaimed_bytes += orphan['size_bytes']
+
+            report = {
+                'dry_run': dry_run,
+                'finished_at': datetime.now().isoformat(),
+                'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+                'orphaned': len(orphans),
+                'collected': collected,
+                'reclaimed_bytes': reclaimed_bytes,
+                'pending_grace': sum(1 for orphan in orphans if not orphan['collectable'])
+            }
+            if not dry_run:
+                self._runs += 1
+                self._collected_total += len(collected)
+                self._reclaimed_bytes_total += reclaimed_bytes
+                self._last_run = report
+            return report
+
+    def request_collection(self):
+        """Wake the background collector, e.g. after a document is deleted"""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval_seconds)
+            self._wake.clear()
+            try:
+                self.collect()
+            except Exception as e:
+                print(f"Error collecting vectorstores: {str(e)}")
+
+    def start(self, interval_seconds: Optional[float] = None):
+        """Start the background collector once; an interval of 0 disables it"""
+        if interval_seconds is not None:
+            self.interval_seconds = interval_seconds
+        if self.interval_seconds <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="vectorstore-gc", daemon=True)
+        self._thread.start()
+
+    def stats(self) -> Dict:
+        counts = self.reference_counts()
+        stores = self.find_stores()
+        return {
+            'stores': len(stores),
+            'disk_bytes': sum(self._dir_size(path) for path in stores),
+            'referenced_paths': sum(1 for count in counts.values() if count['live']),
+            'shared_paths': sum(1 for count in counts.values() if count['live'] > 1),
+            'background': self._thread is not None,
+            'interval_seconds': self.interval_seconds,
+            'grace_seconds': self.grace_seconds,
+            'runs': self._runs,
+            'collected_total': self._collected_total,
+            'reclaimed_bytes_total': self._reclaimed_bytes_total,
+            'last_run': self._last_run
+        }
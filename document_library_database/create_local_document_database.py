@@ -1,10 +1,10 @@
-import os
-import sqlite3
-
-def create_local_document_database(db_path:str):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-        
+def create_baseline_schema(cursor):
+    """
+    The schema as it stood when versioned migrations were introduced, applied as
+    migration 1 (schema_migrations.MIGRATIONS). Every statement is idempotent so
+    databases created before then pass through it unchanged. Do not change it:
+    schema changes are new migrations.
+    """
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS documents(
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -25,6 +25,8 @@ def create_local_document_database(db_path:str):
             chunk_size INTEGER,
             chunk_overlap INTEGER,
             embedding_model TEXT,
+            content_hash TEXT,
+            vectorization_fingerprint TEXT,
             processing_status TEXT DEFAULT 'pending',
             created_at TEXT DEFAULT CURRENT_TIMESTAMP,
             updated_at TEXT DEFAULT CURRENT_TIMESTAMP
@@ -56,13 +58,83 @@ def create_local_document_database(db_path:str):
             UNIQUE(document_id, collection_id)
         )''')
         
+        # Columns added after the table was first created; CREATE TABLE IF NOT EXISTS leaves older databases without them
+    existing_columns = {row[1] for row in cursor.execute('PRAGMA table_info(documents)')}
+    for column, definition in [('content_hash', 'TEXT'), ('vectorization_fingerprint', 'TEXT')]:
+        if column not in existing_columns:
+            cursor.execute(f'ALTER TABLE documents ADD COLUMN {column} {definition}')
+        
+        # Financial facts extracted from filings at ingest, answered without the LLM
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS financial_facts(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER NOT NULL,
+            metric TEXT NOT NULL,
+            period TEXT NOT NULL,
+            value REAL NOT NULL,
+            unit TEXT,
+            scale INTEGER DEFAULT 1,
+            label TEXT,
+            page INTEGER,
+            source_text TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (document_id) REFERENCES documents (id) ON DELETE CASCADE,
+            UNIQUE(document_id, metric, period)
+        )''')
+        
+        # Background re-embedding of the corpus with another embedding model, one item per vectorstore
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS embedding_migrations(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            target_model TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            chunks_per_second REAL,
+            error TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            finished_at TEXT
+        )''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS embedding_migration_items(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            migration_id INTEGER NOT NULL,
+            source_path TEXT NOT NULL,
+            source_model TEXT,
+            target_path TEXT NOT NULL,
+            target_fingerprint TEXT,
+            documents INTEGER DEFAULT 0,
+            chunks_total INTEGER DEFAULT 0,
+            chunks_done INTEGER DEFAULT 0,
+            status TEXT NOT NULL DEFAULT 'pending',
+            error TEXT,
+            started_at TEXT,
+            finished_at TEXT,
+            FOREIGN KEY (migration_id) REFERENCES embedding_migrations (id) ON DELETE CASCADE,
+            UNIQUE(migration_id, source_path)
+        )''')
+
+        # Sharding: nodes that joined after startup, and ids handed out from this node's id block
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS shard_nodes(
+            url TEXT PRIMARY KEY,
+            added_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS shard_ids(
+            id INTEGER PRIMARY KEY AUTOINCREMENT
+        )''')
+
         # Create indexes for better performance
     cursor.execute('''CREATE INDEX IF NOT EXISTS idx_documents_title ON documents(title)''')
     cursor.execute('''CREATE INDEX IF NOT EXISTS idx_documents_employer ON documents(employer)''')
     cursor.execute('''CREATE INDEX IF NOT EXISTS idx_documents_upload_date ON documents(upload_date)''')
+        # Filing-history queries select one issuer's filings by period
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_documents_employer_period ON documents(employer, valid_from, valid_to)''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_documents_content_hash ON documents(content_hash, vectorization_fingerprint)''')
     cursor.execute('''CREATE INDEX IF NOT EXISTS idx_collections_name ON collections(name)''')
     cursor.execute('''CREATE INDEX IF NOT EXISTS idx_document_collections_document_id ON document_collections(document_id)''')
     cursor.execute('''CREATE INDEX IF NOT EXISTS idx_document_collections_collection_id ON document_collections(collection_id)''')
-        
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_financial_facts_metric_period ON financial_facts(metric, period)''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_embedding_migration_items_status ON embedding_migration_items(migration_id, status)''')
@@ -1,4 +1,4 @@
-import datetime
+from datetime import datetime
 
 def delete_document(
         connection,
@@ -6,6 +6,9 @@ def delete_document(
         document_id, soft_delete=True):
     """
     Delete document (soft delete by default)
+
+    Neither mode touches the vectorstore, which other documents may share;
+    VectorstoreLifecycleManager collects it once no live document references it.
     """
     cursor = connection.cursor()
 
@@ -26,6 +29,7 @@ def delete_document(
         # Hard delete - remove document and all collection associations
         # First remove from all collections
         cursor.execute('DELETE FROM document_collections WHERE document_id = ?', (document_id,))
+        cursor.execute('DELETE FROM financial_facts WHERE document_id = ?', (document_id,))
         # Then delete the document record
         cursor.execute('DELETE FROM documents WHERE id = ?', (document_id,))
     
@@ -1,9 +1,5 @@
-import sqlite3
-import os
-from .create_local_document_database import create_local_document_database
+from .schema_migrations import migrate_document_library_db
 
 def ensure_document_library_db(db_path):
-    if not os.path.exists(db_path):
-        create_local_document_database(db_path)    
-
-
+    # Creates the database on first use and brings existing ones up to the current schema version
+    migrate_document_library_db(db_path)
@@ -0,0 +1,121 @@
+import sqlite3
+import logging
+from typing import Callable, List, Optional, Tuple
+
+from .create_local_document_database import create_baseline_schema
+
+logger = logging.getLogger(__name__)
+
+# Live documents with a vectorstore; partial indexes over them serve queries that filter on the same two terms
+LIVE_DOCUMENT = "processing_status != 'deleted' AND vectorstore_path IS NOT NULL"
+
+
+def add_hot_query_indexes(cursor):
+    """
+    Indexes for the DocumentLibraryManager queries, checked on a 100k-document
+    database by benchmarks.benchmark_query_plans:
+
+    - document_collections by collection in added_at order, and by document in
+      added_at order, covering every junction column read (collection listings,
+      document counts, collections of a document) without a sort
+    - collections by is_active then created_at, and by created_at, so both
+      collection listings come out in order
+    - live filings of an issuer by period (find_filings), and live documents by
+      vectorstore_path (vectorstore reference counts, embedding migrations)
+    """
+    # Superseded by the covering indexes below: same leading column, no row lookups
+    cursor.execute('DROP INDEX IF EXISTS idx_document_collections_collection_id')
+    cursor.execute('DROP INDEX IF EXISTS idx_document_collections_document_id')
+    # valid_to between valid_from and the rowid forced a sort for ORDER BY valid_from, id
+    cursor.execute('DROP INDEX IF EXISTS idx_documents_employer_period')
+
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_document_collections_collection_added
+                      ON document_collections(collection_id, added_at, document_id, added_by)''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_document_collections_document_added
+                      ON document_collections(document_id, added_at, collection_id, added_by)''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_collections_active_created ON collections(is_active, created_at)''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_collections_created ON collections(created_at)''')
+    cursor.execute(f'''CREATE INDEX IF NOT EXISTS idx_documents_live_filings
+                       ON documents(employer, valid_from) WHERE {LIVE_DOCUMENT}''')
+    cursor.execute(f'''CREATE INDEX IF NOT EXISTS idx_documents_live_vectorstore
+                       ON documents(vectorstore_path) WHERE {LIVE_DOCUMENT}''')
+
+
+def add_upload_sessions(cursor):
+    """Resumable uploads: one row per session and one per part received, so a session outlives the process"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS upload_sessions(
+            id TEXT PRIMARY KEY,
+            document_id INTEGER,
+            metadata TEXT NOT NULL,
+            vectorization_params TEXT NOT NULL,
+            file_size_bytes INTEGER NOT NULL,
+            part_size_bytes INTEGER NOT NULL,
+            data_path TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'receiving',
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS upload_session_parts(
+            session_id TEXT NOT NULL,
+            part_number INTEGER NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            sha256 TEXT NOT NULL,
+            received_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (session_id, part_number),
+            FOREIGN KEY (session_id) REFERENCES upload_sessions (id) ON DELETE CASCADE
+        )''')
+    # The stale-session sweep
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_upload_sessions_updated_at ON upload_sessions(updated_at)''')
+
+
+# (version, description, migration); append only, never edit one that has shipped
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "baseline schema", create_baseline_schema),
+    (2, "indexes for the hot DocumentLibraryManager queries", add_hot_query_indexes),
+    (3, "resumable upload sessions", add_upload_sessions),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn) -> int:
+    """The last migration applied to the database; 0 for databases created before migrations"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate_document_library_db(db_path: str, target_version: Optional[int] = None) -> List[int]:
+    """
+    Apply the migrations db_path has not had yet, up to target_version (default
+    the latest), and return the versions applied.
+
+    The version is kept in PRAGMA user_version. Each migration commits together
+    with its version bump, under BEGIN IMMEDIATE, so processes starting on the
+    same file at once apply it once and a failed migration leaves the database
+    at the previous version.
+    """
+    target_version = SCHEMA_VERSION if target_version is None else target_version
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    applied = []
+    try:
+        for version, description, migration in MIGRATIONS:
+            if version > target_version:
+                break
+            if get_schema_version(conn) >= version:
+                continue
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                # Another process may have applied it while this one waited for the lock
+                if get_schema_version(conn) < version:
+                    migration(cursor)
+                    cursor.execute(f'PRAGMA user_version = {int(version)}')
+                    applied.append(version)
+                    logger.info("Applied schema migration %d (%s) to %s", version, description, db_path)
+                cursor.execute('COMMIT')
+            except Exception:
+                cursor.execute('ROLLBACK')
+                raise
+    finally:
+        conn.close()
+    return applied
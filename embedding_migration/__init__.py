@@ -0,0 +1,4 @@
+from .reembed_vectorstore import reembed_vectorstore, count_vectors
+from .class_EmbeddingMigrator import EmbeddingMigrator, target_fingerprint
+
+__all__ = ["reembed_vectorstore", "count_vectors", "EmbeddingMigrator", "target_fingerprint"]
\ No newline at end of file
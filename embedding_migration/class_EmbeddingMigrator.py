@@ -0,0 +1,269 @@
+import os
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from chat import AdmissionScheduler, OverloadedError
+from document_library_database import EmbeddingMigrationManager
+from retrieval import RetrievalClient, TwoStageIndex, DEFAULT_EMBEDDING_MODEL, MATRYOSHKA_MODELS
+from routes.upload_filings.content_addressing import vectorization_fingerprint, content_addressed_vectorstore_path
+from .reembed_vectorstore import reembed_vectorstore, count_vectors, checkpoint_path
+
+logger = logging.getLogger(__name__)
+
+
+def target_fingerprint(source: Dict[str, Any], target_model: str) -> str:
+    """
+    Fingerprint of a store rebuilt with target_model. The splitter settings are
+    not stored per document, so they are recovered by matching the stored
+    fingerprint; failing that, a stable fingerprint is derived from it. Two-stage
+    settings come from the store itself and carry over as reembed_vectorstore
+    keeps them: only for a Matryoshka target wider than the coarse stage.
+    """
+    two_stage = {}
+    settings = TwoStageIndex.saved_settings(source['vectorstore_path'])
+    if settings is not None:
+        two_stage = {'coarse_dimensions': settings['coarse_dimensions'], 'rescore_factor': settings['rescore_factor']}
+    keeps_two_stage = settings is not None and settings['coarse_dimensions'] < MATRYOSHKA_MODELS.get(target_model, 0)
+    for splitter in ('sec', 'recursive'):
+        for chunk_unit in ('characters', 'tokens'):
+            params = {
+                'splitter': splitter,
+                'chunk_size': source['chunk_size'],
+                'chunk_overlap': source['chunk_overlap'],
+                'embedding_model': source['embedding_model'],
+                'chunk_unit': chunk_unit,
+                **two_stage
+            }
+            if vectorization_fingerprint(params) == source['vectorization_fingerprint']:
+                target = {**params, 'embedding_model': target_model}
+                if not keeps_two_stage:
+                    target = {name: value for name, value in target.items() if name not in two_stage}
+                return vectorization_fingerprint(target)
+    seed = f"{source['vectorization_fingerprint'] or source['vectorstore_path']}:{target_model}"
+    return hashlib.sha256(seed.encode('utf-8')).hexdigest()[:16]
+
+
+class EmbeddingMigrator:
+    """
+    Singleton that re-embeds the corpus with another embedding model in the background.
+
+    A migration has one item per live vectorstore still on another model. A
+    single worker thread rebuilds the stores one at a time, in the 'background'
+    admission lane and at most chunks_per_second, writing each new store next
+    to the old one. Documents keep being served from the old store until the new
+    one is complete; then all documents on it are switched over in one
+    transaction. The old store is left to the vectorstore collector.
+
+    State lives in the database and embeddings are checkpointed per batch, so a
+    restart resumes running migrations where they stopped. Only one migration
+    can be running or paused at a time.
+
+    Configuration via environment:
+        EMBEDDING_MIGRATION_CHUNKS_PER_SECOND  default throttle, 0 for none (default 50)
+        EMBEDDING_MIGRATION_BATCH              chunks per embedding request and checkpoint (default 128)
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(EmbeddingMigrator, cls).__new__(cls)
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        self.default_chunks_per_second = float(os.getenv("EMBEDDING_MIGRATION_CHUNKS_PER_SECOND", "50"))
+        self.batch_size = int(os.getenv("EMBEDDING_MIGRATION_BATCH", "128"))
+        self.manager = EmbeddingMigrationManager()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._interrupt = threading.Event()
+        self._thread = None
+        self._current = {}
+
+    def _plan(self, target_model: str) -> List[Dict[str, Any]]:
+        items = []
+        for source in self.manager.get_migration_sources(target_model, DEFAULT_EMBEDDING_MODEL):
+            fingerprint = target_fingerprint(source, target_model)
+            source_path = source['vectorstore_path']
+            if source['content_hash']:
+                target_path = content_addressed_vectorstore_path(source['content_hash'], fingerprint)
+            else:
+                target_path = f"{source_path.rstrip('/')}-{fingerprint}"
+            item = {
+                'source_path': source_path,
+                'source_model': source['embedding_model'],
+                'target_path': target_path,
+                'target_fingerprint': fingerprint,
+                'documents': source['documents']
+            }
+            try:
+                item['chunks_total'] = count_vectors(source_path)
+            except Exception as e:
+                item.update(status='skipped', error=f"Vectorstore unreadable: {str(e)}")
+            items.append(item)
+        return items
+
+    def start_migration(self, target_model: str, chunks_per_second: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Plan and start re-embedding every live document with target_model.
+
+        Raises ValueError if another migration is running or paused.
+        """
+        with self._lock:
+            active = self.manager.list_migrations(statuses=('running', 'paused'))
+            if active:
+                raise ValueError(f"Migration {active[0]['id']} to {active[0]['target_model']} is {active[0]['status']}")
+            if chunks_per_second is None:
+                chunks_per_second = self.default_chunks_per_second
+            migration_id = self.manager.create_migration(target_model, chunks_per_second, self._plan(target_model))
+        self.start()
+        self._wake.set()
+        return self.progress(migration_id)
+
+    def pause(self, migration_id) -> bool:
+        return self._change_status(migration_id, ('running',), 'paused')
+
+    def resume(self, migration_id) -> bool:
+        return self._change_status(migration_id, ('paused',), 'running')
+
+    def cancel(self, migration_id) -> bool:
+        """Stop a migration; documents already switched stay on the new model"""
+        return self._change_status(migration_id, ('running', 'paused'), 'cancelled')
+
+    def _change_status(self, migration_id, from_statuses, status) -> bool:
+        with self._lock:
+            migration = self.manager.get_migration(migration_id)
+            if migration is None or migration['status'] not in from_statuses:
+                return False
+            self.manager.set_status(migration_id, status)
+        if status == 'running':
+            self.start()
+        else:
+            self._interrupt.set()
+        self._wake.set()
+        return True
+
+    def _migration_status(self, migration_id) -> Optional[str]:
+        migration = self.manager.get_migration(migration_id)
+        return migration['status'] if migration else None
+
+    def _record_progress(self, item, chunks_done, embedded_now):
+        self._current['chunks_embedded'] += embedded_now
+        self._current['chunks_done'] = chunks_done
+        self.manager.update_item(item['id'], chunks_done=chunks_done)
+
+    def _migrate_item(self, migration, item) -> bool:
+        """Rebuild one store and switch its documents; False when interrupted"""
+        self.manager.update_item(item['id'], status='running', started_at=item['started_at'] or datetime.now().isoformat())
+        self._current.update(item_id=item['id'], source_path=item['source_path'], chunks_done=item['chunks_done'])
+        while True:
+            try:
+                completed = reembed_vectorstore(
+                    item['source_path'],
+                    item['source_model'],
+                    item['target_path'],
+                    migration['target_model'],
+                    batch_size=self.batch_size,
+                    chunks_per_second=migration['chunks_per_second'] or 0.0,
+                    stop_event=self._interrupt,
+                    on_progress=lambda done, embedded: self._record_progress(item, done, embedded)
+                )
+                break
+            except OverloadedError as e:
+                # Interactive traffic has the capacity; wait and carry on from the checkpoint
+                if self._interrupt.wait(e.retry_after):
+                    return False
+        if not completed:
+            return False
+        switched = self.manager.flip_documents(item, migration['target_model'])
+        # Queries that loaded the old store keep it for the collector's grace period
+        if os.path.isdir(item['source_path']):
+            os.utime(item['source_path'])
+        RetrievalClient().preload(item['target_path'], migration['target_model'])
+        logger.info(f"Embedding migration {migration['id']}: switched {switched} documents to {item['target_path']}")
+        return True
+
+    def _discard_cancelled(self):
+        for migration in self.manager.list_migrations(statuses=('cancelled',)):
+            for item in self.manager.get_items(migration['id'], statuses=('pending', 'running')):
+                shutil.rmtree(checkpoint_path(item['target_path']), ignore_errors=True)
+                self.manager.update_item(item['id'], status='cancelled', finished_at=datetime.now().isoformat())
+
+    def _run_migration(self, migration):
+        self._current = {
+            'migration_id': migration['id'],
+            'started': time.monotonic(),
+            'chunks_embedded': 0,
+            'item_id': None,
+            'source_path': None,
+            'chunks_done': 0
+        }
+        with AdmissionScheduler().lane('background'):
+            for item in self.manager.get_items(migration['id'], statuses=('pending', 'running')):
+                if self._interrupt.is_set() or self._migration_status(migration['id']) != 'running':
+                    return
+                try:
+                    if not self._migrate_item(migration, item):
+                        return
+                except Exception as e:
+                    logger.error(f"Error migrating vectorstore {item['source_path']}: {str(e)}")
+                    self.manager.update_item(item['id'], status='failed', error=str(e), finished_at=datetime.now().isoformat())
+        with self._lock:
+            if self._migration_status(migration['id']) != 'running':
+                return
+            failed = self.manager.get_items(migration['id'], statuses=('failed',))
+            error = f"{len(failed)} vectorstores failed; start a new migration to retry them" if failed else None
+            self.manager.set_status(migration['id'], 'completed', error)
+
+    def _run(self):
+        while True:
+            self._interrupt.clear()
+            try:
+                self._discard_cancelled()
+                running = self.manager.list_migrations(statuses=('running',))
+                if running:
+                    self._run_migration(running[0])
+                    continue
+            except Exception as e:
+                logger.error(f"Error running embedding migration: {str(e)}")
+            self._current = {}
+            self._wake.wait(60)
+            self._wake.clear()
+
+    def start(self):
+        """Start the worker once; it picks up migrations left running by a previous process"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="embedding-migration", daemon=True)
+            self._thread.start()
+
+    def progress(self, migration_id) -> Optional[Dict[str, Any]]:
+        """Status, item and chunk counts, observed throughput and ETA of a migration"""
+        migration = self.manager.get_migration(migration_id)
+        if migration is None:
+            return None
+        counts = self.manager.progress(migration_id)
+        current = dict(self._current) if self._current.get('migration_id') == migration_id else None
+        chunks_per_second = None
+        if current:
+            elapsed = time.monotonic() - current['started']
+            if current['chunks_embedded'] and elapsed > 0:
+                chunks_per_second = round(current['chunks_embedded'] / elapsed, 2)
+        rate = chunks_per_second or migration['chunks_per_second']
+        eta_seconds = None
+        if migration['status'] == 'running' and counts['chunks_remaining'] and rate:
+            eta_seconds = round(counts['chunks_remaining'] / rate)
+        return {
+            **migration,
+            **counts,
+            'percent': round(100 * counts['chunks_done'] / counts['chunks_total'], 1) if counts['chunks_total'] else 100.0,
+            'chunks_per_second': chunks_per_second,
+            'eta_seconds': eta_seconds,
+            'current_source_path': current['source_path'] if current else None
+        }
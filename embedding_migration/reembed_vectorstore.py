@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+from typing import Optional, Callable
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from chat import get_embeddings
+from retrieval import load_vectorstore, save_vectorstore, get_query_embeddings, TwoStageIndex, MATRYOSHKA_MODELS
+from retrieval.class_TwoStageIndex import TWO_STAGE_FILE, FULL_VECTORS_FILE
+
+INDEX_FILE = "index.faiss"
+CHECKPOINT_SUFFIX = ".migrating"
+CHECKPOINT_FILE = "checkpoint.json"
+# Written by save_vectorstore; everything else in a store (the section map, ...) is copied as is
+_FAISS_FILES = {"index.faiss", "index.pkl", TWO_STAGE_FILE, FULL_VECTORS_FILE}
+
+
+def count_vectors(vectorstore_path: str) -> int:
+    """Number of vectors in a saved store, read from the memory-mapped index"""
+    return faiss.read_index(os.path.join(vectorstore_path, INDEX_FILE), faiss.IO_FLAG_MMAP).ntotal
+
+
+def checkpoint_path(target_path: str) -> str:
+    return f"{target_path}{CHECKPOINT_SUFFIX}"
+
+
+def _open_checkpoint(target_path: str, target_model: str, batch_size: int, chunks: int) -> str:
+    """Checkpoint directory for a target, emptied when it was started with other settings"""
+    directory = checkpoint_path(target_path)
+    expected = {"target_model": target_model, "batch_size": batch_size, "chunks": chunks}
+    meta_path = os.path.join(directory, CHECKPOINT_FILE)
+    if os.path.isdir(directory):
+        try:
+            with open(meta_path) as f:
+                if json.load(f) == expected:
+                    return directory
+        except (OSError, ValueError):
+            pass
+        shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+    with open(meta_path, "w") as f:
+        json.dump(expected, f)
+    return directory
+
+
+def _save_alongside(vectorstore: FAISS, source_path: str, target_path: str) -> None:
+    """Save the new store next to the old one, copying its other files, and rename it into place"""
+    scratch_path = f"{target_path}.tmp-{uuid.uuid4().hex}"
+    save_vectorstore(vectorstore, scratch_path)
+    for name in os.listdir(source_path):
+        if name not in _FAISS_FILES and os.path.isfile(os.path.join(source_path, name)):
+            shutil.copy2(os.path.join(source_path, name), os.path.join(scratch_path, name))
+    try:
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        os.rename(scratch_path, target_path)
+    except OSError:
+        # The same content was uploaded with the target model meanwhile; its index is equivalent
+        shutil.rmtree(scratch_path, ignore_errors=True)
+        if not os.path.isdir(target_path):
+            raise
+
+
+def reembed_vectorstore(
+    source_path: str,
+    source_model: Optional[str],
+    target_path: str,
+    target_model: str,
+    batch_size: int = 128,
+    chunks_per_second: float = 0.0,
+    stop_event: Optional[threading.Event] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None
+) -> bool:
+    """
+    Build a copy of a vectorstore embedded with target_model at target_path.
+
+    The chunks and their FAISS ids are kept, so the section map stays valid.
+    Each batch of embeddings is checkpointed next to the target, so an
+    interrupted run continues where it stopped. chunks_per_second (0 for no
+    limit) throttles the embedding requests; on_progress(chunks_done,
+    chunks_embedded_now) is called after every batch. A store searched in two
+    stages keeps its TwoStageIndex settings when target_model has Matryoshka
+    embeddings, and becomes a flat index otherwise.
+
+    Returns:
+        True once target_path holds the complete store, False if stop_event was
+        set first
+    """
+    stop_event = stop_event or threading.Event()
+    if os.path.isdir(target_path):
+        return True
+
+    source = load_vectorstore(source_path, source_model)
+    total = source.index.ntotal
+    if total == 0:
+        raise ValueError(f"Vectorstore {source_path} has no chunks")
+    texts = [source.docstore.search(source.index_to_docstore_id[vector_id]).page_content for vector_id in range(total)]
+    directory = _open_checkpoint(target_path, target_model, batch_size, total)
+    embeddings = get_embeddings(target_model)
+
+    batch_files = []
+    for start in range(0, total, batch_size):
+        batch_file = os.path.join(directory, f"batch-{start:08d}.npy")
+        batch_files.append(batch_file)
+        end = min(start + batch_size, total)
+        if os.path.exists(batch_file):
+            continue
+        if stop_event.is_set():
+            return False
+        started = time.monotonic()
+        vectors = np.asarray(embeddings.embed_documents(texts[start:end]), dtype=np.float32)
+        partial_file = f"{batch_file}.partial"
+        with open(partial_file, "wb") as f:
+            np.save(f, vectors)
+        os.replace(partial_file, batch_file)
+        if on_progress:
+            on_progress(end, end - start)
+        if chunks_per_second > 0:
+            # Sleeping on the event lets a pause or cancel cut the wait short
+            stop_event.wait(max(0.0, (end - start) / chunks_per_second - (time.monotonic() - started)))
+
+    vectors = np.concatenate([np.load(batch_file) for batch_file in batch_files])
+    dimensions = vectors.shape[1]
+    if source._normalize_L2:
+        faiss.normalize_L2(vectors)
+    if isinstance(source.index, TwoStageIndex) and target_model in MATRYOSHKA_MODELS and source.index.coarse_dimensions < dimensions:
+        index = TwoStageIndex.build(vectors, source.index.coarse_dimensions, source.index.rescore_factor, source.index.metric_type)
+    else:
+        # Truncated embeddings of other models do not rank like the full ones; they get a flat index
+        index = faiss.IndexFlatIP(dimensions) if source.index.metric_type == faiss.METRIC_INNER_PRODUCT else faiss.IndexFlatL2(dimensions)
+        index.add(vectors)
+    target = FAISS(
+        embedding_function=get_query_embeddings(target_model),
+        index=index,
+        docstore=source.docstore,
+        index_to_docstore_id=source.index_to_docstore_id,
+        normalize_L2=source._normalize_L2,
+        distance_strategy=source.distance_strategy
+    )
+    _save_alongside(target, source_path, target_path)
+    shutil.rmtree(directory, ignore_errors=True)
+    return True
@@ -0,0 +1,4 @@
+from .extract_financial_facts import extract_financial_facts
+from .answer_from_financial_facts import answer_from_financial_facts, parse_metric_question
+
+__all__ = ["extract_financial_facts", "answer_from_financial_facts", "parse_metric_question"]
\ No newline at end of file
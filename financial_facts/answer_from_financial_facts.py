@@ -0,0 +1,97 @@
+import re
+import time
+from typing import Optional, Dict, Any, Tuple
+
+from document_library_database.class_FinancialFactsManager import FinancialFactsManager
+from .metrics import METRICS, QUESTION_PATTERNS
+
+_QUESTION_YEAR = re.compile(r"\b(?:FY\s?'?)?((?:19|20)\d{2})\b", re.IGNORECASE)
+_QUESTION_INTERIM = [
+    (re.compile(r"\b(?:three months|quarter(?:ly)?|q[1-4])\b", re.IGNORECASE), "3M"),
+    (re.compile(r"\bsix months\b", re.IGNORECASE), "6M"),
+    (re.compile(r"\bnine months\b", re.IGNORECASE), "9M"),
+]
+# A lookup is "[what was | how much | show me] [the] [company's] [total] <metric> [period]" and nothing
+# else, so "What are the debt covenants?" or "Explain the change in revenue" go to the filing text
+_LOOKUP_LEAD = re.compile(
+    r"^(?:what\s+(?:was|were|is|are)\s+|how\s+much\s+(?:(?:was|were|is|are|did|does|do)\s+)?|(?:show|give|tell)(?:\s+me)?\s+)?"
+    r"(?:the\s+)?(?:(?:its|their|[\w.&-]+['’]s?)\s+)?(?:total\s+)?",
+    re.IGNORECASE)
+_LOOKUP_TAIL_WORDS = {
+    "for", "in", "during", "as", "of", "at", "on", "end", "the", "its", "it", "company", "did", "does", "do",
+    "report", "reported", "have", "has", "had", "fiscal", "calendar", "year", "years", "quarter", "quarterly",
+    "period", "ended", "ending", "months", "three", "six", "nine", "first", "second", "third", "fourth",
+    "last", "latest", "most", "recent", "current", "prior", "previous", "fy", "january", "february", "march",
+    "april", "may", "june", "july", "august", "september", "october", "november", "december",
+}
+_LOOKUP_TAIL_TOKEN = re.compile(r"^(?:fy)?'?\d{1,4},?$|^q[1-4]$", re.IGNORECASE)
+_SCALE_WORDS = {1_000: "thousand", 1_000_000: "million", 1_000_000_000: "billion"}
+
+
+def parse_metric_question(question: str) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    (metric, period or None) when the question is a plain lookup of a known
+    metric: the metric is what is asked for, followed by at most a period.
+    """
+    text = " ".join(question.strip().rstrip("?.!").split())
+    rest = text[_LOOKUP_LEAD.match(text).end():]
+    match = next(((metric, found) for metric, pattern in QUESTION_PATTERNS if (found := pattern.match(rest))), None)
+    if match is None:
+        return None
+    metric, found = match
+    tail = rest[found.end():].split()
+    if not all(word.lower() in _LOOKUP_TAIL_WORDS or _LOOKUP_TAIL_TOKEN.match(word) for word in tail):
+        return None
+    year = _QUESTION_YEAR.search(question)
+    if not year:
+        return metric, None
+    prefix = next((label for pattern, label in _QUESTION_INTERIM if pattern.search(question)), "FY")
+    return metric, f"{prefix}{year.group(1)}"
+
+
+def format_fact(fact: Dict[str, Any]) -> str:
+    value = fact["value"]
+    scale_word = _SCALE_WORDS.get(fact.get("scale") or 1)
+    amount = f"{abs(value):,.2f}" if value != int(value) else f"{abs(int(value)):,}"
+    if value < 0:
+        amount = f"({amount})"
+    if fact.get("unit", "") and fact["unit"].startswith("USD"):
+        amount = f"${amount}"
+    if scale_word:
+        amount = f"{amount} {scale_word}"
+    if fact.get("unit") == "USD/share":
+        amount = f"{amount} per share"
+    return amount
+
+
+def answer_from_financial_facts(document_id, question: str) -> Optional[Dict[str, Any]]:
+    """
+    Answer a metric lookup ("total revenue FY2023", "long-term debt") from the facts
+    extracted at ingest.
+
+    Returns a result shaped like get_completion's, with source 'financial_facts',
+    or None when the question is not a lookup or no stored fact matches.
+    """
+    started = time.perf_counter()
+    parsed = parse_metric_question(question)
+    if parsed is None:
+        return None
+    metric, period = parsed
+    facts = FinancialFactsManager().get_facts(document_id, metric=metric, period=period)
+    if not facts:
+        return None
+    if period is None:
+        annual = [fact for fact in facts if fact["period"].startswith("FY")]
+        facts = sorted(annual or facts, key=lambda fact: fact["period"][-4:], reverse=True)
+    fact = facts[0]
+
+    page = f" (page {fact['page'] + 1})" if isinstance(fact.get("page"), int) else ""
+    content = f"{METRICS[metric]['label']} for {fact['period']} was {format_fact(fact)}{page}, as reported: \"{fact['source_text']}\""
+    return {
+        "success": True,
+        "content": content,
+        "source": "financial_facts",
+        "facts": facts[:5],
+        "latency_ms": (time.perf_counter() - started) * 1000,
+        "usage": None
+    }
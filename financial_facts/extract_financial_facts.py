@@ -0,0 +1,90 @@
+import re
+from typing import List, Dict, Optional
+
+from .metrics import STATEMENT_PATTERNS, PER_SHARE_METRICS
+
+_YEAR = re.compile(r"\b(19[89]\d|20\d{2})\b")
+_NUMBER = re.compile(r"\(?-?\$?\s*\d[\d,]*(?:\.\d+)?\)?")
+_SCALE = re.compile(r"\bin (thousands|millions|billions)\b", re.IGNORECASE)
+_SCALES = {"thousands": 1_000, "millions": 1_000_000, "billions": 1_000_000_000}
+_PERIOD_TYPES = [("three months", "3M"), ("six months", "6M"), ("nine months", "9M")]
+
+
+def _parse_number(token: str) -> Optional[float]:
+    negative = token.strip().startswith("(") or token.strip().startswith("-")
+    digits = re.sub(r"[^\d.]", "", token)
+    if not digits or digits == ".":
+        return None
+    value = float(digits)
+    return -value if negative else value
+
+
+def _period_columns(line: str, page_text_lower: str) -> Optional[List[str]]:
+    """Period labels for a column header line such as '2023 2022 2021', or None if the line is not one"""
+    years = _YEAR.findall(line)
+    if len(years) < 2:
+        return None
+    # Anything besides the years may only be a day of month ("September 30, 2023")
+    others = [_parse_number(token) for token in _NUMBER.findall(_YEAR.sub(" ", line))]
+    if any(value is None or value > 31 for value in others):
+        return None
+    interim = [label for phrase, label in _PERIOD_TYPES if phrase in page_text_lower]
+    if not interim:
+        return [f"FY{year}" for year in years]
+    # 10-Q statements put three-month columns before year-to-date columns
+    per_group = max(1, len(years) // len(interim))
+    return [f"{interim[min(i // per_group, len(interim) - 1)]}{year}" for i, year in enumerate(years)]
+
+
+def extract_page_facts(text: str, page: Optional[int] = None) -> List[Dict]:
+    """Facts found on one page of a filing"""
+    facts = []
+    lower = text.lower()
+    scale_match = _SCALE.search(text)
+    scale = _SCALES[scale_match.group(1).lower()] if scale_match else 1
+    unit = "USD" if "$" in text or "dollars" in lower else None
+    columns: Optional[List[str]] = None
+
+    for line in text.splitlines():
+        header = _period_columns(line, lower)
+        if header:
+            columns = header
+            continue
+        if not columns:
+            continue
+        for metric, pattern in STATEMENT_PATTERNS:
+            match = pattern.match(line)
+            if not match:
+                continue
+            values = [_parse_number(token) for token in _NUMBER.findall(match.group("values"))]
+            values = [value for value in values if value is not None]
+            if metric in PER_SHARE_METRICS and any(abs(value) >= 1000 for value in values):
+                break
+            for period, value in zip(columns, values):
+                facts.append({
+                    "metric": metric,
+                    "period": period,
+                    "value": value,
+                    "unit": f"{unit}/share" if unit and metric in PER_SHARE_METRICS else unit,
+                    "scale": 1 if metric in PER_SHARE_METRICS else scale,
+                    "label": match.group("label").strip(),
+                    "page": page,
+                    "source_text": line.strip()[:500]
+                })
+            break
+    return facts
+
+
+def extract_financial_facts(pages) -> List[Dict]:
+    """
+    Extract key line items from a filing's loaded pages.
+
+    Column headers with two or more years define the periods of the lines that
+    follow; the first value found for a (metric, period) wins, since the primary
+    statements precede the notes that repeat them.
+    """
+    facts = {}
+    for page in pages:
+        for fact in extract_page_facts(page.page_content, page.metadata.get("page")):
+            facts.setdefault((fact["metric"], fact["period"]), fact)
+    return list(facts.values())
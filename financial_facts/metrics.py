@@ -0,0 +1,80 @@
+import re
+
+# metric key -> display label, statement line labels, and extra phrasings used in questions.
+# Statement labels are matched at the start of a line; question phrasings as the object of a lookup question.
+METRICS = {
+    "revenue": {
+        "label": "Total revenue",
+        "statement": [r"total net sales", r"total net revenues?", r"total revenues?", r"net sales", r"net revenues?", r"revenues?"],
+        "question": [r"total revenues?", r"revenues?", r"net sales", r"sales", r"top line"],
+    },
+    "cost_of_revenue": {
+        "label": "Cost of revenue",
+        "statement": [r"total cost of (?:sales|revenues?)", r"cost of (?:sales|revenues?|goods sold)"],
+        "question": [r"cost of (?:sales|revenues?|goods sold)", r"cogs"],
+    },
+    "gross_profit": {
+        "label": "Gross profit",
+        "statement": [r"gross (?:profit|margin)"],
+        "question": [r"gross (?:profit|margin)"],
+    },
+    "operating_income": {
+        "label": "Operating income",
+        "statement": [r"(?:total )?operating income(?: \(loss\))?", r"income from operations", r"operating (?:loss|profit)"],
+        "question": [r"operating (?:income|profit|loss)", r"income from operations", r"ebit"],
+    },
+    "net_income": {
+        "label": "Net income",
+        "statement": [r"net income(?: \(loss\))?(?: attributable to [\w .,']+)?", r"net (?:loss|earnings)"],
+        "question": [r"net (?:income|earnings|loss|profit)", r"bottom line"],
+    },
+    "eps_diluted": {
+        "label": "Diluted earnings per share",
+        "statement": [r"diluted(?: net income| earnings)?(?: \(loss\))?(?: per share)?", r"(?:net income|earnings) per share[ -]+diluted"],
+        "question": [r"diluted (?:eps|earnings per share)", r"\beps\b", r"earnings per share"],
+    },
+    "total_assets": {
+        "label": "Total assets",
+        "statement": [r"total assets"],
+        "question": [r"total assets", r"assets"],
+    },
+    "total_liabilities": {
+        "label": "Total liabilities",
+        "statement": [r"total liabilities"],
+        "question": [r"total liabilities", r"liabilities"],
+    },
+    "stockholders_equity": {
+        "label": "Total stockholders' equity",
+        "statement": [r"total (?:stockholders|shareholders)['’]? equity(?: \(deficit\))?"],
+        "question": [r"(?:stockholders|shareholders)['’]? equity", r"book value", r"equity"],
+    },
+    "long_term_debt": {
+        "label": "Long-term debt",
+        "statement": [r"long[- ]term debt(?:, (?:net|less current portion|non-?current))*", r"term debt,? non-?current"],
+        "question": [r"long[- ]term debt", r"debt"],
+    },
+    "cash": {
+        "label": "Cash and cash equivalents",
+        "statement": [r"(?:total )?cash and cash equivalents(?:, end of (?:the )?(?:year|period))?"],
+        "question": [r"cash and cash equivalents", r"cash (?:position|balance)", r"cash"],
+    },
+    "operating_cash_flow": {
+        "label": "Cash generated by operating activities",
+        "statement": [r"(?:net )?cash (?:generated|provided) by (?:\(used in\) )?operating activities"],
+        "question": [r"operating cash flows?", r"cash (?:flow )?from operations", r"cash (?:generated|provided) by operating activities"],
+    },
+}
+
+# Question phrasings, longest first so "total revenue" wins over "revenue"
+QUESTION_PATTERNS = sorted(
+    ((metric, re.compile(rf"\b{pattern}\b", re.IGNORECASE)) for metric, spec in METRICS.items() for pattern in spec["question"]),
+    key=lambda item: -len(item[1].pattern)
+)
+
+STATEMENT_PATTERNS = [
+    (metric, re.compile(rf"^\s*(?P<label>{pattern})\b[\s.:$]*(?P<values>[(\-\d$—–].*)$", re.IGNORECASE))
+    for metric, spec in METRICS.items() for pattern in spec["statement"]
+]
+
+# Metrics reported per share are never scaled by "(in millions)"
+PER_SHARE_METRICS = {"eps_diluted"}
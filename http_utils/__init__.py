@@ -0,0 +1,8 @@
+from .class_OrjsonProvider import OrjsonProvider
+from .compress_response import compress_response, choose_encoding
+from .conditional_json import conditional_json
+from .overloaded_response import overloaded_response
+from .class_QueryCapture import QueryCapture
+from .class_RequestProfiler import RequestProfiler
+
+__all__ = ["OrjsonProvider", "compress_response", "choose_encoding", "conditional_json", "overloaded_response", "QueryCapture", "RequestProfiler"]
\ No newline at end of file
@@ -0,0 +1,90 @@
+import os
+import time
+import threading
+from typing import Optional, Dict, Any
+
+import orjson
+from flask import Flask, g, request
+
+CAPTURED_PATHS = ("/query_collective_bargaining_agreement",)
+CAPTURED_PARAMS = ("search_type", "k", "fetch_k", "lambda_mult", "sections", "use_financial_facts",
+                   "mode", "group_token_budget", "max_parallel", "deadline_ms")
+
+
+class QueryCapture:
+    """
+    Opt-in recorder of query traffic for tools/replay_queries.py.
+
+    When QUERY_CAPTURE_PATH is set, every request to a captured route is appended
+    to that file as one JSON line: arrival time, document id, prompt, retrieval
+    parameters, status, latency, token usage and which path answered. Nothing is
+    registered on the app otherwise.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance.path = os.getenv("QUERY_CAPTURE_PATH")
+            cls._instance._lock = threading.Lock()
+            cls._instance._file = None
+            cls._instance.records = 0
+        return cls._instance
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def init_app(self, app: Flask) -> None:
+        if not self.enabled:
+            return
+        app.before_request(self._start)
+        app.after_request(self._record)
+
+    def _start(self):
+        if request.path in CAPTURED_PATHS:
+            g.capture_started = time.perf_counter()
+            g.capture_timestamp = time.time()
+
+    @staticmethod
+    def _answer(response) -> Dict[str, Any]:
+        # Registered after compress_response, so this runs before the body is encoded
+        if response.mimetype != "application/json" or response.headers.get("Content-Encoding"):
+            return {}
+        payload = response.get_json(silent=True) or {}
+        answer = payload.get("answer")
+        return answer if isinstance(answer, dict) else {}
+
+    def _record(self, response):
+        started = g.pop("capture_started", None)
+        if started is None:
+            return response
+        data = request.get_json(silent=True) or {}
+        document = data.get("document")
+        answer = self._answer(response)
+        usage = answer.get("usage") or {}
+        self.write({
+            "timestamp": g.pop("capture_timestamp"),
+            "path": request.path,
+            "document_id": document.get("id") if isinstance(document, dict) else None,
+            "prompt": data.get("prompt"),
+            "params": {name: data[name] for name in CAPTURED_PARAMS if name in data},
+            "status": response.status_code,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            "input_tokens": usage.get("input_tokens", usage.get("imput_token")),
+            "output_tokens": usage.get("output_tokens"),
+            "source": answer.get("source", "rag" if answer.get("success") else answer.get("error_type"))
+        })
+        return response
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = orjson.dumps(record) + b"\n"
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "ab", buffering=0)
+            self._file.write(line)
+            self.records += 1
+
+    def stats(self) -> Dict[str, Optional[Any]]:
+        return {"enabled": self.enabled, "path": self.path, "records": self.records}
@@ -0,0 +1,319 @@
+import os
+import sys
+import hmac
+import json
+import time
+import uuid
+import pstats
+import shutil
+import cProfile
+import threading
+import tracemalloc
+from io import StringIO
+from collections import Counter
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+from flask import Flask, g, request
+
+PROFILED_PATHS = ("/documents/upload", "/query_collective_bargaining_agreement", "/query_filing_history")
+MODES = ("cprofile", "sampling")
+ARTIFACTS = {
+    "profile.prof": "application/octet-stream",
+    "profile.txt": "text/plain",
+    "stacks.txt": "text/plain",
+    "allocations.txt": "text/plain",
+    "meta.json": "application/json"
+}
+TOP_FUNCTIONS = 60
+TOP_ALLOCATIONS = 40
+MAX_STACK_DEPTH = 64
+
+
+class _StackSampler:
+    """Samples the stacks of all threads but its own at a fixed interval, as collapsed stacks"""
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval_seconds):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """One 'frame;frame;... count' line per stack, the input format of flame graph tools"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class RequestProfiler:
+    """
+    Opt-in profiling of single upload and query requests in production.
+
+    A request is profiled when it carries X-Profile (cprofile or sampling) and
+    an X-Admin-Token matching PROFILING_ADMIN_TOKEN, or when it is the Nth
+    request to a profiled route and PROFILING_SAMPLE_EVERY is N. Each profile
+    is a cProfile trace of the request thread (pstats dump plus a text
+    summary) or, in sampling mode, collapsed stacks of every thread sampled
+    every PROFILING_SAMPLE_INTERVAL_MS, together with the tracemalloc
+    allocation difference over the request. cProfile only sees the request
+    thread; work handed to executors (retrieval under a deadline, completion
+    hedging) shows up in sampling mode only. Profiles are written to
+    PROFILING_DIR, the newest PROFILING_MAX_PROFILES are kept, and the
+    response names its profile in X-Profile-Id.
+
+    tracemalloc is process-wide, so allocations of concurrent requests show
+    up in the difference; only one request is profiled at a time and the
+    others run unprofiled. Tracing allocations dominates the overhead on
+    uploads (about five times slower with one frame per allocation, far more
+    with deep tracebacks), so PROFILING_TRACEMALLOC can turn it off. With neither a token nor sampling configured,
+    nothing is registered on the app.
+
+    Configuration via environment:
+        PROFILING_ADMIN_TOKEN         token for X-Profile requests and the admin endpoints
+        PROFILING_SAMPLE_EVERY        profile 1 in N requests to profiled routes, 0 for none (default 0)
+        PROFILING_SAMPLE_MODE         mode of sampled requests (default sampling)
+        PROFILING_SAMPLE_INTERVAL_MS  stack sampling interval (default 5)
+        PROFILING_TRACEMALLOC         trace allocations during profiled requests (default true)
+        PROFILING_TRACEMALLOC_FRAMES  frames kept per allocation (default 1)
+        PROFILING_DIR                 where profiles are stored (default profiles)
+        PROFILING_MAX_PROFILES        profiles kept (default 50)
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self) -> None:
+        self.admin_token = os.getenv("PROFILING_ADMIN_TOKEN")
+        self.sample_every = int(os.getenv("PROFILING_SAMPLE_EVERY", "0"))
+        self.sample_mode = os.getenv("PROFILING_SAMPLE_MODE", "sampling")
+        self.sample_interval_seconds = float(os.getenv("PROFILING_SAMPLE_INTERVAL_MS", "5")) / 1000
+        self.trace_allocations = os.getenv("PROFILING_TRACEMALLOC", "true").lower() == "true"
+        self.tracemalloc_frames = int(os.getenv("PROFILING_TRACEMALLOC_FRAMES", "1"))
+        self.directory = os.getenv("PROFILING_DIR", "profiles")
+        self.max_profiles = int(os.getenv("PROFILING_MAX_PROFILES", "50"))
+        self._lock = threading.Lock()
+        self._active = threading.Lock()
+        self._seen = 0
+        self._counters = {"profiled": 0, "sampled": 0, "skipped_busy": 0, "rejected": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.admin_token) or self.sample_every > 0
+
+    def authorized(self, request_obj) -> bool:
+        """Whether the request carries the admin token; always False when none is configured"""
+        supplied = request_obj.headers.get("X-Admin-Token", "")
+        return bool(self.admin_token) and hmac.compare_digest(supplied.encode(), self.admin_token.encode())
+
+    def init_app(self, app: Flask) -> None:
+        if not self.enabled:
+            return
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._abandon)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _trigger(self) -> Optional[tuple]:
+        """(mode, trigger) when this request should be profiled"""
+        requested = request.headers.get("X-Profile")
+        if requested:
+            if requested in MODES and self.authorized(request):
+                return requested, "header"
+            self._count("rejected")
+            return None
+        if self.sample_every > 0:
+            with self._lock:
+                self._seen += 1
+                sampled = self._seen % self.sample_every == 0
+            if sampled:
+                self._count("sampled")
+                return self.sample_mode, "sample"
+        return None
+
+    def _start(self):
+        if request.path not in PROFILED_PATHS:
+            return
+        trigger = self._trigger()
+        if trigger is None:
+            return
+        if not self._active.acquire(blocking=False):
+            self._count("skipped_busy")
+            return
+        mode, reason = trigger
+        started_tracing = self.trace_allocations and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(self.tracemalloc_frames)
+        g.profile = {
+            "mode": mode,
+            "trigger": reason,
+            "started_tracing": started_tracing,
+            "started": time.perf_counter(),
+            "timestamp": datetime.now().isoformat()
+        }
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            g.profile["snapshot"] = tracemalloc.take_snapshot()
+        if mode == "cprofile":
+            g.profile["profiler"] = cProfile.Profile()
+            g.profile["profiler"].enable()
+        else:
+            g.profile["sampler"] = _StackSampler(self.sample_interval_seconds)
+            g.profile["sampler"].start()
+
+    def _stop(self, profile: Dict[str, Any]) -> Dict[str, Any]:
+        """Stop collecting; returns the artifacts as text/bytes"""
+        duration = time.perf_counter() - profile["started"]
+        artifacts = {}
+        if "profiler" in profile:
+            profile["profiler"].disable()
+            summary = StringIO()
+            stats = pstats.Stats(profile["profiler"], stream=summary)
+            stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            stats.sort_stats("tottime").print_stats(TOP_FUNCTIONS)
+            artifacts["profile.txt"] = summary.getvalue()
+            artifacts["profile.prof"] = profile["profiler"]
+        else:
+            profile["sampler"].stop()
+            artifacts["stacks.txt"] = profile["sampler"].collapsed()
+        artifacts["meta"] = {"duration_ms": round(duration * 1000, 2)}
+        if "snapshot" not in profile:
+            return artifacts
+        snapshot = tracemalloc.take_snapshot()
+        current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+        if profile["started_tracing"]:
+            tracemalloc.stop()
+        ignore = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>")
+        ]
+        differences = snapshot.filter_traces(ignore).compare_to(profile["snapshot"].filter_traces(ignore), "lineno")
+        lines = [f"peak traced memory during request: {peak_bytes / 1024:.1f} KiB (current {current_bytes / 1024:.1f} KiB)", ""]
+        lines.extend(str(difference) for difference in differences[:TOP_ALLOCATIONS])
+        artifacts["allocations.txt"] = "\n".join(lines) + "\n"
+        artifacts["meta"]["peak_traced_bytes"] = peak_bytes
+        return artifacts
+
+    def _finish(self, response):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return response
+        try:
+            artifacts = self._stop(profile)
+            profile_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            self._save(profile_id, artifacts, {
+                "id": profile_id,
+                "mode": profile["mode"],
+                "trigger": profile["trigger"],
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "timestamp": profile["timestamp"],
+                **artifacts.pop("meta")
+            })
+            response.headers["X-Profile-Id"] = profile_id
+            self._count("profiled")
+        except Exception as e:
+            print(f"Error saving request profile: {str(e)}")
+        finally:
+            self._active.release()
+        return response
+
+    def _abandon(self, exception=None):
+        """Stop a profile whose request ended without a response passing through _finish"""
+        profile = g.pop("profile", None)
+        if profile is None:
+            return
+        try:
+            if "profiler" in profile:
+                profile["profiler"].disable()
+            else:
+                profile["sampler"].stop()
+            if profile["started_tracing"]:
+                tracemalloc.stop()
+        finally:
+            self._active.release()
+
+    def _save(self, profile_id: str, artifacts: Dict[str, Any], meta: Dict[str, Any]) -> None:
+        scratch_path = os.path.join(self.directory, f".{profile_id}.tmp")
+        os.makedirs(scratch_path, exist_ok=True)
+        for name, content in artifacts.items():
+            if name == "profile.prof":
+                content.dump_stats(os.path.join(scratch_path, name))
+            else:
+                with open(os.path.join(scratch_path, name), "w") as f:
+                    f.write(content)
+        meta["artifacts"] = sorted([*artifacts, "meta.json"])
+        with open(os.path.join(scratch_path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        os.rename(scratch_path, os.path.join(self.directory, profile_id))
+        for old_profile in self.list_profiles()[self.max_profiles:]:
+            shutil.rmtree(os.path.join(self.directory, old_profile["id"]), ignore_errors=True)
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Metadata of the stored profiles, newest first"""
+        profiles = []
+        if not os.path.isdir(self.directory):
+            return profiles
+        for name in os.listdir(self.directory):
+            meta = self.get_profile(name)
+            if meta is not None:
+                profiles.append(meta)
+        return sorted(profiles, key=lambda meta: meta["id"], reverse=True)
+
+    def get_profile(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        if profile_id.startswith(".") or os.sep in profile_id:
+            return None
+        try:
+            with open(os.path.join(self.directory, profile_id, "meta.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def artifact_path(self, profile_id: str, artifact: str) -> Optional[str]:
+        """Path of one stored artifact, or None if the profile or artifact does not exist"""
+        if artifact not in ARTIFACTS or self.get_profile(profile_id) is None:
+            return None
+        path = os.path.abspath(os.path.join(self.directory, profile_id, artifact))
+        return path if os.path.exists(path) else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            "enabled": self.enabled,
+            "header_profiling": bool(self.admin_token),
+            "sample_every": self.sample_every,
+            "sample_mode": self.sample_mode,
+            "directory": self.directory,
+            "stored": len(self.list_profiles()),
+            **counters
+        }
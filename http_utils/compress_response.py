@@ -0,0 +1,81 @@
+import gzip
+import threading
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+from flask import request
+
+MIN_COMPRESS_BYTES = 1024
+COMPRESSIBLE_MIMETYPES = ("application/json", "text/")
+
+_local = threading.local()
+
+
+def _zstd_compress(data: bytes) -> bytes:
+    # ZstdCompressor instances are not thread-safe, so keep one per thread
+    compressor = getattr(_local, "zstd", None)
+    if compressor is None:
+        compressor = _local.zstd = zstandard.ZstdCompressor(level=3)
+    return compressor.compress(data)
+
+
+def _accepted_encodings(header: str) -> dict:
+    """Accept-Encoding header -> {coding: q}"""
+    encodings = {}
+    for item in header.split(","):
+        parts = [part.strip() for part in item.split(";")]
+        if not parts[0]:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        encodings[parts[0].lower()] = q
+    return encodings
+
+
+def choose_encoding(accept_encoding: str):
+    """Preferred supported encoding for an Accept-Encoding header: zstd, then gzip, else None"""
+    accepted = _accepted_encodings(accept_encoding or "")
+    candidates = (["zstd"] if zstandard is not None else []) + ["gzip"]
+    wildcard = accepted.get("*", 0.0)
+    ranked = sorted(
+        (accepted.get(encoding, wildcard), -i, encoding)
+        for i, encoding in enumerate(candidates)
+    )
+    q, _, encoding = ranked[-1]
+    return encoding if q > 0 else None
+
+
+def compress_response(response):
+    """after_request hook: compress JSON/text bodies with zstd or gzip according to Accept-Encoding"""
+    if (
+        response.direct_passthrough
+        or response.status_code != 200
+        or "Content-Encoding" in response.headers
+        or not (response.mimetype or "").startswith(COMPRESSIBLE_MIMETYPES)
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+
+    encoding = choose_encoding(request.headers.get("Accept-Encoding", ""))
+    if encoding is None:
+        return response
+
+    response.set_data(_zstd_compress(data) if encoding == "zstd" else gzip.compress(data, compresslevel=5))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        # Each encoding is a different representation and needs its own validator
+        response.set_etag(f"{etag}-{encoding}", weak=weak)
+    return response
@@ -0,0 +1,35 @@
+import hashlib
+
+from flask import jsonify, request
+
+_ENCODING_SUFFIXES = ("-zstd", "-gzip")
+
+
+def _client_etags():
+    header = request.headers.get("If-None-Match", "")
+    tags = set()
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        for suffix in _ENCODING_SUFFIXES:
+            if tag.endswith(suffix):
+                tag = tag[:-len(suffix)]
+        if tag:
+            tags.add(tag)
+    return tags
+
+
+def conditional_json(payload, status=200):
+    """
+    JSON response carrying an ETag of its body; answers 304 Not Modified when the
+    client's If-None-Match already holds that ETag (in any content encoding).
+    """
+    response = jsonify(payload)
+    response.status_code = status
+    etag = hashlib.blake2b(response.get_data(), digest_size=16).hexdigest()
+    if etag in _client_etags() or "*" in _client_etags():
+        response = response.__class__(status=304)
+    response.set_etag(etag)
+    return response
@@ -0,0 +1,12 @@
+from flask import jsonify
+
+
+def overloaded_response(retry_after):
+    """503 telling the client how many seconds to wait before retrying"""
+    response = jsonify({
+        'error': 'Server is busy, please retry later',
+        'retry_after': retry_after
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
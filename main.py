@@ -1,31 +1,83 @@
-import os
-from flask import Flask, jsonify
-from document_library_database import ensure_document_library_db
+from flask import Flask, jsonify, request
+from document_library_database import ensure_document_library_db, DocumentLibraryManager, VectorstoreLifecycleManager
+from chat.class_OpenAITransport import OpenAITransport
+from chat.class_ResilientCompletionClient import ResilientCompletionClient
+from chat.class_AdmissionScheduler import AdmissionScheduler, OverloadedError
+from http_utils import OrjsonProvider, compress_response, conditional_json, overloaded_response, QueryCapture, RequestProfiler
 from routes.upload_filings.process_upload import upload_cba_bp
+from routes.upload_filings.resumable_upload import resumable_upload_bp
 from routes.query_collective_bargaining_agreement.query_collective_bargaining_agreement import query_cba_bp
 from routes.collections.post_collections import collection_bp
+from routes.conversations.conversations import conversation_bp
+from routes.embedding_migrations.embedding_migrations import embedding_migration_bp
+from routes.admin.profiles import admin_bp
+from routes.shards.shards import shard_bp
+from sharding import ShardRouter
+from embedding_migration import EmbeddingMigrator
+from resumable_uploads import ResumableUploads
 
 
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
+app.after_request(compress_response)
+# Registered after compress_response so captured answers are read before encoding
+QueryCapture().init_app(app)
+# Opt-in; registers nothing unless PROFILING_ADMIN_TOKEN or PROFILING_SAMPLE_EVERY is set
+RequestProfiler().init_app(app)
+# Registers nothing unless SHARD_NODES, SHARD_SELF and SHARD_TOKEN are set
+ShardRouter().init_app(app)
 app.register_blueprint(upload_cba_bp)
+app.register_blueprint(resumable_upload_bp)
 app.register_blueprint(query_cba_bp)
 app.register_blueprint(collection_bp)
+app.register_blueprint(conversation_bp)
+app.register_blueprint(embedding_migration_bp)
+app.register_blueprint(admin_bp)
+app.register_blueprint(shard_bp)
+app.register_error_handler(OverloadedError, lambda e: overloaded_response(e.retry_after))
+VectorstoreLifecycleManager().start()
+# Picks up migrations left running by a previous process
+EmbeddingMigrator().start()
+# Hands documents this node no longer owns to their owner
+ShardRouter().start()
+# Deletes upload sessions abandoned by their clients
+ResumableUploads().start()
 
 @app.route('/health')
 def health():
     return jsonify({'status': 'ok'})
     
+@app.route('/openai/stats')
+def openai_stats():
+    """Connection pool utilization, completion resilience state and admission queues"""
+    return jsonify({
+        'transport': OpenAITransport().stats(),
+        'completions': ResilientCompletionClient().stats(),
+        'scheduler': AdmissionScheduler().stats()
+    })
+
 @app.route('/agreements', methods=['GET'])
 def list_agreements():
-    vectorstore_dir = os.path.join(os.path.dirname(__file__), 'vectorstore')
-    if not os.path.exists(vectorstore_dir):
-        return jsonify({'agreements': []})
+    try:
+        return conditional_json({'agreements': DocumentLibraryManager.get_agreements()})
+    except Exception as e:
+        print(f"Error listing agreements: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@app.route('/vectorstores/stats')
+def vectorstore_stats():
+    """Store count, disk usage, sharing and what the collector has reclaimed"""
+    return jsonify(VectorstoreLifecycleManager().stats())
 
-    agreements = [{
-        "name":f,
-        "collection":"test"
-        } for f in os.listdir(vectorstore_dir) if os.path.isdir(os.path.join(vectorstore_dir, f))]
-    return jsonify({'agreements': agreements})
+@app.route('/vectorstores/gc', methods=['POST'])
+def collect_vectorstores():
+    """Collect orphaned vectorstores now; ?dry_run=true only reports what would go"""
+    dry_run = request.args.get('dry_run', 'false').lower() == 'true'
+    try:
+        return jsonify(VectorstoreLifecycleManager().collect(dry_run=dry_run))
+    except Exception as e:
+        print(f"Error collecting vectorstores: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,3 @@
+from .class_ResumableUploads import ResumableUploads, UploadSessionConflict
+
+__all__ = ["ResumableUploads", "UploadSessionConflict"]
\ No newline at end of file
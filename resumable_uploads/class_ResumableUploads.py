@@ -0,0 +1,460 @@
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, BinaryIO
+
+from document_library_database import UploadSessionManager, DocumentMetadata
+from routes.upload_filings.content_addressing import UPLOAD_CHUNK_BYTES
+from routes.upload_filings.filing_loaders import select_loader
+from routes.upload_filings.html_filing_loader import IncrementalHTMLFiling
+from retrieval import two_stage_params
+
+UPLOAD_SESSION_ROOT = "uploads"
+MIN_PART_BYTES = 64 * 1024
+MAX_PART_BYTES = 256 * 1024 * 1024
+
+
+class UploadSessionConflict(Exception):
+    """The request does not fit the session's state: a part sent twice with different bytes, parts missing, ..."""
+
+
+class _Progress:
+    """How far this process has hashed, and for HTML parsed, the leading parts of one session"""
+
+    def __init__(self, session: Dict[str, Any]):
+        self.lock = threading.Lock()
+        self.digest = hashlib.sha256()
+        self.offset = 0
+        metadata = DocumentMetadata(**session['metadata'])
+        loader = select_loader(metadata.file_type, metadata.file_name)
+        self.filing = IncrementalHTMLFiling(session['data_path']) if loader == 'html' else None
+
+
+class ResumableUploads:
+    """
+    Singleton for uploads of large filings in parts that can be sent in
+    parallel, retried and resumed.
+
+    A client creates a session with the file's size, metadata and
+    vectorization parameters, PUTs the parts (part n is bytes
+    [n * part_size, (n + 1) * part_size) of the file) in any order, asks which
+    are missing after an interruption, and completes the session to ingest the
+    file as /documents/upload does.
+
+    Each part is streamed straight to its place in a file preallocated under
+    UPLOAD_SESSION_ROOT, hashed on the way and then recorded in the database;
+    a part sent again must have the same SHA-256, and one still being written
+    is refused to other requests. Whenever the parts at the
+    start of the file grow, a worker reads the new bytes back to advance the
+    file's SHA-256 and, for HTML/iXBRL filings, to parse their pages, so that
+    completing a session is left with the tail only. PDFs keep their
+    cross-reference table at the end and are only hashed early. This progress
+    is held in memory: after a restart, or on another worker process, it is
+    redone from the file on completion.
+
+    Sessions untouched for UPLOAD_SESSION_TTL_SECONDS are deleted with their
+    file by a background sweep.
+
+    Configuration via environment:
+        UPLOAD_SESSION_ROOT         directory for the files of open sessions (default uploads)
+        UPLOAD_PART_BYTES           part size unless the client asks for another (default 8 MiB)
+        UPLOAD_MAX_BYTES            largest file accepted (default 2 GiB)
+        UPLOAD_SESSION_TTL_SECONDS  idle time after which a session is collected (default 86400)
+        UPLOAD_GC_INTERVAL_SECONDS  stale-session sweep interval, 0 disables (default 600)
+        UPLOAD_PARSE_WORKERS        threads hashing and parsing the leading parts (default 2)
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ResumableUploads, cls).__new__(cls)
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        self.root = os.getenv("UPLOAD_SESSION_ROOT", UPLOAD_SESSION_ROOT)
+        self.part_bytes = int(os.getenv("UPLOAD_PART_BYTES", str(8 * 1024 * 1024)))
+        self.max_bytes = int(os.getenv("UPLOAD_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+        self.ttl_seconds = float(os.getenv("UPLOAD_SESSION_TTL_SECONDS", "86400"))
+        self.interval_seconds = float(os.getenv("UPLOAD_GC_INTERVAL_SECONDS", "600"))
+        self.sessions = UploadSessionManager()
+        self._executor = ThreadPoolExecutor(max_workers=int(os.getenv("UPLOAD_PARSE_WORKERS", "2")), thread_name_prefix="upload-prefix")
+        self._lock = threading.Lock()
+        self._progress: Dict[str, _Progress] = {}
+        # Parts being streamed to disk, per session, so two first-time writes of a part never overlap
+        self._writing: Dict[str, set] = {}
+        self._thread = None
+        self._counters = {
+            'sessions_created': 0,
+            'parts_received': 0,
+            'bytes_received': 0,
+            'bytes_hashed_early': 0,
+            'pages_parsed_early': 0,
+            'completed': 0,
+            'aborted': 0,
+            'collected': 0
+        }
+        self._last_collection = None
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    @staticmethod
+    def _part_range(session: Dict[str, Any], part_number: int):
+        """(offset, length) of a part"""
+        offset = part_number * session['part_size_bytes']
+        return offset, min(session['part_size_bytes'], session['file_size_bytes'] - offset)
+
+    @staticmethod
+    def _parts_total(session: Dict[str, Any]) -> int:
+        return -(-session['file_size_bytes'] // session['part_size_bytes'])
+
+    def create_session(self, metadata: Dict[str, Any], vectorization_params: Dict[str, Any], file_size_bytes: int,
+                       part_size_bytes: Optional[int] = None, document_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Open a session for a file of file_size_bytes; raises ValueError for
+        metadata, file types, vectorization parameters or sizes that would be
+        refused anyway, before any byte is sent.
+        """
+        document_metadata = DocumentMetadata(**metadata)
+        select_loader(document_metadata.file_type, document_metadata.file_name)
+        two_stage_params(vectorization_params)
+        if not 0 < file_size_bytes <= self.max_bytes:
+            raise ValueError(f"file_size must be between 1 and {self.max_bytes} bytes")
+        part_size_bytes = part_size_bytes or self.part_bytes
+        if not MIN_PART_BYTES <= part_size_bytes <= MAX_PART_BYTES:
+            raise ValueError(f"part_size must be between {MIN_PART_BYTES} and {MAX_PART_BYTES} bytes")
+        # The shard router finds the node holding a session from the document id it starts with
+        token = secrets.token_hex(16)
+        session_id = token if document_id is None else f"{document_id}-{token}"
+        os.makedirs(self.root, exist_ok=True)
+        data_path = os.path.join(self.root, f"{session_id}.upload")
+        with open(data_path, "wb") as f:
+            # Sparse on most filesystems; parts fill it in place
+            f.truncate(file_size_bytes)
+        try:
+            self.sessions.create_session(session_id, metadata, vectorization_params, file_size_bytes,
+                                         part_size_bytes, data_path, document_id)
+        except Exception:
+            os.remove(data_path)
+            raise
+        self._count('sessions_created')
+        return self.describe(session_id)
+
+    def describe(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """What a client needs to resume: the parts still missing, and how far ingestion got ahead"""
+        session = self.sessions.get_session(session_id)
+        if session is None:
+            return None
+        parts = self.sessions.get_parts(session_id)
+        parts_total = self._parts_total(session)
+        with self._lock:
+            progress = self._progress.get(session_id)
+        updated_at = datetime.fromisoformat(session['updated_at'])
+        return {
+            'upload_id': session_id,
+            'status': session['status'],
+            'file_name': session['metadata'].get('file_name'),
+            'file_size_bytes': session['file_size_bytes'],
+            'part_size_bytes': session['part_size_bytes'],
+            'parts_total': parts_total,
+            'parts_received': len(parts),
+            'bytes_received': sum(part['size_bytes'] for part in parts.values()),
+            'missing_parts': [number for number in range(parts_total) if number not in parts],
+            'bytes_hashed': progress.offset if progress else 0,
+            'pages_parsed': len(progress.filing.pages) if progress and progress.filing else 0,
+            'created_at': session['created_at'],
+            'updated_at': session['updated_at'],
+            'expires_at': (updated_at + timedelta(seconds=self.ttl_seconds)).isoformat()
+        }
+
+    def write_part(self, session_id: str, part_number: int, stream: BinaryIO,
+                   expected_sha256: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Stream one part from stream into the session's file; None if there is
+        no such session. Raises ValueError for a part of the wrong size or
+        not matching expected_sha256 (nothing is recorded, send it again), and
+        UploadSessionConflict for a part already received with other bytes,
+        being received by another request, or a session no longer receiving.
+        """
+        session = self.sessions.get_session(session_id)
+        if session is None:
+            return None
+        if session['status'] != 'receiving':
+            raise UploadSessionConflict(f"Upload is {session['status']}")
+        if not 0 <= part_number < self._parts_total(session):
+            raise ValueError(f"part_number must be between 0 and {self._parts_total(session) - 1}")
+        offset, length = self._part_range(session, part_number)
+        received = self.sessions.get_parts(session_id).get(part_number)
+        claimed = not received and self._claim_part(session_id, part_number)
+        if claimed:
+            # Recorded by a request that released its claim just before this one took it
+            received = self.sessions.get_parts(session_id).get(part_number)
+        try:
+            return self._write_part(session, part_number, offset, length, stream, received, expected_sha256)
+        finally:
+            if claimed:
+                self._release_part(session_id, part_number)
+
+    def _claim_part(self, session_id: str, part_number: int) -> bool:
+        with self._lock:
+            writing = self._writing.setdefault(session_id, set())
+            if part_number in writing:
+                raise UploadSessionConflict(f"Part {part_number} is being received by another request")
+            writing.add(part_number)
+        return True
+
+    def _release_part(self, session_id: str, part_number: int) -> None:
+        with self._lock:
+            writing = self._writing.get(session_id, set())
+            writing.discard(part_number)
+            if not writing:
+                self._writing.pop(session_id, None)
+
+    def _write_part(self, session: Dict[str, Any], part_number: int, offset: int, length: int, stream: BinaryIO,
+                    received: Optional[Dict[str, Any]], expected_sha256: Optional[str]) -> Dict[str, Any]:
+        """Stream a part into place, or only hash it when already received; called with the part claimed"""
+        session_id = session['id']
+        digest = hashlib.sha256()
+        size = 0
+        # A part already received is only hashed, so bytes already parsed never change under the parser
+        out = None if received else open(session['data_path'], "r+b")
+        try:
+            if out:
+                out.seek(offset)
+            while size <= length:
+                chunk = stream.read(min(UPLOAD_CHUNK_BYTES, length + 1 - size))
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > length:
+                    break
+                digest.update(chunk)
+                if out:
+                    out.write(chunk)
+        finally:
+            if out:
+                out.close()
+        if size != length:
+            raise ValueError(f"Part {part_number} must be {length} bytes")
+        sha256 = digest.hexdigest()
+        if expected_sha256 and expected_sha256.lower() != sha256:
+            raise ValueError(f"Part {part_number} does not match its X-Part-Sha256")
+        if received:
+            if received['sha256'] != sha256:
+                raise UploadSessionConflict(f"Part {part_number} was already received with other bytes")
+            return {'part_number': part_number, 'size_bytes': size, 'sha256': sha256}
+        if not self.sessions.record_part(session_id, part_number, size, sha256):
+            raise UploadSessionConflict("Upload is no longer receiving parts")
+        self._count('parts_received')
+        self._count('bytes_received', size)
+        self._executor.submit(self._advance_quietly, session_id)
+        return {'part_number': part_number, 'size_bytes': size, 'sha256': sha256}
+
+    def _progress_for(self, session: Dict[str, Any]) -> _Progress:
+        with self._lock:
+            progress = self._progress.get(session['id'])
+            if progress is None:
+                progress = self._progress[session['id']] = _Progress(session)
+            return progress
+
+    def _contiguous_end(self, session: Dict[str, Any]) -> int:
+        """End offset of the parts received without a gap from the start of the file"""
+        parts = self.sessions.get_parts(session['id'])
+        part_number = 0
+        while part_number in parts:
+            part_number += 1
+        return min(part_number * session['part_size_bytes'], session['file_size_bytes'])
+
+    @staticmethod
+    def _consume(progress: _Progress, session: Dict[str, Any], end: int) -> int:
+        """Hash and parse the file from progress.offset up to end; call with progress.lock held"""
+        consumed = 0
+        with open(session['data_path'], "rb") as f:
+            f.seek(progress.offset)
+            while progress.offset < end:
+                chunk = f.read(min(UPLOAD_CHUNK_BYTES, end - progress.offset))
+                if not chunk:
+                    raise OSError(f"{session['data_path']} is shorter than its upload")
+                progress.digest.update(chunk)
+                if progress.filing is not None:
+                    progress.filing.feed(chunk)
+                progress.offset += len(chunk)
+                consumed += len(chunk)
+        return consumed
+
+    def _advance(self, session_id: str) -> None:
+        session = self.sessions.get_session(session_id)
+        if session is None or session['status'] != 'receiving':
+            return
+        progress = self._progress_for(session)
+        # Blocking: a worker already advancing may have stopped short of the part that woke this one
+        with progress.lock:
+            with self._lock:
+                if self._progress.get(session_id) is not progress:
+                    # Completed, aborted or collected meanwhile
+                    return
+            pages_before = len(progress.filing.pages) if progress.filing else 0
+            consumed = self._consume(progress, session, self._contiguous_end(session))
+            self._count('bytes_hashed_early', consumed)
+            if progress.filing is not None:
+                self._count('pages_parsed_early', len(progress.filing.pages) - pages_before)
+
+    def _advance_quietly(self, session_id: str) -> None:
+        try:
+            self._advance(session_id)
+        except Exception as e:
+            # Only an optimization: completion hashes and parses whatever is left
+            print(f"Error reading ahead upload {session_id}: {str(e)}")
+            with self._lock:
+                self._progress.pop(session_id, None)
+
+    def begin_ingestion(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Claim a fully received session for ingestion and finish its hashing and
+        parsing. Returns the save_upload dict for it (its temp_path a link to
+        the session's file, which ingestion may delete) plus pages (None unless
+        parsed here), metadata, vectorization_params and document_id; None if
+        there is no such session. Follow with end_ingestion.
+        """
+        session = self.sessions.get_session(session_id)
+        if session is None:
+            return None
+        parts = self.sessions.get_parts(session_id)
+        missing = [number for number in range(self._parts_total(session)) if number not in parts]
+        if missing:
+            raise UploadSessionConflict(f"{len(missing)} parts are missing, the first is part {missing[0]}")
+        if not self.sessions.set_status(session_id, 'ingesting', expected='receiving'):
+            raise UploadSessionConflict("Upload is already being ingested")
+        try:
+            progress = self._progress_for(session)
+            with progress.lock:
+                with self._lock:
+                    # Parsed pages are handed to ingestion; a retry starts again from the file
+                    self._progress.pop(session_id, None)
+                self._consume(progress, session, session['file_size_bytes'])
+                pages = progress.filing.close() if progress.filing is not None else None
+            temp_path = f"{session['data_path']}.ingest-{uuid.uuid4().hex}"
+            try:
+                os.link(session['data_path'], temp_path)
+            except OSError:
+                shutil.copyfile(session['data_path'], temp_path)
+        except Exception:
+            self.sessions.set_status(session_id, 'receiving', expected='ingesting')
+            raise
+        return {
+            'temp_path': temp_path,
+            'file_name': DocumentMetadata(**session['metadata']).file_name,
+            'content_hash': progress.digest.hexdigest(),
+            'file_size_bytes': session['file_size_bytes'],
+            'pages': pages,
+            'metadata': session['metadata'],
+            'vectorization_params': session['vectorization_params'],
+            'document_id': session['document_id']
+        }
+
+    def end_ingestion(self, session_id: str, upload: Dict[str, Any], succeeded: bool) -> None:
+        """Delete the session once its document exists; otherwise reopen it so completion can be retried"""
+        if os.path.exists(upload['temp_path']):
+            os.remove(upload['temp_path'])
+        if succeeded:
+            self._delete(session_id)
+            self._count('completed')
+        else:
+            self.sessions.set_status(session_id, 'receiving', expected='ingesting')
+
+    def _delete(self, session_id: str) -> None:
+        session = self.sessions.get_session(session_id)
+        self.sessions.delete_session(session_id)
+        with self._lock:
+            self._progress.pop(session_id, None)
+        if session and os.path.exists(session['data_path']):
+            os.remove(session['data_path'])
+
+    def abort(self, session_id: str) -> Optional[bool]:
+        """Delete a session and its file; None if there is none, False while it is being ingested"""
+        session = self.sessions.get_session(session_id)
+        if session is None:
+            return None
+        if session['status'] == 'ingesting':
+            return False
+        self._delete(session_id)
+        self._count('aborted')
+        return True
+
+    def collect(self) -> Dict[str, Any]:
+        """Delete sessions idle for longer than the TTL, and files under the root no session owns"""
+        cutoff = datetime.now() - timedelta(seconds=self.ttl_seconds)
+        collected = []
+        reclaimed_bytes = 0
+        for session in self.sessions.get_stale_sessions(cutoff.isoformat()):
+            if os.path.exists(session['data_path']):
+                reclaimed_bytes += os.path.getsize(session['data_path'])
+            self._delete(session['id'])
+            collected.append(session['id'])
+        owned = {os.path.abspath(path) for path in self.sessions.get_data_paths()}
+        orphans = 0
+        if os.path.isdir(self.root):
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                # Leftovers of a crash: a file created before its session row, or a link ingestion never removed
+                if os.path.isfile(path) and os.path.abspath(path) not in owned and os.path.getmtime(path) < cutoff.timestamp():
+                    reclaimed_bytes += os.path.getsize(path)
+                    os.remove(path)
+                    orphans += 1
+        report = {
+            'collected': collected,
+            'orphaned_files_removed': orphans,
+            'reclaimed_bytes': reclaimed_bytes,
+            'ran_at': datetime.now().isoformat()
+        }
+        self._count('collected', len(collected))
+        with self._lock:
+            self._last_collection = report
+        return report
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval_seconds)
+            try:
+                self.collect()
+            except Exception as e:
+                print(f"Error collecting upload sessions: {str(e)}")
+
+    def start(self, interval_seconds: Optional[float] = None):
+        """Start the stale-session sweep once; an interval of 0 disables it"""
+        if interval_seconds is not None:
+            self.interval_seconds = interval_seconds
+        if self.interval_seconds <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="upload-session-gc", daemon=True)
+        self._thread.start()
+
+    def stats(self) -> Dict[str, Any]:
+        disk_bytes = 0
+        if os.path.isdir(self.root):
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                if os.path.isfile(path):
+                    # Allocated, not apparent, size: session files are sparse until their parts arrive
+                    disk_bytes += os.stat(path).st_blocks * 512
+        sessions = self.sessions.count_sessions()
+        with self._lock:
+            return {
+                'sessions': sessions,
+                'reading_ahead': len(self._progress),
+                'disk_bytes': disk_bytes,
+                'part_bytes': self.part_bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'background': self._thread is not None,
+                **self._counters,
+                'last_collection': self._last_collection
+            }
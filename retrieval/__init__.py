@@ -0,0 +1,53 @@
+from .class_QueryEmbeddingCache import QueryEmbeddingCache, normalize_prompt
+from .class_CachedQueryEmbeddings import CachedQueryEmbeddings
+from .class_TwoStageIndex import TwoStageIndex, two_stage_params, MATRYOSHKA_MODELS, DEFAULT_RESCORE_FACTOR
+from .load_vectorstore import load_vectorstore, save_vectorstore, get_query_embeddings, DEFAULT_EMBEDDING_MODEL
+from .mmr_search import maximal_marginal_relevance, mmr_search
+from .section_search import normalize_section, section_matches, section_ids, save_section_map, load_section_map, section_search_params, search_by_vector, search_by_vector_with_scores
+from .class_BatchedSearcher import BatchedSearcher
+from .class_RetrievalClient import RetrievalClient
+from .retrieval_server import start_retrieval_server
+from .rag_query import rag_query, retrieve
+from .class_DegradationStats import DegradationStats
+from .map_reduce_query import map_reduce_query
+from .class_IssuerIndexes import IssuerIndexes
+from .period_query import period_query, select_filings, find_filings_shard, search_filings_shard
+from .collection_query import collection_query, search_collection_shard
+
+__all__ = [
+    "QueryEmbeddingCache",
+    "normalize_prompt",
+    "CachedQueryEmbeddings",
+    "TwoStageIndex",
+    "two_stage_params",
+    "MATRYOSHKA_MODELS",
+    "DEFAULT_RESCORE_FACTOR",
+    "load_vectorstore",
+    "save_vectorstore",
+    "get_query_embeddings",
+    "DEFAULT_EMBEDDING_MODEL",
+    "maximal_marginal_relevance",
+    "mmr_search",
+    "normalize_section",
+    "section_matches",
+    "section_ids",
+    "save_section_map",
+    "load_section_map",
+    "section_search_params",
+    "search_by_vector",
+    "search_by_vector_with_scores",
+    "BatchedSearcher",
+    "RetrievalClient",
+    "start_retrieval_server",
+    "rag_query",
+    "retrieve",
+    "DegradationStats",
+    "map_reduce_query",
+    "IssuerIndexes",
+    "period_query",
+    "select_filings",
+    "find_filings_shard",
+    "search_filings_shard",
+    "collection_query",
+    "search_collection_shard"
+]
\ No newline at end of file
@@ -0,0 +1,157 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Any, Optional, Dict
+
+import numpy as np
+
+from .load_vectorstore import load_vectorstore
+from .class_TwoStageIndex import TwoStageIndex
+from .mmr_search import maximal_marginal_relevance
+from .section_search import normalize_section, section_search_params
+
+
+class _PendingSearch:
+    def __init__(self, vector: np.ndarray, k: int, search_type: str, fetch_k: int, lambda_mult: float):
+        self.vector = vector
+        self.k = k
+        self.search_type = search_type
+        self.fetch_k = max(fetch_k, k)
+        self.lambda_mult = lambda_mult
+        self.done = threading.Event()
+        self.result: Optional[List[Any]] = None
+        self.error: Optional[Exception] = None
+
+
+class BatchedSearcher:
+    """
+    Owns loaded vectorstores and answers concurrent searches against the same
+    store (and section filter) with a single FAISS call.
+
+    The first search to arrive for a store waits batch_window_ms, then runs every
+    search queued behind it as one (n, d) query matrix at the largest depth any
+    of them needs; MMR selection is done per row on the returned candidates.
+    Stores are kept in an LRU of at most max_stores entries.
+    """
+
+    def __init__(self, max_stores: int = 64, batch_window_ms: float = 2.0):
+        self.max_stores = max_stores
+        self.batch_window = batch_window_ms / 1000.0
+        self._stores: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._stores_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._pending: Dict[tuple, List[_PendingSearch]] = {}
+        self._pending_lock = threading.Lock()
+        self._counters = {"searches": 0, "batches": 0, "largest_batch": 0, "loads": 0, "evictions": 0}
+
+    def get_vectorstore(self, vectorstore_path: str, embedding_model: Optional[str] = None):
+        """The loaded store, loading it on first use; raises FileNotFoundError once it is gone from disk"""
+        key = (os.path.normpath(vectorstore_path), embedding_model)
+        if not os.path.isdir(vectorstore_path):
+            with self._stores_lock:
+                self._stores.pop(key, None)
+            raise FileNotFoundError(f"Vectorstore {vectorstore_path} does not exist")
+        with self._stores_lock:
+            if key in self._stores:
+                self._stores.move_to_end(key)
+                return self._stores[key]
+        with self._load_lock:
+            with self._stores_lock:
+                if key in self._stores:
+                    return self._stores[key]
+            vectorstore = load_vectorstore(vectorstore_path, embedding_model)
+            with self._stores_lock:
+                self._stores[key] = vectorstore
+                self._counters["loads"] += 1
+                while len(self._stores) > self.max_stores:
+                    self._stores.popitem(last=False)
+                    self._counters["evictions"] += 1
+            return vectorstore
+
+    def search(
+        self,
+        vectorstore_path: str,
+        query_vector: np.ndarray,
+        embedding_model: Optional[str] = None,
+        k: int = 4,
+        search_type: str = "similarity",
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        sections: Optional[List[str]] = None
+    ) -> List[Any]:
+        """Top-k (or MMR-selected) documents for a query vector"""
+        key = (
+            vectorstore_path,
+            embedding_model,
+            tuple(sorted({normalize_section(section) for section in sections})) if sections else ()
+        )
+        pending = _PendingSearch(np.asarray(query_vector, dtype=np.float32), k, search_type, fetch_k, lambda_mult)
+        with self._pending_lock:
+            queue = self._pending.setdefault(key, [])
+            queue.append(pending)
+            leader = len(queue) == 1
+
+        if leader:
+            time.sleep(self.batch_window)
+            with self._pending_lock:
+                batch = self._pending.pop(key)
+            try:
+                self._run_batch(key, batch)
+            except Exception as e:
+                for waiting in batch:
+                    waiting.error = e
+            for waiting in batch:
+                waiting.done.set()
+
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _run_batch(self, key: tuple, batch: List[_PendingSearch]) -> None:
+        vectorstore_path, embedding_model, sections = key
+        vectorstore = self.get_vectorstore(vectorstore_path, embedding_model)
+        params = section_search_params(vectorstore_path, list(sections)) if sections else None
+        queries = np.stack([pending.vector for pending in batch])
+        depth = max(pending.fetch_k if pending.search_type == "mmr" else pending.k for pending in batch)
+        if params is None:
+            _, ids = vectorstore.index.search(queries, depth)
+        else:
+            _, ids = vectorstore.index.search(queries, depth, params=params)
+
+        for row, pending in zip(ids, batch):
+            row = row[row >= 0]
+            if pending.search_type == "mmr":
+                candidates = row[:pending.fetch_k]
+                vectors = vectorstore.index.reconstruct_batch(candidates) if len(candidates) else queries[:0]
+                chosen = maximal_marginal_relevance(pending.vector, vectors, k=pending.k, lambda_mult=pending.lambda_mult)
+                selected = candidates[chosen] if chosen else candidates[:0]
+            else:
+                selected = row[:pending.k]
+            pending.result = [
+                vectorstore.docstore.search(vectorstore.index_to_docstore_id[int(vector_id)])
+                for vector_id in selected
+            ]
+
+        with self._pending_lock:
+            self._counters["searches"] += len(batch)
+            self._counters["batches"] += 1
+            self._counters["largest_batch"] = max(self._counters["largest_batch"], len(batch))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stores_lock:
+            loaded = [path for path, _ in self._stores]
+            memory_bytes = sum(
+                store.index.resident_bytes if isinstance(store.index, TwoStageIndex) else store.index.ntotal * store.index.d * 4
+                for store in self._stores.values())
+        with self._pending_lock:
+            counters = dict(self._counters)
+        counters["mean_batch_size"] = round(counters["searches"] / counters["batches"], 2) if counters["batches"] else None
+        return {
+            "stores_loaded": len(loaded),
+            "max_stores": self.max_stores,
+            "vector_bytes": memory_bytes,
+            "batch_window_ms": self.batch_window * 1000,
+            **counters
+        }
@@ -0,0 +1,25 @@
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from .class_QueryEmbeddingCache import QueryEmbeddingCache
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings wrapper that serves embed_query from the shared QueryEmbeddingCache"""
+
+    def __init__(self, embeddings: Embeddings, embedding_model: str):
+        self.embeddings = embeddings
+        self.embedding_model = embedding_model
+        self.cache = QueryEmbeddingCache()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get_or_compute(
+            self.embedding_model,
+            text,
+            self.embeddings.embed_query
+        )
+        return vector.tolist()
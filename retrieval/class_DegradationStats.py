@@ -0,0 +1,48 @@
+import threading
+from typing import Optional, Dict, Any
+
+
+class DegradationStats:
+    """
+    Singleton counters of how deadline-bound queries were answered: in full, or
+    by which degradation path, with the mean time spent in each stage.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self) -> None:
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.paths: Dict[str, int] = {}
+        self.stage_ms_total: Dict[str, float] = {}
+        self.stage_counts: Dict[str, int] = {}
+        self.budget_ms_total = 0.0
+
+    def record(self, degradation: Optional[str], timings_ms: Dict[str, float], deadline_ms: float) -> None:
+        """Count one query; degradation is None when it was answered in full"""
+        path = degradation or "full"
+        with self._lock:
+            self.queries += 1
+            self.paths[path] = self.paths.get(path, 0) + 1
+            self.budget_ms_total += deadline_ms
+            for stage, ms in timings_ms.items():
+                self.stage_ms_total[stage] = self.stage_ms_total.get(stage, 0.0) + ms
+                self.stage_counts[stage] = self.stage_counts.get(stage, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            degraded = self.queries - self.paths.get("full", 0)
+            return {
+                "queries": self.queries,
+                "paths": dict(self.paths),
+                "degraded_ratio": degraded / self.queries if self.queries else 0.0,
+                "mean_deadline_ms": self.budget_ms_total / self.queries if self.queries else 0.0,
+                "mean_stage_ms": {
+                    stage: round(total / self.stage_counts[stage], 2) for stage, total in self.stage_ms_total.items()
+                }
+            }
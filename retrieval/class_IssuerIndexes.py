@@ -0,0 +1,341 @@
+import os
+import json
+import glob
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+from collections import deque, OrderedDict, Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from .load_vectorstore import load_vectorstore, save_vectorstore, get_query_embeddings, DEFAULT_EMBEDDING_MODEL
+from .class_TwoStageIndex import TwoStageIndex
+from .section_search import save_section_map, load_section_map, section_ids
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "issuer.json"
+
+
+def issuer_key(employer: str) -> str:
+    return hashlib.sha256(employer.encode("utf-8")).hexdigest()[:16]
+
+
+def filings_signature(filings: List[Dict[str, Any]]) -> str:
+    """Changes whenever a filing of the issuer is added, removed or re-pointed at another store"""
+    lines = sorted(f"{filing['id']}:{filing['vectorstore_path']}" for filing in filings)
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()[:16]
+
+
+class IssuerIndexes:
+    """
+    Singleton of combined indexes for issuers whose filing history is queried often.
+
+    A combined index holds the chunks of every filing of one issuer in a single
+    FAISS index, with the id range of each filing's store, so a filing-history
+    question is one search instead of one index load and search per filing.
+    An issuer becomes hot after enough queries in the window (or by
+    configuration); its index is then built by a background worker and rebuilt
+    whenever a query or upload finds filings it does not cover. Until then, and
+    for filings on another embedding model, callers search per filing.
+
+    Configuration via environment:
+        ISSUER_INDEX_HOT_QUERIES     queries within the window that make an issuer hot, 0 disables (default 10)
+        ISSUER_INDEX_WINDOW_SECONDS  window for counting queries (default 3600)
+        ISSUER_INDEX_ISSUERS         comma-separated issuers that are always kept indexed
+        ISSUER_INDEX_CACHE_SIZE      combined indexes kept loaded in memory (default 4)
+        ISSUER_INDEX_OVERFETCH       candidates per filing and k fetched by the single search (default 3)
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self) -> None:
+        # Imported here so the retrieval server can import this package without opening the database
+        from document_library_database.class_VectorstoreLifecycleManager import VECTORSTORE_ROOT, ISSUER_INDEX_DIR
+        self.root = os.path.join(VECTORSTORE_ROOT, ISSUER_INDEX_DIR)
+        self.hot_queries = int(os.getenv("ISSUER_INDEX_HOT_QUERIES", "10"))
+        self.window_seconds = float(os.getenv("ISSUER_INDEX_WINDOW_SECONDS", "3600"))
+        self.pinned = {issuer.strip() for issuer in os.getenv("ISSUER_INDEX_ISSUERS", "").split(",") if issuer.strip()}
+        self.cache_size = int(os.getenv("ISSUER_INDEX_CACHE_SIZE", "4"))
+        self.overfetch = int(os.getenv("ISSUER_INDEX_OVERFETCH", "3"))
+        self._lock = threading.Lock()
+        self._queries: Dict[str, deque] = {}
+        self._loaded: "OrderedDict[str, tuple]" = OrderedDict()
+        self._building = set()
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="issuer-index")
+        self._counters = {"builds": 0, "build_failures": 0, "index_searches": 0, "misses": 0, "top_ups": 0}
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def record_query(self, employer: str) -> bool:
+        """Count a filing-history query; schedules a build when the issuer is hot and has no index"""
+        now = time.monotonic()
+        with self._lock:
+            times = self._queries.setdefault(employer, deque())
+            times.append(now)
+            while times and times[0] < now - self.window_seconds:
+                times.popleft()
+        hot = self.is_hot(employer)
+        if hot and self._load(employer) is None:
+            self._schedule(employer)
+        return hot
+
+    def is_hot(self, employer: str) -> bool:
+        if employer in self.pinned:
+            return True
+        if self.hot_queries <= 0:
+            return False
+        with self._lock:
+            return len(self._queries.get(employer, ())) >= self.hot_queries
+
+    def refresh(self, employer: Optional[str]) -> None:
+        """Rebuild a hot issuer's index after its filings changed, e.g. on upload"""
+        if employer and self.is_hot(employer):
+            self._schedule(employer)
+
+    def _schedule(self, employer: str) -> None:
+        with self._lock:
+            if employer in self._building:
+                return
+            self._building.add(employer)
+        self._executor.submit(self._build_in_background, employer)
+
+    def _build_in_background(self, employer: str) -> None:
+        try:
+            self.build(employer)
+        except Exception as e:
+            self._count("build_failures")
+            print(f"Error building issuer index for {employer}: {str(e)}")
+        finally:
+            with self._lock:
+                self._building.discard(employer)
+
+    def _directories(self, employer: str) -> List[str]:
+        """Saved indexes of an issuer, newest first"""
+        directories = [path for path in glob.glob(os.path.join(self.root, f"{issuer_key(employer)}-*"))
+                       if os.path.exists(os.path.join(path, META_FILE))]
+        return sorted(directories, key=os.path.getmtime, reverse=True)
+
+    def _load(self, employer: str) -> Optional[tuple]:
+        """(meta, vectorstore, section map) of the issuer's newest index, from memory or disk"""
+        with self._lock:
+            if employer in self._loaded:
+                self._loaded.move_to_end(employer)
+                return self._loaded[employer]
+        directories = self._directories(employer)
+        if not directories:
+            return None
+        with open(os.path.join(directories[0], META_FILE)) as f:
+            meta = json.load(f)
+        loaded = (meta, load_vectorstore(directories[0], meta["embedding_model"]), load_section_map(directories[0]))
+        self._remember(employer, loaded)
+        return loaded
+
+    def _remember(self, employer: str, loaded: tuple) -> None:
+        with self._lock:
+            self._loaded[employer] = loaded
+            self._loaded.move_to_end(employer)
+            while len(self._loaded) > self.cache_size:
+                self._loaded.popitem(last=False)
+
+    def build(self, employer: str) -> Optional[Dict[str, Any]]:
+        """
+        Build (or reuse) the combined index of an issuer's current filings and
+        drop its older ones. Only filings on the issuer's most common embedding
+        model are included. Returns the index metadata, None without filings.
+        Builds of the same issuer (the background worker and POST
+        /issuer_indexes) run one at a time.
+        """
+        with self._lock:
+            build_lock = self._build_locks.setdefault(employer, threading.Lock())
+        with build_lock:
+            return self._build(employer)
+
+    def _build(self, employer: str) -> Optional[Dict[str, Any]]:
+        from document_library_database import DocumentLibraryManager
+        filings = DocumentLibraryManager.find_filings(employer)
+        if not filings:
+            return None
+        embedding_model, _ = Counter(filing["embedding_model"] or DEFAULT_EMBEDDING_MODEL for filing in filings).most_common(1)[0]
+        filings = [filing for filing in filings if (filing["embedding_model"] or DEFAULT_EMBEDDING_MODEL) == embedding_model]
+        signature = filings_signature(filings)
+        path = os.path.join(self.root, f"{issuer_key(employer)}-{signature}")
+
+        if not os.path.isdir(path):
+            started = time.perf_counter()
+            meta = self._write_index(employer, embedding_model, signature, filings, path)
+            logger.info(f"Built issuer index for {employer}: {meta['chunks']} chunks from {len(meta['ranges'])} stores "
+                        f"in {time.perf_counter() - started:.2f}s")
+            self._count("builds")
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        os.utime(path)
+        self._remember(employer, (meta, load_vectorstore(path, embedding_model), load_section_map(path)))
+        for old_path in self._directories(employer):
+            if old_path != path:
+                shutil.rmtree(old_path, ignore_errors=True)
+        return meta
+
+    def _write_index(self, employer: str, embedding_model: str, signature: str, filings: List[Dict[str, Any]], path: str) -> Dict[str, Any]:
+        ranges, section_map, vectors, docs = {}, {}, [], []
+        first = None
+        two_stage = True
+        for filing in filings:
+            store_path = filing["vectorstore_path"]
+            if store_path in ranges:
+                continue
+            store = load_vectorstore(store_path, embedding_model)
+            first = first or store
+            two_stage = two_stage and isinstance(store.index, TwoStageIndex)
+            count = store.index.ntotal
+            start = len(docs)
+            ranges[store_path] = [start, start + count]
+            # Stored vectors are already normalized when the store normalizes
+            vectors.append(store.index.reconstruct_n(0, count))
+            docs.extend(store.docstore.search(store.index_to_docstore_id[vector_id]) for vector_id in range(count))
+            for section, vector_ids in (load_section_map(store_path) or {}).items():
+                section_map.setdefault(section, []).extend(start + vector_id for vector_id in vector_ids)
+
+        vectors = np.concatenate(vectors).astype(np.float32)
+        dimensions = vectors.shape[1]
+        if two_stage:
+            # Every filing is searched in two stages, so the combined index is too, with the first one's settings
+            index = TwoStageIndex.build(vectors, first.index.coarse_dimensions, first.index.rescore_factor, first.index.metric_type)
+        else:
+            index = faiss.IndexFlatIP(dimensions) if first.index.metric_type == faiss.METRIC_INNER_PRODUCT else faiss.IndexFlatL2(dimensions)
+            index.add(vectors)
+        combined = FAISS(
+            embedding_function=get_query_embeddings(embedding_model),
+            index=index,
+            docstore=InMemoryDocstore({str(vector_id): doc for vector_id, doc in enumerate(docs)}),
+            index_to_docstore_id={vector_id: str(vector_id) for vector_id in range(len(docs))},
+            normalize_L2=first._normalize_L2,
+            distance_strategy=first.distance_strategy
+        )
+        meta = {
+            "employer": employer,
+            "embedding_model": embedding_model,
+            "signature": signature,
+            "built_at": datetime.now().isoformat(),
+            "chunks": len(docs),
+            "coarse_dimensions": index.coarse_dimensions if two_stage else None,
+            "ranges": ranges,
+            "documents": {str(filing["id"]): filing["vectorstore_path"] for filing in filings}
+        }
+        scratch_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        save_vectorstore(combined, scratch_path)
+        if section_map:
+            save_section_map(scratch_path, section_map)
+        with open(os.path.join(scratch_path, META_FILE), "w") as f:
+            json.dump(meta, f)
+        os.makedirs(self.root, exist_ok=True)
+        try:
+            os.rename(scratch_path, path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+            # Another worker process built the same filings first; its index is identical
+            shutil.rmtree(scratch_path, ignore_errors=True)
+        return meta
+
+    def search(
+        self,
+        employer: str,
+        filings: List[Dict[str, Any]],
+        query: str,
+        k: int = 4,
+        sections: Optional[List[str]] = None
+    ) -> Optional[Dict[int, List[Any]]]:
+        """
+        Top-k chunks of each filing ({document id: documents}) from the issuer's
+        combined index in one search, or None when the issuer has no index
+        covering all of the filings (a rebuild is then scheduled if it is hot).
+        """
+        loaded = self._load(employer)
+        if loaded is None:
+            return None
+        meta, vectorstore, section_map = loaded
+        uncovered = [filing for filing in filings if meta["documents"].get(str(filing["id"])) != filing["vectorstore_path"]]
+        if uncovered:
+            self._count("misses")
+            # Filings on another embedding model never enter the index, so only new ones warrant a rebuild
+            if any((filing["embedding_model"] or DEFAULT_EMBEDDING_MODEL) == meta["embedding_model"] for filing in uncovered):
+                self.refresh(employer)
+            return None
+
+        store_paths = list(dict.fromkeys(filing["vectorstore_path"] for filing in filings))
+        allowed_by_path = {
+            store_path: np.arange(*meta["ranges"][store_path], dtype=np.int64) for store_path in store_paths
+        }
+        if sections and section_map is not None:
+            wanted_ids = np.asarray(section_ids(section_map, sections), dtype=np.int64)
+            allowed_by_path = {store_path: np.intersect1d(ids, wanted_ids) for store_path, ids in allowed_by_path.items()}
+        allowed = np.concatenate(list(allowed_by_path.values()))
+
+        by_path = {store_path: [] for store_path in store_paths}
+        if len(allowed):
+            query_vector = np.asarray(vectorstore.embedding_function.embed_query(query), dtype=np.float32).reshape(1, -1)
+            if vectorstore._normalize_L2:
+                faiss.normalize_L2(query_vector)
+            fetch = min(len(allowed), k * len(store_paths) * self.overfetch)
+            _, found = vectorstore.index.search(query_vector, fetch, params=faiss.SearchParameters(sel=faiss.IDSelectorBatch(allowed)))
+            ordered_paths = sorted(store_paths, key=lambda store_path: meta["ranges"][store_path][0])
+            starts = np.asarray([meta["ranges"][store_path][0] for store_path in ordered_paths])
+            for vector_id in found[0]:
+                if vector_id < 0:
+                    continue
+                store_path = ordered_paths[int(np.searchsorted(starts, vector_id, side="right")) - 1]
+                if len(by_path[store_path]) < k:
+                    by_path[store_path].append(int(vector_id))
+            for store_path, vector_ids in by_path.items():
+                available = allowed_by_path[store_path]
+                if len(vector_ids) < min(k, len(available)):
+                    # This filing was crowded out of the shared candidates; search it on its own
+                    self._count("top_ups")
+                    _, own = vectorstore.index.search(
+                        query_vector, min(k, len(available)), params=faiss.SearchParameters(sel=faiss.IDSelectorBatch(available)))
+                    by_path[store_path] = [int(vector_id) for vector_id in own[0] if vector_id >= 0]
+        self._count("index_searches")
+        return {
+            filing["id"]: [
+                vectorstore.docstore.search(vectorstore.index_to_docstore_id[vector_id])
+                for vector_id in by_path[filing["vectorstore_path"]]
+            ]
+            for filing in filings
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            loaded = {employer: {"chunks": meta["chunks"], "filings": len(meta["documents"]), "built_at": meta["built_at"],
+                                 "coarse_dimensions": meta.get("coarse_dimensions")}
+                      for employer, (meta, _, _) in self._loaded.items()}
+            hot = sorted(employer for employer, times in self._queries.items()
+                         if self.hot_queries > 0 and len(times) >= self.hot_queries)
+            building = sorted(self._building)
+        return {
+            "hot_queries": self.hot_queries,
+            "window_seconds": self.window_seconds,
+            "pinned": sorted(self.pinned),
+            "hot": hot,
+            "building": building,
+            "loaded": loaded,
+            **counters
+        }
@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional, Tuple, Dict, Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def collapse_whitespace(prompt: str) -> str:
+    """The prompt with runs of whitespace collapsed to single spaces and trimmed"""
+    return " ".join(prompt.split())
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt so trivially different spellings share a cache entry; used for the key only"""
+    normalized = unicodedata.normalize("NFKC", prompt)
+    return collapse_whitespace(normalized).casefold()
+
+
+class QueryEmbeddingCache:
+    """Singleton LRU cache of query embeddings keyed by (embedding_model, normalized prompt)"""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._setup(
+                max_entries=int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "4096")),
+                persist_path=os.getenv("QUERY_EMBEDDING_CACHE_PATH")
+            )
+        return cls._instance
+
+    def _setup(self, max_entries: int, persist_path: Optional[str]) -> None:
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self.max_entries = max_entries
+        self.persist_path = persist_path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.miss_seconds_total = 0.0
+        if persist_path:
+            self.load()
+            atexit.register(self.save)
+
+    def get(self, embedding_model: str, prompt: str) -> Optional[np.ndarray]:
+        """Return the cached embedding and mark it as recently used, or None"""
+        key = (embedding_model, normalize_prompt(prompt))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, embedding_model: str, prompt: str, vector, elapsed_seconds: float = 0.0) -> np.ndarray:
+        """Store an embedding as a compact float32 array, evicting the least recently used entry"""
+        key = (embedding_model, normalize_prompt(prompt))
+        array = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._entries[key] = array
+            self._entries.move_to_end(key)
+            self.miss_seconds_total += elapsed_seconds
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return array
+
+    def get_or_compute(self, embedding_model: str, prompt: str, compute) -> np.ndarray:
+        """
+        Return the cached embedding, calling compute on a miss with the prompt as
+        written (whitespace collapsed): casefolding would change the embedding of
+        tickers and defined terms ("US" vs "us"), so it only applies to the key.
+        """
+        vector = self.get(embedding_model, prompt)
+        if vector is not None:
+            return vector
+        started = time.perf_counter()
+        computed = compute(collapse_whitespace(prompt))
+        return self.put(embedding_model, prompt, computed, time.perf_counter() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit ratio and estimated latency saved (hits times the mean miss latency)"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            mean_miss_seconds = self.miss_seconds_total / self.misses if self.misses else 0.0
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "mean_miss_latency_ms": mean_miss_seconds * 1000,
+                "saved_latency_ms": self.hits * mean_miss_seconds * 1000,
+                "memory_bytes": sum(v.nbytes for v in self._entries.values()),
+                "persist_path": self.persist_path
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+            self.miss_seconds_total = 0.0
+
+    def save(self) -> None:
+        """Write the cache to persist_path (atomically) so it survives restarts"""
+        if not self.persist_path:
+            return
+        with self._lock:
+            keys = [list(key) for key in self._entries.keys()]
+            vectors = {f"v{i}": vector for i, vector in enumerate(self._entries.values())}
+        directory = os.path.dirname(self.persist_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.persist_path}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                np.savez(f, keys=np.array(json.dumps(keys)), **vectors)
+            os.replace(temp_path, self.persist_path)
+            logger.info(f"Saved {len(keys)} query embeddings to {self.persist_path}")
+        except OSError as e:
+            logger.warning(f"Unable to save query embedding cache: {e}")
+
+    def load(self) -> None:
+        """Load entries written by save(), oldest first so LRU order is preserved"""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with np.load(self.persist_path, allow_pickle=False) as data:
+                keys = json.loads(str(data["keys"]))
+                with self._lock:
+                    for i, (model, prompt) in enumerate(keys[-self.max_entries:], start=max(0, len(keys) - self.max_entries)):
+                        self._entries[(model, prompt)] = data[f"v{i}"].astype(np.float32, copy=False)
+            logger.info(f"Loaded {len(self._entries)} query embeddings from {self.persist_path}")
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable query embedding cache {self.persist_path}: {e}")
@@ -0,0 +1,125 @@
+import os
+import time
+import logging
+import threading
+from typing import List, Optional, Dict, Any
+
+import httpx
+import orjson
+from langchain_core.documents import Document
+
+from .retrieval_server import encode_vector
+
+logger = logging.getLogger(__name__)
+
+
+class RetrievalClient:
+    """
+    Singleton thin client for the retrieval server.
+
+    Enabled by RETRIEVAL_SERVER_URL (localhost HTTP) or RETRIEVAL_SERVER_SOCKET
+    (Unix socket). Methods return None instead of raising when the server cannot
+    answer, so callers fall back to searching in process; after a connection
+    failure the server is skipped for RETRIEVAL_SERVER_RETRY_SECONDS.
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self) -> None:
+        self.url = os.getenv("RETRIEVAL_SERVER_URL")
+        self.socket_path = os.getenv("RETRIEVAL_SERVER_SOCKET")
+        self.enabled = bool(self.url or self.socket_path)
+        self.retry_seconds = float(os.getenv("RETRIEVAL_SERVER_RETRY_SECONDS", "30"))
+        self._unavailable_until = 0.0
+        self._lock = threading.Lock()
+        self._counters = {"remote": 0, "fallbacks": 0, "connection_failures": 0, "deadline_timeouts": 0}
+        self.timeout = float(os.getenv("RETRIEVAL_SERVER_TIMEOUT", "5"))
+        self._client = None
+        if self.enabled:
+            transport = httpx.HTTPTransport(uds=self.socket_path) if self.socket_path else None
+            self._client = httpx.Client(
+                base_url=self.url or "http://retrieval",
+                transport=transport,
+                timeout=self.timeout)
+
+    def available(self) -> bool:
+        return self.enabled and time.monotonic() >= self._unavailable_until
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def _post(self, path: str, payload: Dict[str, Any], timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        if not self.available():
+            return None
+        options = {}
+        if timeout is not None and timeout < self.timeout:
+            options["timeout"] = max(timeout, 0.001)
+        try:
+            response = self._client.post(path, content=orjson.dumps(payload), headers={"Content-Type": "application/json"}, **options)
+        except httpx.TransportError as e:
+            if options and isinstance(e, httpx.TimeoutException):
+                # A timeout shortened by the caller's deadline says nothing about the server's health
+                logger.warning(f"Retrieval server did not answer {path} within the remaining {timeout:.2f}s")
+                self._count("deadline_timeouts")
+                return None
+            logger.warning(f"Retrieval server unreachable, searching in process for {self.retry_seconds:.0f}s: {e}")
+            self._unavailable_until = time.monotonic() + self.retry_seconds
+            self._count("connection_failures")
+            return None
+        if response.status_code != 200:
+            logger.warning(f"Retrieval server returned {response.status_code} for {path}: {response.text[:200]}")
+            return None
+        return orjson.loads(response.content)
+
+    def search(
+        self,
+        vectorstore_path: str,
+        query_vector,
+        embedding_model: Optional[str] = None,
+        k: int = 4,
+        search_type: str = "similarity",
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        sections: Optional[List[str]] = None,
+        timeout: Optional[float] = None
+    ) -> Optional[List[Document]]:
+        """
+        Documents from the server, or None when the caller should search in
+        process; timeout (seconds) shortens the configured one for this call
+        """
+        result = self._post("/search", {
+            "vectorstore_path": os.path.abspath(vectorstore_path),
+            "embedding_model": embedding_model,
+            "vector": encode_vector(query_vector),
+            "k": k,
+            "search_type": search_type,
+            "fetch_k": fetch_k,
+            "lambda_mult": lambda_mult,
+            "sections": sections
+        }, timeout=timeout)
+        if result is None:
+            self._count("fallbacks")
+            return None
+        self._count("remote")
+        return [Document(page_content=document["page_content"], metadata=document["metadata"]) for document in result["documents"]]
+
+    def preload(self, vectorstore_path: str, embedding_model: Optional[str] = None) -> bool:
+        """Ask the server to load a new store before its first query; best effort"""
+        payload = {"vectorstore_path": os.path.abspath(vectorstore_path), "embedding_model": embedding_model}
+        return self._post("/load", payload) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            "enabled": self.enabled,
+            "available": self.available(),
+            "server": self.socket_path or self.url,
+            **counters
+        }
@@ -0,0 +1,180 @@
+import os
+import json
+from typing import Any, Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+TWO_STAGE_FILE = "two_stage.json"
+FULL_VECTORS_FILE = "full_vectors.npy"
+# Models trained so that the leading dimensions of an embedding are an embedding themselves
+# (what the API returns for a smaller `dimensions`), with their full dimensions
+MATRYOSHKA_MODELS = {"text-embedding-3-small": 1536, "text-embedding-3-large": 3072}
+MIN_COARSE_DIMENSIONS = 64
+DEFAULT_RESCORE_FACTOR = 10
+
+
+def two_stage_params(vectorization_params: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    """
+    (coarse_dimensions, rescore_factor) requested by vectorization_params, or
+    None for a plain flat index. Raises ValueError for an embedding model
+    without Matryoshka embeddings or dimensions out of range.
+    """
+    coarse_dimensions = vectorization_params.get('coarse_dimensions')
+    if coarse_dimensions is None:
+        return None
+    embedding_model = vectorization_params.get('embedding_model')
+    if embedding_model not in MATRYOSHKA_MODELS:
+        raise ValueError(f"coarse_dimensions needs an embedding model with Matryoshka embeddings "
+                         f"({', '.join(sorted(MATRYOSHKA_MODELS))}), not '{embedding_model}'")
+    dimensions = MATRYOSHKA_MODELS[embedding_model]
+    if not isinstance(coarse_dimensions, int) or not MIN_COARSE_DIMENSIONS <= coarse_dimensions < dimensions:
+        raise ValueError(f"coarse_dimensions must be a number from {MIN_COARSE_DIMENSIONS} to {dimensions - 1} for {embedding_model}")
+    rescore_factor = vectorization_params.get('rescore_factor', DEFAULT_RESCORE_FACTOR)
+    if not isinstance(rescore_factor, int) or rescore_factor < 1:
+        raise ValueError("rescore_factor must be a whole number of candidates per result, at least 1")
+    return coarse_dimensions, rescore_factor
+
+
+def truncate_vectors(vectors: np.ndarray, coarse_dimensions: int) -> np.ndarray:
+    """The leading coarse_dimensions of each vector, rescaled to unit length as the API does for `dimensions`"""
+    # Always a copy: normalize_L2 works in place, and a single row's slice would be a view of the caller's vector
+    coarse = np.array(np.asarray(vectors, dtype=np.float32)[:, :coarse_dimensions], dtype=np.float32, order="C", copy=True)
+    faiss.normalize_L2(coarse)
+    return coarse
+
+
+class TwoStageIndex:
+    """
+    Flat search over Matryoshka embeddings in two stages, in place of a FAISS flat index.
+
+    Candidates come from a small flat index over the leading coarse_dimensions
+    of every vector (k * rescore_factor of them), and are then re-scored with
+    the full vectors in one NumPy pass. The full vectors are kept in a
+    memory-mapped .npy next to the store, so only the coarse index is resident
+    and the pages of the full vectors that get re-scored are read on demand.
+
+    Answers search, add, reconstruct, reconstruct_n and reconstruct_batch like
+    the flat index it replaces (distances and ids in the full space, -1 for
+    missing results), so LangChain's FAISS and the search helpers use it as is.
+    Search parameters (section selectors) apply to the candidate stage.
+    """
+
+    def __init__(self, coarse_index, full_vectors: np.ndarray, rescore_factor: int = DEFAULT_RESCORE_FACTOR):
+        self.coarse_index = coarse_index
+        self.full_vectors = full_vectors
+        self.rescore_factor = rescore_factor
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, coarse_dimensions: int, rescore_factor: int = DEFAULT_RESCORE_FACTOR,
+              metric_type: int = faiss.METRIC_L2) -> "TwoStageIndex":
+        """An in-memory index over vectors (as stored in the flat index); save() writes it out"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not 0 < coarse_dimensions < vectors.shape[1]:
+            raise ValueError(f"coarse_dimensions must be below the {vectors.shape[1]} dimensions of the vectors")
+        coarse_index = faiss.IndexFlatIP(coarse_dimensions) if metric_type == faiss.METRIC_INNER_PRODUCT else faiss.IndexFlatL2(coarse_dimensions)
+        coarse_index.add(truncate_vectors(vectors, coarse_dimensions))
+        return cls(coarse_index, vectors, rescore_factor)
+
+    @staticmethod
+    def saved_settings(vectorstore_path: str) -> Optional[Dict[str, int]]:
+        """coarse_dimensions, dimensions and rescore_factor of a saved store, None for a plain flat index"""
+        meta_path = os.path.join(vectorstore_path, TWO_STAGE_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            return json.load(f)
+
+    @classmethod
+    def load(cls, coarse_index, vectorstore_path: str) -> Optional["TwoStageIndex"]:
+        """Wrap the coarse index of a saved store, or None when the store is a plain flat index"""
+        meta = cls.saved_settings(vectorstore_path)
+        if meta is None:
+            return None
+        full_vectors = np.load(os.path.join(vectorstore_path, FULL_VECTORS_FILE), mmap_mode="r")
+        return cls(coarse_index, full_vectors, meta["rescore_factor"])
+
+    def save(self, vectorstore_path: str) -> None:
+        """Write the full vectors and settings; the coarse index is written as the store's index.faiss"""
+        np.save(os.path.join(vectorstore_path, FULL_VECTORS_FILE), np.asarray(self.full_vectors))
+        with open(os.path.join(vectorstore_path, TWO_STAGE_FILE), "w") as f:
+            json.dump({
+                "coarse_dimensions": self.coarse_dimensions,
+                "dimensions": self.d,
+                "rescore_factor": self.rescore_factor
+            }, f)
+
+    @property
+    def coarse_dimensions(self) -> int:
+        return self.coarse_index.d
+
+    @property
+    def d(self) -> int:
+        return self.full_vectors.shape[1]
+
+    @property
+    def ntotal(self) -> int:
+        return self.coarse_index.ntotal
+
+    @property
+    def metric_type(self) -> int:
+        return self.coarse_index.metric_type
+
+    @property
+    def resident_bytes(self) -> int:
+        """Memory the index keeps loaded: the coarse vectors, and the full ones unless mapped from disk"""
+        if isinstance(self.full_vectors, np.memmap):
+            return self.ntotal * self.coarse_dimensions * 4
+        return self.ntotal * (self.coarse_dimensions + self.d) * 4
+
+    def search(self, x: np.ndarray, k: int, params: Optional[faiss.SearchParameters] = None) -> Tuple[np.ndarray, np.ndarray]:
+        queries = np.ascontiguousarray(x, dtype=np.float32).reshape(-1, self.d)
+        inner_product = self.metric_type == faiss.METRIC_INNER_PRODUCT
+        missing = -np.inf if inner_product else np.inf
+        distances = np.full((len(queries), k), missing, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        fetch = min(self.ntotal, k * self.rescore_factor)
+        if fetch == 0 or k == 0:
+            return distances, ids
+
+        coarse_queries = truncate_vectors(queries, self.coarse_dimensions)
+        if params is None:
+            _, candidates = self.coarse_index.search(coarse_queries, fetch)
+        else:
+            _, candidates = self.coarse_index.search(coarse_queries, fetch, params=params)
+        found = candidates >= 0
+        # One gather from the mapped file and one pass over every candidate of every query
+        rows = self.full_vectors[np.where(found, candidates, 0).ravel()].reshape(len(queries), fetch, self.d)
+        if inner_product:
+            scores = np.einsum("qcd,qd->qc", rows, queries)
+            order_by = -scores
+        else:
+            difference = rows - queries[:, None, :]
+            scores = np.einsum("qcd,qcd->qc", difference, difference)
+            order_by = scores
+        order_by[~found] = np.inf
+        keep = min(k, fetch)
+        order = np.argsort(order_by, axis=1, kind="stable")[:, :keep]
+        kept_found = np.take_along_axis(found, order, axis=1)
+        distances[:, :keep] = np.where(kept_found, np.take_along_axis(scores, order, axis=1), missing)
+        ids[:, :keep] = np.where(kept_found, np.take_along_axis(candidates, order, axis=1), -1)
+        return distances, ids
+
+    def reconstruct(self, key: int) -> np.ndarray:
+        return np.array(self.full_vectors[int(key)], dtype=np.float32)
+
+    def reconstruct_n(self, i0: int, ni: int) -> np.ndarray:
+        return np.array(self.full_vectors[i0:i0 + ni], dtype=np.float32)
+
+    def reconstruct_batch(self, keys) -> np.ndarray:
+        return np.array(self.full_vectors[np.asarray(keys, dtype=np.int64)], dtype=np.float32)
+
+    def add(self, x: np.ndarray) -> None:
+        """
+        Append vectors (FAISS.add_texts and friends). The full vectors are then
+        held in memory until the store is saved and loaded again.
+        """
+        vectors = np.ascontiguousarray(x, dtype=np.float32).reshape(-1, self.d)
+        # Full vectors first, so a concurrent search never gets a candidate without its full row
+        self.full_vectors = np.concatenate([np.asarray(self.full_vectors), vectors])
+        self.coarse_index.add(truncate_vectors(vectors, self.coarse_dimensions))
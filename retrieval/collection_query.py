@@ -0,0 +1,205 @@
+import time
+import heapq
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List
+
+from langchain_core.documents import Document
+
+from chat import get_completion, OverloadedError
+from sharding import ShardRouter
+from .load_vectorstore import load_vectorstore, get_query_embeddings, DEFAULT_EMBEDDING_MODEL
+from .section_search import section_search_params, search_by_vector_with_scores
+from .retrieval_server import encode_vector, decode_vector
+from .rag_query import build_context, plan_generation, passages_result, DEGRADED_MODEL, GENERATION_TIME_ERRORS
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_SYSTEM_PROMPT = (
+    "You are a financial analyst assistant answering questions across a collection of SEC filings. "
+    "The excerpts are grouped by the filing they come from. Answer only from the excerpts and name the "
+    "filing and page for each point. If the excerpts do not contain the answer, say so."
+)
+MAX_STORE_SEARCH_PARALLEL = 8
+
+
+def search_collection_shard(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    This node's part of a collection search: the k closest chunks among the
+    collection's live documents stored here, with their distances, and the
+    documents whose search failed (left out rather than failing the shard).
+
+    payload holds query, collection_id, k, sections and vectors, the query
+    embedded per embedding model by the router; documents built with another
+    model embed the query here.
+    """
+    from document_library_database import DocumentLibraryManager
+    k = int(payload.get("k", 4))
+    vectors = {model: decode_vector(vector) for model, vector in (payload.get("vectors") or {}).items()}
+    stores: Dict[str, Dict[str, Any]] = {}
+    for document in DocumentLibraryManager.get_documents_by_collection(payload["collection_id"]):
+        if document["processing_status"] == "deleted" or not document["vectorstore_path"]:
+            continue
+        # Documents built from the same bytes share a store; its chunks are credited to the first
+        stores.setdefault(document["vectorstore_path"], document)
+
+    def search(vectorstore_path: str, document: Dict[str, Any]) -> List[Dict[str, Any]]:
+        embedding_model = document["embedding_model"] or DEFAULT_EMBEDDING_MODEL
+        vector = vectors.get(embedding_model)
+        if vector is None:
+            vector = get_query_embeddings(embedding_model).embed_query(payload["query"])
+        vectorstore = load_vectorstore(vectorstore_path, embedding_model)
+        params = section_search_params(vectorstore_path, payload.get("sections"))
+        return [
+            {
+                "page_content": chunk.page_content,
+                "metadata": chunk.metadata,
+                "distance": distance,
+                "document_id": document["id"],
+                "title": document["title"] or document["filename"]
+            }
+            for chunk, distance in search_by_vector_with_scores(vectorstore, vector, k, params)
+        ]
+
+    chunks = []
+    failed = []
+    if stores:
+        with ThreadPoolExecutor(max_workers=min(MAX_STORE_SEARCH_PARALLEL, len(stores)), thread_name_prefix="collection-search") as executor:
+            # Copy the context so the caller's admission lane applies to query embeddings
+            futures = {path: executor.submit(contextvars.copy_context().run, search, path, document) for path, document in stores.items()}
+            for path, future in futures.items():
+                if isinstance(future.exception(), OverloadedError):
+                    raise future.exception()
+                if future.exception() is not None:
+                    # One unreadable store leaves the rest of the shard's answer usable
+                    logger.warning(f"Search of {path} failed: {future.exception()}")
+                    failed.append(stores[path]["id"])
+                else:
+                    chunks.extend(future.result())
+    return {
+        "chunks": heapq.nsmallest(k, chunks, key=lambda chunk: chunk["distance"]),
+        "documents_searched": len(stores) - len(failed),
+        "failed_documents": failed
+    }
+
+
+def merge_top_k(shard_results: List[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
+    """The k closest chunks over every node; each node sent its own k closest, so none is missed"""
+    return heapq.nsmallest(k, (chunk for result in shard_results for chunk in result["chunks"]), key=lambda chunk: chunk["distance"])
+
+
+def build_collection_context(chunks: List[Dict[str, Any]]) -> str:
+    """Excerpts under one header per filing, filings in order of their closest chunk"""
+    by_document: Dict[int, List[Dict[str, Any]]] = {}
+    for chunk in chunks:
+        by_document.setdefault(chunk["document_id"], []).append(chunk)
+    sections = []
+    for document_id, document_chunks in by_document.items():
+        name = document_chunks[0]["title"] or f"document {document_id}"
+        documents = [Document(page_content=chunk["page_content"], metadata=chunk["metadata"]) for chunk in document_chunks]
+        sections.append(f"=== {name} ===\n{build_context(documents)}")
+    return "\n\n".join(sections)
+
+
+def collection_query(
+    query: str,
+    collection_id: int,
+    k: int = 8,
+    sections: Optional[List[str]] = None,
+    temperature: float = 0.2,
+    model: str = "gpt-4o",
+    embedding_model: Optional[str] = None,
+    deadline: Optional[float] = None,
+    degraded_model: Optional[str] = DEGRADED_MODEL
+) -> Dict[str, Any]:
+    """
+    Answer a question from the k most relevant chunks of a whole collection.
+
+    The search is scattered to every shard node (just this one when sharding
+    is off), each returning its k closest chunks, and the k closest overall are
+    given to the model. Distances are only comparable between documents
+    embedded with the same model.
+
+    Args:
+        query: The user question
+        collection_id: Collection to search
+        k: Chunks used as context
+        sections: Filing items ('1A', '7', ...; 'I-2' for one part's item) to restrict the search to
+        temperature: Sampling temperature for the completion
+        model: OpenAI model to use
+        embedding_model: Model the router embeds the query with (default DEFAULT_EMBEDDING_MODEL)
+        deadline: Absolute time.monotonic() by which to answer; nodes get the
+            remaining time, those that miss it are left out (degradation
+            'partial_shards') and generation degrades as in rag_query
+        degraded_model: Cheaper model used when too little time is left for model
+
+    Returns:
+        The get_completion result dict, plus chunks_used, the documents the
+        chunks came from, failed_documents (searches that failed on their node;
+        degradation 'partial_documents'), nodes (chunks returned per node, None
+        for nodes that failed), degradation and timings_ms per stage
+    """
+    timings = {}
+    started = time.perf_counter()
+    embedding_model = embedding_model or DEFAULT_EMBEDDING_MODEL
+    vector = get_query_embeddings(embedding_model).embed_query(query)
+    payload = {
+        "query": query,
+        "collection_id": collection_id,
+        "k": k,
+        "sections": sections,
+        "vectors": {embedding_model: encode_vector(vector)}
+    }
+    results = ShardRouter().scatter(
+        "/shards/search", payload, local=search_collection_shard,
+        timeout=None if deadline is None else max(0.001, deadline - time.monotonic()))
+    answered = [result for result in results.values() if result is not None]
+    failed = [node for node, result in results.items() if result is None]
+    failed_documents = [document_id for result in answered for document_id in result.get("failed_documents", [])]
+    chunks = merge_top_k(answered, k)
+    timings["retrieval_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    if not chunks:
+        result = {
+            "success": False,
+            "content": "The collection could not be searched within the allotted time." if failed or failed_documents else
+                       "No document in this collection contains passages relevant to this question.",
+            "error_type": "shards_unavailable" if failed or failed_documents else "no_passages",
+            "degradation": "partial_shards" if failed else "partial_documents" if failed_documents else None
+        }
+    else:
+        context = build_collection_context(chunks)
+        documents = [Document(page_content=chunk["page_content"], metadata=chunk["metadata"]) for chunk in chunks]
+        generation_model, degradation = plan_generation(
+            None if deadline is None else deadline - time.monotonic(), model, degraded_model)
+        if generation_model is None:
+            result = passages_result(documents, degradation, context)
+        else:
+            generation_started = time.perf_counter()
+            result = get_completion(
+                f"Excerpts by filing:\n\n{context}\n\nQuestion: {query}",
+                temperature=temperature,
+                system_prompt=COLLECTION_SYSTEM_PROMPT,
+                model=generation_model,
+                deadline=deadline
+            )
+            timings["generation_ms"] = round((time.perf_counter() - generation_started) * 1000, 2)
+            if deadline is not None and result.get("error_type") in GENERATION_TIME_ERRORS:
+                result = passages_result(documents, "passages_after_timeout", context)
+            else:
+                result["degradation"] = degradation
+        if failed and result.get("degradation") is None:
+            result["degradation"] = "partial_shards"
+        elif failed_documents and result.get("degradation") is None:
+            result["degradation"] = "partial_documents"
+        if "passages" in result:
+            for passage, chunk in zip(result["passages"], chunks):
+                passage["document_id"] = chunk["document_id"]
+
+    result["chunks_used"] = len(chunks)
+    result["documents"] = list(dict.fromkeys(chunk["document_id"] for chunk in chunks))
+    result["failed_documents"] = failed_documents
+    result["nodes"] = {node: None if shard is None else len(shard["chunks"]) for node, shard in results.items()}
+    result["timings_ms"] = timings
+    return result
\ No newline at end of file
@@ -0,0 +1,47 @@
+from typing import Optional
+
+from langchain_community.vectorstores import FAISS
+
+from chat import get_embeddings
+
+from .class_CachedQueryEmbeddings import CachedQueryEmbeddings
+from .class_TwoStageIndex import TwoStageIndex
+
+DEFAULT_EMBEDDING_MODEL = "text-embedding-ada-002"
+
+
+def get_query_embeddings(embedding_model: Optional[str] = None, openai_api_key: Optional[str] = None) -> CachedQueryEmbeddings:
+    """Embeddings for query-time use, with embed_query served from the shared cache"""
+    embedding_model = embedding_model or DEFAULT_EMBEDDING_MODEL
+    return CachedQueryEmbeddings(get_embeddings(embedding_model, openai_api_key), embedding_model)
+
+
+def load_vectorstore(vectorstore_path: str, embedding_model: Optional[str] = None) -> FAISS:
+    """
+    Load a saved FAISS vectorstore whose query embeddings go through the cache.
+    Stores saved with a TwoStageIndex get it back, over their memory-mapped full vectors.
+    """
+    vectorstore = FAISS.load_local(
+        vectorstore_path,
+        get_query_embeddings(embedding_model),
+        allow_dangerous_deserialization=True
+    )
+    two_stage = TwoStageIndex.load(vectorstore.index, vectorstore_path)
+    if two_stage is not None:
+        vectorstore.index = two_stage
+    return vectorstore
+
+
+def save_vectorstore(vectorstore: FAISS, vectorstore_path: str) -> None:
+    """FAISS.save_local, also for stores searched through a TwoStageIndex"""
+    index = vectorstore.index
+    if not isinstance(index, TwoStageIndex):
+        vectorstore.save_local(vectorstore_path)
+        return
+    # index.faiss holds the coarse index; the full vectors go next to it
+    vectorstore.index = index.coarse_index
+    try:
+        vectorstore.save_local(vectorstore_path)
+    finally:
+        vectorstore.index = index
+    index.save(vectorstore_path)
@@ -0,0 +1,224 @@
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Callable
+
+from chat import get_completion
+from .load_vectorstore import load_vectorstore
+from .rag_query import build_context
+from .section_search import load_section_map, section_ids
+
+logger = logging.getLogger(__name__)
+
+NOTHING_RELEVANT = "NONE"
+
+MAP_SYSTEM_PROMPT = (
+    "You are a financial analyst assistant reading one part of an SEC filing. "
+    "Using only the excerpts, extract everything relevant to the question, citing pages. "
+    f"If nothing in the excerpts is relevant, reply with exactly {NOTHING_RELEVANT}."
+)
+
+REDUCE_SYSTEM_PROMPT = (
+    "You are a financial analyst assistant. Combine partial answers drawn from different parts "
+    "of the same SEC filing into one complete answer to the question. Keep every distinct item "
+    "with its page citations, merge duplicates, and add nothing that is not in the partial answers."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+def load_chunks(vectorstore_path: str, embedding_model: Optional[str] = None, sections: Optional[List[str]] = None) -> List[Any]:
+    """Every chunk of a vectorstore in filing order, optionally only those of the given sections"""
+    vectorstore = load_vectorstore(vectorstore_path, embedding_model)
+    vector_ids = sorted(vectorstore.index_to_docstore_id)
+    section_map = load_section_map(vectorstore_path) if sections else None
+    if section_map is not None:
+        allowed = set(section_ids(section_map, sections))
+        vector_ids = [vector_id for vector_id in vector_ids if vector_id in allowed]
+    return [vectorstore.docstore.search(vectorstore.index_to_docstore_id[vector_id]) for vector_id in vector_ids]
+
+
+def partition(items: List[Any], token_budget: int, size: Callable[[Any], int], max_items: Optional[int] = None) -> List[List[Any]]:
+    """Consecutive groups whose estimated size stays within token_budget (a single oversized item gets its own group)"""
+    groups, current, used = [], [], 0
+    for item in items:
+        tokens = size(item)
+        if current and (used + tokens > token_budget or (max_items and len(current) >= max_items)):
+            groups.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+class _Run:
+    """Shared state of one map-reduce run: cancellation, deadline and accounting"""
+
+    def __init__(self, cancel_event: Optional[threading.Event], deadline: Optional[float]):
+        self.cancel_event = cancel_event or threading.Event()
+        self.deadline = deadline
+        self.lock = threading.Lock()
+        self.llm_calls = 0
+        self.usage = {"input_tokens": 0, "output_tokens": 0, "cached_tokens": 0}
+        self.failures: List[Dict[str, Any]] = []
+
+    def stopped(self) -> bool:
+        return self.cancel_event.is_set() or (self.deadline is not None and time.monotonic() >= self.deadline)
+
+    def complete(self, prompt: str, system_prompt: str, model: str, max_tokens: int) -> Optional[Dict[str, Any]]:
+        if self.stopped():
+            return None
+        result = get_completion(
+            prompt,
+            temperature=0.0,
+            system_prompt=system_prompt,
+            model=model,
+            max_tokens=max_tokens,
+            deadline=self.deadline
+        )
+        usage = result.get("usage") or {}
+        with self.lock:
+            self.llm_calls += 1
+            self.usage["input_tokens"] += usage.get("imput_token") or 0
+            self.usage["output_tokens"] += usage.get("output_tokens") or 0
+            self.usage["cached_tokens"] += usage.get("cached_tokens") or 0
+            if not result.get("success"):
+                self.failures.append(result)
+        return result
+
+    def run_parallel(self, executor: ThreadPoolExecutor, calls: List[Callable[[], Any]]) -> List[Any]:
+        # Copy the context so admission lanes set by the caller apply in the worker threads
+        futures = [executor.submit(contextvars.copy_context().run, call) for call in calls]
+        return [future.result() for future in futures]
+
+
+def map_reduce_query(
+    query: str,
+    vectorstore_path: str,
+    embedding_model: Optional[str] = None,
+    sections: Optional[List[str]] = None,
+    group_token_budget: int = 6000,
+    max_parallel: int = 4,
+    reduce_fan_in: int = 8,
+    map_max_tokens: int = 800,
+    answer_max_tokens: int = 1500,
+    model: str = "gpt-4o",
+    deadline: Optional[float] = None,
+    cancel_event: Optional[threading.Event] = None
+) -> Dict[str, Any]:
+    """
+    Answer a question that needs the whole filing rather than the top-k chunks.
+
+    The chunks (in filing order) are split into groups of about group_token_budget
+    tokens; each group is asked the question concurrently, at most max_parallel at
+    a time. Groups with nothing relevant answer NONE and are dropped. The partial
+    answers are then combined reduce_fan_in at a time, level by level, until one
+    answer remains.
+
+    Setting cancel_event, or reaching deadline (time.monotonic()), stops new calls
+    from starting; the answer is then the partial answers gathered so far.
+
+    Returns:
+        Dict shaped like get_completion's result with source 'map_reduce', plus
+        cancelled, group counts, reduce_levels, summed usage, llm_calls and
+        timings_ms per phase
+    """
+    run = _Run(cancel_event, deadline)
+    reduce_fan_in = max(2, reduce_fan_in)
+    timings = {}
+    started = time.perf_counter()
+
+    chunks = load_chunks(vectorstore_path, embedding_model, sections)
+    timings["load_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    phase_started = time.perf_counter()
+    groups = partition(chunks, group_token_budget, lambda chunk: estimate_tokens(chunk.page_content))
+    timings["partition_ms"] = round((time.perf_counter() - phase_started) * 1000, 2)
+    logger.info(f"Map-reduce over {len(chunks)} chunks in {len(groups)} groups from {vectorstore_path}")
+
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel), thread_name_prefix="map-reduce") as executor:
+        phase_started = time.perf_counter()
+        map_results = run.run_parallel(executor, [
+            lambda group=group: run.complete(
+                f"Excerpts:\n{build_context(group)}\n\nQuestion: {query}",
+                MAP_SYSTEM_PROMPT, model, map_max_tokens)
+            for group in groups
+        ])
+        timings["map_ms"] = round((time.perf_counter() - phase_started) * 1000, 2)
+
+        mapped = [result for result in map_results if result is not None]
+        answered = [result for result in mapped if result.get("success")]
+        partials = [
+            result["content"].strip() for result in answered
+            if result["content"].strip().upper().rstrip(".") != NOTHING_RELEVANT
+        ]
+        relevant_groups = len(partials)
+
+        def reduce_batch(batch):
+            if len(batch) == 1:
+                return {"success": True, "content": batch[0]}
+            parts = "\n\n".join(f"[Part {i}]\n{partial}" for i, partial in enumerate(batch, start=1))
+            return run.complete(f"Partial answers:\n\n{parts}\n\nQuestion: {query}", REDUCE_SYSTEM_PROMPT, model, answer_max_tokens)
+
+        reduce_levels = []
+        while len(partials) > 1 and not run.stopped():
+            phase_started = time.perf_counter()
+            batches = partition(partials, group_token_budget, estimate_tokens, max_items=reduce_fan_in)
+            if len(batches) == len(partials):
+                # Every partial fills the budget on its own; combine them anyway so the levels shrink
+                batches = [partials[i:i + reduce_fan_in] for i in range(0, len(partials), reduce_fan_in)]
+            reduced = run.run_parallel(executor, [lambda batch=batch: reduce_batch(batch) for batch in batches])
+            reduce_levels.append({
+                "inputs": len(partials),
+                "outputs": len(batches),
+                "ms": round((time.perf_counter() - phase_started) * 1000, 2)
+            })
+            if any(result is None or not result.get("success") for result in reduced):
+                break
+            partials = [result["content"].strip() for result in reduced]
+
+    cancelled = run.stopped()
+    timings["reduce_ms"] = round(sum(level["ms"] for level in reduce_levels), 2)
+    timings["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    if not answered:
+        success = False
+        content = "Request could not be completed within the allotted time." if cancelled else "The filing could not be analysed. Please try again later."
+    elif not partials:
+        success = True
+        content = "The filing does not contain information relevant to this question."
+    else:
+        success = True
+        content = "\n\n".join(partials)
+
+    result = {
+        "success": success,
+        "content": content,
+        "source": "map_reduce",
+        "cancelled": cancelled,
+        "chunks": len(chunks),
+        "groups": len(groups),
+        "groups_mapped": len(mapped),
+        "relevant_groups": relevant_groups,
+        "reduce_levels": reduce_levels,
+        "llm_calls": run.llm_calls,
+        "usage": run.usage,
+        "timings_ms": timings
+    }
+    if not success:
+        if run.cancel_event.is_set():
+            result["error_type"] = "cancelled"
+        elif run.failures:
+            result["error_type"] = run.failures[0].get("error_type")
+            if "retry_after" in run.failures[0]:
+                result["retry_after"] = run.failures[0]["retry_after"]
+        else:
+            result["error_type"] = "deadline_exceeded"
+    return result
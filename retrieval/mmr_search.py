@@ -0,0 +1,98 @@
+from typing import List, Tuple, Any, Optional
+
+import faiss
+import numpy as np
+
+
+def maximal_marginal_relevance(
+    query_vector: np.ndarray,
+    candidate_vectors: np.ndarray,
+    k: int = 4,
+    lambda_mult: float = 0.5
+) -> List[int]:
+    """
+    Select k candidates that balance relevance to the query against similarity
+    to what has already been selected.
+
+    All similarities are computed up front as two matrix products; each of the
+    k selection steps is then a handful of whole-array operations, so the cost
+    does not involve any Python loop over candidates.
+
+    Args:
+        query_vector: (d,) query embedding
+        candidate_vectors: (n, d) candidate embeddings
+        k: Number of candidates to select
+        lambda_mult: 1.0 is pure relevance, 0.0 is pure diversity
+
+    Returns:
+        Indices into candidate_vectors, in selection order
+    """
+    n = candidate_vectors.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return []
+
+    candidates = candidate_vectors.astype(np.float32, copy=False)
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = candidates @ query
+    pairwise = candidates @ candidates.T
+
+    selected = np.empty(k, dtype=np.int64)
+    available = np.ones(n, dtype=bool)
+    max_similarity_to_selected = np.full(n, -np.inf, dtype=np.float32)
+
+    first = int(np.argmax(relevance))
+    selected[0] = first
+    available[first] = False
+    np.maximum(max_similarity_to_selected, pairwise[first], out=max_similarity_to_selected)
+
+    for step in range(1, k):
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * max_similarity_to_selected
+        scores[~available] = -np.inf
+        chosen = int(np.argmax(scores))
+        selected[step] = chosen
+        available[chosen] = False
+        np.maximum(max_similarity_to_selected, pairwise[chosen], out=max_similarity_to_selected)
+
+    return selected.tolist()
+
+
+def fetch_candidates(
+    vectorstore,
+    query_vector: np.ndarray,
+    fetch_k: int,
+    params: Optional[faiss.SearchParameters] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Top fetch_k FAISS ids for the query together with their stored vectors"""
+    query = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+    if params is None:
+        _, ids = vectorstore.index.search(query, fetch_k)
+    else:
+        _, ids = vectorstore.index.search(query, fetch_k, params=params)
+    ids = ids[0][ids[0] >= 0]
+    vectors = vectorstore.index.reconstruct_batch(ids) if len(ids) else np.empty((0, query.shape[1]), dtype=np.float32)
+    return ids, vectors
+
+
+def mmr_search(
+    vectorstore,
+    query: str,
+    k: int = 4,
+    fetch_k: int = 20,
+    lambda_mult: float = 0.5,
+    params: Optional[faiss.SearchParameters] = None
+) -> List[Any]:
+    """
+    Diversified retrieval on a LangChain FAISS store: fetch a wider candidate set
+    with its vectors, then keep k chunks chosen by maximal marginal relevance.
+    """
+    query_vector = np.asarray(vectorstore.embedding_function.embed_query(query), dtype=np.float32)
+    ids, vectors = fetch_candidates(vectorstore, query_vector, max(fetch_k, k), params)
+    chosen = maximal_marginal_relevance(query_vector, vectors, k=k, lambda_mult=lambda_mult)
+    return [
+        vectorstore.docstore.search(vectorstore.index_to_docstore_id[int(ids[i])])
+        for i in chosen
+    ]
@@ -0,0 +1,280 @@
+import time
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Optional, Dict, Any, List, Tuple
+
+from langchain_core.documents import Document
+
+from chat import get_completion, OverloadedError
+from sharding import ShardRouter
+from .rag_query import (
+    retrieve, build_context, plan_generation, passages_result, DEGRADED_MODEL, GENERATION_TIME_ERRORS
+)
+from .class_IssuerIndexes import IssuerIndexes
+
+logger = logging.getLogger(__name__)
+
+PERIOD_SYSTEM_PROMPT = (
+    "You are a financial analyst assistant comparing one issuer's SEC filings across reporting periods. "
+    "The excerpts are grouped by the period each filing covers, oldest first. Answer only from the excerpts, "
+    "describe how things changed from period to period in chronological order, and cite the period and page "
+    "for each point. If a period's excerpts do not address the question, say so for that period."
+)
+
+
+def period_label(filing: Dict[str, Any]) -> str:
+    if filing.get("valid_to") and filing["valid_to"] != filing["valid_from"]:
+        return f"{filing['valid_from']} to {filing['valid_to']}"
+    return filing["valid_from"]
+
+
+def build_period_context(periods: List[Dict[str, Any]]) -> str:
+    """Excerpts under one header per period, in the order given"""
+    sections = []
+    for period in periods:
+        name = period["title"] or period["filename"] or f"document {period['document_id']}"
+        excerpts = build_context(period["chunks"]) if period["chunks"] else "(no relevant excerpts)"
+        sections.append(f"=== Period {period['label']} ({name}) ===\n{excerpts}")
+    return "\n\n".join(sections)
+
+
+def _search_per_filing(
+    query: str,
+    filings: List[Dict[str, Any]],
+    k: int,
+    sections: Optional[List[str]],
+    max_parallel: int,
+    deadline: Optional[float]
+) -> Dict[int, Optional[List[Any]]]:
+    """{document id: chunks, or None when its search failed or missed the deadline}, one search per store"""
+    store_paths = {}
+    for filing in filings:
+        store_paths.setdefault(filing["vectorstore_path"], filing["embedding_model"])
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(store_paths))), thread_name_prefix="period-search")
+    try:
+        # Copy the context so the caller's admission lane applies to the query embedding
+        futures = {
+            store_path: executor.submit(
+                contextvars.copy_context().run, retrieve, query, store_path,
+                embedding_model=embedding_model, k=k, sections=sections, deadline=deadline)
+            for store_path, embedding_model in store_paths.items()
+        }
+        wait(futures.values(), timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+    finally:
+        # Searches still running after the deadline finish in the background; queued ones are dropped
+        executor.shutdown(wait=False, cancel_futures=True)
+    by_path = {}
+    for store_path, future in futures.items():
+        if not future.done() or future.cancelled():
+            by_path[store_path] = None
+        elif isinstance(future.exception(), OverloadedError):
+            raise future.exception()
+        elif future.exception() is not None:
+            logger.warning(f"Search of {store_path} failed: {future.exception()}")
+            by_path[store_path] = None
+        else:
+            by_path[store_path] = future.result()
+    return {filing["id"]: by_path[filing["vectorstore_path"]] for filing in filings}
+
+
+def find_filings_shard(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """This node's filings of payload's employer and period (find_filings), at most limit"""
+    from document_library_database import DocumentLibraryManager
+    return {"filings": DocumentLibraryManager.find_filings(
+        payload["employer"], payload.get("period_start"), payload.get("period_end"), limit=payload.get("limit"))}
+
+
+def select_filings(
+    employer: str,
+    period_start: Optional[str] = None,
+    period_end: Optional[str] = None,
+    limit: Optional[int] = None,
+    timeout: Optional[float] = None
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    An issuer's live filings over every shard node, oldest first, each with
+    the node holding it under 'node'; limit keeps the most recent ones. Also
+    returns the nodes that could not be asked.
+    """
+    results = ShardRouter().scatter("/shards/filings", {
+        "employer": employer,
+        "period_start": period_start,
+        "period_end": period_end,
+        "limit": limit
+    }, local=find_filings_shard, timeout=timeout)
+    filings = {}
+    for node, result in results.items():
+        for filing in (result or {}).get("filings", []):
+            # A document being moved can briefly be listed by two nodes
+            filings.setdefault(filing["id"], {**filing, "node": node})
+    # Each node sent its own most recent ones, so none of the overall most recent is missed
+    selected = sorted(filings.values(), key=lambda filing: (filing["valid_from"], filing["id"]))
+    if limit is not None:
+        selected = selected[-limit:]
+    return selected, [node for node, result in results.items() if result is None]
+
+
+def search_filings_shard(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    This node's part of a filing-history search: the top-k chunks of each of
+    its filings in payload's filings_by_node, from the issuer's combined index
+    when it covers them, else from the filings' own indexes ({document id:
+    chunks, or None when that search failed or missed the deadline}).
+    """
+    filings = payload["filings_by_node"].get(ShardRouter().node_name, [])
+    if not filings:
+        return {"search": None, "chunks": {}}
+    timeout_ms = payload.get("timeout_ms")
+    deadline = None if timeout_ms is None else time.monotonic() + timeout_ms / 1000
+    k = int(payload.get("k", 4))
+    indexes = IssuerIndexes()
+    indexes.record_query(filings[0]["employer"])
+    by_document = indexes.search(filings[0]["employer"], filings, payload["query"], k, payload.get("sections"))
+    search = "issuer_index"
+    if by_document is None:
+        search = "per_filing"
+        by_document = _search_per_filing(
+            payload["query"], filings, k, payload.get("sections"), int(payload.get("max_parallel", 4)), deadline)
+    return {
+        "search": search,
+        "chunks": {
+            str(document_id): None if chunks is None else [
+                {"page_content": chunk.page_content, "metadata": chunk.metadata} for chunk in chunks
+            ]
+            for document_id, chunks in by_document.items()
+        }
+    }
+
+
+def period_query(
+    query: str,
+    filings: List[Dict[str, Any]],
+    k: int = 4,
+    sections: Optional[List[str]] = None,
+    max_parallel: int = 4,
+    temperature: float = 0.2,
+    model: str = "gpt-4o",
+    deadline: Optional[float] = None,
+    degraded_model: Optional[str] = DEGRADED_MODEL
+) -> Dict[str, Any]:
+    """
+    Answer a question across one issuer's filings, grouped by reporting period.
+
+    Each node holding some of the filings (just this one when sharding is
+    off) searches its own: the top-k chunks of every filing come from the
+    node's combined index of the issuer when it has one covering them (a
+    single search), otherwise from searching the filings' own indexes in
+    parallel, at most max_parallel at a time. The excerpts are then given to
+    the model period by period, oldest first.
+
+    Args:
+        query: The user question
+        filings: Rows from select_filings, oldest first
+        k: Chunks retrieved per filing
+        sections: Filing items ('1A', '7', ...; 'I-2' for one part's item) to restrict the search to
+        max_parallel: Concurrent per-filing searches
+        temperature: Sampling temperature for the completion
+        model: OpenAI model to use
+        deadline: Absolute time.monotonic() by which to answer; filings not
+            searched by then, or whose node failed, are left out (degradation
+            'partial_periods') and generation degrades as in rag_query
+        degraded_model: Cheaper model used when too little time is left for model
+
+    Returns:
+        The get_completion result dict, plus periods (document, period and
+        chunks used per filing), search ('issuer_index' or 'per_filing', 'mixed'
+        when nodes differed), degradation and timings_ms per stage
+    """
+    timings = {}
+    started = time.perf_counter()
+    router = ShardRouter()
+    filings_by_node: Dict[str, List[Dict[str, Any]]] = {}
+    for filing in filings:
+        filings_by_node.setdefault(filing.get("node") or router.node_name, []).append(filing)
+    timeout = None if deadline is None else max(0.001, deadline - time.monotonic())
+    results = router.scatter("/shards/filing_search", {
+        "query": query,
+        "filings_by_node": filings_by_node,
+        "k": k,
+        "sections": sections,
+        "max_parallel": max_parallel,
+        "timeout_ms": None if timeout is None else timeout * 1000
+    }, local=search_filings_shard, timeout=timeout)
+    by_document: Dict[int, Optional[List[Any]]] = {}
+    searches = set()
+    for result in results.values():
+        if result is None:
+            continue
+        if result["search"] is not None:
+            searches.add(result["search"])
+        for document_id, chunks in result["chunks"].items():
+            by_document.setdefault(int(document_id), None if chunks is None else [
+                Document(page_content=chunk["page_content"], metadata=chunk["metadata"]) for chunk in chunks
+            ])
+    search = searches.pop() if len(searches) == 1 else "mixed" if searches else "per_filing"
+    timings["retrieval_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    periods = [
+        {
+            "document_id": filing["id"],
+            "title": filing.get("title"),
+            "filename": filing.get("filename"),
+            "valid_from": filing["valid_from"],
+            "valid_to": filing.get("valid_to"),
+            "label": period_label(filing),
+            "chunks": by_document.get(filing["id"]) or [],
+            "searched": by_document.get(filing["id"]) is not None
+        }
+        for filing in filings
+    ]
+    searched = [period for period in periods if period["searched"]]
+    documents = [chunk for period in searched for chunk in period["chunks"]]
+    missing = len(periods) - len(searched)
+
+    if not documents:
+        result = {
+            "success": False,
+            "content": "Request could not be completed within the allotted time." if missing else
+                       "None of the selected filings contain passages relevant to this question.",
+            "error_type": "deadline_exceeded" if missing else "no_passages",
+            "degradation": "deadline_exceeded" if missing else None
+        }
+    else:
+        context = build_period_context(searched)
+        generation_model, degradation = plan_generation(
+            None if deadline is None else deadline - time.monotonic(), model, degraded_model)
+        if generation_model is None:
+            result = passages_result(documents, degradation, context)
+        else:
+            generation_started = time.perf_counter()
+            result = get_completion(
+                f"Excerpts by period:\n\n{context}\n\nQuestion: {query}",
+                temperature=temperature,
+                system_prompt=PERIOD_SYSTEM_PROMPT,
+                model=generation_model,
+                deadline=deadline
+            )
+            timings["generation_ms"] = round((time.perf_counter() - generation_started) * 1000, 2)
+            if deadline is not None and result.get("error_type") in GENERATION_TIME_ERRORS:
+                result = passages_result(documents, "passages_after_timeout", context)
+            else:
+                result["degradation"] = degradation
+        if missing and result.get("degradation") is None:
+            result["degradation"] = "partial_periods"
+        if "passages" in result:
+            labels = [period["label"] for period in searched for _ in period["chunks"]]
+            for passage, label in zip(result["passages"], labels):
+                passage["period"] = label
+
+    result["search"] = search
+    result["chunks_used"] = len(documents)
+    result["periods"] = [
+        {
+            **{key: period[key] for key in ("document_id", "title", "valid_from", "valid_to", "label", "searched")},
+            "chunks_used": len(period["chunks"])
+        }
+        for period in periods
+    ]
+    result["timings_ms"] = timings
+    return result
@@ -0,0 +1,239 @@
+import os
+import time
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+from chat import get_completion
+from chat.class_ResilientCompletionClient import ResilientCompletionClient, DeadlineExceededError
+from .load_vectorstore import load_vectorstore, get_query_embeddings
+from .class_RetrievalClient import RetrievalClient
+from .mmr_search import mmr_search
+from .section_search import section_search_params, search_by_vector
+
+logger = logging.getLogger(__name__)
+
+RAG_SYSTEM_PROMPT = (
+    "You are a financial analyst assistant answering questions about SEC filings. "
+    "Answer only from the provided excerpts. If the excerpts do not contain the answer, say so."
+)
+
+# Least time left after retrieval to still call the requested model, and the cheaper one
+GENERATION_MIN_SECONDS = float(os.getenv("QUERY_GENERATION_MIN_SECONDS", "3"))
+DEGRADED_GENERATION_MIN_SECONDS = float(os.getenv("QUERY_DEGRADED_GENERATION_MIN_SECONDS", "1"))
+DEGRADED_MODEL = os.getenv("QUERY_DEGRADED_MODEL", "gpt-4o-mini")
+# get_completion errors after which the retrieved passages are returned instead
+GENERATION_TIME_ERRORS = ("deadline_exceeded", "timeout_error")
+
+# Retrieval under a deadline runs here so the caller can stop waiting for a slow index load
+_retrieval_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("QUERY_RETRIEVAL_WORKERS", "8")),
+    thread_name_prefix="deadline-retrieval"
+)
+
+
+def build_context(documents: List[Any]) -> str:
+    """Format retrieved chunks as numbered excerpts with their page when known"""
+    excerpts = []
+    for i, document in enumerate(documents, start=1):
+        page = document.metadata.get("page")
+        section = document.metadata.get("section")
+        header = f"[Excerpt {i}"
+        if section and section != "preamble":
+            part, _, item = section.rpartition("-")
+            header += f", Part {part}, Item {item}" if part else f", Item {section}"
+        header += f", page {page + 1}]" if isinstance(page, int) else "]"
+        excerpts.append(f"{header}\n{document.page_content}")
+    return "\n\n".join(excerpts)
+
+
+def retrieve(
+    query: str,
+    vectorstore_path: str,
+    embedding_model: Optional[str] = None,
+    k: int = 4,
+    search_type: str = "similarity",
+    fetch_k: int = 20,
+    lambda_mult: float = 0.5,
+    sections: Optional[List[str]] = None,
+    deadline: Optional[float] = None
+) -> List[Any]:
+    """
+    Chunks for a query, from the retrieval server when one is configured and
+    reachable, otherwise by loading the vectorstore in this process.
+
+    With a deadline (time.monotonic()) the server gets only the remaining time,
+    and DeadlineExceededError is raised instead of starting an in-process load
+    once it has passed.
+    """
+    client = RetrievalClient()
+    if client.available():
+        query_vector = get_query_embeddings(embedding_model).embed_query(query)
+        documents = client.search(
+            vectorstore_path,
+            query_vector,
+            embedding_model=embedding_model,
+            k=k,
+            search_type=search_type,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            sections=sections,
+            timeout=None if deadline is None else deadline - time.monotonic()
+        )
+        if documents is not None:
+            logger.info(f"Retrieved {len(documents)} chunks from {vectorstore_path} via the retrieval server")
+            return documents
+
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceededError(f"No time left to load {vectorstore_path}")
+    vectorstore = load_vectorstore(vectorstore_path, embedding_model)
+    params = section_search_params(vectorstore_path, sections)
+    if search_type == "mmr":
+        documents = mmr_search(vectorstore, query, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, params=params)
+    elif params is not None:
+        query_vector = np.asarray(vectorstore.embedding_function.embed_query(query), dtype=np.float32)
+        documents = search_by_vector(vectorstore, query_vector, k, params)
+    else:
+        documents = vectorstore.similarity_search(query, k=k)
+    logger.info(f"Retrieved {len(documents)} chunks from {vectorstore_path}")
+
+    return documents
+
+
+def plan_generation(remaining_seconds: Optional[float], model: str, degraded_model: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (model to call or None, degradation path or None) for the time left after
+    retrieval. A model is only called when the remaining time covers both its
+    minimum and its observed p95 latency; otherwise the cheaper model is tried,
+    and failing that the passages are returned without generation.
+    """
+    if remaining_seconds is None:
+        return model, None
+    latencies = ResilientCompletionClient()
+    if remaining_seconds >= max(GENERATION_MIN_SECONDS, latencies.latency_p95(model) or 0.0):
+        return model, None
+    if degraded_model and degraded_model != model and \
+            remaining_seconds >= max(DEGRADED_GENERATION_MIN_SECONDS, latencies.latency_p95(degraded_model) or 0.0):
+        return degraded_model, "cheaper_model"
+    return None, "passages_only"
+
+
+def passages_result(documents: List[Any], degradation: str, context: Optional[str] = None) -> Dict[str, Any]:
+    """The retrieved chunks in place of a generated answer; context defaults to build_context(documents)"""
+    return {
+        "success": True,
+        "content": "No answer could be generated in time; these are the most relevant passages.\n\n" + (context or build_context(documents)),
+        "passages": [
+            {
+                "content": document.page_content,
+                "page": document.metadata.get("page"),
+                "section": document.metadata.get("section")
+            }
+            for document in documents
+        ],
+        "model": None,
+        "degradation": degradation
+    }
+
+
+def rag_query(
+    query: str,
+    vectorstore_path: str,
+    embedding_model: Optional[str] = None,
+    k: int = 4,
+    search_type: str = "similarity",
+    fetch_k: int = 20,
+    lambda_mult: float = 0.5,
+    sections: Optional[List[str]] = None,
+    temperature: float = 0.2,
+    system_prompt: str = RAG_SYSTEM_PROMPT,
+    model: str = "gpt-4o",
+    deadline: Optional[float] = None,
+    degraded_model: Optional[str] = DEGRADED_MODEL
+) -> Dict[str, Any]:
+    """
+    Answer a question from a single document's vectorstore.
+
+    Args:
+        query: The user question
+        vectorstore_path: Path of the saved FAISS vectorstore
+        embedding_model: Embedding model the vectorstore was built with
+        k: Number of chunks to retrieve
+        search_type: "similarity" for plain top-k, "mmr" for diversified retrieval
+        fetch_k: Candidates fetched before MMR selection
+        lambda_mult: MMR trade-off, 1.0 is pure relevance and 0.0 pure diversity
+        sections: Filing items ('1A', '7', ...; 'I-2' for one part's item) to restrict the search to
+        temperature: Sampling temperature for the completion
+        system_prompt: System message for the model
+        model: OpenAI model to use
+        deadline: Absolute time.monotonic() by which to answer; retrieval and
+            generation only get the time that is left, and the answer degrades
+            (see plan_generation) instead of running past it
+        degraded_model: Cheaper model used when too little time is left for model
+
+    Returns:
+        The get_completion result dict, plus the number of chunks used as context.
+        With a deadline also degradation (None, 'cheaper_model', 'passages_only'
+        or 'passages_after_timeout'; with passages_* the chunks are in passages)
+        and timings_ms per stage
+    """
+    timings = {}
+    started = time.perf_counter()
+    retrieval_args = (query, vectorstore_path)
+    retrieval_kwargs = {
+        "embedding_model": embedding_model,
+        "k": k,
+        "search_type": search_type,
+        "fetch_k": fetch_k,
+        "lambda_mult": lambda_mult,
+        "sections": sections,
+        "deadline": deadline
+    }
+    if deadline is None:
+        documents = retrieve(*retrieval_args, **retrieval_kwargs)
+    else:
+        # Copy the context so the caller's admission lane applies to the query embedding
+        future = _retrieval_executor.submit(contextvars.copy_context().run, retrieve, *retrieval_args, **retrieval_kwargs)
+        try:
+            documents = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except (FutureTimeoutError, DeadlineExceededError):
+            future.cancel()
+            logger.warning(f"Retrieval from {vectorstore_path} did not finish before the deadline")
+            return {
+                "success": False,
+                "content": "Request could not be completed within the allotted time.",
+                "error_type": "deadline_exceeded",
+                "degradation": "deadline_exceeded",
+                "chunks_used": 0,
+                "timings_ms": {"retrieval_ms": round((time.perf_counter() - started) * 1000, 2)}
+            }
+    timings["retrieval_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    generation_model, degradation = plan_generation(
+        None if deadline is None else deadline - time.monotonic(), model, degraded_model)
+    if generation_model is None:
+        logger.warning(f"Too little time left to generate an answer; returning {len(documents)} passages")
+        result = passages_result(documents, degradation)
+    else:
+        generation_started = time.perf_counter()
+        prompt = f"Excerpts:\n{build_context(documents)}\n\nQuestion: {query}"
+        result = get_completion(
+            prompt,
+            temperature=temperature,
+            system_prompt=system_prompt,
+            model=generation_model,
+            deadline=deadline
+        )
+        timings["generation_ms"] = round((time.perf_counter() - generation_started) * 1000, 2)
+        if deadline is not None and result.get("error_type") in GENERATION_TIME_ERRORS:
+            logger.warning(f"Generation with {generation_model} ran out of time; returning {len(documents)} passages")
+            result = passages_result(documents, "passages_after_timeout")
+        elif deadline is not None:
+            result["degradation"] = degradation
+    result["chunks_used"] = len(documents)
+    if deadline is not None:
+        result["timings_ms"] = timings
+    return result
@@ -0,0 +1,183 @@
+"""
+Retrieval service: one long-lived process that owns the loaded FAISS indexes
+and serves batched searches to every API worker.
+
+    python -m retrieval.retrieval_server --port 8091
+    python -m retrieval.retrieval_server --socket /tmp/retrieval.sock
+
+Point the API at it with RETRIEVAL_SERVER_URL=http://127.0.0.1:8091 or
+RETRIEVAL_SERVER_SOCKET=/tmp/retrieval.sock; workers then embed queries
+themselves (keeping their query embedding cache) and send only the vector.
+
+Saved stores are unpickled when loaded, so only paths inside the vectorstore
+root are served: --vectorstore-root or RETRIEVAL_SERVER_VECTORSTORE_ROOT, by
+default "vectorstore" in the working directory, so start the server from the
+API's directory or point it at the API's vectorstore/. Any other
+vectorstore_path is refused with 403.
+
+Endpoints:
+    POST /search  {vectorstore_path, embedding_model, vector, k, search_type, fetch_k, lambda_mult, sections}
+    POST /load    {vectorstore_path, embedding_model}
+    GET  /stats
+    GET  /health
+"""
+import os
+import base64
+import socket
+import logging
+import argparse
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import orjson
+
+from .class_BatchedSearcher import BatchedSearcher
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VECTORSTORE_ROOT = "vectorstore"
+
+
+def encode_vector(vector) -> str:
+    """float32 bytes as base64, about a third of the size of a JSON float list"""
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def decode_vector(encoded: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(encoded), dtype=np.float32)
+
+
+def resolve_vectorstore_path(vectorstore_path, root: str) -> str:
+    """
+    The real path of vectorstore_path; raises PermissionError unless it lies
+    inside root once symlinks and '..' are resolved.
+    """
+    if not isinstance(vectorstore_path, str) or not vectorstore_path:
+        raise ValueError("vectorstore_path must be a non-empty string")
+    real_root = os.path.realpath(root)
+    resolved = os.path.realpath(vectorstore_path)
+    if resolved == real_root or os.path.commonpath([resolved, real_root]) != real_root:
+        raise PermissionError(f"vectorstore_path is outside the vectorstore root: {vectorstore_path}")
+    return resolved
+
+
+def make_handler(searcher: BatchedSearcher, vectorstore_root: str = DEFAULT_VECTORSTORE_ROOT):
+    class RetrievalHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload):
+            body = orjson.dumps(payload)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length", 0))
+            return orjson.loads(self.rfile.read(length)) if length else {}
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"status": "ok"})
+            elif self.path == "/stats":
+                self._send_json(200, searcher.stats())
+            else:
+                self._send_json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            try:
+                data = self._read_json()
+                if self.path == "/search":
+                    documents = searcher.search(
+                        resolve_vectorstore_path(data["vectorstore_path"], vectorstore_root),
+                        decode_vector(data["vector"]),
+                        embedding_model=data.get("embedding_model"),
+                        k=int(data.get("k", 4)),
+                        search_type=data.get("search_type", "similarity"),
+                        fetch_k=int(data.get("fetch_k", 20)),
+                        lambda_mult=float(data.get("lambda_mult", 0.5)),
+                        sections=data.get("sections")
+                    )
+                    self._send_json(200, {"documents": [
+                        {"page_content": document.page_content, "metadata": document.metadata}
+                        for document in documents
+                    ]})
+                elif self.path == "/load":
+                    searcher.get_vectorstore(resolve_vectorstore_path(data["vectorstore_path"], vectorstore_root),
+                                             data.get("embedding_model"))
+                    self._send_json(200, {"loaded": data["vectorstore_path"]})
+                else:
+                    self._send_json(404, {"error": "Not found"})
+            except PermissionError as e:
+                self._send_json(403, {"error": str(e)})
+            except FileNotFoundError as e:
+                self._send_json(404, {"error": str(e)})
+            except (KeyError, ValueError, orjson.JSONDecodeError) as e:
+                self._send_json(400, {"error": f"Bad request: {e}"})
+            except Exception as e:
+                print(f"Error serving retrieval request: {str(e)}")
+                self._send_json(500, {"error": str(e)})
+
+    return RetrievalHandler
+
+
+class ThreadingTCPHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address
+        return request, ("local", 0)
+
+
+def start_retrieval_server(host="127.0.0.1", port=8091, socket_path=None, searcher=None, vectorstore_root=None):
+    """Create the server (not yet serving); returns (server, searcher)"""
+    searcher = searcher or BatchedSearcher(
+        max_stores=int(os.getenv("RETRIEVAL_SERVER_MAX_STORES", "64")),
+        batch_window_ms=float(os.getenv("RETRIEVAL_BATCH_WINDOW_MS", "2"))
+    )
+    vectorstore_root = vectorstore_root or os.getenv("RETRIEVAL_SERVER_VECTORSTORE_ROOT", DEFAULT_VECTORSTORE_ROOT)
+    handler = make_handler(searcher, vectorstore_root)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, handler)
+    else:
+        server = ThreadingTCPHTTPServer((host, port), handler)
+        server.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return server, searcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--socket", dest="socket_path", help="Serve on this Unix socket instead of TCP")
+    parser.add_argument("--vectorstore-root", help="Only serve stores under this directory (default vectorstore)")
+    args = parser.parse_args()
+
+    server, _ = start_retrieval_server(args.host, args.port, args.socket_path, vectorstore_root=args.vectorstore_root)
+    print(f"Retrieval server listening on {args.socket_path or f'http://{args.host}:{args.port}'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket_path and os.path.exists(args.socket_path):
+            os.remove(args.socket_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+import re
+import json
+import logging
+from typing import Dict, List, Optional, Any, Tuple, Iterable
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SECTION_MAP_FILE = "sections.json"
+
+
+# "Part II, Item 1A" / "II-1A" / "ii 1a"; the part is a roman numeral, the item starts with a digit
+_QUALIFIED_SECTION = re.compile(r"^(?:PART\s+)?(IV|I{1,3})\s*[-,.:]?\s*(?:ITEM\s+)?(\d{1,2}[A-C]?)$")
+
+
+def normalize_section(section: str) -> str:
+    """
+    'item 1a' / 'Item 1A.' / '1a' -> '1A'; with a part, 'Part II Item 1A' /
+    'ii-1a' -> 'II-1A', the key of items seen after a PART header
+    """
+    section = " ".join(section.strip().upper().split()).strip(" .")
+    qualified = _QUALIFIED_SECTION.match(section)
+    if qualified:
+        return f"{qualified.group(1)}-{qualified.group(2)}"
+    if section.startswith("ITEM"):
+        section = section[4:]
+    return section.strip(" .")
+
+
+def section_matches(section: str, wanted: Iterable[str]) -> bool:
+    """
+    Whether a section map key is one of the wanted (normalized) sections. A bare
+    item matches it in every part ('2' is Part I and Part II Item 2 of a 10-Q),
+    and a key saved without a part matches any part of its item.
+    """
+    item = section.rsplit("-", 1)[-1]
+    return any(
+        section == label or item == label or (section == item and label.rsplit("-", 1)[-1] == item)
+        for label in wanted
+    )
+
+
+def section_ids(section_map: Dict[str, List[int]], sections: List[str]) -> List[int]:
+    """Sorted FAISS ids of the chunks in any of the requested sections"""
+    wanted = {normalize_section(section) for section in sections}
+    return sorted(vector_id for section, vector_ids in section_map.items() if section_matches(section, wanted)
+                  for vector_id in vector_ids)
+
+
+def save_section_map(vectorstore_path: str, section_map: Dict[str, List[int]]) -> None:
+    """Write the section -> FAISS id map next to the saved index"""
+    with open(os.path.join(vectorstore_path, SECTION_MAP_FILE), "w") as f:
+        json.dump(section_map, f)
+
+
+def load_section_map(vectorstore_path: str) -> Optional[Dict[str, List[int]]]:
+    """The section map saved at ingest, or None for vectorstores built before sections were tracked"""
+    path = os.path.join(vectorstore_path, SECTION_MAP_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def section_search_params(vectorstore_path: str, sections: Optional[List[str]]) -> Optional[faiss.SearchParameters]:
+    """
+    FAISS search parameters restricting a search to the vectors of the given sections.
+
+    Returns None (search everything) when no sections were requested or the
+    vectorstore has no section map.
+    """
+    if not sections:
+        return None
+    section_map = load_section_map(vectorstore_path)
+    if section_map is None:
+        logger.warning(f"{vectorstore_path} has no section map, searching all sections")
+        return None
+    ids = np.array(section_ids(section_map, sections), dtype=np.int64)
+    return faiss.SearchParameters(sel=faiss.IDSelectorBatch(ids))
+
+
+def search_by_vector(vectorstore, query_vector: np.ndarray, k: int, params: Optional[faiss.SearchParameters] = None) -> List[Any]:
+    """Top-k documents for a query vector, optionally restricted by FAISS search parameters"""
+    return [document for document, _ in search_by_vector_with_scores(vectorstore, query_vector, k, params)]
+
+
+def search_by_vector_with_scores(vectorstore, query_vector: np.ndarray, k: int, params: Optional[faiss.SearchParameters] = None) -> List[Tuple[Any, float]]:
+    """(document, distance) pairs of search_by_vector, closest first"""
+    query = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+    if params is None:
+        distances, ids = vectorstore.index.search(query, k)
+    else:
+        distances, ids = vectorstore.index.search(query, k, params=params)
+    return [
+        (vectorstore.docstore.search(vectorstore.index_to_docstore_id[int(vector_id)]), float(distance))
+        for vector_id, distance in zip(ids[0], distances[0]) if vector_id >= 0
+    ]
@@ -0,0 +1,33 @@
+from flask import Blueprint, request, jsonify, send_file
+
+from http_utils import RequestProfiler
+from http_utils.class_RequestProfiler import ARTIFACTS
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.before_request
+def require_admin_token():
+    # Without a configured token the admin endpoints do not exist
+    if not RequestProfiler().authorized(request):
+        return jsonify({'error': 'Not found'}), 404
+
+@admin_bp.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    """Stored request profiles, newest first, and the profiler's counters"""
+    profiler = RequestProfiler()
+    return jsonify({'profiles': profiler.list_profiles(), 'stats': profiler.stats()}), 200
+
+@admin_bp.route('/admin/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    profile = RequestProfiler().get_profile(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return jsonify(profile), 200
+
+@admin_bp.route('/admin/profiles/<profile_id>/<artifact>', methods=['GET'])
+def download_profile_artifact(profile_id, artifact):
+    """profile.prof (load with pstats or snakeviz), profile.txt, stacks.txt (collapsed stacks), allocations.txt"""
+    path = RequestProfiler().artifact_path(profile_id, artifact)
+    if path is None:
+        return jsonify({'error': 'Artifact not found'}), 404
+    return send_file(path, mimetype=ARTIFACTS[artifact], as_attachment=True, download_name=f"{profile_id}-{artifact}")
@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify
 from document_library_database import DocumentLibraryManager
+from http_utils import conditional_json
+from sharding import ShardRouter
 
 collection_bp = Blueprint('collections', __name__)
 
@@ -29,7 +31,8 @@ def create_collection():
         collection_id = DocumentLibraryManager.create_collection(
             name=name, 
             description=description or None,  # Convert empty string to None
-            created_by=created_by
+            created_by=created_by,
+            collection_id=ShardRouter().assigned_id()
         )
         
         # Return created collection details
@@ -55,10 +58,10 @@ def list_collections():
         include_inactive = request.args.get('include_inactive', 'false').lower() == 'true'
         collections = DocumentLibraryManager.get_all_collections(include_inactive=include_inactive)
         
-        return jsonify({
+        return conditional_json({
             'collections': collections,
             'count': len(collections)
-        }), 200
+        })
         
     except Exception as e:
         print(f"Error fetching collections: {str(e)}")
@@ -171,31 +174,25 @@ def add_document_to_collection(collection_id):
         if not document_id:
             return jsonify({'error': 'document_id is required'}), 400
         
-        # Check if collection exists
-        collection = DocumentLibraryManager.get_collection_by_id(collection_id)
-        if not collection:
-            return jsonify({'error': 'Collection not found'}), 404
-        
-        # Check if document exists
-        document = DocumentLibraryManager.get_document_by_id(document_id)
-        if not document:
-            return jsonify({'error': 'Document not found'}), 404
-        
-        # Add document to collection
-        success = DocumentLibraryManager.add_document_to_collection(
-            document_id=document_id,
+        # Existence checks and insert share one connection
+        results = DocumentLibraryManager.bulk_add_documents_to_collection(
             collection_id=collection_id,
+            document_ids=[document_id],
             added_by=added_by
         )
+        if results is None:
+            return jsonify({'error': 'Collection not found'}), 404
         
-        if success:
-            return jsonify({
-                'message': 'Document added to collection successfully'
-            }), 201
-        else:
+        status = results[0]['status']
+        if status == 'document_not_found':
+            return jsonify({'error': 'Document not found'}), 404
+        if status == 'already_in_collection':
             return jsonify({
                 'error': 'Document is already in this collection'
             }), 409
+        return jsonify({
+            'message': 'Document added to collection successfully'
+        }), 201
         
     except Exception as e:
         print(f"Error adding document to collection: {str(e)}")
@@ -223,6 +220,116 @@ def remove_document_from_collection(collection_id, document_id):
         print(f"Error removing document from collection: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+def _get_document_ids(data):
+    """Validated list of integer document ids from a bulk request body, or None"""
+    document_ids = data.get('document_ids')
+    if not isinstance(document_ids, list) or not document_ids:
+        return None
+    if not all(isinstance(document_id, int) and not isinstance(document_id, bool) for document_id in document_ids):
+        return None
+    return document_ids
+
+def _summarize(results):
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    return summary
+
+@collection_bp.route('/collections/<int:collection_id>/documents/bulk_add', methods=['POST'])
+def bulk_add_documents_to_collection(collection_id):
+    """Add many documents to a collection in one transaction"""
+    try:
+        if not request.is_json:
+            return jsonify({'error': 'Content-Type must be application/json'}), 400
+        
+        data = request.get_json()
+        document_ids = _get_document_ids(data)
+        if document_ids is None:
+            return jsonify({'error': 'document_ids must be a non-empty list of integers'}), 400
+        
+        results = DocumentLibraryManager.bulk_add_documents_to_collection(
+            collection_id=collection_id,
+            document_ids=document_ids,
+            added_by=data.get('added_by')
+        )
+        if results is None:
+            return jsonify({'error': 'Collection not found'}), 404
+        
+        return jsonify({
+            'collection_id': collection_id,
+            'results': results,
+            'summary': _summarize(results)
+        }), 200
+        
+    except Exception as e:
+        print(f"Error bulk adding documents to collection {collection_id}: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@collection_bp.route('/collections/<int:collection_id>/documents/bulk_remove', methods=['POST', 'DELETE'])
+def bulk_remove_documents_from_collection(collection_id):
+    """Remove many documents from a collection in one transaction"""
+    try:
+        if not request.is_json:
+            return jsonify({'error': 'Content-Type must be application/json'}), 400
+        
+        document_ids = _get_document_ids(request.get_json())
+        if document_ids is None:
+            return jsonify({'error': 'document_ids must be a non-empty list of integers'}), 400
+        
+        results = DocumentLibraryManager.bulk_remove_documents_from_collection(
+            collection_id=collection_id,
+            document_ids=document_ids
+        )
+        
+        return jsonify({
+            'collection_id': collection_id,
+            'results': results,
+            'summary': _summarize(results)
+        }), 200
+        
+    except Exception as e:
+        print(f"Error bulk removing documents from collection {collection_id}: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@collection_bp.route('/collections/documents/bulk_move', methods=['POST'])
+def bulk_move_documents():
+    """Move many documents from one collection to another in one transaction"""
+    try:
+        if not request.is_json:
+            return jsonify({'error': 'Content-Type must be application/json'}), 400
+        
+        data = request.get_json()
+        document_ids = _get_document_ids(data)
+        if document_ids is None:
+            return jsonify({'error': 'document_ids must be a non-empty list of integers'}), 400
+        
+        source_collection_id = data.get('source_collection_id')
+        target_collection_id = data.get('target_collection_id')
+        if not isinstance(source_collection_id, int) or not isinstance(target_collection_id, int):
+            return jsonify({'error': 'source_collection_id and target_collection_id are required'}), 400
+        if source_collection_id == target_collection_id:
+            return jsonify({'error': 'Source and target collections must differ'}), 400
+        
+        results = DocumentLibraryManager.bulk_move_documents(
+            source_collection_id=source_collection_id,
+            target_collection_id=target_collection_id,
+            document_ids=document_ids,
+            added_by=data.get('added_by')
+        )
+        if results is None:
+            return jsonify({'error': 'Target collection not found'}), 404
+        
+        return jsonify({
+            'source_collection_id': source_collection_id,
+            'target_collection_id': target_collection_id,
+            'results': results,
+            'summary': _summarize(results)
+        }), 200
+        
+    except Exception as e:
+        print(f"Error moving documents between collections: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @collection_bp.route('/collections/<int:collection_id>/documents', methods=['GET'])
 def get_collection_documents(collection_id):
     """Get all documents in a collection"""
@@ -234,12 +341,12 @@ def get_collection_documents(collection_id):
         
         documents = DocumentLibraryManager.get_documents_by_collection(collection_id)
         
-        return jsonify({
+        return conditional_json({
             'collection_id': collection_id,
             'collection_name': collection['name'],
             'documents': documents,
             'count': len(documents)
-        }), 200
+        })
         
     except Exception as e:
         print(f"Error fetching documents for collection {collection_id}: {str(e)}")
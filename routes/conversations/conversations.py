@@ -0,0 +1,64 @@
+from flask import Blueprint, request, jsonify
+
+from document_library_database import DocumentLibraryManager
+from conversations import SessionStore, answer_turn
+from http_utils import overloaded_response
+from routes.query_collective_bargaining_agreement.query_collective_bargaining_agreement import parse_retrieval_params
+
+conversation_bp = Blueprint('conversations', __name__)
+
+@conversation_bp.route('/conversations', methods=['POST'])
+def create_conversation():
+    """Start a session on a document; retrieval parameters apply to every turn"""
+    data = request.get_json() or {}
+    selected_document = data.get('document') or {}
+    try:
+        document_db_record = DocumentLibraryManager.get_document_by_id(selected_document['id'])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    if document_db_record is None or document_db_record['processing_status'] == 'deleted':
+        return jsonify({'error': 'Document not found'}), 404
+
+    retrieval_params, error = parse_retrieval_params(data)
+    if error:
+        return jsonify({'error': error}), 400
+
+    session = SessionStore().create(document_db_record, retrieval_params)
+    return jsonify(session.summary()), 201
+
+@conversation_bp.route('/conversations/<session_id>/query', methods=['POST'])
+def query_conversation(session_id):
+    data = request.get_json() or {}
+    prompt = data.get('prompt')
+    if not prompt:
+        return jsonify({'error': 'No prompt provided'}), 400
+    session = SessionStore().get(session_id)
+    if session is None:
+        return jsonify({'error': 'Conversation not found or expired'}), 404
+
+    answer, savings = answer_turn(session, prompt, use_financial_facts=data.get('use_financial_facts', True))
+    if answer.get('error_type') == 'overloaded':
+        return overloaded_response(answer['retry_after'])
+    return jsonify({
+        'answer': answer,
+        'savings': savings,
+        'session_totals': session.totals
+    }), 200
+
+@conversation_bp.route('/conversations/<session_id>', methods=['GET'])
+def get_conversation(session_id):
+    session = SessionStore().get(session_id)
+    if session is None:
+        return jsonify({'error': 'Conversation not found or expired'}), 404
+    return jsonify(session.summary()), 200
+
+@conversation_bp.route('/conversations/<session_id>', methods=['DELETE'])
+def delete_conversation(session_id):
+    if not SessionStore().delete(session_id):
+        return jsonify({'error': 'Conversation not found or expired'}), 404
+    return jsonify({'message': 'Conversation deleted successfully'}), 200
+
+@conversation_bp.route('/conversations/stats', methods=['GET'])
+def conversation_stats():
+    """Live sessions and what reuse has saved across them"""
+    return jsonify(SessionStore().stats()), 200
@@ -0,0 +1,58 @@
+from flask import Blueprint, request, jsonify
+
+from document_library_database import EmbeddingMigrationManager
+from embedding_migration import EmbeddingMigrator
+
+embedding_migration_bp = Blueprint('embedding_migrations', __name__)
+
+@embedding_migration_bp.route('/embedding_migrations', methods=['POST'])
+def start_embedding_migration():
+    """Re-embed every live document with target_model in the background, at most chunks_per_second"""
+    data = request.get_json() or {}
+    target_model = data.get('target_model')
+    if not target_model:
+        return jsonify({'error': 'No target_model provided'}), 400
+    chunks_per_second = data.get('chunks_per_second')
+    if chunks_per_second is not None:
+        try:
+            chunks_per_second = float(chunks_per_second)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'chunks_per_second must be a number'}), 400
+        if chunks_per_second < 0:
+            return jsonify({'error': 'chunks_per_second must not be negative'}), 400
+    try:
+        return jsonify(EmbeddingMigrator().start_migration(target_model, chunks_per_second)), 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        print(f"Error starting embedding migration: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@embedding_migration_bp.route('/embedding_migrations', methods=['GET'])
+def list_embedding_migrations():
+    migrator = EmbeddingMigrator()
+    return jsonify({'migrations': [
+        migrator.progress(migration['id']) for migration in EmbeddingMigrationManager().list_migrations()
+    ]}), 200
+
+@embedding_migration_bp.route('/embedding_migrations/<int:migration_id>', methods=['GET'])
+def get_embedding_migration(migration_id):
+    """Progress, throughput and ETA; ?items=true adds the per-vectorstore items"""
+    progress = EmbeddingMigrator().progress(migration_id)
+    if progress is None:
+        return jsonify({'error': 'Migration not found'}), 404
+    if request.args.get('items', 'false').lower() == 'true':
+        progress['item_details'] = EmbeddingMigrationManager().get_items(migration_id)
+    return jsonify(progress), 200
+
+@embedding_migration_bp.route('/embedding_migrations/<int:migration_id>/<action>', methods=['POST'])
+def change_embedding_migration(migration_id, action):
+    migrator = EmbeddingMigrator()
+    actions = {'pause': migrator.pause, 'resume': migrator.resume, 'cancel': migrator.cancel}
+    if action not in actions:
+        return jsonify({'error': f"Unknown action '{action}'; use pause, resume or cancel"}), 404
+    if EmbeddingMigrationManager().get_migration(migration_id) is None:
+        return jsonify({'error': 'Migration not found'}), 404
+    if not actions[action](migration_id):
+        return jsonify({'error': f'Migration cannot {action} from its current status'}), 409
+    return jsonify(migrator.progress(migration_id)), 200
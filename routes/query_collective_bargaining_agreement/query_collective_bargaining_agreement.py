@@ -1,29 +1,330 @@
+import os
+import time
+import uuid
+import threading
+from datetime import date
+
 from flask import Blueprint, request, jsonify
 
 from document_library_database.class_DocumentLibraryManager import DocumentLibraryManager
-from union_steward_mode import steward_rag_query
+from retrieval import rag_query, map_reduce_query, period_query, select_filings, collection_query, QueryEmbeddingCache, RetrievalClient, DegradationStats, IssuerIndexes
+from financial_facts import answer_from_financial_facts
+from http_utils import overloaded_response
 
 query_cba_bp = Blueprint('query_cba', __name__)
 
+# Cancellation events of running map-reduce queries, by job id
+MAX_MAP_REDUCE_PARALLEL = 16
+_map_reduce_jobs = {}
+_map_reduce_jobs_lock = threading.Lock()
+
+# Time budgets when the client sends no deadline_ms; map-reduce reads the whole filing
+DEFAULT_DEADLINE_MS = float(os.getenv("QUERY_DEADLINE_MS", "30000"))
+DEFAULT_MAP_REDUCE_DEADLINE_MS = float(os.getenv("QUERY_MAP_REDUCE_DEADLINE_MS", "120000"))
+# Filings one filing-history question may span
+MAX_FILINGS_PER_QUERY = int(os.getenv("QUERY_MAX_FILINGS", "40"))
+MAX_FILING_SEARCH_PARALLEL = 16
+
+def parse_deadline_ms(data, default_ms):
+    """(deadline_ms, None) from a request body, or (None, error message)"""
+    try:
+        deadline_ms = float(data.get('deadline_ms', default_ms))
+    except (TypeError, ValueError):
+        return None, 'deadline_ms must be a number'
+    if deadline_ms <= 0:
+        return None, 'deadline_ms must be positive'
+    return deadline_ms, None
+
+def _elapsed_ms(started):
+    return round((time.monotonic() - started) * 1000, 2)
+
+def parse_retrieval_params(data):
+    """(params for rag_query/retrieve, None) from a request body, or (None, error message)"""
+    search_type = data.get('search_type', 'similarity')
+    if search_type not in ('similarity', 'mmr'):
+        return None, "search_type must be 'similarity' or 'mmr'"
+    try:
+        k = int(data.get('k', 4))
+        fetch_k = int(data.get('fetch_k', 20))
+        lambda_mult = float(data.get('lambda_mult', 0.5))
+    except (TypeError, ValueError):
+        return None, 'k and fetch_k must be integers and lambda_mult a number'
+    if k <= 0 or fetch_k < k or not (0.0 <= lambda_mult <= 1.0):
+        return None, 'Require 0 < k <= fetch_k and 0 <= lambda_mult <= 1'
+    sections = data.get('sections')
+    if sections is not None and (not isinstance(sections, list) or not all(isinstance(s, str) for s in sections)):
+        return None, "sections must be a list of item labels such as ['1A', '7'] or ['I-2']"
+    return {
+        'k': k,
+        'search_type': search_type,
+        'fetch_k': fetch_k,
+        'lambda_mult': lambda_mult,
+        'sections': sections
+    }, None
+
 @query_cba_bp.route('/query_collective_bargaining_agreement', methods=['POST'])
 def query_collective_bargaining_agreement():
+    """
+    Answer a question about one document within deadline_ms (default
+    QUERY_DEADLINE_MS), measured from arrival. Document lookup, index load,
+    retrieval and generation share that budget; when it runs low the answer
+    degrades to a cheaper model or to the retrieved passages, and the response
+    says which under 'degradation'.
+    """
+    started = time.monotonic()
     data = request.get_json()
     prompt = data.get('prompt')
     selected_document = data.get('document')
+    mode = data.get('mode', 'rag')
+    deadline_ms, error = parse_deadline_ms(data, DEFAULT_MAP_REDUCE_DEADLINE_MS if mode == 'map_reduce' else DEFAULT_DEADLINE_MS)
+    if error:
+        return jsonify({'error': error}), 400
+    deadline = started + deadline_ms / 1000
     try:
         document_db_record = DocumentLibraryManager.get_document_by_id(selected_document['id'])
     except Exception as e:
         return jsonify({'error': str(e)}), 400
+    timings = {'lookup_ms': _elapsed_ms(started)}
+    if document_db_record is None or document_db_record['processing_status'] == 'deleted':
+        return jsonify({'error': 'Document not found'}), 404
     vectorstore_path = document_db_record['vectorstore_path']
     if not prompt:
         return jsonify({'error': 'No prompt provided'}), 400
 
-    answer = steward_rag_query(
+    retrieval_params, error = parse_retrieval_params(data)
+    if error:
+        return jsonify({'error': error}), 400
+
+    if mode not in ('rag', 'map_reduce'):
+        return jsonify({'error': "mode must be 'rag' or 'map_reduce'"}), 400
+    if time.monotonic() >= deadline:
+        DegradationStats().record('deadline_exceeded', timings, deadline_ms)
+        return jsonify({'error': 'Deadline exceeded before retrieval', 'degradation': 'deadline_exceeded'}), 504
+    if mode == 'map_reduce':
+        return _map_reduce(data, prompt, document_db_record, retrieval_params['sections'], deadline, deadline_ms, timings)
+
+    # Metric lookups are answered from the facts extracted at ingest when one matches
+    if data.get('use_financial_facts', True):
+        answer = answer_from_financial_facts(document_db_record['id'], prompt)
+        if answer is not None:
+            timings['financial_facts_ms'] = round(_elapsed_ms(started) - timings['lookup_ms'], 2)
+            DegradationStats().record(None, timings, deadline_ms)
+            return jsonify({"answer": {**answer, "degradation": None, "timings_ms": timings}}), 200
+
+    answer = rag_query(
         query=prompt,
-        vectorstore_path=vectorstore_path
+        vectorstore_path=vectorstore_path,
+        embedding_model=document_db_record.get('embedding_model'),
+        deadline=deadline,
+        **retrieval_params
     )
-    
+    if answer.get('error_type') == 'overloaded':
+        return overloaded_response(answer['retry_after'])
+
+    answer['timings_ms'] = {**timings, **answer.get('timings_ms', {}), 'total_ms': _elapsed_ms(started)}
+    DegradationStats().record(answer.get('degradation'), answer['timings_ms'], deadline_ms)
     results = {
         "answer": answer
     }
     return jsonify(results), 200
+
+def _map_reduce(data, prompt, document_db_record, sections, deadline, deadline_ms, timings):
+    """
+    Whole-document answer; the client may pass job_id to cancel it while it runs.
+    Reaching the deadline returns the partial answers gathered so far. A job_id
+    starting with "<document id>-" lets a sharded deployment send the cancel
+    straight to the node running the job instead of asking every node.
+    """
+    try:
+        group_token_budget = int(data.get('group_token_budget', 6000))
+        max_parallel = min(int(data.get('max_parallel', 4)), MAX_MAP_REDUCE_PARALLEL)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'group_token_budget and max_parallel must be integers'}), 400
+    if group_token_budget < 500 or max_parallel < 1:
+        return jsonify({'error': 'Require group_token_budget >= 500 and max_parallel >= 1'}), 400
+
+    job_id = str(data.get('job_id') or f"{document_db_record['id']}-{uuid.uuid4().hex}")
+    cancel_event = threading.Event()
+    with _map_reduce_jobs_lock:
+        if job_id in _map_reduce_jobs:
+            return jsonify({'error': f'Job {job_id} is already running'}), 409
+        _map_reduce_jobs[job_id] = cancel_event
+    try:
+        answer = map_reduce_query(
+            query=prompt,
+            vectorstore_path=document_db_record['vectorstore_path'],
+            embedding_model=document_db_record.get('embedding_model'),
+            sections=sections,
+            group_token_budget=group_token_budget,
+            max_parallel=max_parallel,
+            deadline=deadline,
+            cancel_event=cancel_event
+        )
+    finally:
+        with _map_reduce_jobs_lock:
+            _map_reduce_jobs.pop(job_id, None)
+    if answer.get('error_type') == 'overloaded':
+        return overloaded_response(answer.get('retry_after', 1))
+    if answer['cancelled'] and not cancel_event.is_set():
+        answer['degradation'] = 'partial_answers' if answer['success'] else 'deadline_exceeded'
+    else:
+        answer['degradation'] = None
+    DegradationStats().record(answer['degradation'], {**timings, **answer['timings_ms']}, deadline_ms)
+    return jsonify({"answer": answer, "job_id": job_id}), 200
+
+@query_cba_bp.route('/query_collective_bargaining_agreement/<job_id>/cancel', methods=['POST'])
+def cancel_map_reduce(job_id):
+    """Stop a running map-reduce query from starting further calls; it returns what it has"""
+    with _map_reduce_jobs_lock:
+        cancel_event = _map_reduce_jobs.get(job_id)
+    if cancel_event is None:
+        return jsonify({'error': 'No running job with that id'}), 404
+    cancel_event.set()
+    return jsonify({'message': 'Cancellation requested', 'job_id': job_id}), 200
+
+@query_cba_bp.route('/query_filing_history', methods=['POST'])
+def query_filing_history():
+    """
+    Answer a question across one issuer's filings, e.g. how guidance changed
+    over the last 8 quarters. Filings are selected by employer and an optional
+    period_start/period_end (ISO dates), or the last_n most recent; the answer
+    is grouped by period. With sharding the filings are looked up and searched
+    on every node. Shares the deadline handling of the document query.
+    """
+    started = time.monotonic()
+    data = request.get_json() or {}
+    prompt = data.get('prompt')
+    employer = (data.get('employer') or '').strip()
+    if not prompt or not employer:
+        return jsonify({'error': 'prompt and employer are required'}), 400
+    try:
+        period_start = date.fromisoformat(data['period_start']).isoformat() if data.get('period_start') else None
+        period_end = date.fromisoformat(data['period_end']).isoformat() if data.get('period_end') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'period_start and period_end must be dates (YYYY-MM-DD)'}), 400
+    try:
+        last_n = int(data['last_n']) if data.get('last_n') is not None else None
+        max_parallel = min(int(data.get('max_parallel', 4)), MAX_FILING_SEARCH_PARALLEL)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'last_n and max_parallel must be integers'}), 400
+    if (last_n is not None and last_n <= 0) or max_parallel < 1:
+        return jsonify({'error': 'Require last_n > 0 and max_parallel >= 1'}), 400
+    retrieval_params, error = parse_retrieval_params(data)
+    if error:
+        return jsonify({'error': error}), 400
+    deadline_ms, error = parse_deadline_ms(data, DEFAULT_DEADLINE_MS)
+    if error:
+        return jsonify({'error': error}), 400
+    deadline = started + deadline_ms / 1000
+
+    try:
+        filings, failed_nodes = select_filings(
+            employer, period_start, period_end, limit=last_n or MAX_FILINGS_PER_QUERY + 1,
+            timeout=max(0.001, deadline - time.monotonic()))
+    except Exception as e:
+        print(f"Error selecting filings: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+    if not filings and failed_nodes:
+        return jsonify({'error': 'Shard node unavailable', 'nodes': failed_nodes}), 503
+    if not filings:
+        return jsonify({'error': 'No filings of that employer in that period'}), 404
+    if len(filings) > MAX_FILINGS_PER_QUERY:
+        return jsonify({'error': f'More than {MAX_FILINGS_PER_QUERY} filings match; narrow the period or set last_n'}), 400
+    timings = {'lookup_ms': _elapsed_ms(started)}
+
+    answer = period_query(
+        query=prompt,
+        filings=filings,
+        k=retrieval_params['k'],
+        sections=retrieval_params['sections'],
+        max_parallel=max_parallel,
+        deadline=deadline
+    )
+    if answer.get('error_type') == 'overloaded':
+        return overloaded_response(answer['retry_after'])
+    if failed_nodes and answer.get('degradation') is None:
+        # Filings on nodes that could not be asked are missing from the answer
+        answer['degradation'] = 'partial_shards'
+    answer['timings_ms'] = {**timings, **answer['timings_ms'], 'total_ms': _elapsed_ms(started)}
+    DegradationStats().record(answer.get('degradation'), answer['timings_ms'], deadline_ms)
+    return jsonify({"answer": answer}), 200
+
+@query_cba_bp.route('/query_collection', methods=['POST'])
+def query_collection():
+    """
+    Answer a question from the most relevant chunks of every document in a
+    collection. With sharding the search runs on all nodes and the k closest
+    chunks overall are used. Shares the deadline handling of the document query.
+    """
+    started = time.monotonic()
+    data = request.get_json() or {}
+    prompt = data.get('prompt')
+    collection_id = data.get('collection_id')
+    if not prompt or isinstance(collection_id, bool) or not isinstance(collection_id, int):
+        return jsonify({'error': 'prompt and collection_id are required'}), 400
+    retrieval_params, error = parse_retrieval_params(data)
+    if error:
+        return jsonify({'error': error}), 400
+    if retrieval_params['search_type'] != 'similarity':
+        return jsonify({'error': "Collection queries support search_type 'similarity' only"}), 400
+    deadline_ms, error = parse_deadline_ms(data, DEFAULT_DEADLINE_MS)
+    if error:
+        return jsonify({'error': error}), 400
+    deadline = started + deadline_ms / 1000
+
+    try:
+        collection = DocumentLibraryManager.get_collection_by_id(collection_id)
+    except Exception as e:
+        print(f"Error fetching collection {collection_id}: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+    if not collection or not collection['is_active']:
+        return jsonify({'error': 'Collection not found'}), 404
+    timings = {'lookup_ms': _elapsed_ms(started)}
+
+    answer = collection_query(
+        query=prompt,
+        collection_id=collection_id,
+        k=retrieval_params['k'],
+        sections=retrieval_params['sections'],
+        deadline=deadline
+    )
+    if answer.get('error_type') == 'overloaded':
+        return overloaded_response(answer['retry_after'])
+    answer['timings_ms'] = {**timings, **answer['timings_ms'], 'total_ms': _elapsed_ms(started)}
+    DegradationStats().record(answer.get('degradation'), answer['timings_ms'], deadline_ms)
+    return jsonify({"answer": answer}), 200
+
+@query_cba_bp.route('/issuer_indexes', methods=['POST'])
+def build_issuer_index():
+    """Build an issuer's combined index now instead of waiting for it to become hot"""
+    employer = ((request.get_json() or {}).get('employer') or '').strip()
+    if not employer:
+        return jsonify({'error': 'No employer provided'}), 400
+    try:
+        meta = IssuerIndexes().build(employer)
+    except Exception as e:
+        print(f"Error building issuer index: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+    if meta is None:
+        return jsonify({'error': 'No filings of that employer'}), 404
+    return jsonify({key: value for key, value in meta.items() if key != 'ranges'}), 200
+
+@query_cba_bp.route('/issuer_indexes/stats', methods=['GET'])
+def issuer_index_stats():
+    """Hot issuers, loaded combined indexes and how often queries were served from them"""
+    return jsonify(IssuerIndexes().stats()), 200
+
+@query_cba_bp.route('/query_embedding_cache/stats', methods=['GET'])
+def query_embedding_cache_stats():
+    """Hit ratio and latency saved by the shared query embedding cache"""
+    return jsonify(QueryEmbeddingCache().stats()), 200
+
+@query_cba_bp.route('/query_deadlines/stats', methods=['GET'])
+def query_deadline_stats():
+    """How often queries were answered in full or degraded, by path, and where their time went"""
+    return jsonify(DegradationStats().stats()), 200
+
+@query_cba_bp.route('/retrieval/stats', methods=['GET'])
+def retrieval_stats():
+    """Whether queries go to the retrieval server and how often they fell back to in-process search"""
+    return jsonify(RetrievalClient().stats()), 200
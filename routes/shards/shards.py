@@ -0,0 +1,116 @@
+import orjson
+from flask import Blueprint, request, jsonify
+
+from document_library_database import ShardStateManager
+from retrieval import search_collection_shard, find_filings_shard, search_filings_shard
+from sharding import ShardRouter
+
+shard_bp = Blueprint('shards', __name__)
+
+@shard_bp.before_request
+def require_node_token():
+    """Everything here but the stats is for other nodes and operators holding SHARD_TOKEN"""
+    if request.endpoint != 'shards.shard_stats' and not ShardRouter().authorized(request):
+        return jsonify({'error': 'Not found'}), 404
+
+@shard_bp.route('/shards/nodes', methods=['POST'])
+def add_node():
+    """Add a node to the ring of every node; documents it now owns move to it in the background"""
+    url = ((request.get_json(silent=True) or {}).get('url') or '').strip()
+    if not url.startswith(('http://', 'https://')):
+        return jsonify({'error': 'url must be the base URL of the new node'}), 400
+    try:
+        return jsonify(ShardRouter().add_node(url)), 200
+    except Exception as e:
+        print(f"Error adding shard node: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@shard_bp.route('/shards/ring', methods=['POST'])
+def update_ring():
+    data = request.get_json(silent=True) or {}
+    nodes = data.get('nodes')
+    if not isinstance(nodes, list) or not nodes or not all(isinstance(node, str) for node in nodes):
+        return jsonify({'error': 'nodes must be a non-empty list of URLs'}), 400
+    try:
+        ShardRouter().apply_nodes(nodes, source=data.get('source'))
+    except Exception as e:
+        print(f"Error updating shard ring: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+    return jsonify({'nodes': ShardRouter().ring.nodes}), 200
+
+@shard_bp.route('/shards/documents', methods=['POST'])
+def receive_document():
+    """A document handed over by its previous owner: its rows as JSON and its vectorstore as a tar file"""
+    try:
+        bundle = orjson.loads(request.form['bundle'])
+    except (KeyError, orjson.JSONDecodeError):
+        return jsonify({'error': 'bundle is required'}), 400
+    archive = request.files.get('vectorstore')
+    try:
+        document_id = ShardRouter().receive_document(bundle, archive.stream if archive else None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error receiving document: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+    return jsonify({'document_id': document_id}), 200
+
+@shard_bp.route('/shards/search', methods=['POST'])
+def shard_search():
+    """This node's top k chunks of a collection search"""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get('collection_id'), int) or not data.get('query'):
+        return jsonify({'error': 'query and collection_id are required'}), 400
+    try:
+        return jsonify(search_collection_shard(data)), 200
+    except Exception as e:
+        print(f"Error searching collection shard: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@shard_bp.route('/shards/filings', methods=['POST'])
+def shard_filings():
+    """This node's filings of an issuer and period"""
+    data = request.get_json(silent=True) or {}
+    if not data.get('employer'):
+        return jsonify({'error': 'employer is required'}), 400
+    try:
+        return jsonify(find_filings_shard(data)), 200
+    except Exception as e:
+        print(f"Error selecting shard filings: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@shard_bp.route('/shards/filing_search', methods=['POST'])
+def shard_filing_search():
+    """The top k chunks of each of this node's filings in a filing-history search"""
+    data = request.get_json(silent=True) or {}
+    if not data.get('query') or not isinstance(data.get('filings_by_node'), dict):
+        return jsonify({'error': 'query and filings_by_node are required'}), 400
+    try:
+        return jsonify(search_filings_shard(data)), 200
+    except Exception as e:
+        print(f"Error searching shard filings: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@shard_bp.route('/shards/collections', methods=['GET'])
+def export_collections():
+    """Collection rows for a joining node"""
+    return jsonify({'collections': ShardStateManager().export_collections()}), 200
+
+@shard_bp.route('/shards/rebalance', methods=['POST'])
+def rebalance():
+    """Move documents this node no longer owns now instead of waiting for the background retry"""
+    try:
+        return jsonify(ShardRouter().rebalance()), 200
+    except Exception as e:
+        print(f"Error rebalancing shards: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@shard_bp.route('/shards/owner/<int:document_id>', methods=['GET'])
+def document_owner(document_id):
+    router = ShardRouter()
+    return jsonify({'document_id': document_id, 'owner': router.owner(document_id), 'previous_owner': router.previous_owner(document_id)}), 200
+
+@shard_bp.route('/shards/stats', methods=['GET'])
+def shard_stats():
+    """Ring membership, how requests were routed and rebalancing progress"""
+    return jsonify(ShardRouter().stats()), 200
\ No newline at end of file
@@ -0,0 +1,156 @@
+import re
+import math
+from functools import lru_cache
+from typing import List, Optional, Iterable, Tuple, Dict
+
+import numpy as np
+import tiktoken
+from langchain_core.documents import Document
+
+DEFAULT_ENCODING = "cl100k_base"
+
+# Boundary strengths, weakest first; the regex match ends where the next chunk may begin
+SENTENCE, LINE, PARAGRAPH = 1, 2, 3
+_BOUNDARIES = [
+    (SENTENCE, re.compile(r"[.!?;][\"')\]]*(?=[ \t])")),
+    (LINE, re.compile(r"(?=\n)")),
+    (PARAGRAPH, re.compile(r"(?=\n[ \t]*\n)")),
+]
+
+
+@lru_cache(maxsize=None)
+def get_encoding(embedding_model: Optional[str] = None) -> tiktoken.Encoding:
+    """Tokenizer of an OpenAI embedding model (cl100k_base when the model is unknown)"""
+    if embedding_model:
+        try:
+            return tiktoken.encoding_for_model(embedding_model)
+        except KeyError:
+            pass
+    return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+
+@lru_cache(maxsize=8)
+def _token_byte_lengths(encoding: tiktoken.Encoding) -> np.ndarray:
+    """Byte length of every token id of an encoding (0 for unused ids)"""
+    lengths = np.zeros(encoding.n_vocab, dtype=np.int64)
+    for token in range(encoding.n_vocab):
+        try:
+            lengths[token] = len(encoding.decode_single_token_bytes(token))
+        except KeyError:
+            pass
+    return lengths
+
+
+class TokenAwareTextSplitter:
+    """
+    Split text into chunks of at most chunk_size tokens, overlapping by about chunk_overlap tokens.
+
+    Each text is tokenized once. Paragraph, line and sentence boundaries are
+    found with one regex scan each and mapped onto token positions. Chunk sizes
+    are balanced over the text (600 tokens at chunk_size 256 give three chunks
+    of about 220, not 256, 256 and 88), and a chunk ends at the boundary in the
+    back half of its window closest to that size, where each step of strength
+    (sentence < line < paragraph) outweighs 1/32 of a chunk of distance.
+    Without any boundary it ends mid-sentence. The overlap starts at a boundary
+    when one is available. Chunks are slices of the original text, so
+    they can be located with metadata['start_index'].
+
+    Drop-in for RecursiveCharacterTextSplitter's create_documents/split_documents,
+    with chunk_size and chunk_overlap counted in tokens instead of characters.
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int = 0, embedding_model: Optional[str] = None, encoding: Optional[tiktoken.Encoding] = None):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be at least 0 and smaller than chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.encoding = encoding or get_encoding(embedding_model)
+        self.fill_per_strength = max(1, chunk_size // 32)
+
+    def _token_offsets(self, text: str, tokens: np.ndarray) -> np.ndarray:
+        """Character offset at which each token starts, plus len(text) at the end"""
+        if text.isascii():
+            # One byte per character: offsets are the running sum of token byte lengths
+            offsets = np.empty(len(tokens) + 1, dtype=np.int64)
+            offsets[0] = 0
+            np.cumsum(_token_byte_lengths(self.encoding)[tokens], out=offsets[1:])
+            return offsets
+        _, starts = self.encoding.decode_with_offsets(tokens.tolist())
+        return np.array(starts + [len(text)], dtype=np.int64)
+
+    def _boundary_strengths(self, text: str, offsets: np.ndarray) -> np.ndarray:
+        """strengths[i] > 0 when a chunk may end just before token i"""
+        strengths = np.zeros(len(offsets), dtype=np.int8)
+        for strength, pattern in _BOUNDARIES:
+            positions = np.fromiter((match.end() for match in pattern.finditer(text)), dtype=np.int64)
+            if len(positions):
+                # The token containing the boundary character starts the next chunk;
+                # stronger kinds come later and overwrite weaker ones at the same token
+                strengths[np.searchsorted(offsets, positions, side="right") - 1] = strength
+        strengths[0] = 0
+        return strengths
+
+    def split_spans(self, text: str) -> List[Tuple[int, int, int]]:
+        """(start character, end character, token count) of every chunk of text"""
+        tokens = self.encoding.encode_to_numpy(text, disallowed_special=())
+        total = len(tokens)
+        if total == 0:
+            return []
+        offsets = self._token_offsets(text, tokens)
+        strengths = self._boundary_strengths(text, offsets)
+
+        spans = []
+        start = 0
+        while start < total:
+            remaining = total - start
+            if remaining <= self.chunk_size:
+                end = total
+            else:
+                # Spread what is left evenly over the chunks it needs, instead of leaving a short tail
+                count = math.ceil((remaining - self.chunk_overlap) / (self.chunk_size - self.chunk_overlap))
+                target = start + min(self.chunk_size, math.ceil((remaining + (count - 1) * self.chunk_overlap) / count))
+                low = start + max(1, self.chunk_size // 2)
+                end = target
+                window = strengths[low:start + self.chunk_size + 1]
+                candidates = np.flatnonzero(window)
+                if len(candidates):
+                    # Each step of boundary strength is worth 1/32 of a chunk of distance from the target
+                    scores = window[candidates].astype(np.int64) * self.fill_per_strength - np.abs(low + candidates - target)
+                    end = low + int(candidates[np.argmax(scores)])
+            char_start, char_end = int(offsets[start]), int(offsets[end])
+            chunk = text[char_start:char_end]
+            stripped = chunk.strip()
+            if stripped:
+                char_start += len(chunk) - len(chunk.lstrip())
+                spans.append((char_start, char_start + len(stripped), end - start))
+            if end >= total:
+                break
+            next_start = end - self.chunk_overlap
+            if self.chunk_overlap:
+                sentence_starts = np.flatnonzero(strengths[next_start:end])
+                if len(sentence_starts):
+                    next_start += int(sentence_starts[0])
+            start = max(next_start, start + 1)
+        return spans
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end, _ in self.split_spans(text)]
+
+    def create_documents(self, texts: Iterable[str], metadatas: Optional[List[Dict]] = None) -> List[Document]:
+        metadatas = metadatas or [{}] * len(texts)
+        documents = []
+        for text, metadata in zip(texts, metadatas):
+            for start, end, token_count in self.split_spans(text):
+                documents.append(Document(
+                    page_content=text[start:end],
+                    metadata={**metadata, "start_index": start, "token_count": token_count}
+                ))
+        return documents
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        documents = list(documents)
+        return self.create_documents(
+            [document.page_content for document in documents],
+            [document.metadata for document in documents])
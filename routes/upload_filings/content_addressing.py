@@ -0,0 +1,64 @@
+import os
+import json
+import hashlib
+import tempfile
+
+from retrieval import DEFAULT_RESCORE_FACTOR
+
+VECTORSTORE_ROOT = "vectorstore"
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Parameters that change what ends up in the index; anything else may differ between duplicates
+FINGERPRINT_PARAMS = ('splitter', 'chunk_size', 'chunk_overlap', 'embedding_model')
+FINGERPRINT_DEFAULTS = {'splitter': 'sec'}
+# Added after indexes were already fingerprinted: they only count when set to something else,
+# so existing documents keep their fingerprints
+OPTIONAL_FINGERPRINT_PARAMS = {'chunk_unit': 'characters', 'coarse_dimensions': None, 'rescore_factor': DEFAULT_RESCORE_FACTOR}
+
+
+def save_upload(file):
+    """
+    Stream an uploaded file to a temporary path, hashing it on the way.
+
+    Returns a dict with temp_path, file_name, content_hash (sha256 hex) and file_size_bytes.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    extension = os.path.splitext(file.filename)[1].lower()
+    fd, temp_path = tempfile.mkstemp(prefix="upload-", suffix=extension)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = file.stream.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return {
+        "temp_path": temp_path,
+        "file_name": file.filename,
+        "content_hash": digest.hexdigest(),
+        "file_size_bytes": size
+    }
+
+
+def vectorization_fingerprint(vectorization_params):
+    """Short stable hash of the parameters that determine an index's contents"""
+    relevant = {
+        name: vectorization_params.get(name, FINGERPRINT_DEFAULTS.get(name))
+        for name in FINGERPRINT_PARAMS
+    }
+    for name, default in OPTIONAL_FINGERPRINT_PARAMS.items():
+        if vectorization_params.get(name, default) != default:
+            relevant[name] = vectorization_params[name]
+    encoded = json.dumps(relevant, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def content_addressed_vectorstore_path(content_hash, fingerprint):
+    """vectorstore/<first two hash chars>/<content hash>/<parameter fingerprint>"""
+    return f"{VECTORSTORE_ROOT}/{content_hash[:2]}/{content_hash}/{fingerprint}"
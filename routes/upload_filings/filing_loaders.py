@@ -0,0 +1,45 @@
+import os
+from typing import List
+
+from langchain_core.documents import Document
+from langchain_community.document_loaders import PyPDFLoader
+
+from .html_filing_loader import load_html_filing
+
+# DocumentMetadata.file_type (a MIME type) -> loader
+LOADERS_BY_FILE_TYPE = {
+    "application/pdf": "pdf",
+    "text/html": "html",
+    "application/xhtml+xml": "html",
+    "application/xml": "html",
+    "text/xml": "html",
+}
+# Used when the client sent no file type, or a generic one
+LOADERS_BY_EXTENSION = {
+    ".pdf": "pdf",
+    ".htm": "html",
+    ".html": "html",
+    ".xhtml": "html",
+}
+
+
+def select_loader(file_type: str, file_name: str) -> str:
+    """
+    'pdf' or 'html' for an upload, from its MIME type and then its extension.
+
+    Raises ValueError for anything else.
+    """
+    mime_type = (file_type or "").split(";")[0].strip().lower()
+    loader = LOADERS_BY_FILE_TYPE.get(mime_type)
+    if loader is None:
+        loader = LOADERS_BY_EXTENSION.get(os.path.splitext(file_name or "")[1].lower())
+    if loader is None:
+        raise ValueError("Only PDF and HTML/iXBRL files are supported")
+    return loader
+
+
+def load_filing_pages(file_path: str, loader: str) -> List[Document]:
+    """Pages of a filing, each with its 0-based page number in metadata['page']"""
+    if loader == "html":
+        return load_html_filing(file_path)
+    return PyPDFLoader(file_path).load()
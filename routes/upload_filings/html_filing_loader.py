@@ -0,0 +1,249 @@
+import re
+import codecs
+from html.parser import HTMLParser
+from typing import Iterator, List, Optional
+
+from langchain_core.documents import Document
+
+READ_CHUNK_BYTES = 64 * 1024
+# Filings without page breaks are cut at the first block boundary past this many characters
+MAX_PAGE_CHARS = 8000
+
+# Never rendered, or (ix:header) the hidden iXBRL facts, contexts and units
+_SKIPPED_TAGS = {"head", "script", "style", "noscript", "template", "ix:header"}
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+_BLOCK_TAGS = {
+    "p", "div", "br", "li", "ul", "ol", "h1", "h2", "h3", "h4", "h5", "h6",
+    "section", "article", "blockquote", "pre", "center", "hr", "dl", "dt", "dd", "body"
+}
+_HIDDEN_STYLE = re.compile(r"display\s*:\s*none", re.IGNORECASE)
+_BREAK_BEFORE = re.compile(r"(?:page-)?break-before\s*:\s*(?:always|page)", re.IGNORECASE)
+_BREAK_AFTER = re.compile(r"(?:page-)?break-after\s*:\s*(?:always|page)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"[ \t\r\n\f\v\xa0\u200b]+")
+# Running page numbers and "Table of Contents" back-links at the top or bottom of a page
+_PAGE_FURNITURE = re.compile(r"^(?:page\s+)?[-–—]?\s*(?:\d{1,4}|[ivxlc]{1,6})\s*[-–—]?$|^table of contents$", re.IGNORECASE)
+# Table cells that belong to the previous cell: closing parentheses and percent signs
+_TRAILING_CELL = re.compile(r"^[)%]+$")
+
+
+def _strip_furniture(lines: List[str]) -> List[str]:
+    while lines and (not lines[0] or _PAGE_FURNITURE.match(lines[0])):
+        lines.pop(0)
+    while lines and (not lines[-1] or _PAGE_FURNITURE.match(lines[-1])):
+        lines.pop()
+    return lines
+
+
+class _FilingHTMLParser(HTMLParser):
+    """
+    Incremental HTML/iXBRL to text, one page at a time.
+
+    Text is collected line by line; finished pages are queued on self.pages and
+    taken off by the caller after every feed(), so memory stays at roughly one
+    page plus one read chunk whatever the size of the filing.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.pages: List[str] = []
+        self._lines: List[str] = []
+        self._line: List[str] = []
+        self._chars = 0
+        self._skip_tag: Optional[str] = None
+        self._skip_depth = 0
+        self._break_after: List[List] = []
+        self._table_depth = 0
+        self._row: Optional[List[str]] = None
+        self._cell: Optional[List[str]] = None
+
+    def _end_line(self) -> None:
+        text = _WHITESPACE.sub(" ", "".join(self._line)).strip()
+        self._line = []
+        if text:
+            self._lines.append(text)
+            self._chars += len(text) + 1
+
+    def _end_page(self) -> None:
+        self._end_cell()
+        self._end_row()
+        self._end_line()
+        lines = _strip_furniture(self._lines)
+        if lines:
+            self.pages.append("\n".join(lines))
+        self._lines = []
+        self._chars = 0
+
+    def _end_cell(self) -> None:
+        if self._cell is None:
+            return
+        text = _WHITESPACE.sub(" ", "".join(self._cell)).strip()
+        self._cell = None
+        if not text or self._row is None:
+            return
+        if self._row and _TRAILING_CELL.match(text):
+            self._row[-1] += text
+        elif self._row and self._row[-1] in ("$", "(", "$("):
+            self._row[-1] += text
+        else:
+            self._row.append(text)
+
+    def _end_row(self) -> None:
+        if self._row is None:
+            return
+        self._end_cell()
+        if self._row:
+            self._end_line()
+            # One line per row keeps a line item and its values together for the splitter and fact extraction
+            self._lines.append("  ".join(self._row))
+            self._chars += sum(len(cell) + 2 for cell in self._row)
+        self._row = None
+
+    def _block_boundary(self) -> None:
+        if self._row is not None:
+            return
+        self._end_line()
+        if self._chars >= MAX_PAGE_CHARS and self._table_depth == 0:
+            self._end_page()
+
+    def handle_starttag(self, tag, attrs):
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth += 1
+            return
+        attributes = dict(attrs)
+        style = attributes.get("style") or ""
+        is_void = tag in _VOID_TAGS
+        # A valueless <div hidden> arrives as ("hidden", None)
+        if tag in _SKIPPED_TAGS or (not is_void and (_HIDDEN_STYLE.search(style) or "hidden" in attributes)):
+            self._skip_tag, self._skip_depth = tag, 1
+            return
+        for entry in self._break_after:
+            if entry[0] == tag:
+                entry[1] += 1
+        if style and _BREAK_BEFORE.search(style):
+            self._end_page()
+        if tag == "table":
+            self._end_row()
+            self._end_line()
+            self._table_depth += 1
+        elif tag == "tr":
+            self._end_row()
+            self._row = []
+        elif tag in ("td", "th"):
+            self._end_cell()
+            if self._row is None:
+                self._row = []
+            self._cell = []
+        elif tag in _BLOCK_TAGS:
+            self._block_boundary()
+        if style and _BREAK_AFTER.search(style):
+            if is_void:
+                self._end_page()
+            else:
+                self._break_after.append([tag, 1])
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if self._skip_tag is not None:
+            if tag == self._skip_tag:
+                self._skip_depth -= 1
+                if self._skip_depth == 0:
+                    self._skip_tag = None
+            return
+        if tag in ("td", "th"):
+            self._end_cell()
+        elif tag == "tr":
+            self._end_row()
+        elif tag == "table":
+            self._end_row()
+            self._table_depth = max(0, self._table_depth - 1)
+            if self._table_depth == 0:
+                self._lines.append("")
+        elif tag in _BLOCK_TAGS:
+            self._block_boundary()
+        for entry in list(self._break_after):
+            if entry[0] == tag:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    self._break_after.remove(entry)
+                    self._end_page()
+
+    def handle_data(self, data):
+        if self._skip_tag is not None:
+            return
+        if self._cell is not None:
+            self._cell.append(data)
+        elif self._row is not None:
+            # Text between cells of a row belongs to the row, not to the page
+            self._cell = [data]
+            self._end_cell()
+        else:
+            self._line.append(data)
+
+    def close(self):
+        super().close()
+        self._end_page()
+
+
+def iter_html_pages(file_path: str, encoding: str = "utf-8") -> Iterator[Document]:
+    """
+    Stream an EDGAR HTML or inline XBRL filing as page Documents.
+
+    Pages follow the filing's own page breaks (numbered from 0, like PyPDFLoader).
+    Scripts, styles, hidden elements and the iXBRL header with its hidden facts
+    are dropped, as are running page numbers and "Table of Contents" links at page
+    edges. Each table row becomes one line with its cells separated by two spaces.
+    """
+    parser = _FilingHTMLParser()
+    page_number = 0
+    with open(file_path, "r", encoding=encoding, errors="replace") as f:
+        while True:
+            chunk = f.read(READ_CHUNK_BYTES)
+            if chunk:
+                parser.feed(chunk)
+            else:
+                parser.close()
+            for text in parser.pages:
+                yield Document(page_content=text, metadata={"source": file_path, "page": page_number})
+                page_number += 1
+            parser.pages.clear()
+            if not chunk:
+                break
+
+
+class IncrementalHTMLFiling:
+    """
+    The pages iter_html_pages would yield, from bytes fed in file order as they
+    become available, e.g. the leading parts of an upload still in progress.
+    """
+
+    def __init__(self, source: str, encoding: str = "utf-8"):
+        self.source = source
+        self.pages: List[Document] = []
+        self._parser = _FilingHTMLParser()
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+
+    def _take_pages(self) -> None:
+        for text in self._parser.pages:
+            self.pages.append(Document(page_content=text, metadata={"source": self.source, "page": len(self.pages)}))
+        self._parser.pages.clear()
+
+    def feed(self, data: bytes) -> None:
+        self._parser.feed(self._decoder.decode(data))
+        self._take_pages()
+
+    def close(self) -> List[Document]:
+        """Flush the last page; returns every page"""
+        self._parser.feed(self._decoder.decode(b"", final=True))
+        self._parser.close()
+        self._take_pages()
+        return self.pages
+
+
+def load_html_filing(file_path: str) -> List[Document]:
+    """All pages of an HTML or inline XBRL filing"""
+    return list(iter_html_pages(file_path))
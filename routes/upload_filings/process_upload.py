@@ -1,48 +1,112 @@
 from flask import Blueprint, request, jsonify
-from document_library_database import DocumentMetadata, DocumentLibraryManager
-from union_steward_mode import steward_rag_query
+from document_library_database import DocumentMetadata, DocumentLibraryManager, FinancialFactsManager
+from http_utils import conditional_json, overloaded_response
+from chat import AdmissionScheduler, OverloadedError
+from retrieval import RetrievalClient, IssuerIndexes, two_stage_params, rag_query
+from sharding import ShardRouter
 from .vectorize_file import vectorize_file
+from .content_addressing import save_upload, vectorization_fingerprint, content_addressed_vectorstore_path
 
 import os
 import json
+from datetime import date
 
 upload_cba_bp = Blueprint('documents', __name__)
+
+def ingest_upload(upload, doc_metadata, vectorization_params, document_id=None, pages=None):
+    """
+    Index an upload saved by save_upload (or a completed resumable upload) and
+    record its document; returns the (response, status) of /documents/upload.
+    pages are the filing's pages when they were parsed during the upload.
+    Raises OverloadedError when ingestion is shed.
+    """
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    fingerprint = vectorization_fingerprint(vectorization_params)
+
+    # Same bytes with the same chunking/embedding parameters: reuse the existing index
+    existing = DocumentLibraryManager.find_document_by_content(upload['content_hash'], fingerprint)
+    if existing and os.path.isdir(existing['vectorstore_path']):
+        os.remove(upload['temp_path'])
+        document_id = DocumentLibraryManager.create_document(
+            document_metadata=doc_metadata,
+            document_description=existing['description'],
+            vectorstore_path=existing['vectorstore_path'],
+            vectorization_params=vectorization_params,
+            content_hash=upload['content_hash'],
+            file_size_bytes=upload['file_size_bytes'],
+            vectorization_fingerprint=fingerprint,
+            document_id=document_id
+        )
+        FinancialFactsManager().copy_facts(existing['id'], document_id)
+        IssuerIndexes().refresh(doc_metadata.employer)
+        return jsonify({
+            'message': 'File already processed; linked to the existing index',
+            'results': {
+                'document_id': document_id,
+                'deduplicated': True,
+                'source_document_id': existing['id'],
+                'content_hash': upload['content_hash'],
+                'vectorstore_path': existing['vectorstore_path'],
+                'description': existing['description'],
+                'processing_steps': ['Matched content hash and parameters of an existing document']
+            }
+        }), 200
+
+    vectorization_params['vectorstore_path'] = content_addressed_vectorstore_path(upload['content_hash'], fingerprint)
+    # Embedding and describing uploads yields to interactive queries
+    scheduler = AdmissionScheduler()
+    with scheduler.lane('ingestion'):
+        results = vectorize_file(upload, vectorization_params, openai_api_key, file_type=doc_metadata.file_type, pages=pages)
+    if 'error' in results:
+        return jsonify({'error': results['error']}), 500
+    vectorstore_path = results.get('vectorstore_path')
+    RetrievalClient().preload(vectorstore_path, vectorization_params.get('embedding_model'))
+    with scheduler.lane('ingestion'):
+        file_description = rag_query(
+            query="Provide a description of what this document is and what it does in less than 200 words. Who are the parties concerned? In the description, include the period of time it covers, when it begins application and when it ends if applicable",
+            vectorstore_path=vectorstore_path,
+            embedding_model=vectorization_params.get('embedding_model')
+        )
+    file_description = file_description['content']
+    results['description'] = file_description
+    document_id = DocumentLibraryManager.create_document(
+        document_metadata=doc_metadata,
+        document_description=file_description,
+        vectorstore_path=vectorstore_path,
+        vectorization_params=vectorization_params,
+        content_hash=upload['content_hash'],
+        file_size_bytes=upload['file_size_bytes'],
+        vectorization_fingerprint=fingerprint,
+        document_id=document_id
+    )
+    results['document_id'] = document_id
+    results['deduplicated'] = False
+    results['content_hash'] = upload['content_hash']
+    results['financial_facts'] = FinancialFactsManager().add_facts(document_id, results.get('financial_facts', []))
+    IssuerIndexes().refresh(doc_metadata.employer)
+    return jsonify({
+        'message': 'File uploaded and vectorized successfully',
+        'results': results
+    }), 200
+
 @upload_cba_bp.route('/documents/upload', methods=['POST'])
 def upload_document():
-    results={
-        "chunks": 0,
-        "processing_steps": []
-    }  
     doc_metadata = DocumentMetadata.from_flask_request(request)
     file = request.files.get('file')
     
-    vectorstore_name = doc_metadata.file_name.rsplit('.', 1)[0]
     vectorization_params = json.loads(request.form.get('vectorization_params')) if request.form.get('vectorization_params') else {}
-    vectorization_params['vectorstore_name'] = vectorstore_name
-
-    openai_api_key = os.getenv("OPENAI_API_KEY")
 
     if not file:
         return jsonify({'error': 'No file uploaded'}), 400
     try:
-        results = vectorize_file(file, vectorization_params, openai_api_key)
-        vectorstore_path = results.get('vectorstore_path')
-        file_description = steward_rag_query(
-            query="Provide a description of what this document is and what it does in less than 200 words. Who are the parties concerned? In the description, include the period of time it covers, when it begins application and when it ends if applicable",
-            vectorstore_path=vectorstore_path
-        )
-        file_description = file_description['content']
-        results['description'] = file_description
-        document_id = DocumentLibraryManager.create_document(
-            document_metadata=doc_metadata,
-            document_description=file_description,
-            vectorstore_path=vectorstore_path
-        )
-        results['document_id'] = document_id
-        return jsonify({
-            'message': 'File uploaded and vectorized successfully',
-            'results': results
-        }), 200 
+        two_stage_params(vectorization_params)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        upload = save_upload(file)
+        return ingest_upload(upload, doc_metadata, vectorization_params, document_id=ShardRouter().assigned_id())
+    except OverloadedError as e:
+        return overloaded_response(e.retry_after)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -59,16 +123,45 @@ def list_documents():
             documents = DocumentLibraryManager.get_documents_by_collection(collection['id'])
             rolled_up_documents[collection['name']] = documents
 
-        return jsonify(rolled_up_documents), 200
+        return conditional_json(rolled_up_documents)
         
     except Exception as e:
         print(f"Error fetching documents: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
     
+@upload_cba_bp.route('/documents/<int:document_id>/filing_period', methods=['PUT'])
+def set_filing_period(document_id):
+    """Record which issuer and reporting period a document covers, for filing-history queries"""
+    data = request.get_json() or {}
+    employer = (data.get('employer') or '').strip()
+    if not employer or not data.get('valid_from'):
+        return jsonify({'error': 'employer and valid_from are required'}), 400
+    try:
+        valid_from = date.fromisoformat(data['valid_from']).isoformat()
+        valid_to = date.fromisoformat(data['valid_to']).isoformat() if data.get('valid_to') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'valid_from and valid_to must be dates (YYYY-MM-DD)'}), 400
+    if valid_to and valid_to < valid_from:
+        return jsonify({'error': 'valid_to must not be before valid_from'}), 400
+    try:
+        previous = DocumentLibraryManager.get_document_by_id(document_id)
+        if previous is None or not DocumentLibraryManager.set_filing_period(
+                document_id, employer, valid_from, valid_to):
+            return jsonify({'error': 'Document not found'}), 404
+        IssuerIndexes().refresh(employer)
+        if previous['employer'] != employer:
+            IssuerIndexes().refresh(previous['employer'])
+        return jsonify({'message': 'Filing period updated', 'document': DocumentLibraryManager.get_document_by_id(document_id)}), 200
+    except Exception as e:
+        print(f"Error updating filing period: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @upload_cba_bp.route('/documents/<int:document_id>', methods=['DELETE'])
 def delete_document(document_id):
     try:
-        DocumentLibraryManager.delete_document(document_id)
+        hard_delete = request.args.get('hard', 'false').lower() == 'true'
+        if not DocumentLibraryManager.delete_document(document_id, soft_delete=not hard_delete):
+            return jsonify({'error': 'Document not found'}), 404
         return jsonify({'message': 'Document deleted successfully'}), 200
     except Exception as e:
         print(f"Error deleting document: {str(e)}")
@@ -0,0 +1,106 @@
+from flask import Blueprint, request, jsonify
+
+from document_library_database import DocumentMetadata
+from chat import OverloadedError
+from http_utils import overloaded_response
+from resumable_uploads import ResumableUploads, UploadSessionConflict
+from sharding import ShardRouter
+from .process_upload import ingest_upload
+
+resumable_upload_bp = Blueprint('uploads', __name__)
+
+@resumable_upload_bp.route('/documents/uploads', methods=['POST'])
+def create_upload():
+    """
+    Open a resumable upload: JSON with metadata and vectorization_params as for
+    /documents/upload, file_size in bytes and optionally part_size
+    """
+    data = request.get_json(silent=True) or {}
+    metadata = data.get('metadata')
+    vectorization_params = data.get('vectorization_params') or {}
+    file_size = data.get('file_size')
+    part_size = data.get('part_size')
+    if not isinstance(metadata, dict) or not isinstance(vectorization_params, dict):
+        return jsonify({'error': 'metadata and vectorization_params must be objects'}), 400
+    if not isinstance(file_size, int) or isinstance(file_size, bool):
+        return jsonify({'error': 'file_size must be the size of the file in bytes'}), 400
+    if part_size is not None and (not isinstance(part_size, int) or isinstance(part_size, bool)):
+        return jsonify({'error': 'part_size must be a number of bytes'}), 400
+    try:
+        session = ResumableUploads().create_session(metadata, vectorization_params, file_size, part_size,
+                                                    document_id=ShardRouter().assigned_id())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error creating upload session: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+    return jsonify(session), 201
+
+@resumable_upload_bp.route('/documents/uploads/<upload_id>/parts/<int:part_number>', methods=['PUT'])
+def upload_part(upload_id, part_number):
+    """The raw bytes of one part as the body; an X-Part-Sha256 header is checked when sent"""
+    try:
+        part = ResumableUploads().write_part(upload_id, part_number, request.stream, request.headers.get('X-Part-Sha256'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except UploadSessionConflict as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        print(f"Error receiving upload part: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+    if part is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(part), 200
+
+@resumable_upload_bp.route('/documents/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """Parts received and missing, to resume an interrupted upload"""
+    session = ResumableUploads().describe(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(session), 200
+
+@resumable_upload_bp.route('/documents/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """Ingest a fully received upload; answers as /documents/upload, and can be retried if ingestion failed"""
+    uploads = ResumableUploads()
+    try:
+        upload = uploads.begin_ingestion(upload_id)
+    except UploadSessionConflict as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        print(f"Error completing upload: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+    if upload is None:
+        return jsonify({'error': 'Upload not found'}), 404
+
+    status = 500
+    try:
+        response, status = ingest_upload(
+            upload,
+            DocumentMetadata(**upload['metadata']),
+            upload['vectorization_params'],
+            document_id=upload['document_id'],
+            pages=upload['pages']
+        )
+        return response, status
+    except OverloadedError as e:
+        return overloaded_response(e.retry_after)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        uploads.end_ingestion(upload_id, upload, succeeded=status == 200)
+
+@resumable_upload_bp.route('/documents/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    aborted = ResumableUploads().abort(upload_id)
+    if aborted is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    if not aborted:
+        return jsonify({'error': 'Upload is being ingested'}), 409
+    return jsonify({'message': 'Upload aborted'}), 200
+
+@resumable_upload_bp.route('/documents/uploads/stats', methods=['GET'])
+def upload_stats():
+    """Open sessions, bytes on disk, how much was hashed and parsed ahead, and what the sweep collected"""
+    return jsonify(ResumableUploads().stats()), 200
@@ -0,0 +1,208 @@
+import re
+from typing import List, Dict, Optional
+
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from retrieval.section_search import normalize_section
+from .class_TokenAwareTextSplitter import TokenAwareTextSplitter
+
+# Item titles of Form 10-K; the numbers run on across Parts I to IV
+FORM_10K_ITEM_TITLES = {
+    "1": "Business",
+    "1A": "Risk Factors",
+    "1B": "Unresolved Staff Comments",
+    "1C": "Cybersecurity",
+    "2": "Properties",
+    "3": "Legal Proceedings",
+    "4": "Mine Safety Disclosures",
+    "5": "Market for Registrant's Common Equity",
+    "6": "[Reserved]",
+    "7": "Management's Discussion and Analysis",
+    "7A": "Quantitative and Qualitative Disclosures About Market Risk",
+    "8": "Financial Statements and Supplementary Data",
+    "9": "Changes in and Disagreements with Accountants",
+    "9A": "Controls and Procedures",
+    "9B": "Other Information",
+    "9C": "Disclosure Regarding Foreign Jurisdictions that Prevent Inspections",
+    "10": "Directors, Executive Officers and Corporate Governance",
+    "11": "Executive Compensation",
+    "12": "Security Ownership of Certain Beneficial Owners and Management",
+    "13": "Certain Relationships and Related Transactions",
+    "14": "Principal Accountant Fees and Services",
+    "15": "Exhibits and Financial Statement Schedules",
+    "16": "Form 10-K Summary",
+}
+
+# Item titles of Form 10-Q, by part: both parts number their items from 1
+FORM_10Q_ITEM_TITLES = {
+    "I": {
+        "1": "Financial Statements",
+        "2": "Management's Discussion and Analysis",
+        "3": "Quantitative and Qualitative Disclosures About Market Risk",
+        "4": "Controls and Procedures",
+    },
+    "II": {
+        "1": "Legal Proceedings",
+        "1A": "Risk Factors",
+        "2": "Unregistered Sales of Equity Securities and Use of Proceeds",
+        "3": "Defaults Upon Senior Securities",
+        "4": "Mine Safety Disclosures",
+        "5": "Other Information",
+        "6": "Exhibits",
+    },
+}
+
+FORM_10K = "10-K"
+FORM_10Q = "10-Q"
+
+PREAMBLE_SECTION = "preamble"
+
+# "Item 1A." / "ITEM 7 -" at the start of a line; table-of-contents lines end with a page number (_toc_entries)
+_ITEM_HEADER = re.compile(r"^[ \t]*item[ \t]+(\d{1,2}[a-c]?)\b[ \t]*[.:\-—–]?(?P<rest>[^\n]*)$", re.IGNORECASE | re.MULTILINE)
+_PART_HEADER = re.compile(r"^[ \t]*part[ \t]+(i{1,3}|iv)\b", re.IGNORECASE | re.MULTILINE)
+# A page number set off by dot leaders or a run of whitespace (table cells are joined by two spaces)
+_TOC_PAGE_NUMBER = re.compile(r"(?:\.{2,}|…+|\t|[ \t]{2,})[ \t.…]*(?P<page>\d{1,4})\s*$")
+# A number after a single space may be a page number or end the title ("Fiscal 2023")
+_TRAILING_NUMBER = re.compile(r"(?<![\d,.$])\b(?P<page>\d{1,4})\s*$")
+# The cover page names the form: "FORM 10-Q" or "QUARTERLY REPORT PURSUANT TO SECTION 13 OR 15(d)"
+_FORM_10Q = re.compile(r"\bform[ \t]+10-?q\b|\bquarterly[ \t]+report[ \t]+pursuant\b", re.IGNORECASE)
+_FORM_10K = re.compile(r"\bform[ \t]+10-?k\b|\bannual[ \t]+report[ \t]+pursuant\b", re.IGNORECASE)
+COVER_PAGES = 3
+
+
+def detect_form_type(pages: List[Document]) -> str:
+    """FORM_10Q when the cover names a quarterly report before an annual one, FORM_10K otherwise"""
+    cover = "\n".join(page.page_content for page in pages[:COVER_PAGES])
+    quarterly, annual = _FORM_10Q.search(cover), _FORM_10K.search(cover)
+    if quarterly and (annual is None or quarterly.start() < annual.start()):
+        return FORM_10Q
+    return FORM_10K
+
+
+def section_key(part: Optional[str], item: str) -> str:
+    """'II-1A' for an item after a PART header, the bare item before any"""
+    return f"{part}-{item}" if part else item
+
+
+def item_title(form_type: str, part: Optional[str], item: str) -> str:
+    if form_type == FORM_10Q:
+        return FORM_10Q_ITEM_TITLES.get(part or "I", {}).get(item, "")
+    return FORM_10K_ITEM_TITLES.get(item, "")
+
+
+def _toc_entries(matches: List[re.Match], page_count: Optional[int]) -> List[bool]:
+    """
+    Which item lines of a page are table-of-contents entries. Their page number
+    must be one the filing can have (at most page_count when known). One set off
+    by dot leaders or a whitespace run marks an entry on its own; a bare trailing
+    number only when another item line of the page also ends in a page number,
+    as a contents page lists the items together while a title ending in a year
+    stands alone.
+    """
+    def page_number(pattern: re.Pattern, match: re.Match) -> bool:
+        found = pattern.search(match.group("rest"))
+        return found is not None and (page_count is None or int(found.group("page")) <= page_count)
+
+    marked = [page_number(_TOC_PAGE_NUMBER, match) for match in matches]
+    bare = [page_number(_TRAILING_NUMBER, match) for match in matches]
+    listed = sum(1 for is_marked, is_bare in zip(marked, bare) if is_marked or is_bare)
+    return [is_marked or (is_bare and listed > 1) for is_marked, is_bare in zip(marked, bare)]
+
+
+def find_item_headers(text: str, page_count: Optional[int] = None) -> List[Dict]:
+    """
+    Positions of item and part headers in a page, skipping table-of-contents
+    entries; page_count, when known, rules out numbers that cannot be pages.
+    """
+    headers = []
+    for match in _PART_HEADER.finditer(text):
+        headers.append({"offset": match.start(), "part": match.group(1).upper()})
+    matches = list(_ITEM_HEADER.finditer(text))
+    for match, is_toc_entry in zip(matches, _toc_entries(matches, page_count)):
+        if is_toc_entry:
+            continue
+        headers.append({"offset": match.start(), "section": normalize_section(match.group(1))})
+    return sorted(headers, key=lambda header: header["offset"])
+
+
+def make_text_splitter(chunk_size: int, chunk_overlap: int, chunk_unit: str = "characters", embedding_model: Optional[str] = None):
+    """Splitter for vectorization_params: chunk_size/chunk_overlap in 'characters' (default) or 'tokens'"""
+    if chunk_unit == "tokens":
+        return TokenAwareTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, embedding_model=embedding_model)
+    if chunk_unit != "characters":
+        raise ValueError(f"Unknown chunk_unit '{chunk_unit}'; use 'characters' or 'tokens'")
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", " ", ""])
+
+
+def split_sec_filing(
+    pages: List[Document],
+    chunk_size: int,
+    chunk_overlap: int,
+    chunk_unit: str = "characters",
+    embedding_model: Optional[str] = None,
+    form_type: Optional[str] = None
+) -> List[Document]:
+    """
+    Split a 10-K/10-Q into chunks that never cross a page or an item boundary.
+
+    Every chunk's metadata carries the page it came from (as loaded), its section
+    ('preamble' before the first item; the item, '1A', '7', ..., qualified by its
+    part, 'II-1A', once a PART header was seen, since a 10-Q numbers the items
+    of both parts from 1), the item, the item title for the form type (detected
+    from the cover when not given) and the part when one was seen.
+    """
+    splitter = make_text_splitter(chunk_size, chunk_overlap, chunk_unit, embedding_model)
+    form_type = form_type or detect_form_type(pages)
+
+    segments = []
+    item: Optional[str] = None
+    part: Optional[str] = None
+    item_part: Optional[str] = None
+    for page in pages:
+        text = page.page_content
+        start = 0
+        for header in find_item_headers(text, len(pages)):
+            if header["offset"] > start:
+                segments.append((text[start:header["offset"]], start, page.metadata, item, item_part))
+                start = header["offset"]
+            if "part" in header:
+                part = header["part"]
+            else:
+                # Text after a PART header stays with the previous item until the next item header
+                item, item_part = header["section"], part
+        segments.append((text[start:], start, page.metadata, item, item_part))
+
+    documents = []
+    for text, offset, page_metadata, item, part in segments:
+        if not text.strip():
+            continue
+        if item is None:
+            metadata = {**page_metadata, "section": PREAMBLE_SECTION, "section_title": ""}
+        else:
+            metadata = {
+                **page_metadata,
+                "section": section_key(part, item),
+                "item": item,
+                "section_title": item_title(form_type, part, item)
+            }
+        if part:
+            metadata["part"] = part
+        chunks = splitter.create_documents([text], metadatas=[metadata])
+        for chunk in chunks:
+            # Token-sized chunks record where they start; make that relative to the page
+            if "start_index" in chunk.metadata:
+                chunk.metadata["start_index"] += offset
+        documents.extend(chunks)
+    return documents
+
+
+def build_section_map(documents: List[Document]) -> Dict[str, List[int]]:
+    """section -> FAISS ids, assuming ids follow the order documents were indexed in"""
+    section_map: Dict[str, List[int]] = {}
+    for vector_id, document in enumerate(documents):
+        section_map.setdefault(document.metadata.get("section", PREAMBLE_SECTION), []).append(vector_id)
+    return section_map
@@ -1,46 +1,108 @@
 import os
+import uuid
+import shutil
 from flask import Blueprint, request, jsonify
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_community.vectorstores import FAISS
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from chat import get_embeddings, OverloadedError
+from retrieval import save_section_map, save_vectorstore, two_stage_params, TwoStageIndex
+from financial_facts import extract_financial_facts
+from .sec_section_splitter import split_sec_filing, build_section_map, make_text_splitter
+from .filing_loaders import select_loader, load_filing_pages
+
+def _save_vectorstore(vectorstore, section_map, vectorstore_path):
+    """Write the index to a scratch directory and rename it into place, so readers never see a partial store"""
+    scratch_path = f"{vectorstore_path}.tmp-{uuid.uuid4().hex}"
+    save_vectorstore(vectorstore, scratch_path)
+    save_section_map(scratch_path, section_map)
+    try:
+        os.makedirs(os.path.dirname(vectorstore_path), exist_ok=True)
+        os.rename(scratch_path, vectorstore_path)
+    except OSError:
+        # Another upload of the same content finished first; its index is identical
+        shutil.rmtree(scratch_path, ignore_errors=True)
+        if not os.path.isdir(vectorstore_path):
+            raise
+        # Restart the collector's grace period for the store this upload is about to reference
+        os.utime(vectorstore_path)
 
 def vectorize_file(
-        file, 
+        upload, 
         vectorization_params, 
-        openai_api_key):
+        openai_api_key,
+        file_type=None,
+        pages=None):
+    """
+    Build and save the FAISS index for an upload saved by save_upload.
+    
+    file_type (DocumentMetadata.file_type) picks the loader: PDFs go through
+    PyPDFLoader, HTML and inline XBRL filings through the streaming HTML loader.
+    pages, when given, are the filing's pages already parsed while it was being
+    uploaded, and the file is not read again.
+    With coarse_dimensions (and optionally rescore_factor) in vectorization_params
+    the store is searched in two stages, see retrieval.TwoStageIndex.
+    The index is written to vectorization_params['vectorstore_path'].
+    """
 
     results={
         "chunks": 0,
         "processing_steps": []
     }
 
-    if file.filename.lower().endswith('.pdf'):
-        # Save the file temporarily
-        temp_path = f"/tmp/{file.filename}"
-        try:
-            file.save(temp_path)
-            embeddings = OpenAIEmbeddings(
-                model=vectorization_params['embedding_model'], 
-                openai_api_key=openai_api_key)
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=vectorization_params['chunk_size'], 
-                chunk_overlap=vectorization_params['chunk_overlap'], 
-                separators=["\n\n", "\n", " ", ""])
-            loader = PyPDFLoader(temp_path)
-            pages = loader.load()
-            os.remove(temp_path)
+    temp_path = upload['temp_path']
+    try:
+        loader = select_loader(file_type, upload['file_name'])
+        two_stage = two_stage_params(vectorization_params)
+    except ValueError as e:
+        os.remove(temp_path)
+        return {'error': str(e)}
+    try:
+        embeddings = get_embeddings(
+            vectorization_params['embedding_model'], 
+            openai_api_key=openai_api_key)
+        if pages is None:
+            pages = load_filing_pages(temp_path, loader)
+            results["processing_steps"].append(f"Loaded {len(pages)} pages with the {loader} loader")
+        else:
+            results["processing_steps"].append(f"Used {len(pages)} pages parsed with the {loader} loader during the upload")
+        os.remove(temp_path)
+        results["financial_facts"] = extract_financial_facts(pages)
+        results["processing_steps"].append(f"Extracted {len(results['financial_facts'])} financial facts")
+        chunk_unit = vectorization_params.get('chunk_unit', 'characters')
+        if vectorization_params.get('splitter', 'sec') == 'sec':
+            documents = split_sec_filing(
+                pages,
+                chunk_size=vectorization_params['chunk_size'],
+                chunk_overlap=vectorization_params['chunk_overlap'],
+                chunk_unit=chunk_unit,
+                embedding_model=vectorization_params['embedding_model'])
+        else:
+            splitter = make_text_splitter(
+                vectorization_params['chunk_size'], 
+                vectorization_params['chunk_overlap'], 
+                chunk_unit,
+                vectorization_params['embedding_model'])
             documents = splitter.split_documents(pages)   
-            results["chunks"] = len(documents)
-            results["processing_steps"].append(f"Created {len(documents)} text chunks")         
-            vectorstore = FAISS.from_documents(documents, embeddings)
-            vectorstore_path = f"vectorstore/{vectorization_params['vectorstore_name']}"
-            vectorstore.save_local(vectorstore_path)
-            results["vectorstore_path"] = vectorstore_path
-            return results
-        except Exception as e:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            return {'error': str(e)}
-    else:
-        return {'error': 'Only PDF files are supported'}
+        results["chunks"] = len(documents)
+        results["processing_steps"].append(f"Created {len(documents)} text chunks of up to {vectorization_params['chunk_size']} {chunk_unit}")         
+        vectorstore = FAISS.from_documents(documents, embeddings)
+        if two_stage is not None:
+            coarse_dimensions, rescore_factor = two_stage
+            index = vectorstore.index
+            vectorstore.index = TwoStageIndex.build(index.reconstruct_n(0, index.ntotal), coarse_dimensions, rescore_factor, index.metric_type)
+            results["processing_steps"].append(
+                f"Indexed the leading {coarse_dimensions} of {index.d} dimensions for candidate search, "
+                f"re-scoring {rescore_factor} candidates per result on the full vectors")
+        vectorstore_path = vectorization_params['vectorstore_path']
+        section_map = build_section_map(documents)
+        _save_vectorstore(vectorstore, section_map, vectorstore_path)
+        results["sections"] = {section: len(ids) for section, ids in section_map.items()}
+        results["processing_steps"].append(f"Tagged chunks with {len(section_map)} filing sections")
+        results["vectorstore_path"] = vectorstore_path
+        return results
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        if isinstance(e, OverloadedError):
+            raise
+        return {'error': str(e)}
+
@@ -0,0 +1,4 @@
+from .class_HashRing import HashRing
+from .class_ShardRouter import ShardRouter, ROUTES
+
+__all__ = ["HashRing", "ShardRouter", "ROUTES"]
\ No newline at end of file
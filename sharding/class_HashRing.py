@@ -0,0 +1,58 @@
+import bisect
+import hashlib
+from typing import Iterable, List, Optional
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes.
+
+    Every node is placed on the ring at virtual_nodes points; a key belongs to
+    the first node point at or after the key's own hash. Adding a node to N
+    nodes therefore moves only about 1/(N+1) of the keys, all of them to the
+    new node.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), virtual_nodes: int = 64):
+        self.virtual_nodes = virtual_nodes
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self._nodes: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodes)
+
+    def add(self, node: str) -> None:
+        if node in self._nodes:
+            return
+        self._nodes.append(node)
+        for replica in range(self.virtual_nodes):
+            point = self._hash(f"{node}#{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: str) -> None:
+        if node not in self._nodes:
+            return
+        self._nodes.remove(node)
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def node_for(self, key: str) -> Optional[str]:
+        """The node owning key, or None on an empty ring"""
+        if not self._points:
+            return None
+        index = bisect.bisect_left(self._points, self._hash(key))
+        return self._owners[index % len(self._owners)]
+
+    def copy(self) -> "HashRing":
+        return HashRing(self._nodes, self.virtual_nodes)
\ No newline at end of file
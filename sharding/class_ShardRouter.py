@@ -0,0 +1,657 @@
+import os
+import io
+import hmac
+import shutil
+import logging
+import tarfile
+import tempfile
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+import httpx
+import orjson
+from flask import Flask, Response, g, request, jsonify, current_app
+
+from http_utils import conditional_json
+
+from .class_HashRing import HashRing
+from .merge_responses import GATHER_MERGES, merge_split_responses
+
+logger = logging.getLogger(__name__)
+
+# How each endpoint is served with sharding enabled; endpoints not listed are served by whichever node receives them
+#   upload     allocate a document id and send the upload to the node owning it
+#   upload_session  send to the node holding the resumable upload, found from the document id its upload_id starts with
+#   conversation    send to the node holding the in-memory session, found from the document id its session_id starts with
+#   job        send to the node running the map-reduce job, found from the document id its job_id starts with,
+#              or ask every node when the client chose a job_id without one
+#   document   send to the node owning the document named in the URL or body
+#   broadcast  apply on every node (collection rows are kept on all of them)
+#   split      send each node the document ids it owns and merge the per-document results
+#   gather     ask every node and merge the answers
+#   node_local refuse with 501: the endpoint acts on this node's documents only and has no cluster-wide form
+ROUTES = {
+    "documents.upload_document": "upload",
+    "uploads.create_upload": "upload",
+    "uploads.upload_part": "upload_session",
+    "uploads.get_upload": "upload_session",
+    "uploads.complete_upload": "upload_session",
+    "uploads.abort_upload": "upload_session",
+    "conversations.create_conversation": "document",
+    "conversations.query_conversation": "conversation",
+    "conversations.get_conversation": "conversation",
+    "conversations.delete_conversation": "conversation",
+    "query_cba.cancel_map_reduce": "job",
+    "documents.set_filing_period": "document",
+    "documents.delete_document": "document",
+    "query_cba.query_collective_bargaining_agreement": "document",
+    "collections.add_document_to_collection": "document",
+    "collections.remove_document_from_collection": "document",
+    "collections.create_collection": "broadcast",
+    "collections.update_collection": "broadcast",
+    "collections.delete_collection": "broadcast",
+    "collections.bulk_add_documents_to_collection": "split",
+    "collections.bulk_remove_documents_from_collection": "split",
+    "collections.bulk_move_documents": "split",
+    "collections.list_collections": "gather",
+    "collections.get_collection": "gather",
+    "collections.get_collection_documents": "gather",
+    "documents.list_documents": "gather",
+    "list_agreements": "gather",
+    "query_cba.build_issuer_index": "node_local",
+    "embedding_migrations.start_embedding_migration": "node_local",
+    "embedding_migrations.list_embedding_migrations": "node_local",
+    "embedding_migrations.get_embedding_migration": "node_local",
+    "embedding_migrations.change_embedding_migration": "node_local"
+}
+FORWARDED_HEADERS = ("Content-Type", "Content-Length", "If-None-Match", "X-Part-Sha256")
+RETURNED_HEADERS = ("Content-Type", "ETag", "Retry-After", "X-Profile-Id")
+UPLOAD_STREAM_CHUNK_BYTES = 1024 * 1024
+
+
+def document_key(document_id: int) -> str:
+    return f"document:{document_id}"
+
+
+class ShardRouter:
+    """
+    Singleton that spreads documents over several nodes and routes requests to them.
+
+    Each node is a full instance of this app with its own SQLite file and
+    vectorstore/ directory. Documents are placed on a consistent hash ring by
+    id; ids are allocated by the node that receives an upload, from a block of
+    its own (ShardStateManager), so any node can compute any document's owner
+    without a directory. Collection rows are small and kept on every node,
+    while a document's collection memberships live with the document. ROUTES
+    says how each endpoint is served; collection and filing-history queries
+    scatter their search to every node and merge the results
+    (retrieval.collection_query, retrieval.period_query). Conversation
+    sessions and map-reduce jobs live in the memory of the node that started
+    them, the document's owner, and their ids start with the document id so
+    later requests about them are sent there too.
+
+    When a node joins (add_node), every node switches to the new ring and
+    pushes the documents it no longer owns, with their vectorstores, to the
+    new owner. Until that has finished a document can still be on its previous
+    owner, so a lookup that misses on the new owner is retried there.
+
+    Nodes talk to each other with X-Shard-Token; requests carrying it are
+    always served locally. Without SHARD_NODES, SHARD_SELF and SHARD_TOKEN
+    nothing is registered and the app behaves as a single node.
+
+    Configuration via environment:
+        SHARD_NODES                   comma-separated base URLs of the initial nodes, this one included
+        SHARD_SELF                    this node's base URL as listed in SHARD_NODES
+        SHARD_NODE_ID                 small integer unique per node, selects its id block (default 1)
+        SHARD_TOKEN                   shared secret for node-to-node requests
+        SHARD_VIRTUAL_NODES           ring points per node (default 64)
+        SHARD_TIMEOUT_SECONDS         timeout of forwarded requests (default 30)
+        SHARD_UPLOAD_TIMEOUT_SECONDS  timeout of forwarded uploads and document transfers (default 600)
+        SHARD_MAX_PARALLEL            concurrent requests to other nodes (default 16)
+        SHARD_REBALANCE_INTERVAL_SECONDS  retry interval for documents that failed to move (default 300)
+    """
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._setup()
+        return cls._instance
+
+    def _setup(self) -> None:
+        self.self_url = (os.getenv("SHARD_SELF") or "").rstrip("/")
+        self.initial_nodes = [node.strip().rstrip("/") for node in os.getenv("SHARD_NODES", "").split(",") if node.strip()]
+        self.node_id = int(os.getenv("SHARD_NODE_ID", "1"))
+        self.token = os.getenv("SHARD_TOKEN")
+        self.virtual_nodes = int(os.getenv("SHARD_VIRTUAL_NODES", "64"))
+        self.timeout = float(os.getenv("SHARD_TIMEOUT_SECONDS", "30"))
+        self.upload_timeout = float(os.getenv("SHARD_UPLOAD_TIMEOUT_SECONDS", "600"))
+        self.rebalance_interval_seconds = float(os.getenv("SHARD_REBALANCE_INTERVAL_SECONDS", "300"))
+        self.enabled = bool(self.initial_nodes and self.self_url and self.token)
+        if self.initial_nodes and not self.enabled:
+            logger.warning("SHARD_NODES is set but SHARD_SELF or SHARD_TOKEN is missing; running as a single node")
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("SHARD_MAX_PARALLEL", "16")),
+            thread_name_prefix="shard-router"
+        )
+        self._client = httpx.Client(timeout=self.timeout)
+        self.ring = HashRing([self.self_url] if self.self_url else [], self.virtual_nodes)
+        self.previous_ring: Optional[HashRing] = None
+        self._rebalance = {"running": False, "runs": 0, "moved_total": 0, "last_run": None}
+        self._counters = {
+            "forwarded": 0, "served_locally": 0, "previous_owner_hits": 0, "broadcasts": 0,
+            "replication_failures": 0, "gathers": 0, "partial_gathers": 0, "splits": 0,
+            "scatters": 0, "node_errors": 0, "received_documents": 0, "node_local_refusals": 0
+        }
+        if self.enabled:
+            self._load_nodes()
+
+    def _load_nodes(self) -> None:
+        from document_library_database import ShardStateManager
+        nodes = list(dict.fromkeys(self.initial_nodes + ShardStateManager().get_nodes()))
+        if self.self_url not in nodes:
+            nodes.append(self.self_url)
+        self.ring = HashRing(nodes, self.virtual_nodes)
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    @property
+    def node_name(self) -> str:
+        """Key of this node in scatter results; 'local' when sharding is disabled"""
+        return self.self_url or "local"
+
+    def owner(self, document_id: int) -> str:
+        return self.ring.node_for(document_key(document_id))
+
+    def previous_owner(self, document_id: int) -> Optional[str]:
+        """The owner before the last ring change, when it was a different node"""
+        ring = self.previous_ring
+        if ring is None:
+            return None
+        previous = ring.node_for(document_key(document_id))
+        return previous if previous != self.owner(document_id) else None
+
+    def allocate_id(self) -> int:
+        from document_library_database import ShardStateManager
+        return ShardStateManager().allocate_id(self.node_id)
+
+    def assigned_id(self) -> Optional[int]:
+        """Id chosen by the router for the document or collection this request creates, if any"""
+        return g.get("shard_id")
+
+    def authorized(self, request_obj) -> bool:
+        """Whether the request comes from another node; always False when sharding is disabled"""
+        supplied = request_obj.headers.get("X-Shard-Token", "")
+        return self.enabled and hmac.compare_digest(supplied.encode(), self.token.encode())
+
+    def _headers(self, assigned_id: Optional[int] = None) -> Dict[str, str]:
+        headers = {"X-Shard-Token": self.token, "X-Shard-Forwarded-By": self.self_url}
+        if assigned_id is not None:
+            headers["X-Shard-Id"] = str(assigned_id)
+        return headers
+
+    def _send(self, node: str, method: str, path: str, body: bytes = b"", headers: Optional[Dict[str, str]] = None,
+              timeout: Optional[float] = None) -> Tuple[int, Dict[str, str], bytes]:
+        """(status, headers, body) of a request to a node; this node is called in process, not over HTTP"""
+        headers = {**self._headers(), **(headers or {})}
+        if node == self.self_url:
+            # Through the WSGI stack in this thread, so a single-worker server cannot deadlock on itself
+            response = current_app.test_client().open(path, method=method, data=body, headers=headers)
+            return response.status_code, dict(response.headers), response.get_data()
+        response = self._client.request(method, node + path, content=body, headers=headers, timeout=timeout or self.timeout)
+        return response.status_code, dict(response.headers), response.content
+
+    def _fan_out(self, calls: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+        """Run one call per node in parallel; a node whose call raised maps to the exception"""
+        app = current_app._get_current_object()
+
+        def in_app_context(call):
+            with app.app_context():
+                return call()
+
+        # Copy the context so the caller's admission lane applies on this node
+        futures = {
+            node: self._executor.submit(contextvars.copy_context().run, in_app_context, call)
+            for node, call in calls.items()
+        }
+        wait(futures.values())
+        results = {}
+        for node, future in futures.items():
+            if future.exception() is not None:
+                logger.warning(f"Shard node {node} failed: {future.exception()}")
+                self._count("node_errors")
+                results[node] = future.exception()
+            else:
+                results[node] = future.result()
+        return results
+
+    @staticmethod
+    def _response(status: int, headers: Dict[str, str], body: bytes) -> Response:
+        response = Response(body, status=status)
+        for name in RETURNED_HEADERS:
+            if name in headers:
+                response.headers[name] = headers[name]
+        return response
+
+    def scatter(self, path: str, payload: Dict[str, Any], local: Callable[[Dict[str, Any]], Any],
+                timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        POST payload to path on every node and return {node: decoded JSON}; this
+        node runs local(payload) instead. Nodes that failed or answered with an
+        error map to None.
+        """
+        if not self.enabled:
+            return {self.node_name: local(payload)}
+        self._count("scatters")
+        body = orjson.dumps(payload)
+        calls = {}
+        for node in self.ring.nodes:
+            if node == self.self_url:
+                calls[node] = lambda: local(payload)
+            else:
+                calls[node] = lambda node=node: self._send(node, "POST", path, body, {"Content-Type": "application/json"}, timeout)
+        results = {}
+        for node, result in self._fan_out(calls).items():
+            if isinstance(result, Exception):
+                results[node] = None
+            elif isinstance(result, tuple):
+                status, _, content = result
+                if status != 200:
+                    logger.warning(f"Shard node {node} answered {path} with {status}: {content[:200]!r}")
+                    self._count("node_errors")
+                results[node] = orjson.loads(content) if status == 200 else None
+            else:
+                results[node] = result
+        return results
+
+    def init_app(self, app: Flask) -> None:
+        if not self.enabled:
+            return
+        app.before_request(self._route)
+
+    def _route(self):
+        if self.authorized(request):
+            # Sent by another node: serve here, with the id that node allocated
+            if request.headers.get("X-Shard-Id"):
+                g.shard_id = int(request.headers["X-Shard-Id"])
+            return None
+        strategy = ROUTES.get(request.endpoint)
+        if strategy is None:
+            return None
+        try:
+            return getattr(self, f"_route_{strategy}")()
+        except httpx.TransportError as e:
+            self._count("node_errors")
+            print(f"Error reaching shard node: {str(e)}")
+            return jsonify({'error': 'Shard node unavailable'}), 503
+
+    def _forward(self, node: str, assigned_id: Optional[int] = None, stream: bool = False) -> Response:
+        """Send the current request unchanged to another node and relay its response"""
+        self._count("forwarded")
+        headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+        headers.update(self._headers(assigned_id))
+        if stream:
+            body = iter(lambda: request.stream.read(UPLOAD_STREAM_CHUNK_BYTES), b"")
+        else:
+            body = request.get_data()
+        response = self._client.request(
+            request.method,
+            node + request.full_path.rstrip("?"),
+            content=body,
+            headers=headers,
+            timeout=self.upload_timeout if stream else self.timeout
+        )
+        return self._response(response.status_code, dict(response.headers), response.content)
+
+    def _route_upload(self):
+        document_id = self.allocate_id()
+        node = self.owner(document_id)
+        if node == self.self_url:
+            g.shard_id = document_id
+            self._count("served_locally")
+            return None
+        return self._forward(node, document_id, stream=True)
+
+    def _has_upload_session(self, node: str, upload_id: str) -> bool:
+        if node == self.self_url:
+            from document_library_database import UploadSessionManager
+            return UploadSessionManager().get_session(upload_id) is not None
+        return self._send(node, "GET", f"/documents/uploads/{upload_id}")[0] == 200
+
+    def _route_upload_session(self):
+        """Sessions stay where they were opened, on the owner of their document id when the ring was last stable"""
+        prefix, _, token = (request.view_args or {}).get("upload_id", "").partition("-")
+        if not prefix.isdigit() or not token:
+            # Opened with sharding off; only this node can have it
+            return None
+        document_id = int(prefix)
+        node = self.owner(document_id)
+        previous = self.previous_owner(document_id)
+        if previous is not None and not self._has_upload_session(node, request.view_args["upload_id"]):
+            # Opened before the node it now belongs to joined
+            node = previous
+            self._count("previous_owner_hits")
+        if node == self.self_url:
+            self._count("served_locally")
+            return None
+        # Streamed, and with the upload timeout: parts can be large and completing one runs the whole ingestion
+        return self._forward(node, stream=True)
+
+    @staticmethod
+    def _prefix_document_id(name: str) -> Optional[int]:
+        """The document id a URL's <name> ("<document id>-<token>") starts with, if it has one"""
+        prefix, _, token = str((request.view_args or {}).get(name, "")).partition("-")
+        return int(prefix) if prefix.isdigit() and token else None
+
+    def _relay(self, node: str) -> Response:
+        """The current request sent to node, this one included, as a response"""
+        if node != self.self_url:
+            self._count("forwarded")
+        headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+        return self._response(*self._send(node, request.method, request.full_path.rstrip("?"), request.get_data(), headers))
+
+    def _route_prefixed(self, name: str):
+        """
+        In-memory state (conversation sessions, map-reduce jobs) stays on the node
+        that created it: the owner of its document id, or the previous owner when
+        it was created before the ring last changed.
+        """
+        document_id = self._prefix_document_id(name)
+        if document_id is None:
+            # Created with sharding off; only this node can have it
+            return None
+        node = self.owner(document_id)
+        previous = self.previous_owner(document_id)
+        if node == self.self_url and previous is None:
+            self._count("served_locally")
+            return None
+        response = self._relay(node)
+        if response.status_code == 404 and previous is not None:
+            self._count("previous_owner_hits")
+            return self._relay(previous)
+        return response
+
+    def _route_conversation(self):
+        return self._route_prefixed("session_id")
+
+    def _route_job(self):
+        if self._prefix_document_id("job_id") is not None:
+            return self._route_prefixed("job_id")
+        # A job_id chosen by the client without the document id: whichever node runs it answers 200
+        path = request.full_path.rstrip("?")
+        body = request.get_data()
+        headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+        calls = {node: (lambda node=node, method=request.method: self._send(node, method, path, body, headers))
+                 for node in self.ring.nodes}
+        results = self._fan_out(calls)
+        found = [result for result in results.values() if not isinstance(result, Exception) and result[0] == 200]
+        if found:
+            return self._response(*found[0])
+        local = results[self.self_url]
+        if isinstance(local, Exception):
+            return jsonify({'error': 'Shard node unavailable'}), 503
+        return self._response(*local)
+
+    def _request_document_id(self) -> Optional[int]:
+        document_id = (request.view_args or {}).get("document_id")
+        if document_id is None:
+            data = request.get_json(silent=True) or {}
+            reference = data.get("document")
+            document_id = reference.get("id") if isinstance(reference, dict) else data.get("document_id")
+        if isinstance(document_id, bool) or not isinstance(document_id, int):
+            return None
+        return document_id
+
+    def _route_document(self):
+        document_id = self._request_document_id()
+        if document_id is None:
+            # Let the endpoint reject the request
+            return None
+        node = self.owner(document_id)
+        previous = self.previous_owner(document_id)
+        if node == self.self_url:
+            from document_library_database import DocumentLibraryManager
+            if previous is None or DocumentLibraryManager.get_document_by_id(document_id) is not None:
+                self._count("served_locally")
+                return None
+            node, previous = previous, None
+            self._count("previous_owner_hits")
+        response = self._forward(node)
+        if response.status_code == 404 and previous is not None:
+            # Not moved yet
+            self._count("previous_owner_hits")
+            if previous == self.self_url:
+                return None
+            return self._forward(previous)
+        return response
+
+    def _route_broadcast(self):
+        """Apply on this node first; the others follow only if it succeeded"""
+        self._count("broadcasts")
+        assigned_id = self.allocate_id() if request.endpoint == "collections.create_collection" else None
+        body = request.get_data()
+        headers = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+        headers.update(self._headers(assigned_id))
+        status, response_headers, content = self._send(self.self_url, request.method, request.full_path.rstrip("?"), body, headers)
+        if not 200 <= status < 300:
+            return self._response(status, response_headers, content)
+        others = {
+            node: (lambda node=node, path=request.full_path.rstrip("?"), method=request.method:
+                   self._send(node, method, path, body, headers))
+            for node in self.ring.nodes if node != self.self_url
+        }
+        failed = [node for node, result in self._fan_out(others).items()
+                  if isinstance(result, Exception) or not 200 <= result[0] < 300]
+        response = self._response(status, response_headers, content)
+        if failed:
+            self._count("replication_failures", len(failed))
+            logger.warning(f"{request.endpoint} not applied on {failed}")
+            response.headers["X-Shard-Failed-Nodes"] = ",".join(failed)
+        return response
+
+    def _route_split(self):
+        self._count("splits")
+        data = request.get_json(silent=True) or {}
+        document_ids = data.get("document_ids")
+        if not isinstance(document_ids, list) or not all(
+                isinstance(document_id, int) and not isinstance(document_id, bool) for document_id in document_ids):
+            return None
+        by_node: Dict[str, List[int]] = {}
+        for document_id in dict.fromkeys(document_ids):
+            by_node.setdefault(self.owner(document_id), []).append(document_id)
+        path = request.full_path.rstrip("?")
+        calls = {
+            node: (lambda node=node, ids=ids, method=request.method: self._send(
+                node, method, path, orjson.dumps({**data, "document_ids": ids}), {"Content-Type": "application/json"}))
+            for node, ids in by_node.items()
+        }
+        responses = []
+        for node, result in self._fan_out(calls).items():
+            if isinstance(result, Exception):
+                return jsonify({'error': 'Shard node unavailable', 'node': node}), 503
+            status, response_headers, content = result
+            if status != 200:
+                return self._response(status, response_headers, content)
+            responses.append(orjson.loads(content))
+        return jsonify(merge_split_responses(responses, document_ids)), 200
+
+    def _route_gather(self):
+        self._count("gathers")
+        path = request.full_path.rstrip("?")
+        calls = {node: (lambda node=node: self._send(node, "GET", path)) for node in self.ring.nodes}
+        results = self._fan_out(calls)
+        local = results.pop(self.self_url)
+        if isinstance(local, Exception):
+            print(f"Error gathering {request.endpoint} on this node: {str(local)}")
+            return jsonify({'error': 'Internal server error'}), 500
+        local_status, local_headers, local_content = local
+        if local_status != 200:
+            return self._response(local_status, local_headers, local_content)
+        payloads = [orjson.loads(local_content)]
+        failed = []
+        for node, result in results.items():
+            if isinstance(result, Exception) or result[0] != 200:
+                failed.append(node)
+            else:
+                payloads.append(orjson.loads(result[2]))
+        response = conditional_json(GATHER_MERGES[request.endpoint](payloads))
+        if failed:
+            self._count("partial_gathers")
+            response.headers["X-Shard-Failed-Nodes"] = ",".join(failed)
+        return response
+
+    def _route_node_local(self):
+        self._count("node_local_refusals")
+        return jsonify({'error': f'{request.path} is not available with sharding enabled: it only sees the documents of one node'}), 501
+
+    def add_node(self, node: str) -> Dict[str, Any]:
+        """Add a node to the ring on every node, which then hand it the documents it now owns"""
+        node = node.rstrip("/")
+        nodes = self.ring.nodes
+        if node in nodes:
+            return {"nodes": nodes, "added": False}
+        nodes.append(node)
+        body = orjson.dumps({"nodes": nodes, "source": self.self_url})
+        headers = {"Content-Type": "application/json"}
+        # The new node copies the collections before any other node can start sending it documents
+        status, _, content = self._send(node, "POST", "/shards/ring", body, headers)
+        if status != 200:
+            raise RuntimeError(f"{node} answered {status}: {content[:200]!r}")
+        calls = {other: (lambda other=other: self._send(other, "POST", "/shards/ring", body, headers))
+                 for other in nodes if other not in (node, self.self_url)}
+        failed = [other for other, result in self._fan_out(calls).items()
+                  if isinstance(result, Exception) or result[0] != 200]
+        self.apply_nodes(nodes)
+        return {"nodes": nodes, "added": True, "failed_nodes": failed}
+
+    def apply_nodes(self, nodes: List[str], source: Optional[str] = None) -> None:
+        """Switch to a new ring and start moving documents; a joining node first copies the collections of source"""
+        from document_library_database import ShardStateManager
+        nodes = [node.rstrip("/") for node in nodes]
+        # A node started on its own learns of the cluster from the first ring update it gets
+        joining = source is not None and source not in self.ring.nodes
+        if joining:
+            status, _, content = self._send(source, "GET", "/shards/collections")
+            if status == 200:
+                ShardStateManager().import_collections(orjson.loads(content)["collections"])
+        with self._lock:
+            self.previous_ring = self.ring
+            self.ring = HashRing(nodes, self.virtual_nodes)
+        ShardStateManager().set_nodes(nodes)
+        logger.info(f"Shard ring is now {nodes}")
+        self._wake.set()
+
+    def rebalance(self) -> Dict[str, Any]:
+        """Send every document this node holds but no longer owns to its owner"""
+        from document_library_database import ShardStateManager, DocumentLibraryManager
+        with self._lock:
+            if self._rebalance["running"]:
+                return {"running": True}
+            self._rebalance["running"] = True
+        moved, failed = [], []
+        try:
+            for document_id in ShardStateManager().get_document_ids():
+                node = self.owner(document_id)
+                if node == self.self_url:
+                    continue
+                try:
+                    self._transfer(document_id, node)
+                except Exception as e:
+                    logger.warning(f"Could not move document {document_id} to {node}: {e}")
+                    failed.append(document_id)
+                    continue
+                DocumentLibraryManager.delete_document(document_id, soft_delete=False)
+                moved.append(document_id)
+        finally:
+            with self._lock:
+                self._rebalance["running"] = False
+                self._rebalance["runs"] += 1
+                self._rebalance["moved_total"] += len(moved)
+                self._rebalance["last_run"] = {"moved": len(moved), "failed": failed}
+        return {"moved": moved, "failed": failed}
+
+    def _transfer(self, document_id: int, node: str) -> None:
+        from document_library_database import ShardStateManager
+        bundle = ShardStateManager().export_document(document_id)
+        if bundle is None:
+            return
+        files = {}
+        vectorstore_path = bundle["document"].get("vectorstore_path")
+        if vectorstore_path and os.path.isdir(vectorstore_path):
+            archive = io.BytesIO()
+            with tarfile.open(fileobj=archive, mode="w") as tar:
+                tar.add(vectorstore_path, arcname=".")
+            files["vectorstore"] = ("vectorstore.tar", archive.getvalue(), "application/x-tar")
+        response = self._client.post(
+            node + "/shards/documents",
+            data={"bundle": orjson.dumps(bundle).decode()},
+            files=files or None,
+            headers=self._headers(),
+            timeout=self.upload_timeout
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"{node} answered {response.status_code}: {response.text[:200]}")
+
+    def receive_document(self, bundle: Dict[str, Any], archive=None) -> int:
+        """Store a document sent by another node, unpacking its vectorstore unless it is already here"""
+        from document_library_database import ShardStateManager
+        vectorstore_path = bundle["document"].get("vectorstore_path")
+        if archive is not None and vectorstore_path and not os.path.isdir(vectorstore_path):
+            if os.path.isabs(vectorstore_path) or os.path.normpath(vectorstore_path).startswith(".."):
+                raise ValueError(f"Refusing to unpack outside the working directory: {vectorstore_path}")
+            parent = os.path.dirname(os.path.normpath(vectorstore_path)) or "."
+            os.makedirs(parent, exist_ok=True)
+            scratch_path = tempfile.mkdtemp(prefix=".incoming-", dir=parent)
+            try:
+                with tarfile.open(fileobj=archive, mode="r") as tar:
+                    tar.extractall(scratch_path, filter="data")
+                os.rename(scratch_path, vectorstore_path)
+            except Exception:
+                shutil.rmtree(scratch_path, ignore_errors=True)
+                raise
+        document_id = ShardStateManager().import_document(bundle)
+        self._count("received_documents")
+        employer = bundle["document"].get("employer")
+        if employer:
+            from retrieval import IssuerIndexes
+            IssuerIndexes().refresh(employer)
+        return document_id
+
+    def _run(self) -> None:
+        while True:
+            try:
+                result = self.rebalance()
+            except Exception as e:
+                print(f"Error rebalancing shards: {str(e)}")
+                result = {}
+            # Retry failed moves later; a ring change wakes the loop at once
+            self._wake.wait(self.rebalance_interval_seconds if result.get("failed") else None)
+            self._wake.clear()
+
+    def start(self) -> None:
+        """Start the background rebalancer once; it also moves documents left over from a previous ring"""
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="shard-rebalance", daemon=True)
+        self._thread.start()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            rebalance = dict(self._rebalance)
+        return {
+            "enabled": self.enabled,
+            "self": self.self_url,
+            "node_id": self.node_id,
+            "nodes": self.ring.nodes,
+            "previous_nodes": self.previous_ring.nodes if self.previous_ring else None,
+            "rebalance": rebalance,
+            **counters
+        }
\ No newline at end of file
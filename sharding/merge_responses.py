@@ -0,0 +1,75 @@
+from typing import Dict, Any, List
+
+
+def _unique(items: List[Dict[str, Any]], key) -> List[Dict[str, Any]]:
+    """First occurrence of each key; a document being moved can briefly answer from two nodes"""
+    seen = set()
+    unique = []
+    for item in items:
+        if key(item) not in seen:
+            seen.add(key(item))
+            unique.append(item)
+    return unique
+
+
+def merge_collections(payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Collection rows are the same on every node; only the document counts add up"""
+    collections = {collection['id']: dict(collection) for collection in payloads[0]['collections']}
+    for payload in payloads[1:]:
+        for collection in payload['collections']:
+            if collection['id'] in collections:
+                collections[collection['id']]['document_count'] += collection['document_count']
+    return {'collections': list(collections.values()), 'count': len(collections)}
+
+
+def merge_collection(payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+    collection = dict(payloads[0]['collection'])
+    if 'documents' in collection:
+        documents = [document for payload in payloads for document in payload['collection'].get('documents', [])]
+        collection['documents'] = _merge_documents(documents)
+    return {'collection': collection}
+
+
+def _merge_documents(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    documents = _unique(documents, lambda document: document['id'])
+    return sorted(documents, key=lambda document: document.get('added_at') or '', reverse=True)
+
+
+def merge_collection_documents(payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+    documents = _merge_documents([document for payload in payloads for document in payload['documents']])
+    return {**payloads[0], 'documents': documents, 'count': len(documents)}
+
+
+def merge_documents_by_collection(payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+    merged = {}
+    for payload in payloads:
+        for name, documents in payload.items():
+            merged.setdefault(name, []).extend(documents)
+    return {name: _merge_documents(documents) for name, documents in merged.items()}
+
+
+def merge_agreements(payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+    agreements = [agreement for payload in payloads for agreement in payload['agreements']]
+    agreements = _unique(agreements, lambda agreement: (agreement['document_id'], agreement['collection']))
+    return {'agreements': sorted(agreements, key=lambda agreement: agreement['document_id'])}
+
+
+# Endpoints served by asking every node, and how their answers combine; the local answer comes first
+GATHER_MERGES = {
+    "collections.list_collections": merge_collections,
+    "collections.get_collection": merge_collection,
+    "collections.get_collection_documents": merge_collection_documents,
+    "documents.list_documents": merge_documents_by_collection,
+    "list_agreements": merge_agreements
+}
+
+
+def merge_split_responses(payloads: List[Dict[str, Any]], document_ids: List[int]) -> Dict[str, Any]:
+    """One bulk collection response from the responses of the nodes owning each document, in request order"""
+    by_document = {result['document_id']: result for payload in payloads for result in payload['results']}
+    results = [by_document[document_id] for document_id in dict.fromkeys(document_ids) if document_id in by_document]
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    merged = {key: value for key, value in payloads[0].items() if key not in ('results', 'summary')} if payloads else {}
+    return {**merged, 'results': results, 'summary': summary}
\ No newline at end of file
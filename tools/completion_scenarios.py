@@ -0,0 +1,196 @@
+"""
+Drive get_completion through circuit breaker, hedging and retry scenarios against tools.fake_openai_server.
+
+    python -m tools.completion_scenarios
+
+Each breaker scenario opens a model's circuit with injected 500s, waits for it
+to turn half_open, lets the probe end in a given way, then checks that a
+healthy upstream is reached again instead of the circuit refusing calls for
+good. The hedging scenarios check that a slow primary is answered by its hedge
+and that attempts still queued when the caller gives up are never sent; the
+retry scenarios that backoffs are waited out only when they fit the deadline
+and the admission lane. Prints one line per scenario and exits 1 if any fails.
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+FAILURES_TO_OPEN = 2
+RESET_SECONDS = 0.3
+SLOW_LATENCY_MS = 1000
+# Two completion workers, so a third concurrent attempt has to queue
+HEDGE_WORKERS = 2
+# Longer than a first jittered backoff (at most 1s), shorter than RETRY_AFTER_SECONDS
+INTERACTIVE_MAX_WAIT_SECONDS = 1.5
+RETRY_AFTER_SECONDS = 2
+
+
+def open_circuit(config, model, get_completion):
+    config.error_rate = 1.0
+    for _ in range(FAILURES_TO_OPEN):
+        get_completion("ping", model=model, max_retries=1, hedge=False)
+    config.error_rate = 0.0
+    refused = get_completion("ping", model=model, max_retries=1, hedge=False)
+    time.sleep(RESET_SECONDS * 1.5)
+    return refused.get("error_type")
+
+
+def probe_recovers(config, model, get_completion):
+    """A healthy probe closes the circuit"""
+    return None
+
+
+def probe_rate_limited(config, model, get_completion):
+    """The probe is answered 429, which says nothing about upstream health"""
+    config.rate_limit_rate = 1.0
+    try:
+        return get_completion("ping", model=model, max_retries=1, hedge=False).get("error_type")
+    finally:
+        config.rate_limit_rate = 0.0
+
+
+def probe_deadline_timeout(config, model, get_completion):
+    """The probe times out because the caller's deadline was shorter than the request timeout"""
+    config.slow_fraction = 1.0
+    try:
+        outcome = get_completion("ping", model=model, max_retries=1, hedge=False, timeout=30,
+                                 deadline=time.monotonic() + 0.2).get("error_type")
+        # The caller gives up at its deadline; the abandoned attempt ends with its own timeout just after
+        time.sleep(0.3)
+        return outcome
+    finally:
+        config.slow_fraction = 0.0
+
+
+BREAKER_SCENARIOS = [
+    ("healthy probe", probe_recovers),
+    ("429 during half-open", probe_rate_limited),
+    ("deadline timeout during half-open", probe_deadline_timeout),
+]
+
+
+def warm_up(model, get_completion):
+    """Enough fast answers for a p95, so hedges go out after ResilientCompletionClient.MIN_HEDGE_DELAY"""
+    from chat.class_ResilientCompletionClient import ResilientCompletionClient
+    for _ in range(ResilientCompletionClient.MIN_SAMPLES_FOR_P95):
+        get_completion("ping", model=model, max_retries=1, hedge=False)
+
+
+def hedge_wins(config, model, get_completion, client, scheduler):
+    """The primary is slow, the hedge sent after the p95 answers"""
+    warm_up(model, get_completion)
+    won = client.hedges_won
+    config.scripted.extend(["slow", "ok"])
+    started = time.monotonic()
+    result = get_completion("ping", model=model, max_retries=1)
+    elapsed = time.monotonic() - started
+    # The losing primary cannot be interrupted once sent; let it end before the next scenario
+    time.sleep(SLOW_LATENCY_MS / 1000)
+    return (result["success"] and client.hedges_won == won + 1 and elapsed < SLOW_LATENCY_MS / 2000,
+            f"answered in {elapsed:.2f}s by the hedge: {client.hedges_won == won + 1}")
+
+
+def queued_attempts_cancelled(config, model, get_completion, client, scheduler):
+    """Both workers are busy with slow primaries, so their hedges queue and are dropped at the deadline"""
+    warm_up(model, get_completion)
+    cancelled, requests = client.attempts_cancelled, config.requests
+    config.scripted.extend(["slow"] * HEDGE_WORKERS)
+    deadline = time.monotonic() + 0.6
+    with ThreadPoolExecutor(max_workers=HEDGE_WORKERS) as callers:
+        results = list(callers.map(
+            lambda _: get_completion("ping", model=model, max_retries=1, deadline=deadline), range(HEDGE_WORKERS)))
+    sent = config.requests - requests
+    time.sleep(SLOW_LATENCY_MS / 1000)
+    outcomes = sorted({result.get("error_type") or "success" for result in results})
+    return (outcomes == ["deadline_exceeded"] and client.attempts_cancelled == cancelled + HEDGE_WORKERS and sent == HEDGE_WORKERS,
+            f"outcomes: {', '.join(outcomes)}  cancelled: {client.attempts_cancelled - cancelled}  sent: {sent}")
+
+
+def retry_after_error(config, model, get_completion, client, scheduler):
+    """A 500 is retried after a jittered backoff"""
+    backoffs = scheduler.stats()["lanes"]["interactive"]["backoffs"]
+    config.scripted.append("error")
+    result = get_completion("ping", model=model, max_retries=3, hedge=False)
+    waited = scheduler.stats()["lanes"]["interactive"]["backoffs"] - backoffs
+    return result["success"] and waited == 1, f"result: {result.get('error_type') or 'success'}  backoffs: {waited}"
+
+
+def backoff_past_deadline(config, model, get_completion, client, scheduler):
+    """A Retry-After that ends after the deadline fails at once instead of sleeping"""
+    config.scripted.append("rate_limited")
+    started = time.monotonic()
+    result = get_completion("ping", model=model, max_retries=3, hedge=False, deadline=time.monotonic() + 0.5)
+    elapsed = time.monotonic() - started
+    return (result.get("error_type") == "rate_limit_error" and elapsed < 0.3,
+            f"result: {result.get('error_type')} after {elapsed:.2f}s")
+
+
+def backoff_past_lane_wait(config, model, get_completion, client, scheduler):
+    """A Retry-After longer than the interactive lane may wait is shed with that Retry-After"""
+    config.scripted.append("rate_limited")
+    started = time.monotonic()
+    result = get_completion("ping", model=model, max_retries=3, hedge=False)
+    elapsed = time.monotonic() - started
+    return (result.get("error_type") == "overloaded" and result.get("retry_after") == config.retry_after_seconds and elapsed < 0.3,
+            f"result: {result.get('error_type')} (retry after {result.get('retry_after')}s) after {elapsed:.2f}s")
+
+
+def background_waits_backoff(config, model, get_completion, client, scheduler):
+    """The background lane may wait longer, so the same Retry-After is waited out and retried"""
+    config.scripted.append("rate_limited")
+    started = time.monotonic()
+    result = get_completion("ping", model=model, max_retries=3, hedge=False, priority="background")
+    elapsed = time.monotonic() - started
+    return (result["success"] and elapsed >= config.retry_after_seconds,
+            f"result: {result.get('error_type') or 'success'} after {elapsed:.2f}s")
+
+
+SCENARIOS = [
+    ("hedge answers a slow primary", hedge_wins),
+    ("queued hedges dropped at the deadline", queued_attempts_cancelled),
+    ("500 retried after backoff", retry_after_error),
+    ("429 backoff past the deadline", backoff_past_deadline),
+    ("429 backoff past the lane's max wait", backoff_past_lane_wait),
+    ("429 backoff in the background lane", background_waits_backoff),
+]
+
+
+def main():
+    os.environ["OPENAI_CIRCUIT_FAILURES"] = str(FAILURES_TO_OPEN)
+    os.environ["OPENAI_CIRCUIT_RESET_SECONDS"] = str(RESET_SECONDS)
+    os.environ["OPENAI_HEDGING"] = "true"
+    os.environ["OPENAI_HEDGE_WORKERS"] = str(HEDGE_WORKERS)
+    os.environ["LLM_MAX_WAIT_INTERACTIVE"] = str(INTERACTIVE_MAX_WAIT_SECONDS)
+    os.environ.pop("OPENAI_FALLBACK_MODEL", None)
+    from tools.fake_openai_server import start_fake_openai_server
+    server, config = start_fake_openai_server(latency_ms=5, slow_latency_ms=SLOW_LATENCY_MS, retry_after_seconds=RETRY_AFTER_SECONDS)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+
+    from chat import get_completion, AdmissionScheduler
+    from chat.class_ResilientCompletionClient import ResilientCompletionClient
+    client = ResilientCompletionClient()
+    scheduler = AdmissionScheduler()
+
+    failed = 0
+    for number, (name, probe) in enumerate(BREAKER_SCENARIOS):
+        model = f"breaker-{number}"
+        refused = open_circuit(config, model, get_completion)
+        probe_outcome = probe(config, model, get_completion)
+        after = get_completion("ping", model=model, max_retries=1, hedge=False)
+        state = client.breaker(model).state
+        passed = refused == "circuit_open" and after["success"] and state == "closed"
+        failed += not passed
+        print(f"{'ok  ' if passed else 'FAIL'} {name:<38} opened: {refused}  probe: {probe_outcome or 'success'}  "
+              f"next call: {'success' if after['success'] else after.get('error_type')}  circuit: {state}")
+    for number, (name, scenario) in enumerate(SCENARIOS):
+        passed, detail = scenario(config, f"scenario-{number}", get_completion, client, scheduler)
+        failed += not passed
+        print(f"{'ok  ' if passed else 'FAIL'} {name:<38} {detail}")
+    server.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Local stand-in for the OpenAI API with injectable latency and failures.
+
+Serves the two endpoints the API uses (POST /v1/responses and POST /v1/embeddings)
+so the completion and embedding paths can be exercised offline. Point the app at it with
+
+    python -m tools.fake_openai_server --port 8089 --latency-ms 200 --slow-fraction 0.05 --slow-latency-ms 5000
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake python main.py
+"""
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+EMBEDDING_DIMENSIONS = 1536
+
+
+def fake_embedding(text: str, dimensions: int = EMBEDDING_DIMENSIONS) -> list:
+    """Deterministic unit vector derived from the text, so identical inputs embed identically"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FakeOpenAIConfig:
+    def __init__(self, latency_ms=50, slow_fraction=0.0, slow_latency_ms=5000, error_rate=0.0, rate_limit_rate=0.0, cache_min_tokens=1024,
+                 retry_after_seconds=1):
+        self.latency_ms = latency_ms
+        self.slow_fraction = slow_fraction
+        self.slow_latency_ms = slow_latency_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_seconds = retry_after_seconds
+        # Outcomes forced on the next requests in order ('ok', 'slow', 'error' or 'rate_limited'), ahead of the rates
+        self.scripted = deque()
+        # Prompt caching as upstream does it: prefixes of at least cache_min_tokens, in 128-token steps
+        self.cache_min_tokens = cache_min_tokens
+        self.prompt_cache = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+def make_handler(config: FakeOpenAIConfig):
+    class FakeOpenAIHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def handle(self):
+            try:
+                super().handle()
+            except (BrokenPipeError, ConnectionResetError):
+                # The client gave up on a slow answer, as callers with a deadline do
+                pass
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _inject_faults(self) -> bool:
+            with config.lock:
+                config.requests += 1
+                outcome = config.scripted.popleft() if config.scripted else None
+            slow = outcome == "slow" if outcome else random.random() < config.slow_fraction
+            time.sleep((config.slow_latency_ms if slow else config.latency_ms) / 1000)
+            if outcome == "rate_limited" or (outcome is None and random.random() < config.rate_limit_rate):
+                self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                                {"retry-after": str(config.retry_after_seconds)})
+                return True
+            if outcome == "error" or (outcome is None and random.random() < config.error_rate):
+                self._send_json(500, {"error": {"message": "Injected server error", "type": "server_error"}})
+                return True
+            return False
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if self._inject_faults():
+                return
+            if self.path.endswith("/responses"):
+                self._send_json(200, self._response(payload))
+            elif self.path.endswith("/embeddings"):
+                self._send_json(200, self._embeddings(payload))
+            else:
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+        def _response(self, payload):
+            messages = payload.get("input") or []
+            question = messages[-1]["content"] if isinstance(messages, list) and messages else str(messages)
+            text = f"Fake answer to: {question[-200:]}"
+            input_tokens = sum(len(str(m.get("content", "")).split()) for m in messages) if isinstance(messages, list) else 0
+            cached_tokens = self._cached_tokens(payload, messages)
+            return {
+                "id": f"resp_{random.getrandbits(48):x}",
+                "object": "response",
+                "created_at": int(time.time()),
+                "model": payload.get("model"),
+                "status": "completed",
+                "output": [{
+                    "id": f"msg_{random.getrandbits(48):x}",
+                    "type": "message",
+                    "role": "assistant",
+                    "status": "completed",
+                    "content": [{"type": "output_text", "text": text, "annotations": []}]
+                }],
+                "parallel_tool_calls": False,
+                "tool_choice": "auto",
+                "tools": [],
+                "usage": {
+                    "input_tokens": input_tokens,
+                    "output_tokens": len(text.split()),
+                    "total_tokens": input_tokens + len(text.split()),
+                    "input_tokens_details": {"cached_tokens": cached_tokens},
+                    "output_tokens_details": {"reasoning_tokens": 0}
+                }
+            }
+
+        def _cached_tokens(self, payload, messages):
+            # Whitespace-separated words stand in for tokens, as in input_tokens above
+            if not isinstance(messages, list):
+                return 0
+            words = [word for m in messages for word in str(m.get("content", "")).split()]
+            key = payload.get("prompt_cache_key") or " ".join(words[:32])
+            with config.lock:
+                previous = config.prompt_cache.get(key, [])
+                config.prompt_cache[key] = words
+            shared = 0
+            for old, new in zip(previous, words):
+                if old != new:
+                    break
+                shared += 1
+            return shared // 128 * 128 if shared >= config.cache_min_tokens else 0
+
+        def _embeddings(self, payload):
+            inputs = payload.get("input")
+            if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+                inputs = [inputs]
+            dimensions = payload.get("dimensions") or EMBEDDING_DIMENSIONS
+            data = [{
+                "object": "embedding",
+                "index": i,
+                "embedding": fake_embedding(text if isinstance(text, str) else json.dumps(text), dimensions)
+            } for i, text in enumerate(inputs)]
+            return {
+                "object": "list",
+                "data": data,
+                "model": payload.get("model"),
+                "usage": {"prompt_tokens": 0, "total_tokens": 0}
+            }
+
+    return FakeOpenAIHandler
+
+
+def start_fake_openai_server(host="127.0.0.1", port=0, **config_kwargs):
+    """Start the server on a daemon thread; returns (server, config). port=0 picks a free port."""
+    config = FakeOpenAIConfig(**config_kwargs)
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI API with injected latency")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--slow-fraction", type=float, default=0.0, help="Fraction of requests that take --slow-latency-ms")
+    parser.add_argument("--slow-latency-ms", type=float, default=5000)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 429")
+    args = parser.parse_args()
+
+    config = FakeOpenAIConfig(
+        latency_ms=args.latency_ms,
+        slow_fraction=args.slow_fraction,
+        slow_latency_ms=args.slow_latency_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f"Fake OpenAI API listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Replay captured query traffic against a running instance and report how it held up.
+
+Capture traffic first by starting the API with QUERY_CAPTURE_PATH=captures/queries.jsonl,
+then replay it:
+
+    python -m tools.replay_queries captures/queries.jsonl --target http://127.0.0.1:5000 --speedup 10 --concurrency 16
+
+With --offline the app is started in this process against tools.fake_openai_server,
+so nothing leaves the machine (the documents and vectorstores referenced by the
+capture must exist locally, and tiktoken's cl100k_base encoding must be cached,
+e.g. in TIKTOKEN_CACHE_DIR, since embedding requests count tokens with it):
+
+    python -m tools.replay_queries captures/queries.jsonl --offline --speedup 0 --concurrency 32
+
+Arrival times are replayed compressed by --speedup (0 sends as fast as the
+concurrency allows). The report covers latency percentiles, status and error
+rates, which path answered (financial facts or RAG), the query embedding cache
+hit rate over the run, and how far dispatch fell behind the schedule.
+"""
+import os
+import time
+import logging
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import orjson
+
+
+def load_capture(path, limit=None):
+    """Captured records in arrival order"""
+    records = []
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(orjson.loads(line))
+    records.sort(key=lambda record: record["timestamp"])
+    return records[:limit] if limit else records
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def replay_request(client, record):
+    body = {"prompt": record["prompt"], "document": {"id": record["document_id"]}, **record.get("params", {})}
+    started = time.perf_counter()
+    try:
+        response = client.post(record.get("path", "/query_collective_bargaining_agreement"), json=body)
+    except httpx.HTTPError as e:
+        return {"status": None, "latency_ms": (time.perf_counter() - started) * 1000, "error": type(e).__name__}
+    latency_ms = (time.perf_counter() - started) * 1000
+    answer = {}
+    if response.headers.get("content-type", "").startswith("application/json"):
+        answer = (response.json() or {}).get("answer") or {}
+    return {
+        "status": response.status_code,
+        "latency_ms": latency_ms,
+        "source": answer.get("source", "rag") if answer.get("success") else answer.get("error_type"),
+        "error": None if response.status_code == 200 and answer.get("success", True) else (answer.get("error_type") or f"http_{response.status_code}")
+    }
+
+
+def cache_stats(client):
+    try:
+        response = client.get("/query_embedding_cache/stats")
+        return response.json() if response.status_code == 200 else None
+    except httpx.HTTPError:
+        return None
+
+
+def replay(records, target, speedup=1.0, concurrency=8, timeout=120.0):
+    """Re-issue the records against target; returns the report dict"""
+    client = httpx.Client(
+        base_url=target,
+        timeout=timeout,
+        headers={"Accept-Encoding": "gzip"},
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency))
+    cache_before = cache_stats(client)
+    results = []
+    lags = []
+    results_lock = threading.Lock()
+
+    def run(record):
+        result = replay_request(client, record)
+        with results_lock:
+            results.append(result)
+
+    started = time.perf_counter()
+    first_timestamp = records[0]["timestamp"] if records else 0.0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for record in records:
+            if speedup > 0:
+                scheduled = (record["timestamp"] - first_timestamp) / speedup
+                delay = scheduled - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    lags.append(-delay * 1000)
+            executor.submit(run, record)
+    elapsed = time.perf_counter() - started
+    cache_after = cache_stats(client)
+    client.close()
+
+    latencies = [result["latency_ms"] for result in results]
+    errors = Counter(result["error"] for result in results if result["error"])
+    report = {
+        "requests": len(results),
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            name: round(percentile(latencies, fraction), 2) if latencies else None
+            for name, fraction in (("p50", 0.50), ("p90", 0.90), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))
+        },
+        "captured_latency_ms": {
+            name: percentile([record["latency_ms"] for record in records if record.get("latency_ms") is not None], fraction)
+            for name, fraction in (("p50", 0.50), ("p95", 0.95))
+        },
+        "status_codes": dict(Counter(str(result["status"]) for result in results)),
+        "error_rate": round(sum(errors.values()) / len(results), 4) if results else None,
+        "errors": dict(errors),
+        "answered_by": dict(Counter(result["source"] for result in results if result.get("source"))),
+        "dispatch_lag_ms": {"p95": round(percentile(lags, 0.95), 2) if lags else 0.0, "max": round(max(lags), 2) if lags else 0.0}
+    }
+    if cache_before and cache_after:
+        hits = cache_after["hits"] - cache_before["hits"]
+        lookups = hits + cache_after["misses"] - cache_before["misses"]
+        report["query_embedding_cache"] = {
+            "hits": hits,
+            "lookups": lookups,
+            "hit_rate": round(hits / lookups, 4) if lookups else None
+        }
+    return report
+
+
+def check_offline_tokenizer():
+    """Embedding requests count tokens with tiktoken, which downloads its encoding on first use"""
+    import tiktoken
+    try:
+        tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        raise SystemExit(f"--offline needs tiktoken's cl100k_base encoding cached locally "
+                         f"(point TIKTOKEN_CACHE_DIR at a directory holding it): {e}")
+
+
+def start_offline_app(latency_ms, error_rate, rate_limit_rate):
+    """Run the API in this process with the OpenAI client pointed at a local fake; returns its base URL"""
+    check_offline_tokenizer()
+    from tools.fake_openai_server import start_fake_openai_server
+    fake_server, _ = start_fake_openai_server(latency_ms=latency_ms, error_rate=error_rate, rate_limit_rate=rate_limit_rate)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{fake_server.server_address[1]}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    os.environ.pop("QUERY_CAPTURE_PATH", None)
+
+    from werkzeug.serving import make_server
+    from main import app
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    app_server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=app_server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{app_server.server_port}"
+
+
+def print_report(report):
+    print(f"requests        {report['requests']} in {report['elapsed_seconds']}s ({report['throughput_rps']} req/s)")
+    latency = report["latency_ms"]
+    print(f"latency ms      p50 {latency['p50']}  p90 {latency['p90']}  p95 {latency['p95']}  p99 {latency['p99']}  max {latency['max']}")
+    captured = report["captured_latency_ms"]
+    print(f"captured ms     p50 {captured['p50']}  p95 {captured['p95']}")
+    print(f"status codes    {report['status_codes']}")
+    print(f"error rate      {report['error_rate']}  {report['errors']}")
+    print(f"answered by     {report['answered_by']}")
+    if "query_embedding_cache" in report:
+        cache = report["query_embedding_cache"]
+        print(f"embedding cache {cache['hits']}/{cache['lookups']} hits (rate {cache['hit_rate']})")
+    print(f"dispatch lag ms p95 {report['dispatch_lag_ms']['p95']}  max {report['dispatch_lag_ms']['max']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="File written by QUERY_CAPTURE_PATH")
+    parser.add_argument("--target", default="http://127.0.0.1:5000")
+    parser.add_argument("--speedup", type=float, default=1.0, help="Replay this many times faster than captured; 0 for no pacing")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--limit", type=int, help="Replay only the first N records")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--offline", action="store_true", help="Serve the app in process against a fake OpenAI backend")
+    parser.add_argument("--fake-latency-ms", type=float, default=200)
+    parser.add_argument("--fake-error-rate", type=float, default=0.0)
+    parser.add_argument("--fake-rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--json", dest="json_path", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    records = load_capture(args.capture, args.limit)
+    target = args.target
+    if args.offline:
+        target = start_offline_app(args.fake_latency_ms, args.fake_error_rate, args.fake_rate_limit_rate)
+    report = replay(records, target, speedup=args.speedup, concurrency=args.concurrency, timeout=args.timeout)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "wb") as f:
+            f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Run a sharded cluster of the API on this machine, one process per port, each
+in its own working directory and so with its own SQLite file and vectorstore/:
+
+    python -m tools.run_shard_cluster --nodes 3 --base-port 5101 --root /tmp/shards
+
+Any node accepts every request and routes it (sharding.ShardRouter). With
+--fake-openai the nodes use tools.fake_openai_server started here, so uploads
+and queries need no network access. --join starts one more node on its own
+once the cluster is up and adds it through POST /shards/nodes, so documents
+can be watched moving onto it (GET /shards/stats on any node):
+
+    python -m tools.run_shard_cluster --nodes 2 --join --fake-openai
+
+Node output goes to <root>/node-<n>/node.log. Ctrl-C stops every node.
+"""
+import os
+import sys
+import time
+import secrets
+import argparse
+import subprocess
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_node(node_id, port, nodes, token, root, app="main", env=None):
+    """Start one node in <root>/node-<node_id>; returns (url, process)"""
+    url = f"http://127.0.0.1:{port}"
+    directory = os.path.join(root, f"node-{node_id}")
+    os.makedirs(directory, exist_ok=True)
+    node_env = {
+        **os.environ,
+        **(env or {}),
+        "PYTHONPATH": os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get("PYTHONPATH")])),
+        "SHARD_NODES": ",".join(nodes),
+        "SHARD_SELF": url,
+        "SHARD_NODE_ID": str(node_id),
+        "SHARD_TOKEN": token
+    }
+    log = open(os.path.join(directory, "node.log"), "ab")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "flask", "--app", app, "run", "--port", str(port), "--with-threads"],
+        cwd=directory, env=node_env, stdout=log, stderr=subprocess.STDOUT)
+    return url, process
+
+
+def wait_healthy(url, process, timeout_seconds=60.0):
+    deadline = time.monotonic() + timeout_seconds
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Node {url} exited with {process.returncode}; see its node.log")
+        try:
+            if httpx.get(f"{url}/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Node {url} did not become healthy within {timeout_seconds:.0f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--base-port", type=int, default=5101)
+    parser.add_argument("--root", default="shards", help="Directory holding one working directory per node")
+    parser.add_argument("--app", default="main", help="Flask app import path, as for flask --app")
+    parser.add_argument("--token", default=None, help="SHARD_TOKEN shared by the nodes (default random)")
+    parser.add_argument("--join", action="store_true", help="Start one more node afterwards and add it to the ring")
+    parser.add_argument("--fake-openai", action="store_true", help="Point the nodes at a fake OpenAI API run here")
+    args = parser.parse_args()
+
+    token = args.token or secrets.token_hex(16)
+    env = {}
+    if args.fake_openai:
+        from tools.fake_openai_server import start_fake_openai_server
+        server, _ = start_fake_openai_server("127.0.0.1", 0)
+        env = {"OPENAI_API_KEY": "fake", "OPENAI_BASE_URL": f"http://127.0.0.1:{server.server_address[1]}/v1"}
+
+    urls = [f"http://127.0.0.1:{args.base_port + index}" for index in range(args.nodes)]
+    processes = []
+    try:
+        for index, url in enumerate(urls):
+            processes.append(start_node(index + 1, args.base_port + index, urls, token, args.root, args.app, env))
+        for url, process in processes:
+            wait_healthy(url, process)
+        print(f"Cluster of {len(urls)} nodes up: {', '.join(urls)}")
+        print(f"SHARD_TOKEN={token}")
+
+        if args.join:
+            node_id = args.nodes + 1
+            port = args.base_port + args.nodes
+            joining_url = f"http://127.0.0.1:{port}"
+            joining = start_node(node_id, port, [joining_url], token, args.root, args.app, env)
+            processes.append(joining)
+            wait_healthy(*joining)
+            response = httpx.post(f"{urls[0]}/shards/nodes", json={"url": joining_url},
+                                  headers={"X-Shard-Token": token}, timeout=60.0)
+            print(f"Joined {joining_url}: {response.status_code} {response.text.strip()}")
+
+        while all(process.poll() is None for _, process in processes):
+            time.sleep(1.0)
+        print("A node exited; stopping the cluster")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for _, process in processes:
+            process.terminate()
+        for _, process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file